@@ -0,0 +1,54 @@
+"""Solve time of the batch dispatch assignment against batch size.
+
+Requests and workers are scattered over a 30 x 20 km area and a worker can
+only take requests within the scheduler's search radius. The greedy column
+replays one-at-a-time dispatch in arrival order for comparison.
+
+Run from the repository root:
+    python -m benchmarks.bench_assignment
+"""
+import time
+import numpy as np
+from src.services.distance_service import DistanceService
+from src.utils import assignment
+from src.utils.assignment import solve_assignment
+
+RADIUS_KM = 10
+
+def random_cost(rng, requests, workers):
+    origins = np.column_stack([rng.uniform(31.8, 32.0, requests), rng.uniform(117.2, 117.5, requests)])
+    destinations = np.column_stack([rng.uniform(31.8, 32.0, workers), rng.uniform(117.2, 117.5, workers)])
+    distance = DistanceService.distance_matrix(origins, destinations)
+    specialization = rng.random((requests, workers)) < 0.5
+    # Same weights as TaskSchedulerService._calculate_worker_score, all workers available
+    score = 0.4 / (1 + distance) + 0.4 * specialization + 0.2
+    return np.where(distance <= RADIUS_KM, -score, np.inf)
+
+def greedy(cost):
+    taken = np.zeros(cost.shape[1], dtype=bool)
+    total, matched = 0.0, 0
+    for row in cost:
+        row = np.where(taken, np.inf, row)
+        col = int(np.argmin(row))
+        if np.isfinite(row[col]):
+            taken[col] = True
+            total += row[col]
+            matched += 1
+    return matched, -total
+
+def main():
+    rng = np.random.default_rng(0)
+    solver = "scipy" if assignment.linear_sum_assignment is not None else "numpy"
+    print(f"solver: {solver}")
+    print(f"{'requests x workers':>20} {'solve':>10} {'matched':>8} {'score':>9} {'greedy score':>13}")
+    for requests, workers in ((100, 100), (250, 500), (500, 500), (1000, 1000), (1000, 2000), (2000, 2000)):
+        cost = random_cost(rng, requests, workers)
+        start = time.perf_counter()
+        rows, cols = solve_assignment(cost)
+        elapsed = time.perf_counter() - start
+        greedy_matched, greedy_score = greedy(cost)
+        print(f"{f'{requests} x {workers}':>20} {elapsed * 1e3:>8.1f}ms {len(rows):>8} "
+              f"{-cost[rows, cols].sum():>9.1f} {greedy_score:>9.1f} ({greedy_matched})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Available-worker area queries at night, with and without the partitioned geo sets.
+
+OFFLINE_SHARE of WORKERS workers are offline. The first row searches the
+geo set of every worker and drops the unavailable ones after fetching them,
+as get_available_care_workers_in_area did; the second asks the geo set of
+available workers with the specialization. Redis and MongoDB are the
+in-memory fakes in benchmarks/fakes.py.
+
+Run from the repository root:
+    python -m benchmarks.bench_available_workers
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareWorkerStatus, ServiceType
+from src.services import care_worker_service as care_worker_module
+from src.services.care_worker_service import CareWorkerService, WORKER_LOCATIONS_KEY
+from src.utils.local_cache import LocalCache
+from benchmarks.fakes import FakeCollection, FakeRedis
+
+LATENCY = 0.001
+WORKERS = 20000
+OFFLINE_SHARE = 0.9
+QUERIES = 200
+RADIUS_KM = 5
+
+def make_service(rng):
+    redis, collection = FakeRedis(LATENCY), FakeCollection(LATENCY)
+    service_types = list(ServiceType)
+    latitudes, longitudes = rng.uniform(31.7, 32.1, WORKERS), rng.uniform(117.1, 117.6, WORKERS)
+    offline = rng.random(WORKERS) < OFFLINE_SHARE
+    for index, (latitude, longitude) in enumerate(zip(latitudes.tolist(), longitudes.tolist())):
+        document = {"_id": ObjectId(), "name": "Worker", "email": "worker@example.com", "phone_number": "0",
+                    "specializations": [service_types[index % len(service_types)]],
+                    "care_center_id": str(ObjectId()),
+                    "status": CareWorkerStatus.OFFLINE if offline[index] else CareWorkerStatus.AVAILABLE,
+                    "current_location": {"latitude": latitude, "longitude": longitude}}
+        collection.documents[document["_id"]] = document
+        redis.seed_worker(str(document["_id"]), document, longitude, latitude)
+
+    async def get_care_workers_collection():
+        return collection
+
+    care_worker_module.get_care_workers_collection = get_care_workers_collection
+    service = CareWorkerService()
+    service.redis_cache.redis = redis
+    # Measure the queries, not the cache tier in front of them
+    service.local_cache = LocalCache(0, 0)
+    return service, redis
+
+async def filtered(service, latitude, longitude, service_type):
+    worker_ids = await service.redis_cache.georadius(WORKER_LOCATIONS_KEY, longitude, latitude, RADIUS_KM)
+    workers = await service.get_care_workers_bulk(worker_ids)
+    return [worker for worker in workers.values()
+            if worker.status == CareWorkerStatus.AVAILABLE and service_type in worker.specializations]
+
+async def partitioned(service, latitude, longitude, service_type):
+    return await service.get_available_care_workers_in_area(latitude, longitude, RADIUS_KM, service_type)
+
+async def run(query, queries, rng):
+    service, redis = make_service(rng)
+    matches = 0
+    start = time.perf_counter()
+    for latitude, longitude, service_type in queries:
+        matches += len(await query(service, latitude, longitude, service_type))
+    elapsed = time.perf_counter() - start
+    # Every worker document fetched went through the Redis cache
+    return elapsed, len(redis.strings), matches
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    service_types = list(ServiceType)
+    queries = [(latitude, longitude, service_types[index % len(service_types)]) for index, (latitude, longitude)
+               in enumerate(zip(rng.uniform(31.8, 32.0, QUERIES).tolist(), rng.uniform(117.2, 117.5, QUERIES).tolist()))]
+
+    print(f"{WORKERS} workers, {OFFLINE_SHARE:.0%} offline, {QUERIES} queries within {RADIUS_KM} km, "
+          f"{LATENCY * 1e3:.0f}ms per round trip")
+    print(f"{'path':>12} {'queries/s':>10} {'workers fetched':>16} {'matches':>8}")
+    for name, query in (("filtered", filtered), ("partitioned", partitioned)):
+        elapsed, fetched, matches = asyncio.run(run(query, queries, np.random.default_rng(1)))
+        print(f"{name:>12} {QUERIES / elapsed:>10.0f} {fetched:>16} {matches:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Care request creation latency with events published directly or through the outbox.
+
+CareRequestService.create_care_request runs CONCURRENCY requests at a time
+against the bundled service area, each MongoDB round trip (a transaction
+commit included) costing MONGO_LATENCY and a broker acknowledgement
+BROKER_LATENCY. Rows:
+
+- send_and_wait: publish_message after the insert, waiting for the broker
+- publish: the long-lived producer's publish after the insert
+- outbox: the insert and its event commit in one transaction, and an
+  OutboxRelayService publishes the events
+
+"delivered s" is when the broker had acknowledged every event, counted
+from the first request.
+
+Run from the repository root:
+    python -m benchmarks.bench_care_request_intake
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareRequestCreate, Location, ServiceType, UrgencyLevel
+from src.services import care_request_service as care_request_module
+from src.services import outbox_service as outbox_module
+from src.services.care_request_service import CareRequestService
+from src.services.geofencing_service import GeofencingService
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.outbox_service import OutboxRelayService
+from src.utils.spatial_index import CoverageIndex
+from benchmarks.fakes import FakeCollection, FakeMongoClient, FakeProducer
+from benchmarks.simulator import DEFAULT_SERVICE_AREA, sample_points
+
+MONGO_LATENCY = 0.001
+BROKER_LATENCY = 0.005
+REQUESTS = 5000
+CONCURRENCY = 50
+
+async def run(geofencing, care_requests, mode):
+    collection, outbox, leases = FakeCollection(MONGO_LATENCY), FakeCollection(MONGO_LATENCY), FakeCollection(MONGO_LATENCY)
+    client = FakeMongoClient(MONGO_LATENCY)
+
+    async def get_care_requests_collection():
+        return collection
+
+    async def get_outbox_collection():
+        return outbox
+
+    async def get_leases_collection():
+        return leases
+
+    async def get_client():
+        return client
+
+    care_request_module.get_care_requests_collection = get_care_requests_collection
+    outbox_module.get_outbox_collection = get_outbox_collection
+    outbox_module.get_leases_collection = get_leases_collection
+    outbox_module.get_client = get_client
+    care_request_module.settings.OUTBOX_ENABLED = mode == "outbox"
+
+    kafka_producer = KafkaProducerService()
+    kafka_producer.producer = FakeProducer({}, BROKER_LATENCY)
+    if mode == "send_and_wait":
+        kafka_producer.publish = kafka_producer.publish_message
+    relay = OutboxRelayService(kafka_producer, interval=0.005)
+    if mode == "outbox":
+        await relay.start()
+    service = CareRequestService(geofencing, kafka_producer, CoverageIndex())
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+
+    async def create(care_request):
+        async with semaphore:
+            start = time.perf_counter()
+            await service.create_care_request(care_request)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(create(care_request) for care_request in care_requests))
+    elapsed = time.perf_counter() - start
+    while outbox.documents or kafka_producer.in_flight:
+        await asyncio.sleep(0.001)
+    delivered = time.perf_counter() - start
+    await relay.close()
+    return elapsed, np.percentile(latencies, [50, 99]) * 1e3, delivered, kafka_producer.producer.sent
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    geofencing = GeofencingService(care_request_module.settings.model_copy(update={
+        "SERVICE_AREA_GEOJSON_PATH": DEFAULT_SERVICE_AREA, "SERVICE_AREA_SNAPSHOT_PATH": None
+    }))
+    latitudes, longitudes, _ = sample_points(geofencing.service_area, REQUESTS, rng)
+    care_requests = [
+        CareRequestCreate(client_id=str(ObjectId()), service_type=ServiceType.PERSONAL_CARE,
+                          urgency=UrgencyLevel.NORMAL, location=Location(latitude=latitude, longitude=longitude))
+        for latitude, longitude in zip(latitudes.tolist(), longitudes.tolist())
+    ]
+
+    print(f"{REQUESTS} requests, {CONCURRENCY} in flight, {MONGO_LATENCY * 1e3:.0f}ms per MongoDB round trip, "
+          f"{BROKER_LATENCY * 1e3:.0f}ms per broker acknowledgement")
+    print(f"{'events':>14} {'requests/s':>11} {'p50 ms':>7} {'p99 ms':>7} {'delivered s':>12} {'sent':>6}")
+    for mode in ("send_and_wait", "publish", "outbox"):
+        elapsed, (p50, p99), delivered, sent = asyncio.run(run(geofencing, care_requests, mode))
+        print(f"{mode:>14} {REQUESTS / elapsed:>11.0f} {p50:>7.1f} {p99:>7.1f} {delivered:>12.2f} {sent:>6}")
+
+if __name__ == "__main__":
+    main()
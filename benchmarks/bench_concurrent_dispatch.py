@@ -0,0 +1,83 @@
+"""Reservation throughput and safety with several schedulers dispatching at once.
+
+Each scheduler instance has its own in-process worker index, fed status
+changes as they happen, and reserves workers through the shared fake
+services, whose status check and write happen together like MongoDB's
+find_one_and_update. Requests cluster
+around a few hot spots so that schedulers keep contending for the same
+workers.
+
+Run from the repository root:
+    python -m benchmarks.bench_concurrent_dispatch
+"""
+import asyncio
+import logging
+import time
+from collections import Counter
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, Location, ServiceType, UrgencyLevel
+from src.services import task_scheduler_service as scheduler_module
+from src.services.distance_service import DistanceService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.worker_index import WorkerIndex
+from src.utils.worker_table import WorkerTable
+from benchmarks.fakes import FakeCareRequestService, FakeCareWorkerService
+
+LATENCY = 0.001
+SCHEDULERS = 4
+REQUESTS_PER_SCHEDULER = 500
+BATCH_SIZE = 100
+WORKERS = 3000
+HOT_SPOTS = [(31.85, 117.30), (31.90, 117.40), (31.95, 117.25)]
+
+def make_fixtures(rng):
+    workers = [
+        CareWorker(_id=str(ObjectId()), name="Worker", email="worker@example.com", phone_number="0",
+                   specializations=[ServiceType.MEDICAL_CHECKUP], care_center_id=str(ObjectId()),
+                   current_location=Location(latitude=lat, longitude=lon))
+        for lat, lon in zip(rng.uniform(31.8, 32.0, WORKERS), rng.uniform(117.2, 117.5, WORKERS))
+    ]
+    care_requests = []
+    for index in range(SCHEDULERS * REQUESTS_PER_SCHEDULER):
+        lat, lon = HOT_SPOTS[index % len(HOT_SPOTS)]
+        care_requests.append(CareRequest(
+            _id=str(ObjectId()), client_id=str(ObjectId()), service_type=ServiceType.MEDICAL_CHECKUP,
+            urgency=UrgencyLevel.NORMAL,
+            location=Location(latitude=lat + rng.normal(0, 0.005), longitude=lon + rng.normal(0, 0.005))
+        ))
+    return workers, care_requests
+
+async def run(workers, care_requests, concurrency):
+    scheduler_module.settings.SCHEDULER_DISPATCH_CONCURRENCY = concurrency
+    care_worker_service = FakeCareWorkerService(workers, LATENCY)
+    care_request_service = FakeCareRequestService(LATENCY)
+
+    async def dispatch(requests):
+        scheduler = TaskSchedulerService(care_worker_service, care_request_service, DistanceService())
+        scheduler.worker_index = WorkerIndex.from_table(WorkerTable.from_workers(workers))
+        care_worker_service.listeners.append(scheduler.apply_worker_update)
+        for start in range(0, len(requests), BATCH_SIZE):
+            await scheduler.process_micro_batch(requests[start:start + BATCH_SIZE])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(dispatch(care_requests[index::SCHEDULERS]) for index in range(SCHEDULERS)))
+    elapsed = time.perf_counter() - start
+
+    bookings = Counter(care_request_service.assignments.values())
+    double_booked = sum(count - 1 for count in bookings.values() if count > 1)
+    return elapsed, len(care_request_service.assignments), care_worker_service.conflicts, double_booked
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    workers, care_requests = make_fixtures(np.random.default_rng(0))
+    print(f"{SCHEDULERS} schedulers, {len(care_requests)} requests, {WORKERS} workers, "
+          f"{LATENCY * 1e3:.0f}ms per round trip")
+    print(f"{'concurrency':>12} {'reqs/s':>8} {'assigned':>9} {'conflicts':>10} {'double booked':>14}")
+    for concurrency in (1, 8, 32):
+        elapsed, assigned, conflicts, double_booked = asyncio.run(run(workers, care_requests, concurrency))
+        print(f"{concurrency:>12} {len(care_requests) / elapsed:>8.0f} {assigned:>9} {conflicts:>10} "
+              f"{double_booked:>14}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Time to assignment of EMERGENCY requests arriving behind a backlog of LOW ones.
+
+A backlog of LOW requests is queued, then EMERGENCY requests arrive at a
+steady rate while TaskSchedulerService.process_tasks works through it. The
+first run publishes everything to a single topic, as before the urgency
+lanes; the second publishes each request to the topic of its lane.
+
+Run from the repository root:
+    python -m benchmarks.bench_dispatch_lanes
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, Location, ServiceType, UrgencyLevel
+from src.services import task_scheduler_service as scheduler_module
+from src.services.distance_service import DistanceService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.dispatch_lanes import LANE_TOPICS
+from src.utils.worker_index import WorkerIndex
+from src.utils.worker_table import WorkerTable
+from benchmarks.fakes import FakeCareRequestService, FakeCareWorkerService, FakeConsumer
+
+LATENCY = 0.001
+WRITE_LATENCY = 0.005
+BACKLOG = 20000
+EMERGENCIES = 20
+EMERGENCY_INTERVAL = 0.05
+WORKERS = 25000
+
+def make_request(rng, urgency):
+    return CareRequest(_id=str(ObjectId()), client_id=str(ObjectId()), service_type=ServiceType.MEDICAL_CHECKUP,
+                       urgency=urgency, location=Location(latitude=rng.uniform(31.8, 32.0),
+                                                          longitude=rng.uniform(117.2, 117.5)))
+
+class TimedCareRequestService(FakeCareRequestService):
+    def __init__(self, latency: float):
+        super().__init__(latency)
+        self.assigned_at = {}
+
+    async def claim_care_request(self, request_id, worker_id):
+        claimed = await super().claim_care_request(request_id, worker_id)
+        if claimed:
+            self.assigned_at[request_id] = time.perf_counter()
+        return claimed
+
+async def run(workers, backlog, emergencies, lanes: bool):
+    consumer = FakeConsumer([], LATENCY)
+    for care_request in backlog:
+        topic = LANE_TOPICS[UrgencyLevel.LOW] if lanes else LANE_TOPICS[UrgencyLevel.NORMAL]
+        consumer.append(topic, care_request.model_dump_json(by_alias=True).encode())
+    care_request_service = TimedCareRequestService(WRITE_LATENCY)
+    scheduler = TaskSchedulerService(FakeCareWorkerService(workers, LATENCY), care_request_service, DistanceService())
+    scheduler.worker_index = WorkerIndex.from_table(WorkerTable.from_workers(workers))
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    scheduler_module.get_kafka_consumer = get_kafka_consumer
+    scheduler_module.settings.SCHEDULER_MICRO_BATCH_SIZE = 100
+    scheduler_module.settings.SCHEDULER_METRICS_INTERVAL = 0
+    # Requests left unassigned go back to their lane at once instead of after a backoff
+    scheduler_module.settings.SCHEDULER_RETRY_BACKOFF_MS = 0
+
+    task = asyncio.create_task(scheduler.process_tasks())
+    produced_at = {}
+    for care_request in emergencies:
+        await asyncio.sleep(EMERGENCY_INTERVAL)
+        topic = LANE_TOPICS[UrgencyLevel.EMERGENCY] if lanes else LANE_TOPICS[UrgencyLevel.NORMAL]
+        consumer.append(topic, care_request.model_dump_json(by_alias=True).encode())
+        produced_at[str(care_request.id)] = time.perf_counter()
+
+    while any(request_id not in care_request_service.assigned_at for request_id in produced_at):
+        await asyncio.sleep(0.01)
+    task.cancel()
+    return np.array([care_request_service.assigned_at[request_id] - produced
+                     for request_id, produced in produced_at.items()])
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    workers = [
+        CareWorker(_id=str(ObjectId()), name="Worker", email="worker@example.com", phone_number="0",
+                   specializations=[ServiceType.MEDICAL_CHECKUP], care_center_id=str(ObjectId()),
+                   current_location=Location(latitude=lat, longitude=lon))
+        for lat, lon in zip(rng.uniform(31.8, 32.0, WORKERS), rng.uniform(117.2, 117.5, WORKERS))
+    ]
+    backlog = [make_request(rng, UrgencyLevel.LOW) for _ in range(BACKLOG)]
+    emergencies = [make_request(rng, UrgencyLevel.EMERGENCY) for _ in range(EMERGENCIES)]
+
+    print(f"{EMERGENCIES} emergencies arriving behind {BACKLOG} low-urgency requests")
+    print(f"{'topics':>16} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for label, lanes in (("single topic", False), ("urgency lanes", True)):
+        latencies = asyncio.run(run(workers, backlog, emergencies, lanes)) * 1000
+        print(f"{label:>16} {np.percentile(latencies, 50):>9.0f} {np.percentile(latencies, 99):>9.0f} "
+              f"{latencies.max():>9.0f}")
+
+if __name__ == "__main__":
+    main()
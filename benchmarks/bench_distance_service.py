@@ -0,0 +1,46 @@
+"""Compare the scalar haversine loop with the vectorized DistanceService APIs.
+
+Run from the repository root:
+    python -m benchmarks.bench_distance_service
+"""
+import time
+import numpy as np
+from src.models.schemas import Location
+from src.services.distance_service import DistanceService
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def main():
+    rng = np.random.default_rng(0)
+    origin = Location(latitude=31.88, longitude=117.35)
+    print(f"{'workers':>8} {'scalar loop':>12} {'vectorized':>12} {'speedup':>8}")
+    for count in (100, 1_000, 10_000, 50_000):
+        lats = rng.uniform(31.8, 32.0, count)
+        lons = rng.uniform(117.2, 117.5, count)
+        workers = [Location(latitude=lat, longitude=lon) for lat, lon in zip(lats, lons)]
+
+        scalar = best_of(lambda: [DistanceService.calculate_distance(origin, worker) for worker in workers])
+        vectorized = best_of(lambda: DistanceService.calculate_distances(origin, lats, lons))
+        print(f"{count:>8} {scalar * 1e3:>10.2f}ms {vectorized * 1e3:>10.3f}ms {scalar / vectorized:>7.0f}x")
+
+    print()
+    print(f"{'requests x workers':>20} {'scalar loop':>12} {'matrix':>12} {'speedup':>8}")
+    for requests, count in ((10, 1_000), (100, 1_000), (100, 10_000)):
+        origins = np.column_stack([rng.uniform(31.8, 32.0, requests), rng.uniform(117.2, 117.5, requests)])
+        destinations = np.column_stack([rng.uniform(31.8, 32.0, count), rng.uniform(117.2, 117.5, count)])
+        origin_locations = [Location(latitude=lat, longitude=lon) for lat, lon in origins]
+        destination_locations = [Location(latitude=lat, longitude=lon) for lat, lon in destinations]
+
+        scalar = best_of(lambda: [[DistanceService.calculate_distance(o, d) for d in destination_locations]
+                                  for o in origin_locations], repeat=1)
+        matrix = best_of(lambda: DistanceService.distance_matrix(origins, destinations))
+        print(f"{f'{requests} x {count}':>20} {scalar * 1e3:>10.1f}ms {matrix * 1e3:>10.2f}ms {scalar / matrix:>7.0f}x")
+
+if __name__ == "__main__":
+    main()
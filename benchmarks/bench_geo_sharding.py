@@ -0,0 +1,105 @@
+"""Dispatch throughput when care requests are split across geo-partitioned scheduler instances.
+
+Requests are keyed by geographic cell and spread over PARTITIONS partitions
+as the producer's GeoPartitioner would, each partition a stretch of the
+Hilbert curve through the cells of BOUNDS. Each instance owns a range of
+consecutive partitions, as the range assignor hands them out, sees only the
+requests of those partitions and indexes only the workers of its region and
+a HALO_KM halo. Instances are timed one after another, so the projected rate is
+what N instances on separate machines reach: every request divided by the
+slowest instance's time. Contention for workers in the halo between
+neighbouring instances is not modelled here; bench_concurrent_dispatch
+covers reservation conflicts.
+
+Run from the repository root:
+    python -m benchmarks.bench_geo_sharding
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, Location, ServiceType, UrgencyLevel
+from src.services import task_scheduler_service as scheduler_module
+from src.services.distance_service import DistanceService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.geo_sharding import GeoGrid, ShardRegion
+from src.utils.worker_index import WorkerIndex
+from src.utils.worker_table import WorkerTable
+from benchmarks.fakes import FakeCareRequestService, FakeCareWorkerService, FakeConsumer
+
+LATENCY = 0.001
+PARTITIONS = 16
+CELL_KM = 5
+HALO_KM = 2
+SEARCH_RADIUS_KM = 5
+BOUNDS = (31.6, 117.0, 32.2, 117.8)
+MESSAGES = 8000
+WORKERS = 30000
+
+def make_fixtures(rng):
+    workers = [
+        CareWorker(_id=str(ObjectId()), name="Worker", email="worker@example.com", phone_number="0",
+                   specializations=[ServiceType.MEDICAL_CHECKUP], care_center_id=str(ObjectId()),
+                   current_location=Location(latitude=lat, longitude=lon))
+        for lat, lon in zip(rng.uniform(31.6, 32.2, WORKERS), rng.uniform(117.0, 117.8, WORKERS))
+    ]
+    care_requests = [
+        CareRequest(_id=str(ObjectId()), client_id=str(ObjectId()), service_type=ServiceType.MEDICAL_CHECKUP,
+                    urgency=UrgencyLevel.NORMAL, location=Location(latitude=lat, longitude=lon))
+        for lat, lon in zip(rng.uniform(31.6, 32.2, MESSAGES), rng.uniform(117.0, 117.8, MESSAGES))
+    ]
+    return workers, care_requests
+
+GRID = GeoGrid(BOUNDS, CELL_KM)
+
+def request_partition(care_request: CareRequest) -> int:
+    return GRID.partition_of(care_request.location.latitude, care_request.location.longitude, PARTITIONS)
+
+async def run_shard(workers, care_requests, region):
+    # Only this instance's partitions, and only its region's workers
+    values = [care_request.model_dump_json(by_alias=True).encode() for care_request in care_requests
+              if region is None or request_partition(care_request) in region.partitions]
+    local_workers = [worker for worker in workers if region is None
+                     or region.covers(worker.current_location.latitude, worker.current_location.longitude)]
+    consumer = FakeConsumer(values, LATENCY)
+    scheduler = TaskSchedulerService(FakeCareWorkerService(local_workers, LATENCY), FakeCareRequestService(LATENCY),
+                                     DistanceService())
+    scheduler.shard = region
+    scheduler.worker_index = WorkerIndex.from_table(WorkerTable.from_workers(local_workers))
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    scheduler_module.get_kafka_consumer = get_kafka_consumer
+    start = time.perf_counter()
+    task = asyncio.create_task(scheduler.process_tasks())
+    await consumer.drained.wait()
+    task.cancel()
+    return time.perf_counter() - start, len(values), len(local_workers)
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    scheduler_module.settings.SCHEDULER_SEARCH_RADIUS_KM = SEARCH_RADIUS_KM
+    scheduler_module.settings.SCHEDULER_METRICS_INTERVAL = 0
+    # Requests left unassigned go back to their lane at once instead of after a backoff
+    scheduler_module.settings.SCHEDULER_RETRY_BACKOFF_MS = 0
+    workers, care_requests = make_fixtures(np.random.default_rng(0))
+    print(f"{MESSAGES} requests, {WORKERS} workers, {PARTITIONS} partitions, {CELL_KM} km cells, {HALO_KM} km halo, "
+          f"{SEARCH_RADIUS_KM} km search radius")
+    print(f"{'instances':>10} {'msgs/s':>8} {'speedup':>8} {'max requests':>13} {'max workers':>12}")
+    baseline = None
+    for instances in (1, 2, 4, 8):
+        results = []
+        for instance in range(instances):
+            partitions = set(range(instance * PARTITIONS // instances, (instance + 1) * PARTITIONS // instances))
+            region = None if instances == 1 else ShardRegion(partitions, PARTITIONS, GRID, HALO_KM)
+            results.append(asyncio.run(run_shard(workers, care_requests, region)))
+        assert sum(count for _, count, _ in results) == MESSAGES
+        rate = MESSAGES / max(elapsed for elapsed, _, _ in results)
+        baseline = baseline or rate
+        print(f"{instances:>10} {rate:>8.0f} {rate / baseline:>7.1f}x {max(count for _, count, _ in results):>13} "
+              f"{max(local for _, _, local in results):>12}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Messages handled per second by one consumer, one message at a time or partitions in parallel.
+
+PARTITIONS partitions hold MESSAGES_PER_PARTITION messages each, and handling
+a message awaits HANDLER_LATENCY (a database write, say). The "sequential"
+row reads the consumer one message at a time as consume_messages did; the
+others run KafkaConsumerService with a worker per partition at several
+max-in-flight limits. Out-of-order counts messages handled before an
+earlier one of their partition, and commits counts commit requests.
+
+Run from the repository root:
+    python -m benchmarks.bench_kafka_consumer
+"""
+import asyncio
+import logging
+import time
+from src.services.kafka_consumer_service import KafkaConsumerService
+from src.utils.codec import Codec, get_codec
+from benchmarks.fakes import FakeConsumer
+
+PARTITIONS = 8
+MESSAGES_PER_PARTITION = 500
+HANDLER_LATENCY = 0.001
+LATENCY = 0.001
+
+class OrderCheck:
+    def __init__(self):
+        self.last = {}
+        self.out_of_order = 0
+        self.handled = 0
+
+    async def handle(self, message: dict):
+        await asyncio.sleep(HANDLER_LATENCY)
+        if message["sequence"] < self.last.get(message["partition"], -1):
+            self.out_of_order += 1
+        self.last[message["partition"]] = message["sequence"]
+        self.handled += 1
+
+def make_consumer() -> FakeConsumer:
+    codec = get_codec("json")
+    # Each topic of the fake has one partition
+    return FakeConsumer([(f"events.{partition}", codec.encode({"partition": partition, "sequence": sequence}))
+                         for sequence in range(MESSAGES_PER_PARTITION) for partition in range(PARTITIONS)], LATENCY)
+
+async def run_sequential():
+    consumer, check = make_consumer(), OrderCheck()
+    start = time.perf_counter()
+    async for message in consumer:
+        await check.handle(Codec.decode(message.value))
+    return time.perf_counter() - start, check, consumer.commits
+
+async def run_partitioned(max_in_flight: int):
+    consumer, check = make_consumer(), OrderCheck()
+    service = KafkaConsumerService(*consumer.topics, group_id="bench", handler=check.handle,
+                                   prefetch=max(1, max_in_flight // PARTITIONS), max_in_flight=max_in_flight,
+                                   commit_interval=0.1)
+    service.consumer = consumer
+    start = time.perf_counter()
+    await service.start()
+    while check.handled < PARTITIONS * MESSAGES_PER_PARTITION:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed, check, consumer.commits
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    total = PARTITIONS * MESSAGES_PER_PARTITION
+    print(f"{total} messages over {PARTITIONS} partitions, {HANDLER_LATENCY * 1e3:g}ms per message handled, "
+          f"{LATENCY * 1e3:g}ms per broker round trip")
+    print(f"{'path':>27} {'messages/s':>11} {'out of order':>13} {'commits':>8}")
+    elapsed, check, commits = asyncio.run(run_sequential())
+    print(f"{'sequential':>27} {total / elapsed:>11.0f} {check.out_of_order:>13} {'auto':>8}")
+    for max_in_flight in (64, 512, 2000):
+        elapsed, check, commits = asyncio.run(run_partitioned(max_in_flight))
+        print(f"{f'partitioned, {max_in_flight} in flight':>27} {total / elapsed:>11.0f} "
+              f"{check.out_of_order:>13} {commits:>8}")
+
+if __name__ == "__main__":
+    main()
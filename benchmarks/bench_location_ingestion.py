@@ -0,0 +1,118 @@
+"""GPS pings per second through the location endpoint's service call.
+
+The first row sends each ping through CareWorkerService.update_care_worker,
+as PUT /care-workers/{id}/location does: a MongoDB update, a GEOADD, a
+worker update and a re-read of the worker per ping, 100 pings in flight at
+a time. The second row submits the same kind of pings in batches of
+BATCH_SIZE to LocationIngestionService, as POST /locations does, with its flush and persist loops
+running, and counts until every ping has reached Redis. Redis, MongoDB and
+Kafka are the in-memory fakes in benchmarks/fakes.py.
+
+Run from the repository root:
+    python -m benchmarks.bench_location_ingestion
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareWorkerStatus, CareWorkerUpdate, Location
+from src.services import care_worker_service as care_worker_module
+from src.services import location_ingestion_service as ingestion_module
+from src.services.care_worker_service import CareWorkerService, WORKER_LOCATIONS_KEY
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.location_ingestion_service import LocationIngestionService
+from src.utils.config import get_settings
+from benchmarks.fakes import FakeCollection, FakeProducer, FakeRedis
+
+LATENCY = 0.001
+WORKERS = 20000
+PINGS = 200000
+DIRECT_PINGS = 5000
+IN_FLIGHT = 100
+BATCH_SIZE = 500
+
+def make_fakes():
+    redis, collection = FakeRedis(LATENCY), FakeCollection(LATENCY)
+    worker_ids = []
+    for _ in range(WORKERS):
+        document = {"_id": ObjectId(), "name": "Worker", "email": "worker@example.com", "phone_number": "0",
+                    "specializations": [], "care_center_id": str(ObjectId()), "status": CareWorkerStatus.AVAILABLE,
+                    "current_location": {"latitude": 31.9, "longitude": 117.3}}
+        collection.documents[document["_id"]] = document
+        redis.seed_worker(str(document["_id"]), document, 117.3, 31.9)
+        worker_ids.append(str(document["_id"]))
+
+    async def get_care_workers_collection():
+        return collection
+
+    care_worker_module.get_care_workers_collection = get_care_workers_collection
+    ingestion_module.get_care_workers_collection = get_care_workers_collection
+    kafka_producer = KafkaProducerService()
+    kafka_producer.producer = FakeProducer({}, LATENCY)
+    return redis, collection, kafka_producer, worker_ids
+
+def make_pings(worker_ids, count, rng):
+    workers = rng.integers(0, len(worker_ids), count)
+    latitudes, longitudes = rng.uniform(31.8, 32.0, count), rng.uniform(117.2, 117.5, count)
+    return [(worker_ids[worker], latitude, longitude)
+            for worker, latitude, longitude in zip(workers.tolist(), latitudes.tolist(), longitudes.tolist())]
+
+async def run_direct(fakes, pings):
+    redis, collection, kafka_producer, _ = fakes
+    care_worker_service = CareWorkerService(kafka_producer)
+    care_worker_service.redis_cache.redis = redis
+    semaphore = asyncio.Semaphore(IN_FLIGHT)
+
+    async def ping(worker_id, latitude, longitude):
+        async with semaphore:
+            await care_worker_service.update_care_worker(
+                worker_id, CareWorkerUpdate(current_location=Location(latitude=latitude, longitude=longitude))
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ping(*p) for p in pings))
+    return time.perf_counter() - start, redis.round_trips, collection.round_trips
+
+async def run_ingestion(fakes, pings):
+    redis, collection, kafka_producer, _ = fakes
+    redis.round_trips = collection.round_trips = 0
+    care_worker_service = CareWorkerService(kafka_producer)
+    care_worker_service.redis_cache.redis = redis
+    service = LocationIngestionService(get_settings(), care_worker_service.redis_cache, kafka_producer)
+    await service.start()
+
+    start = time.perf_counter()
+    for offset in range(0, len(pings), BATCH_SIZE):
+        for worker_id, latitude, longitude in pings[offset:offset + BATCH_SIZE]:
+            service.submit(worker_id, latitude, longitude)
+        # One request handler per batch; let the flush loop in between
+        await asyncio.sleep(0)
+    # Done once the last pings are in the geo set
+    last_worker, last_latitude, last_longitude = pings[-1]
+    while redis.geo[WORKER_LOCATIONS_KEY].get(last_worker) != (last_longitude, last_latitude):
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    await service.close()
+    return elapsed, redis.round_trips, collection.round_trips, service.stats()
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    fakes = make_fakes()
+    worker_ids = fakes[3]
+    settings = get_settings()
+    print(f"{WORKERS} workers, {LATENCY * 1e3:.0f}ms per round trip, flush every {settings.LOCATION_FLUSH_INTERVAL_MS}ms")
+    print(f"{'path':>22} {'pings':>8} {'pings/s':>9} {'redis trips':>12} {'mongo trips':>12}")
+
+    elapsed, redis_trips, mongo_trips = asyncio.run(run_direct(fakes, make_pings(worker_ids, DIRECT_PINGS, rng)))
+    print(f"{'update_care_worker':>22} {DIRECT_PINGS:>8} {DIRECT_PINGS / elapsed:>9.0f} {redis_trips:>12} "
+          f"{mongo_trips:>12}")
+
+    elapsed, redis_trips, mongo_trips, stats = asyncio.run(run_ingestion(fakes, make_pings(worker_ids, PINGS, rng)))
+    print(f"{'LocationIngestion':>22} {PINGS:>8} {PINGS / elapsed:>9.0f} {redis_trips:>12} {mongo_trips:>12}")
+    print(f"coalesced {stats['coalesced']} pings, flushed {stats['flushed']} positions, "
+          f"persisted {stats['persisted']} on shutdown")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Encode and decode time and payload size of cached workers and care request messages.
+
+The "stdlib" rows are the path before the codec layer: json.dumps with
+default=str, json.loads and full Pydantic validation of every cached
+worker. The codec rows encode through src/utils/codec.py and build cached
+workers with CareWorker.from_trusted; care requests are still validated,
+as the scheduler does. Rows for msgpack are left out unless it is installed.
+
+Run from the repository root:
+    python -m benchmarks.bench_payload_codec
+"""
+import json
+import logging
+import time
+from datetime import datetime
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, CareWorkerStatus, ServiceType, UrgencyLevel
+from src.utils import codec as codec_module
+from src.utils.codec import get_codec
+
+ROUNDS = 20000
+
+def worker_document():
+    return {"_id": ObjectId(), "name": "Worker", "email": "worker@example.com", "phone_number": "13800000000",
+            "password": "$2b$12$" + "x" * 53, "specializations": [ServiceType.PERSONAL_CARE, ServiceType.PHYSICAL_THERAPY],
+            "care_center_id": str(ObjectId()), "status": CareWorkerStatus.AVAILABLE, "rating": 4.5,
+            "completed_tasks": 120, "current_location": {"latitude": 31.86, "longitude": 117.28}}
+
+def care_request_message():
+    return {"request_id": str(ObjectId()), "client_id": str(ObjectId()), "service_type": ServiceType.PERSONAL_CARE,
+            "urgency": UrgencyLevel.NORMAL, "location": {"latitude": 31.86, "longitude": 117.28},
+            "description": "Help with bathing", "created_at": datetime.utcnow(), "status": "Pending",
+            "assigned_worker_id": None, "care_center_id": None, "estimated_fee": None}
+
+def build_request(data):
+    data["_id"] = data.pop("request_id")
+    return CareRequest.model_validate(data)
+
+def timed(function, value):
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        result = function(value)
+    return (time.perf_counter() - start) / ROUNDS * 1e6, result
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    payloads = [("worker", worker_document(), lambda data: CareWorker(**data), CareWorker.from_trusted),
+                ("care request", care_request_message(), build_request, build_request)]
+    codecs = ["json"] + (["msgpack"] if codec_module.msgpack is not None else [])
+    print(f"{'payload':>12} {'path':>8} {'encode us':>10} {'decode us':>10} {'bytes':>6}")
+    for name, value, validated, trusted in payloads:
+        encode_us, encoded = timed(lambda v: json.dumps(v, default=str).encode("utf-8"), value)
+        decode_us, _ = timed(lambda data: validated(json.loads(data)), encoded)
+        print(f"{name:>12} {'stdlib':>8} {encode_us:>10.1f} {decode_us:>10.1f} {len(encoded):>6}")
+        for codec_name in codecs:
+            codec = get_codec(codec_name)
+            encode_us, encoded = timed(codec.encode, value)
+            decode_us, _ = timed(lambda data: trusted(codec.decode(data)), encoded)
+            print(f"{name:>12} {codec_name:>8} {encode_us:>10.1f} {decode_us:>10.1f} {len(encoded):>6}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Query latency of the offline road-network engine on a synthetic street grid.
+
+Run from the repository root:
+    python -m benchmarks.bench_road_network
+"""
+import time
+import numpy as np
+from src.utils.road_network import RoadNetwork
+
+def street_grid(size, spacing=0.002, seed=0):
+    """size x size grid of two-way streets with random per-block travel times and a river with a few bridges.
+
+    A two-node street cut off from the grid sits past its north-east corner.
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = np.divmod(np.arange(size * size), size)
+    lats, lons = 31.80 + rows * spacing, 117.20 + cols * spacing
+    bridges = set(rng.choice(size, 4, replace=False).tolist())
+    edges = []
+    for node in range(size * size):
+        row, col = divmod(node, size)
+        neighbors = []
+        if col + 1 < size:
+            neighbors.append(node + 1)
+        if row + 1 < size and (row != size // 2 or col in bridges):
+            neighbors.append(node + size)
+        for neighbor in neighbors:
+            minutes = float(rng.uniform(0.2, 0.6))
+            edges.append((node, neighbor, minutes))
+            edges.append((neighbor, node, minutes))
+    island = size * size
+    lats = np.append(lats, [lats[-1] + spacing, lats[-1] + spacing])
+    lons = np.append(lons, [lons[-1] + spacing, lons[-1] + 2 * spacing])
+    edges += [(island, island + 1, 0.5), (island + 1, island, 0.5)]
+    return lats, lons, edges
+
+def percentile_ms(samples, q):
+    return np.percentile(samples, q) * 1e3
+
+def main():
+    rng = np.random.default_rng(1)
+    for size in (50, 100, 200):
+        lats, lons, edges = street_grid(size)
+        start = time.perf_counter()
+        network = RoadNetwork(lats, lons, edges, landmark_count=8)
+        build = time.perf_counter() - start
+
+        pairs = rng.integers(0, len(network), (100, 2))
+        alt, dijkstra = [], []
+        for source, target in pairs:
+            start = time.perf_counter()
+            network.shortest_path_minutes(int(source), int(target))
+            alt.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            network._dijkstra(network.forward, int(source), {int(target)})
+            dijkstra.append(time.perf_counter() - start)
+
+        one_to_many, unreachable = [], []
+        for _ in range(20):
+            request = rng.integers(0, size * size)
+            workers = rng.integers(0, size * size, 200)
+            nearby = workers[np.abs(lats[workers] - lats[request]) + np.abs(lons[workers] - lons[request]) < 0.03]
+            start = time.perf_counter()
+            network.travel_times_to(lats[request], lons[request], lats[nearby], lons[nearby], max_minutes=30)
+            one_to_many.append(time.perf_counter() - start)
+            # One worker on the island, with no time limit to stop the search
+            nearby = np.append(nearby, size * size)
+            start = time.perf_counter()
+            network.travel_times_to(lats[request], lons[request], lats[nearby], lons[nearby])
+            unreachable.append(time.perf_counter() - start)
+
+        print(f"{len(network):>6} nodes  build {build:6.2f}s  "
+              f"ALT p50 {percentile_ms(alt, 50):6.2f}ms p99 {percentile_ms(alt, 99):6.2f}ms  "
+              f"Dijkstra p50 {percentile_ms(dijkstra, 50):6.2f}ms  "
+              f"one-to-many p50 {percentile_ms(one_to_many, 50):6.2f}ms  "
+              f"with an unreachable worker p50 {percentile_ms(unreachable, 50):6.2f}ms")
+
+if __name__ == "__main__":
+    main()
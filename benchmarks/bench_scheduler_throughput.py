@@ -0,0 +1,112 @@
+"""Messages per second through TaskSchedulerService.process_tasks at different micro-batch sizes.
+
+Kafka, Redis, MongoDB and the worker cache are replaced by the in-memory
+fakes in benchmarks/fakes.py, with every round trip costing ``LATENCY``
+seconds. The first row replays the previous loop, which handled one
+message at a time with sequential worker lookups.
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduler_throughput
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, Location, ServiceType, UrgencyLevel
+from src.services import task_scheduler_service as scheduler_module
+from src.services.distance_service import DistanceService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.worker_index import WorkerIndex
+from src.utils.worker_table import WorkerTable
+from benchmarks.fakes import FakeCareRequestService, FakeCareWorkerService, FakeConsumer, FakeRedis
+
+LATENCY = 0.001
+MESSAGES = 1000
+WORKERS = 1500
+RADIUS_KM = 1
+
+def make_fixtures(rng):
+    service_types = list(ServiceType)
+    workers = [
+        CareWorker(_id=str(ObjectId()), name=f"Worker {index}", email="worker@example.com", phone_number="0",
+                   specializations=[service_types[index % len(service_types)]], care_center_id=str(ObjectId()),
+                   current_location=Location(latitude=lat, longitude=lon))
+        for index, (lat, lon) in enumerate(zip(rng.uniform(31.8, 32.0, WORKERS), rng.uniform(117.2, 117.5, WORKERS)))
+    ]
+    values = [
+        CareRequest(_id=str(ObjectId()), client_id=str(ObjectId()), service_type=service_types[index % len(service_types)],
+                    urgency=UrgencyLevel.NORMAL, location=Location(latitude=lat, longitude=lon)
+                    ).model_dump_json(by_alias=True).encode()
+        for index, (lat, lon) in enumerate(zip(rng.uniform(31.8, 32.0, MESSAGES), rng.uniform(117.2, 117.5, MESSAGES)))
+    ]
+    return workers, values
+
+def make_redis(workers):
+    redis = FakeRedis(LATENCY)
+    for worker in workers:
+        redis.seed_worker(str(worker.id), worker.model_dump(), worker.current_location.longitude,
+                          worker.current_location.latitude)
+    return redis
+
+async def one_at_a_time(scheduler, consumer, redis):
+    # The loop process_tasks used before micro-batching
+    for _ in range(len(consumer.messages)):
+        msg = await consumer.__anext__()
+        care_request = CareRequest.model_validate_json(msg.value)
+        worker_ids = await redis.georadius("worker_locations", care_request.location.longitude,
+                                           care_request.location.latitude, RADIUS_KM, "km")
+        workers = [await scheduler.care_worker_service.get_care_worker(worker_id) for worker_id in worker_ids]
+        optimal_worker = scheduler._find_optimal_worker(care_request, workers)
+        if optimal_worker:
+            await scheduler.care_request_service.assign_care_worker(care_request.id, optimal_worker.id)
+
+async def run(workers, values, batch_size, use_index=False):
+    redis = make_redis(workers)
+    consumer = FakeConsumer(values, LATENCY)
+    scheduler = TaskSchedulerService(FakeCareWorkerService(workers, LATENCY), FakeCareRequestService(LATENCY),
+                                     DistanceService())
+    if use_index:
+        scheduler.worker_index = WorkerIndex.from_table(WorkerTable.from_workers(workers))
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    scheduler.care_worker_service.redis_cache.redis = redis
+    scheduler_module.get_kafka_consumer = get_kafka_consumer
+    scheduler_module.settings.SCHEDULER_SEARCH_RADIUS_KM = RADIUS_KM
+    scheduler_module.settings.SCHEDULER_INITIAL_SEARCH_RADIUS_KM = RADIUS_KM
+    scheduler_module.settings.SCHEDULER_MICRO_BATCH_SIZE = batch_size or 1
+    scheduler_module.settings.SCHEDULER_METRICS_INTERVAL = 0
+    # Requests left unassigned go back to their lane at once instead of after a backoff
+    scheduler_module.settings.SCHEDULER_RETRY_BACKOFF_MS = 0
+
+    start = time.perf_counter()
+    if batch_size is None:
+        await one_at_a_time(scheduler, consumer, redis)
+    else:
+        # process_tasks runs forever; stop it once every offset is committed
+        task = asyncio.create_task(scheduler.process_tasks())
+        await consumer.drained.wait()
+        task.cancel()
+    elapsed = time.perf_counter() - start
+    return elapsed, redis.round_trips, scheduler.care_worker_service.round_trips, consumer.commits
+
+def main():
+    # Requests nobody can reach are expected here
+    logging.getLogger("src").setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    workers, values = make_fixtures(rng)
+    print(f"{MESSAGES} messages, {WORKERS} workers, {LATENCY * 1e3:.0f}ms per round trip")
+    print(f"{'batch size':>14} {'msgs/s':>9} {'redis trips':>12} {'worker trips':>13} {'commits':>8}")
+    for batch_size in (None, 1, 10, 50, 100, 500):
+        elapsed, redis_trips, worker_trips, commits = asyncio.run(run(workers, values, batch_size))
+        label = "one at a time" if batch_size is None else str(batch_size)
+        print(f"{label:>14} {MESSAGES / elapsed:>9.0f} {redis_trips:>12} {worker_trips:>13} {commits:>8}")
+    print("with the in-process worker index")
+    for batch_size in (1, 10, 100):
+        elapsed, redis_trips, worker_trips, commits = asyncio.run(run(workers, values, batch_size, use_index=True))
+        print(f"{batch_size:>14} {MESSAGES / elapsed:>9.0f} {redis_trips:>12} {worker_trips:>13} {commits:>8}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Worker reads per second with and without the in-process cache tier.
+
+Reads follow a Zipf distribution over WORKERS workers, as dispatch keeps
+returning to the busy areas, through CareWorkerService.get_care_worker and
+get_care_worker_table. Redis and MongoDB are the in-memory fakes in
+benchmarks/fakes.py, with every round trip costing ``LATENCY`` seconds.
+
+Run from the repository root:
+    python -m benchmarks.bench_worker_cache
+"""
+import asyncio
+import logging
+import time
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareWorkerStatus
+from src.services import care_worker_service as care_worker_module
+from src.services.care_worker_service import CareWorkerService
+from src.utils.local_cache import LocalCache
+from benchmarks.fakes import FakeCollection, FakeRedis
+
+LATENCY = 0.001
+WORKERS = 20000
+READS = 5000
+TABLE_READS = 500
+TABLE_SIZE = 32
+
+async def run(local_cache_size, worker_ids, reads, tables):
+    redis, collection = FakeRedis(LATENCY), FakeCollection(LATENCY)
+    for worker_id in worker_ids:
+        collection.documents[ObjectId(worker_id)] = {
+            "_id": ObjectId(worker_id), "name": "Worker", "email": "worker@example.com", "phone_number": "0",
+            "specializations": [], "care_center_id": str(ObjectId()), "status": CareWorkerStatus.AVAILABLE,
+            "current_location": {"latitude": 31.9, "longitude": 117.3}
+        }
+
+    async def get_care_workers_collection():
+        return collection
+
+    care_worker_module.get_care_workers_collection = get_care_workers_collection
+    service = CareWorkerService()
+    service.redis_cache.redis = redis
+    service.local_cache = LocalCache(local_cache_size, care_worker_module.settings.WORKER_LOCAL_CACHE_TTL)
+
+    start = time.perf_counter()
+    for worker_id in reads:
+        await service.get_care_worker(worker_id)
+    for table in tables:
+        await service.get_care_worker_table(table)
+    elapsed = time.perf_counter() - start
+    return elapsed, redis.round_trips, collection.round_trips, service.cache_stats()["local"]["hit_rate"]
+
+def main():
+    logging.getLogger("src").setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    worker_ids = [str(ObjectId()) for _ in range(WORKERS)]
+    ranks = np.minimum(rng.zipf(1.2, READS + TABLE_READS * TABLE_SIZE), WORKERS) - 1
+    reads = [worker_ids[rank] for rank in ranks[:READS].tolist()]
+    tables = [[worker_ids[rank] for rank in ranks[READS + start:READS + start + TABLE_SIZE].tolist()]
+              for start in range(0, TABLE_READS * TABLE_SIZE, TABLE_SIZE)]
+
+    print(f"{READS} single reads and {TABLE_READS} tables of {TABLE_SIZE} over {WORKERS} workers, "
+          f"{LATENCY * 1e3:.0f}ms per round trip")
+    print(f"{'local cache':>12} {'ops/s':>8} {'redis trips':>12} {'mongo trips':>12} {'local hit rate':>15}")
+    for size in (0, 10000):
+        elapsed, redis_trips, mongo_trips, hit_rate = asyncio.run(run(size, worker_ids, reads, tables))
+        print(f"{size:>12} {(READS + TABLE_READS) / elapsed:>8.0f} {redis_trips:>12} {mongo_trips:>12} "
+              f"{hit_rate:>15.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Scalar _calculate_worker_score against the vectorized WorkerTable scoring pass.
+
+Also compares the memory held by CareWorker models with the columnar table.
+
+Run from the repository root:
+    python -m benchmarks.bench_worker_scoring
+"""
+import time
+import tracemalloc
+from unittest.mock import AsyncMock
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, CareWorkerStatus, Location, ServiceType, UrgencyLevel
+from src.services.distance_service import DistanceService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.worker_table import WorkerTable
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+def make_documents(rng, count):
+    service_types, statuses = list(ServiceType), list(CareWorkerStatus)
+    return [
+        {"_id": str(ObjectId()), "name": "Worker", "email": "worker@example.com", "phone_number": "0",
+         "specializations": [service_types[index % 4], service_types[(index + 1) % 4]],
+         "care_center_id": str(ObjectId()), "current_location": {"latitude": lat, "longitude": lon},
+         "status": statuses[index % 3].value}
+        for index, (lat, lon) in enumerate(zip(rng.uniform(31.8, 32.0, count), rng.uniform(117.2, 117.5, count)))
+    ]
+
+def measure(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def main():
+    rng = np.random.default_rng(0)
+    scheduler = TaskSchedulerService(AsyncMock(), AsyncMock(), DistanceService())
+    care_request = CareRequest(client_id=str(ObjectId()), service_type=ServiceType.PERSONAL_CARE,
+                               urgency=UrgencyLevel.NORMAL, location=Location(latitude=31.9, longitude=117.35))
+    print(f"{'candidates':>10} {'scalar':>10} {'vectorized':>11} {'speedup':>8} {'models':>10} {'table':>10}")
+    for count in (200, 1_000, 10_000, 50_000):
+        documents = make_documents(rng, count)
+        workers, model_bytes = measure(lambda: [CareWorker(**document) for document in documents])
+        table, table_bytes = measure(lambda: WorkerTable.from_documents(documents))
+
+        scalar = best_of(lambda: [scheduler._calculate_worker_score(care_request, worker) for worker in workers])
+        vectorized = best_of(lambda: scheduler._score_workers(care_request, table))
+        print(f"{count:>10} {scalar * 1e3:>8.2f}ms {vectorized * 1e3:>9.3f}ms {scalar / vectorized:>7.0f}x "
+              f"{model_bytes / count:>8.0f}B {table_bytes / count:>8.0f}B")
+    print("(memory is per candidate; the table figure includes the ID strings)")
+
+if __name__ == "__main__":
+    main()
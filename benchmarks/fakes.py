@@ -0,0 +1,564 @@
+"""In-memory stand-ins for Kafka, Redis, MongoDB and the worker/request services.
+
+Every round trip sleeps for ``latency`` seconds so benchmarks measure how
+many network round trips a code path needs, not the speed of a local server.
+"""
+import asyncio
+import math
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+from aiokafka.structs import TopicPartition
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from src.models.schemas import CareWorker, CareWorkerStatus
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.redis_cache_service import RedisCacheService
+from src.services.worker_geo_index_service import WORKER_GEO_MEMBERSHIP_KEY, WORKER_LOCATIONS_KEY, partition_keys
+from src.utils.error_handling import AppException
+from src.utils.worker_table import WorkerTable
+
+
+class FakeMessage:
+    def __init__(self, value: bytes, offset: int, topic: str = "care_requests.normal", timestamp: int = None):
+        self.value = value
+        self.offset = offset
+        self.topic = topic
+        self.partition = 0
+        self.timestamp = timestamp
+        self.key = None
+
+
+class FakeConsumer:
+    """Serves pre-encoded messages through getmany and records commits.
+
+    Values are (topic, value) pairs or bare values on the normal lane, each
+    topic having one partition. Like a real fetch, getmany interleaves the
+    topics that are not paused.
+    """
+
+    def __init__(self, values: List, latency: float = 0.001):
+        self.latency = latency
+        self.topics: Dict[str, List[FakeMessage]] = defaultdict(list)
+        self.positions: Dict[str, int] = defaultdict(int)
+        self.committed_offsets = {}
+        self.commits = 0
+        self.paused = set()
+        self.drained = asyncio.Event()
+        self.arrived = asyncio.Event()
+        for value in values:
+            self.append(*(value if isinstance(value, tuple) else ("care_requests.normal", value)))
+
+    @property
+    def messages(self) -> List[FakeMessage]:
+        return [msg for messages in self.topics.values() for msg in messages]
+
+    def append(self, topic: str, value: bytes):
+        """Produce a message now."""
+        self.topics[topic].append(FakeMessage(value, len(self.topics[topic]), topic, int(time.time() * 1000)))
+        self.drained.clear()
+        self.arrived.set()
+
+    async def seek_to_end(self):
+        for topic, messages in self.topics.items():
+            self.positions[topic] = len(messages)
+
+    async def getmany(self, timeout_ms: int = 0, max_records: int = None) -> Dict[str, List[FakeMessage]]:
+        await asyncio.sleep(self.latency)
+        topics = [topic for topic in self.topics if TopicPartition(topic, 0) not in self.paused]
+        if not any(self.positions[topic] < len(self.topics[topic]) for topic in topics):
+            # Like a fetch, return as soon as a message arrives
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), timeout_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            return {}
+        records, remaining = {}, max_records or sum(len(messages) for messages in self.topics.values())
+        share = max(1, remaining // len(topics))
+        for topic in topics:
+            start = self.positions[topic]
+            batch = self.topics[topic][start:start + min(share, remaining)]
+            if batch:
+                records[TopicPartition(topic, 0)] = batch
+                self.positions[topic] += len(batch)
+                remaining -= len(batch)
+        return records
+
+    async def commit(self, offsets: Dict = None):
+        await asyncio.sleep(self.latency)
+        self.commits += 1
+        self.committed_offsets.update(offsets or {})
+        if sum(self.committed_offsets.values()) >= sum(len(messages) for messages in self.topics.values()):
+            self.drained.set()
+
+    def assignment(self):
+        return {TopicPartition(topic, 0) for topic in self.topics}
+
+    def highwater(self, partition: TopicPartition) -> int:
+        return len(self.topics[partition.topic])
+
+    async def position(self, partition: TopicPartition) -> int:
+        return self.positions[partition.topic]
+
+    async def stop(self):
+        pass
+
+    def pause(self, *partitions):
+        self.paused.update(partitions)
+
+    def resume(self, *partitions):
+        self.paused.difference_update(partitions)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> FakeMessage:
+        messages = self.messages
+        position = sum(self.positions.values())
+        if position >= len(messages):
+            raise StopAsyncIteration
+        await asyncio.sleep(self.latency)
+        msg = messages[position]
+        self.positions[msg.topic] += 1
+        return msg
+
+
+class FakeProducer:
+    """Stands in for AIOKafkaProducer, delivering each topic to the consumer reading it."""
+
+    def __init__(self, routes: Dict[str, "FakeConsumer"], latency: float = 0.001):
+        self.routes = routes
+        self.latency = latency
+        self.sent = 0
+
+    def _deliver(self, topic: str, value: bytes):
+        self.sent += 1
+        if topic in self.routes:
+            self.routes[topic].append(topic, value)
+
+    async def send_and_wait(self, topic: str, value: bytes, key: bytes = None):
+        await asyncio.sleep(self.latency)
+        self._deliver(topic, value)
+
+    async def send(self, topic: str, value: bytes, key: bytes = None):
+        # Batched sends share one round trip, paid by whoever awaits the delivery
+        self._deliver(topic, value)
+        delivery = asyncio.get_running_loop().create_future()
+        asyncio.get_running_loop().call_later(self.latency, self._acknowledge, delivery)
+        return delivery
+
+    @staticmethod
+    def _acknowledge(delivery: asyncio.Future):
+        # A caller may have cancelled its wait on shutdown
+        if not delivery.done():
+            delivery.set_result(None)
+
+    async def flush(self):
+        await asyncio.sleep(self.latency)
+
+    async def stop(self):
+        pass
+
+
+class FakeRedis:
+    """Strings, hashes and geo sets over dicts, with pipelines costing one round trip.
+
+    Every command is a synchronous ``_name`` method; calling ``name`` costs a
+    round trip and queuing it on a pipeline costs nothing until execute().
+    Expiry is ignored and published messages are only recorded.
+    """
+
+    def __init__(self, latency: float = 0.001):
+        self.latency = latency
+        self.geo: Dict[str, Dict[str, tuple]] = defaultdict(dict)
+        self.strings: Dict[str, str] = {}
+        self.hashes: Dict[str, Dict[str, str]] = defaultdict(dict)
+        self.published = []
+        self.round_trips = 0
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+
+    def __getattr__(self, name: str):
+        command = getattr(type(self), f"_{name}", None)
+        if command is None:
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            await self._round_trip()
+            return command(self, *args, **kwargs)
+        return call
+
+    def seed_worker(self, worker_id: str, document: dict, longitude: float, latitude: float):
+        """Index a worker the way WorkerGeoIndexService.update_worker does, without a round trip."""
+        keys = partition_keys(document)
+        for key in [WORKER_LOCATIONS_KEY] + keys:
+            self.geo[key][worker_id] = (longitude, latitude)
+        self.hashes[WORKER_GEO_MEMBERSHIP_KEY][worker_id] = "|".join(keys)
+
+    def _execute_command(self, command, *args, **options):
+        # RedisCacheService reads encoded values through raw GET and MGET
+        if command == "MGET":
+            return self._mget(list(args))
+        return getattr(self, f"_{command.lower()}")(*args)
+
+    def _set(self, key, value, ex=None, **kwargs):
+        self.strings[key] = value
+        return True
+
+    def _get(self, key):
+        return self.strings.get(key)
+
+    def _mget(self, keys):
+        return [self.strings.get(key) for key in keys]
+
+    def _delete(self, *keys):
+        return sum(self.strings.pop(key, None) is not None for key in keys)
+
+    def _publish(self, channel, message):
+        self.published.append((channel, message))
+        return 0
+
+    def _hset(self, key, field, value):
+        self.hashes[key][field] = value
+        return 1
+
+    def _hmget(self, key, fields):
+        return [self.hashes[key].get(field) for field in fields]
+
+    def _hgetall(self, key):
+        return dict(self.hashes[key])
+
+    def _hdel(self, key, *fields):
+        return sum(self.hashes[key].pop(field, None) is not None for field in fields)
+
+    def _zrange(self, key, start, end):
+        members = list(self.geo[key])
+        return members[start:] if end == -1 else members[start:end + 1]
+
+    def _zrem(self, key, *members):
+        return sum(self.geo[key].pop(member, None) is not None for member in members)
+
+    def _geopos(self, key, *members):
+        return [self.geo[key].get(member) for member in members]
+
+    def _geoadd(self, key, values, xx=False, **kwargs):
+        added = 0
+        for index in range(0, len(values), 3):
+            longitude, latitude, member = values[index:index + 3]
+            if xx and member not in self.geo[key]:
+                continue
+            added += member not in self.geo[key]
+            self.geo[key][member] = (longitude, latitude)
+        return added
+
+    def _georadius(self, key, longitude, latitude, radius, unit="km", **kwargs):
+        members = []
+        for member, (member_longitude, member_latitude) in self.geo[key].items():
+            # Equirectangular distance is accurate enough at city scale
+            dx = math.radians(member_longitude - longitude) * math.cos(math.radians(latitude))
+            dy = math.radians(member_latitude - latitude)
+            if 6371 * math.hypot(dx, dy) <= radius:
+                members.append(member)
+        return members
+
+    def _geosearch(self, key, longitude=None, latitude=None, radius=None, unit="km", sort=None, count=None, **kwargs):
+        members = self._georadius(key, longitude, latitude, radius, unit)
+        if sort or count:
+            members.sort(key=lambda member: math.hypot(
+                math.radians(self.geo[key][member][0] - longitude) * math.cos(math.radians(latitude)),
+                math.radians(self.geo[key][member][1] - latitude)
+            ), reverse=sort == "DESC")
+        return members[:count] if count else members
+
+    def pipeline(self, transaction: bool = True) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def close(self):
+        pass
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def __getattr__(self, name: str):
+        command = getattr(FakeRedis, f"_{name}", None)
+        if command is None:
+            raise AttributeError(name)
+
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    async def execute(self):
+        await self.redis._round_trip()
+        commands, self.commands = self.commands, []
+        return [command(self.redis, *args, **kwargs) for command, args, kwargs in commands]
+
+
+class FakeCursor:
+    def __init__(self, collection: "FakeCollection", documents: List[dict]):
+        self.collection = collection
+        self.documents = documents
+
+    def skip(self, count: int) -> "FakeCursor":
+        self.documents = self.documents[count:]
+        return self
+
+    def limit(self, count: int) -> "FakeCursor":
+        self.documents = self.documents[:count]
+        return self
+
+    def sort(self, keys: list) -> "FakeCursor":
+        # Ascending keys only, applied last to first so the first key decides
+        for field, _ in reversed(keys):
+            self.documents = sorted(self.documents, key=lambda document: document[field])
+        return self
+
+    async def to_list(self, length: int = None) -> List[dict]:
+        await self.collection._round_trip()
+        return [dict(document) for document in self.documents[:length]]
+
+
+class FakeCollection:
+    """The Motor collection calls the services make, over a dict of documents.
+
+    Queries support equality, $in and $lt on top-level fields, where None
+    in an $in list also matches a missing field, and $or; updates support
+    $set and upserts. Each call is atomic, as single-document writes are in
+    MongoDB, and sessions are accepted and ignored. Listeners are called
+    with every updated document and the fields that were set.
+    """
+
+    def __init__(self, latency: float = 0.001):
+        self.latency = latency
+        self.documents: Dict[ObjectId, dict] = {}
+        self.round_trips = 0
+        self.listeners = []
+
+    async def _round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+
+    def _find(self, query: dict) -> List[dict]:
+        ids = query.get("_id")
+        if ids is None:
+            candidates = self.documents.values()
+        elif isinstance(ids, dict):
+            candidates = [self.documents[_id] for _id in ids["$in"] if _id in self.documents]
+        else:
+            candidates = [self.documents[ids]] if ids in self.documents else []
+        return [document for document in candidates if self._matches(document, query)]
+
+    @classmethod
+    def _matches(cls, document: dict, query: dict) -> bool:
+        for field, condition in query.items():
+            value = document.get(field)
+            if field == "$or":
+                if not any(cls._matches(document, alternative) for alternative in condition):
+                    return False
+            elif isinstance(condition, dict) and "$in" in condition:
+                if value not in condition["$in"]:
+                    return False
+            elif isinstance(condition, dict) and "$lt" in condition:
+                if value is None or not value < condition["$lt"]:
+                    return False
+            elif value != condition:
+                return False
+        return True
+
+    def _update(self, document: dict, update: dict):
+        changes = update.get("$set", {})
+        document.update(changes)
+        for listener in self.listeners:
+            listener(document, changes)
+
+    async def insert_one(self, document: dict, session=None) -> SimpleNamespace:
+        await self._round_trip()
+        # Like pymongo, the _id is added to the caller's dict
+        document.setdefault("_id", ObjectId())
+        self.documents[document["_id"]] = dict(document)
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents: List[dict], session=None) -> SimpleNamespace:
+        await self._round_trip()
+        for document in documents:
+            document.setdefault("_id", ObjectId())
+            self.documents[document["_id"]] = dict(document)
+        return SimpleNamespace(inserted_ids=[document["_id"] for document in documents])
+
+    async def find_one(self, query: dict, projection: dict = None) -> Optional[dict]:
+        await self._round_trip()
+        found = self._find(query)
+        return dict(found[0]) if found else None
+
+    def find(self, query: dict = None, projection: dict = None) -> FakeCursor:
+        return FakeCursor(self, self._find(query or {}))
+
+    async def find_one_and_update(self, query: dict, update: dict,
+                                  return_document: bool = ReturnDocument.BEFORE) -> Optional[dict]:
+        await self._round_trip()
+        found = self._find(query)
+        if not found:
+            return None
+        before = dict(found[0])
+        self._update(found[0], update)
+        return dict(found[0]) if return_document == ReturnDocument.AFTER else before
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False, session=None) -> SimpleNamespace:
+        await self._round_trip()
+        found = self._find(query)
+        if found:
+            self._update(found[0], update)
+        elif upsert:
+            if query["_id"] in self.documents:
+                raise DuplicateKeyError("E11000 duplicate key error")
+            self.documents[query["_id"]] = {"_id": query["_id"], **update.get("$set", {})}
+        return SimpleNamespace(matched_count=len(found[:1]), modified_count=len(found[:1]))
+
+    async def bulk_write(self, requests: list, ordered: bool = True, session=None) -> SimpleNamespace:
+        await self._round_trip()
+        modified = 0
+        for request in requests:
+            found = self._find(request._filter)
+            if found:
+                self._update(found[0], request._doc)
+                modified += 1
+        return SimpleNamespace(modified_count=modified)
+
+    async def delete_one(self, query: dict) -> SimpleNamespace:
+        await self._round_trip()
+        found = self._find(query)
+        if found:
+            del self.documents[found[0]["_id"]]
+        return SimpleNamespace(deleted_count=len(found[:1]))
+
+    async def delete_many(self, query: dict) -> SimpleNamespace:
+        await self._round_trip()
+        found = self._find(query)
+        for document in found:
+            del self.documents[document["_id"]]
+        return SimpleNamespace(deleted_count=len(found))
+
+    async def create_index(self, keys, **kwargs) -> str:
+        # Finds scan every document anyway
+        await self._round_trip()
+        return "_".join(f"{field}_{direction}" for field, direction in keys)
+
+
+class FakeSession:
+    """A client session whose transaction commit costs one round trip; writes in it apply at once."""
+
+    def __init__(self, client: "FakeMongoClient"):
+        self.client = client
+
+    async def __aenter__(self) -> "FakeSession":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    @asynccontextmanager
+    async def start_transaction(self):
+        yield
+        self.client.commits += 1
+        await asyncio.sleep(self.client.latency)
+
+
+class FakeMongoClient:
+    def __init__(self, latency: float = 0.001):
+        self.latency = latency
+        self.commits = 0
+        self.admin = SimpleNamespace(command=self._command)
+
+    async def _command(self, name: str) -> dict:
+        await asyncio.sleep(self.latency)
+        # A replica set, so transactions are available
+        return {"setName": "fake"} if name == "hello" else {}
+
+    async def start_session(self) -> FakeSession:
+        return FakeSession(self)
+
+
+class FakeCareWorkerService:
+    def __init__(self, workers: List[CareWorker], latency: float = 0.001):
+        self.workers = {str(worker.id): worker for worker in workers}
+        self.latency = latency
+        # Candidate searches go through its pipelines; benchmarks plug in a FakeRedis
+        self.redis_cache = RedisCacheService()
+        self.round_trips = 0
+        self.conflicts = 0
+        # Called with each worker_updates event, like schedulers consuming the topic
+        self.listeners = []
+
+    async def get_care_worker(self, worker_id: str) -> CareWorker:
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        if worker_id not in self.workers:
+            raise AppException(status_code=404, detail="Care worker not found")
+        return self.workers[worker_id]
+
+    async def get_care_workers_bulk(self, worker_ids: List[str]) -> Dict[str, CareWorker]:
+        # A warm cache answers with a single MGET
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        return {worker_id: self.workers[worker_id] for worker_id in dict.fromkeys(worker_ids) if worker_id in self.workers}
+
+    async def get_care_worker_table(self, worker_ids: List[str]) -> WorkerTable:
+        return WorkerTable.from_workers((await self.get_care_workers_bulk(worker_ids)).values())
+
+    async def reserve_care_worker(self, worker_id: str) -> bool:
+        return await self._transition_status(worker_id, CareWorkerStatus.AVAILABLE, CareWorkerStatus.BUSY)
+
+    async def release_care_worker(self, worker_id: str) -> bool:
+        return await self._transition_status(worker_id, CareWorkerStatus.BUSY, CareWorkerStatus.AVAILABLE)
+
+    async def _transition_status(self, worker_id: str, current: CareWorkerStatus, new: CareWorkerStatus) -> bool:
+        # The check and the write happen together on the server, after the round trip
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        worker = self.workers.get(worker_id)
+        if worker is None or worker.status != current:
+            self.conflicts += 1
+            return False
+        self.workers[worker_id] = worker.model_copy(update={"status": new})
+        for listener in self.listeners:
+            listener({"worker_id": worker_id, "status": new})
+        return True
+
+
+class FakeCareRequestService:
+    def __init__(self, latency: float = 0.001):
+        self.latency = latency
+        self.assignments: Dict[str, str] = {}
+        self.round_trips = 0
+        # Unassigned requests the scheduler publishes to their lane again are dropped
+        self.kafka_producer = KafkaProducerService()
+        self.kafka_producer.producer = FakeProducer({}, latency)
+
+    async def assign_care_worker(self, request_id: str, worker_id: str):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        self.assignments[str(request_id)] = str(worker_id)
+
+    async def claim_care_request(self, request_id: str, worker_id: str) -> bool:
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+        if request_id in self.assignments:
+            return False
+        self.assignments[request_id] = worker_id
+        return True
@@ -0,0 +1,356 @@
+"""Dispatch simulator: the real intake and scheduler against in-memory Kafka, Redis and MongoDB.
+
+Synthetic care workers are spread over the service area polygon at a given
+density and stay where they are. Care requests arrive at random points of
+the polygon as a Poisson stream with a chosen urgency mix; with a burst
+factor above 1, each burst period's requests all arrive in the first
+1/factor of it, so the mean rate is unchanged. Every request goes through
+CareRequestService.create_care_request, the outbox relay, its urgency
+lane, TaskSchedulerService.process_tasks and the worker reservation as in
+production, with each Kafka, Redis and MongoDB round trip costing
+--latency seconds. An assigned worker becomes available again after
+--service-time seconds.
+
+Reports time to assignment (from intake until the request is claimed),
+assignments per second and mean pickup distance, overall and per urgency
+lane, plus a count of workers that were ever given two requests at once.
+
+Run from the repository root:
+    python -m benchmarks.simulator
+    python -m benchmarks.simulator --rate 400 --burst-factor 4 --urgency-mix Emergency=0.2,Normal=0.8
+    python -m benchmarks.simulator --service-area area.geojson --workers-per-km2 2 --json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional
+import numpy as np
+from bson import ObjectId
+from src.models.schemas import (
+    CareRequestCreate, CareRequestStatus, CareWorkerCreate, CareWorkerStatus, Location, ServiceType, UrgencyLevel
+)
+from src.services import care_request_service as care_request_module
+from src.services import care_worker_service as care_worker_module
+from src.services import kafka_consumer_service as kafka_consumer_module
+from src.services import outbox_service as outbox_module
+from src.services import task_scheduler_service as scheduler_module
+from src.services.care_request_service import CareRequestService
+from src.services.care_worker_service import CareWorkerService, WORKER_UPDATES_TOPIC
+from src.services.distance_service import DistanceService
+from src.services.geofencing_service import GeofencingService
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.outbox_service import OutboxRelayService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.dispatch_lanes import LANE_TOPICS, LANES
+from src.utils.geometry import PreparedPolygon
+from src.utils.spatial_index import CoverageIndex
+from benchmarks.fakes import FakeCollection, FakeConsumer, FakeMongoClient, FakeProducer, FakeRedis
+
+DEFAULT_SERVICE_AREA = os.path.join(os.path.dirname(__file__), "service_area.geojson")
+KM_PER_DEGREE = 111.32
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--service-area", default=DEFAULT_SERVICE_AREA, help="GeoJSON polygon of the service area")
+    parser.add_argument("--workers-per-km2", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=100, help="mean care requests per second")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of arrivals")
+    parser.add_argument("--urgency-mix", default="Emergency=0.05,High=0.15,Normal=0.6,Low=0.2",
+                        help="share of each urgency, e.g. Emergency=1,Normal=4")
+    parser.add_argument("--burst-factor", type=float, default=1, help="peak rate over mean rate; 1 is a steady stream")
+    parser.add_argument("--burst-period", type=float, default=5, help="seconds from one burst to the next")
+    parser.add_argument("--service-time", type=float, default=30, help="seconds a worker is busy per request")
+    parser.add_argument("--latency", type=float, default=0.001, help="seconds per simulated round trip")
+    parser.add_argument("--drain-timeout", type=float, default=30,
+                        help="seconds to wait for the scheduler once arrivals stop")
+    parser.add_argument("--batch", action="store_true", help="dispatch batches jointly (SCHEDULER_BATCH_DISPATCH)")
+    parser.add_argument("--redis-search", action="store_true",
+                        help="search candidates in Redis instead of the in-process worker index")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+def parse_urgency_mix(text: str) -> Dict[UrgencyLevel, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, share = part.partition("=")
+        mix[UrgencyLevel(name.strip())] = float(share)
+    total = sum(mix.values())
+    if total <= 0:
+        raise ValueError("Urgency mix shares must add up to more than zero")
+    return {urgency: share / total for urgency, share in mix.items()}
+
+def sample_points(polygon: PreparedPolygon, count: int, rng: np.random.Generator):
+    """Uniform points inside the polygon, by rejection from its bounding box.
+
+    Returns the latitudes, the longitudes and the share of the box the
+    polygon covers.
+    """
+    min_x, min_y, max_x, max_y = polygon.bounds
+    latitudes, longitudes = [], []
+    drawn = accepted = 0
+    while accepted < count:
+        xs = rng.uniform(min_x, max_x, max(2 * (count - accepted), 1024))
+        ys = rng.uniform(min_y, max_y, xs.size)
+        inside = polygon.contains_many(xs, ys)
+        drawn += xs.size
+        accepted += int(np.count_nonzero(inside))
+        latitudes.append(ys[inside])
+        longitudes.append(xs[inside])
+    return np.concatenate(latitudes)[:count], np.concatenate(longitudes)[:count], accepted / drawn
+
+def area_km2(polygon: PreparedPolygon, rng: np.random.Generator) -> float:
+    min_x, min_y, max_x, max_y = polygon.bounds
+    _, _, share = sample_points(polygon, 100_000, rng)
+    mid_latitude = np.radians((min_y + max_y) / 2)
+    return share * (max_x - min_x) * np.cos(mid_latitude) * KM_PER_DEGREE * (max_y - min_y) * KM_PER_DEGREE
+
+def arrival_times(rate: float, duration: float, burst_factor: float, burst_period: float,
+                  rng: np.random.Generator) -> np.ndarray:
+    # A Poisson process over the bursts only, laid back out onto the clock
+    burst_factor = max(burst_factor, 1)
+    burst = burst_period / burst_factor
+    active = np.sort(rng.uniform(0, duration / burst_factor, rng.poisson(rate * duration)))
+    return (active // burst) * burst_period + active % burst
+
+def seed_workers(collection: FakeCollection, redis: FakeRedis, polygon: PreparedPolygon, count: int,
+                 rng: np.random.Generator):
+    """Put a fleet of available workers straight into the database and the geo sets."""
+    service_types = list(ServiceType)
+    latitudes, longitudes, _ = sample_points(polygon, count, rng)
+    for latitude, longitude in zip(latitudes.tolist(), longitudes.tolist()):
+        specializations = rng.choice(len(service_types), size=rng.integers(1, 3), replace=False)
+        document = CareWorkerCreate(
+            name="Worker", email="worker@example.com", phone_number="0", password="-",
+            specializations=[service_types[index] for index in specializations.tolist()],
+            care_center_id=str(ObjectId()), current_location=Location(latitude=latitude, longitude=longitude)
+        ).model_dump(exclude={"password"})
+        document["_id"] = ObjectId()
+        document["status"] = CareWorkerStatus.AVAILABLE
+        collection.documents[document["_id"]] = document
+        redis.seed_worker(str(document["_id"]), document, longitude, latitude)
+
+def make_care_requests(polygon: PreparedPolygon, count: int, mix: Dict[UrgencyLevel, float],
+                       rng: np.random.Generator):
+    service_types = list(ServiceType)
+    urgencies = list(mix)
+    latitudes, longitudes, _ = sample_points(polygon, count, rng)
+    urgency_indexes = rng.choice(len(urgencies), size=count, p=list(mix.values()))
+    service_type_indexes = rng.integers(0, len(service_types), count)
+    return [
+        CareRequestCreate(client_id=str(ObjectId()), service_type=service_types[service_type],
+                          urgency=urgencies[urgency], location=Location(latitude=latitude, longitude=longitude))
+        for latitude, longitude, urgency, service_type in zip(latitudes.tolist(), longitudes.tolist(),
+                                                              urgency_indexes.tolist(), service_type_indexes.tolist())
+    ]
+
+class DispatchRecorder:
+    """Watches the care request collection for claims and sends workers back after their visit."""
+
+    def __init__(self, workers: FakeCollection, care_worker_service: CareWorkerService, service_time: float):
+        self.workers = workers
+        self.care_worker_service = care_worker_service
+        self.service_time = service_time
+        self.submitted: Dict[str, tuple] = {}
+        self.claims: Dict[str, tuple] = {}
+        self.busy = set()
+        self.double_bookings = 0
+        self._visits = set()
+
+    def submit(self, request_id: str, submitted_at: float, care_request: CareRequestCreate):
+        self.submitted[request_id] = (submitted_at, UrgencyLevel(care_request.urgency), care_request.location)
+
+    def on_request_update(self, document: dict, changes: dict):
+        if changes.get("status") != CareRequestStatus.ASSIGNED:
+            return
+        worker_id = changes["assigned_worker_id"]
+        if worker_id in self.busy:
+            self.double_bookings += 1
+        self.busy.add(worker_id)
+        location = self.workers.documents[ObjectId(worker_id)]["current_location"]
+        self.claims[str(document["_id"])] = (time.perf_counter(), Location(**location))
+        asyncio.get_running_loop().call_later(self.service_time, self._finish_visit, worker_id)
+
+    def _finish_visit(self, worker_id: str):
+        self.busy.discard(worker_id)
+        task = asyncio.ensure_future(self.care_worker_service.release_care_worker(worker_id))
+        self._visits.add(task)
+        task.add_done_callback(self._visits.discard)
+
+    def report(self, elapsed: float) -> dict:
+        lanes = {}
+        for lane in LANES + [None]:
+            latencies, distances = [], []
+            requests = 0
+            for request_id, (submitted_at, urgency, location) in self.submitted.items():
+                if lane is not None and urgency != lane:
+                    continue
+                requests += 1
+                if request_id in self.claims:
+                    claimed_at, worker_location = self.claims[request_id]
+                    latencies.append((claimed_at - submitted_at) * 1000)
+                    distances.append(DistanceService.calculate_distance(location, worker_location))
+            lanes["all" if lane is None else lane.value] = {
+                "requests": requests,
+                "assigned": len(latencies),
+                "p50_ms": _round(np.percentile(latencies, 50)) if latencies else None,
+                "p99_ms": _round(np.percentile(latencies, 99)) if latencies else None,
+                "mean_pickup_km": _round(np.mean(distances), 3) if distances else None,
+            }
+        return {
+            "elapsed_s": _round(elapsed, 2),
+            "assignments_per_s": _round(len(self.claims) / elapsed) if elapsed else None,
+            "double_bookings": self.double_bookings,
+            "lanes": lanes,
+        }
+
+def _round(value: float, digits: int = 1) -> float:
+    return round(float(value), digits)
+
+async def simulate(args: argparse.Namespace) -> dict:
+    rng = np.random.default_rng(args.seed)
+    settings = scheduler_module.settings
+    settings.SCHEDULER_BATCH_DISPATCH = args.batch
+    settings.SCHEDULER_WORKER_INDEX = not args.redis_search
+    settings.SCHEDULER_METRICS_INTERVAL = 0
+    geofencing = GeofencingService(settings.model_copy(update={
+        "SERVICE_AREA_GEOJSON_PATH": args.service_area, "SERVICE_AREA_SNAPSHOT_PATH": None
+    }))
+    polygon = geofencing.service_area
+
+    # In-memory Kafka, Redis and MongoDB behind the real services
+    redis = FakeRedis(args.latency)
+    workers, care_requests = FakeCollection(args.latency), FakeCollection(args.latency)
+    outbox, leases, mongo_client = FakeCollection(args.latency), FakeCollection(args.latency), FakeMongoClient(args.latency)
+    lanes_consumer, updates_consumer = FakeConsumer([], args.latency), FakeConsumer([], args.latency)
+    routes = {topic: lanes_consumer for topic in LANE_TOPICS.values()}
+    routes[WORKER_UPDATES_TOPIC] = updates_consumer
+    kafka_producer = KafkaProducerService()
+    kafka_producer.producer = FakeProducer(routes, args.latency)
+
+    async def get_redis_client():
+        return redis
+
+    async def get_workers_collection():
+        return workers
+
+    async def get_requests_collection():
+        return care_requests
+
+    async def get_outbox_collection():
+        return outbox
+
+    async def get_leases_collection():
+        return leases
+
+    async def get_mongo_client():
+        return mongo_client
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield lanes_consumer
+
+    async def start_kafka_consumer(*topics, **kwargs):
+        # A new consumer group starts at the end of the topic
+        await updates_consumer.seek_to_end()
+        return updates_consumer
+
+    care_worker_module.get_care_workers_collection = get_workers_collection
+    care_request_module.get_care_requests_collection = get_requests_collection
+    outbox_module.get_outbox_collection = get_outbox_collection
+    outbox_module.get_leases_collection = get_leases_collection
+    outbox_module.get_client = get_mongo_client
+    scheduler_module.get_redis_client = get_redis_client
+    scheduler_module.get_kafka_consumer = get_kafka_consumer
+    kafka_consumer_module.start_kafka_consumer = start_kafka_consumer
+
+    care_worker_service = CareWorkerService(kafka_producer)
+    care_worker_service.redis_cache.redis = redis
+    care_request_service = CareRequestService(geofencing, kafka_producer, CoverageIndex())
+    outbox_relay = OutboxRelayService(kafka_producer)
+    scheduler = TaskSchedulerService(care_worker_service, care_request_service, DistanceService())
+
+    area = area_km2(polygon, rng)
+    seed_workers(workers, redis, polygon, round(area * args.workers_per_km2), rng)
+    arrivals = arrival_times(args.rate, args.duration, args.burst_factor, args.burst_period, rng)
+    requests = make_care_requests(polygon, len(arrivals), parse_urgency_mix(args.urgency_mix), rng)
+    recorder = DispatchRecorder(workers, care_worker_service, args.service_time)
+    care_requests.listeners.append(recorder.on_request_update)
+
+    tasks = []
+    if settings.OUTBOX_ENABLED:
+        await outbox_relay.start()
+    if settings.SCHEDULER_WORKER_INDEX:
+        tasks.append(asyncio.create_task(scheduler.consume_worker_updates()))
+        while scheduler.worker_index is None:
+            await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(scheduler.process_tasks()))
+
+    async def submit(care_request: CareRequestCreate):
+        submitted_at = time.perf_counter()
+        request_id = await care_request_service.create_care_request(care_request)
+        recorder.submit(request_id, submitted_at, care_request)
+
+    start = time.perf_counter()
+    intake = []
+    for arrival, care_request in zip(arrivals.tolist(), requests):
+        delay = start + arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        intake.append(asyncio.create_task(submit(care_request)))
+    await asyncio.gather(*intake)
+
+    async def drain():
+        # Intake returns once the events are in the outbox; wait for the relay, then the scheduler
+        while outbox.documents:
+            await asyncio.sleep(0.01)
+        await lanes_consumer.drained.wait()
+
+    if requests:
+        try:
+            await asyncio.wait_for(drain(), args.drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = time.perf_counter() - start
+    for task in tasks:
+        task.cancel()
+    await outbox_relay.close()
+
+    report = recorder.report(elapsed)
+    report.update({
+        "service_area_km2": _round(area),
+        "workers": len(workers.documents),
+        "offered_rate": args.rate,
+        "burst_factor": args.burst_factor,
+    })
+    return report
+
+def print_report(report: dict, args: argparse.Namespace):
+    print(f"{report['workers']} workers over {report['service_area_km2']:.0f} km2, "
+          f"{report['lanes']['all']['requests']} requests at {args.rate:g}/s for {args.duration:g}s "
+          f"(burst x{args.burst_factor:g}), {args.latency * 1e3:g}ms per round trip")
+    print(f"{'lane':>10} {'requests':>9} {'assigned':>9} {'p50 ms':>9} {'p99 ms':>9} {'pickup km':>10}")
+    for lane, stats in report["lanes"].items():
+        if not stats["requests"]:
+            continue
+        print(f"{lane:>10} {stats['requests']:>9} {stats['assigned']:>9} {_cell(stats['p50_ms'], 9)} "
+              f"{_cell(stats['p99_ms'], 9)} {_cell(stats['mean_pickup_km'], 10, '.2f')}")
+    print(f"{report['assignments_per_s']:.0f} assignments/s over {report['elapsed_s']}s, "
+          f"{report['double_bookings']} double bookings")
+
+def _cell(value: Optional[float], width: int, spec: str = ".0f") -> str:
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}{spec}}"
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.getLogger("src").setLevel(logging.ERROR)
+    report = asyncio.run(simulate(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report, args)
+
+if __name__ == "__main__":
+    main()
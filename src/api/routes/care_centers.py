@@ -9,6 +9,14 @@ router = APIRouter()
 async def create_care_center(care_center: CareCenterCreate, service: CareCenterService = Depends()):
     return await service.create_care_center(care_center)
 
+@router.get("/care-centers/covering", response_model=List[CareCenter])
+async def get_covering_care_centers(
+    latitude: float = Query(..., description="Latitude of the point"),
+    longitude: float = Query(..., description="Longitude of the point"),
+    service: CareCenterService = Depends()
+):
+    return await service.get_care_centers_covering(latitude, longitude)
+
 @router.get("/care-centers/{center_id}", response_model=CareCenter)
 async def get_care_center(center_id: str, service: CareCenterService = Depends()):
     return await service.get_care_center(center_id)
@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
-from typing import List
-from src.models.schemas import CareRequest, CareRequestCreate, CareRequestUpdate, CareRequestStatus
+from fastapi import APIRouter, Body, Depends, HTTPException, Request
+from typing import Any, Dict, List
+from src.models.schemas import CareRequest, CareRequestCreate, CareRequestUpdate, CareRequestStatus, CareRequestBulkResult
 from src.services.care_request_service import CareRequestService
+from src.services.care_worker_service import CareWorkerService
 from src.services.geofencing_service import GeofencingService
-from src.utils.config import Settings
 
 router = APIRouter()
 
-def get_geofencing_service():
-    settings = Settings()
-    return GeofencingService(settings)
+def get_geofencing_service(request: Request) -> GeofencingService:
+    return request.app.state.geofencing_service
 
-def get_care_request_service():
-    return CareRequestService()
+def get_care_worker_service(request: Request) -> CareWorkerService:
+    return request.app.state.care_worker_service
+
+def get_care_request_service(request: Request) -> CareRequestService:
+    return CareRequestService(request.app.state.geofencing_service, request.app.state.kafka_producer_service)
 
 @router.post("/care-requests", response_model=str)
 async def create_care_request(
@@ -24,6 +26,14 @@ async def create_care_request(
         raise HTTPException(status_code=400, detail="Location is not within the service area")
     return await service.create_care_request(care_request)
 
+@router.post("/bulk", response_model=CareRequestBulkResult)
+async def create_care_requests_bulk(
+    care_requests: List[Dict[str, Any]] = Body(...),
+    service: CareRequestService = Depends(get_care_request_service)
+):
+    # Items are validated one by one in the service so a bad item only rejects itself
+    return await service.create_care_requests_bulk(care_requests)
+
 @router.get("/care-requests/{request_id}", response_model=CareRequest)
 async def get_care_request(
     request_id: str, 
@@ -43,9 +53,10 @@ async def update_care_request(
 async def assign_care_worker(
     request_id: str, 
     worker_id: str, 
-    service: CareRequestService = Depends(get_care_request_service)
+    service: CareRequestService = Depends(get_care_request_service),
+    care_worker_service: CareWorkerService = Depends(get_care_worker_service)
 ):
-    return await service.assign_care_worker(request_id, worker_id)
+    return await service.assign_care_worker(request_id, worker_id, care_worker_service)
 
 @router.get("/care-requests", response_model=List[CareRequest])
 async def list_care_requests(
@@ -1,43 +1,69 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from bson import ObjectId
+from fastapi import APIRouter, HTTPException, Depends, Request, status
 from src.services.care_worker_service import CareWorkerService
-from src.models.schemas import CareWorker, CareWorkerStatus, CareWorkerCreate, CareWorkerUpdate, Location
+from src.services.location_ingestion_service import LocationIngestionService
+from src.models.schemas import (
+    CareWorker, CareWorkerStatus, CareWorkerCreate, CareWorkerUpdate, Location, LocationPing, LocationPingBatchResult
+)
 from typing import List
 from src.utils.error_handling import AppException
 
 router = APIRouter()
 
+def get_care_worker_service(request: Request) -> CareWorkerService:
+    return request.app.state.care_worker_service
+
+def get_location_ingestion_service(request: Request) -> LocationIngestionService:
+    return request.app.state.location_ingestion_service
+
 @router.post("/care-workers", response_model=str, status_code=status.HTTP_201_CREATED)
-async def create_worker(worker: CareWorkerCreate):
-    return await CareWorkerService.create_care_worker(worker)
+async def create_worker(worker: CareWorkerCreate, service: CareWorkerService = Depends(get_care_worker_service)):
+    return await service.create_care_worker(worker)
 
 @router.get("/care-workers", response_model=List[CareWorker])
-async def list_workers(status: CareWorkerStatus = None, skip: int = 0, limit: int = 100):
-    return await CareWorkerService.list_care_workers(skip, limit)
+async def list_workers(status: CareWorkerStatus = None, skip: int = 0, limit: int = 100,
+                       service: CareWorkerService = Depends(get_care_worker_service)):
+    return await service.list_care_workers(skip, limit)
 
 @router.get("/care-workers/{worker_id}", response_model=CareWorker)
-async def get_worker(worker_id: str):
+async def get_worker(worker_id: str, service: CareWorkerService = Depends(get_care_worker_service)):
     try:
-        return await CareWorkerService.get_care_worker(worker_id)
+        return await service.get_care_worker(worker_id)
     except AppException as e:
         raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.put("/care-workers/{worker_id}", response_model=CareWorker)
-async def update_worker(worker_id: str, worker: CareWorkerUpdate):
+async def update_worker(worker_id: str, worker: CareWorkerUpdate,
+                        service: CareWorkerService = Depends(get_care_worker_service)):
     try:
-        return await CareWorkerService.update_care_worker(worker_id, worker)
+        return await service.update_care_worker(worker_id, worker)
     except AppException as e:
         raise HTTPException(status_code=e.status_code, detail=e.detail)
 
 @router.delete("/care-workers/{worker_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_worker(worker_id: str):
-    success = await CareWorkerService.delete_care_worker(worker_id)
+async def delete_worker(worker_id: str, service: CareWorkerService = Depends(get_care_worker_service)):
+    success = await service.delete_care_worker(worker_id)
     if not success:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Care worker not found")
 
 @router.put("/care-workers/{worker_id}/location", response_model=CareWorker)
-async def update_worker_location(worker_id: str, location: Location):
-    update_data = CareWorkerUpdate(current_location=location)
+async def update_worker_location(worker_id: str, location: Location,
+                                 service: CareWorkerService = Depends(get_care_worker_service),
+                                 ingestion: LocationIngestionService = Depends(get_location_ingestion_service)):
+    if not ObjectId.is_valid(worker_id):
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid care worker ID")
     try:
-        return await CareWorkerService.update_care_worker(worker_id, update_data)
+        care_worker = await service.update_care_worker(worker_id, CareWorkerUpdate(current_location=location))
     except AppException as e:
-        raise HTTPException(status_code=e.status_code, detail=e.detail)
\ No newline at end of file
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    # Written through at once; pings queued before it must not overwrite it later
+    ingestion.supersede(worker_id)
+    return care_worker
+
+@router.post("/locations", response_model=LocationPingBatchResult, status_code=status.HTTP_202_ACCEPTED)
+async def ingest_worker_locations(pings: List[LocationPing],
+                                  service: LocationIngestionService = Depends(get_location_ingestion_service)):
+    try:
+        return LocationPingBatchResult(received=len(pings), accepted=service.submit_many(pings))
+    except AppException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
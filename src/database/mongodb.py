@@ -22,6 +22,11 @@ async def get_database():
         await connect_to_mongo()
     return db.client[settings.db_name]
 
+async def get_client() -> AsyncIOMotorClient:
+    if not db.client:
+        await connect_to_mongo()
+    return db.client
+
 async def get_collection(collection_name: str):
     database = await get_database()
     return database[collection_name]
@@ -33,4 +38,10 @@ async def get_care_workers_collection():
     return await get_collection("care_workers")
 
 async def get_users_collection():
-    return await get_collection("users")
\ No newline at end of file
+    return await get_collection("users")
+
+async def get_outbox_collection():
+    return await get_collection("outbox")
+
+async def get_leases_collection():
+    return await get_collection("leases")
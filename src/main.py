@@ -2,6 +2,7 @@ from fastapi import FastAPI, Request, Depends
 from fastapi.exceptions import RequestValidationError
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from contextlib import asynccontextmanager
+import asyncio
 from .api.routes import care_requests, care_workers, care_centers
 from .utils.error_handling import (
     AppException,
@@ -11,26 +12,70 @@ from .utils.error_handling import (
     log_request
 )
 from .database.mongodb import connect_to_mongo, close_mongo_connection
+from .services.care_center_service import CareCenterService
 from .services.care_worker_service import CareWorkerService
+from .services.geofencing_service import GeofencingService
+from .services.kafka_producer_service import KafkaProducerService
+from .services.location_ingestion_service import LocationIngestionService
+from .services.outbox_service import OutboxRelayService
+from .services.worker_geo_index_service import WorkerGeoIndexService
+from .utils.config import get_settings
 from redis.asyncio import Redis
-from src.utils.redis_config import get_redis
+from src.utils.redis_config import connect_to_redis, close_redis_connection, get_redis
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
+    # One pooled Redis client shared by every service and request
+    await connect_to_redis()
     
     # Initialize services
-    care_worker_service = CareWorkerService()
+    kafka_producer_service = KafkaProducerService()
+    await kafka_producer_service.initialize()
+    # Care request events committed to the outbox are relayed to Kafka by one process at a time
+    outbox_relay_service = OutboxRelayService(kafka_producer_service)
+    if get_settings().OUTBOX_ENABLED:
+        await outbox_relay_service.start()
+
+    # Worker changes are published for the task scheduler's in-process index
+    care_worker_service = CareWorkerService(kafka_producer_service)
     await care_worker_service.initialize()
-    
-    # Store the service in app state for access in route handlers
+    # Keep the status- and specialization-partitioned geo sets in line with MongoDB
+    worker_geo_index_service = WorkerGeoIndexService(care_worker_service.redis_cache,
+                                                     get_settings().WORKER_GEO_RECONCILE_INTERVAL)
+    await worker_geo_index_service.start()
+
+    # Worker GPS pings are coalesced in memory and written out in batches
+    location_ingestion_service = LocationIngestionService(get_settings(), care_worker_service.redis_cache,
+                                                          kafka_producer_service, care_worker_service)
+    await location_ingestion_service.start()
+
+    # Load the geofence once (from GeoJSON or the local snapshot when available)
+    # off the event loop, then keep it fresh in the background
+    geofencing_service = await asyncio.to_thread(GeofencingService, get_settings())
+    await geofencing_service.start()
+
+    # Build the in-memory index of care center service areas used on request intake
+    await CareCenterService().load_coverage_index()
+
+    # Store the services in app state for access in route handlers
     app.state.care_worker_service = care_worker_service
+    app.state.location_ingestion_service = location_ingestion_service
+    app.state.geofencing_service = geofencing_service
+    app.state.kafka_producer_service = kafka_producer_service
+    app.state.outbox_relay_service = outbox_relay_service
     
     yield
     
     # Shutdown
+    await geofencing_service.close()
+    await location_ingestion_service.close()
+    await worker_geo_index_service.close()
     await care_worker_service.close()
+    await outbox_relay_service.close()
+    await kafka_producer_service.close()
+    await close_redis_connection()
     await close_mongo_connection()
 
 app = FastAPI(title="CareNet API", lifespan=lifespan)
@@ -62,6 +107,22 @@ async def test_redis(redis: Redis = Depends(get_redis)):
     value = await redis.get("test_key")
     return {"redis_test": value}
 
+@app.get("/geofence/stats")
+async def geofence_stats(request: Request):
+    return request.app.state.geofencing_service.stats()
+
+@app.get("/care-workers/cache/stats")
+async def care_worker_cache_stats(request: Request):
+    return request.app.state.care_worker_service.cache_stats()
+
+@app.get("/kafka/producer/stats")
+async def kafka_producer_stats(request: Request):
+    return request.app.state.kafka_producer_service.stats()
+
+@app.get("/outbox/stats")
+async def outbox_stats(request: Request):
+    return request.app.state.outbox_relay_service.stats()
+
 @app.get("/base_url")
 async def get_base_url(request: Request):
     return {"base_url": str(request.base_url)}
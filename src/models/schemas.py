@@ -1,6 +1,6 @@
 from enum import Enum
 from datetime import datetime
-from typing import Optional, List, Any, Dict
+from typing import Optional, List, Any, Callable, Dict, Union, get_args, get_origin
 from pydantic import BaseModel, Field, EmailStr
 from pydantic.config import ConfigDict
 from pydantic_core import core_schema
@@ -26,9 +26,61 @@ class PyObjectId(str):
             core_schema.no_info_plain_validator_function(cls.validate)
         ])
 
+# Per model, each field's name, alias and how from_trusted converts its stored value
+_TRUSTED_FIELDS: Dict[type, List[tuple]] = {}
+
+def _trusted_converter(annotation: Any) -> Optional[Callable[[Any], Any]]:
+    """How a stored value becomes a field of this type without validation; None keeps it as is."""
+    origin = get_origin(annotation)
+    if origin is Union:
+        # Optional[X]
+        (annotation,) = [arg for arg in get_args(annotation) if arg is not type(None)]
+        convert = _trusted_converter(annotation)
+        return convert and (lambda value: None if value is None else convert(value))
+    if origin in (list, List):
+        convert = _trusted_converter(get_args(annotation)[0])
+        return convert and (lambda values: [convert(value) for value in values])
+    if not isinstance(annotation, type):
+        return None
+    if issubclass(annotation, PyObjectId):
+        # Documents from MongoDB hold ObjectIds, cache entries hold strings
+        return str
+    if issubclass(annotation, Enum):
+        return annotation
+    if issubclass(annotation, BaseModel):
+        return lambda value: _construct_trusted(annotation, value)
+    if annotation is float:
+        return float
+    if annotation is datetime:
+        return lambda value: value if isinstance(value, datetime) else datetime.fromisoformat(value)
+    return None
+
+def _construct_trusted(model: type, data: Dict[str, Any]) -> BaseModel:
+    fields = _TRUSTED_FIELDS.get(model)
+    if fields is None:
+        fields = _TRUSTED_FIELDS[model] = [(name, field.alias, _trusted_converter(field.annotation))
+                                           for name, field in model.model_fields.items()]
+    values = {}
+    for name, alias, convert in fields:
+        key = alias if alias is not None and alias in data else name
+        if key in data:
+            values[name] = data[key] if convert is None else convert(data[key])
+    return model.model_construct(**values)
+
 class BaseMongoModel(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True, populate_by_name=True)
 
+    @classmethod
+    def from_trusted(cls, data: Dict[str, Any]):
+        """Build the model from a document this service wrote, without validating it again.
+
+        Enums, nested models, floats and timestamps are converted the way
+        validation would, and ObjectIds become strings whether the data came
+        from MongoDB or a cache; anything else is taken as is. Only use it on data
+        that was validated before it was stored, such as cache entries.
+        """
+        return _construct_trusted(cls, data)
+
 class ServiceType(str, Enum):
     MEDICAL_CHECKUP = "Medical Checkup" #医疗检查
     MEDICATION_ADMINISTRATION = "Medication Administration" #药物管理
@@ -66,6 +118,7 @@ class CareRequest(CareRequestBase):
     status: CareRequestStatus = CareRequestStatus.PENDING
     created_at: datetime = Field(default_factory=datetime.utcnow)
     assigned_worker_id: Optional[PyObjectId] = None
+    care_center_id: Optional[PyObjectId] = None
     estimated_fee: Optional[float] = None
 
 class CareRequestCreate(CareRequestBase):
@@ -76,6 +129,15 @@ class CareRequestUpdate(BaseMongoModel):
     assigned_worker_id: Optional[PyObjectId] = None
     estimated_fee: Optional[float] = None
 
+class CareRequestBulkItemResult(BaseModel):
+    index: int
+    request_id: Optional[str] = None
+    detail: Optional[Any] = None
+
+class CareRequestBulkResult(BaseModel):
+    accepted: List[CareRequestBulkItemResult] = []
+    rejected: List[CareRequestBulkItemResult] = []
+
 # CareCenter models
 
 class CareCenter(BaseMongoModel):
@@ -122,6 +184,16 @@ class CareWorker(CareWorkerBase):
     rating: float = Field(ge=0, le=5, default=0)
     completed_tasks: int = 0
 
+class LocationPing(BaseModel):
+    worker_id: PyObjectId
+    latitude: float = Field(ge=-90, le=90)
+    longitude: float = Field(ge=-180, le=180)
+    timestamp: Optional[datetime] = None  # when the app took the fix; arrival time if unset
+
+class LocationPingBatchResult(BaseModel):
+    received: int
+    accepted: int
+
 # User models
 class UserBase(BaseMongoModel):
     username: str
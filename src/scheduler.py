@@ -0,0 +1,53 @@
+"""Task scheduler worker process.
+
+Run from the repository root:
+    python -m src.scheduler
+"""
+import asyncio
+import logging
+from src.database.mongodb import connect_to_mongo, close_mongo_connection
+from src.services.care_request_service import CareRequestService
+from src.services.care_worker_service import CareWorkerService
+from src.services.distance_service import DistanceService
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.outbox_service import OutboxRelayService
+from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.config import get_settings
+from src.utils.redis_config import connect_to_redis, close_redis_connection
+
+logger = logging.getLogger(__name__)
+
+async def main():
+    settings = get_settings()
+    await connect_to_mongo()
+    await connect_to_redis()
+
+    kafka_producer_service = KafkaProducerService()
+    await kafka_producer_service.initialize()
+    care_worker_service = CareWorkerService(kafka_producer_service)
+    await care_worker_service.initialize()
+    # The scheduler only assigns existing requests, so intake geofencing is not needed here
+    care_request_service = CareRequestService(None, kafka_producer_service)
+    # Assignments commit status events to the outbox; the relay lease decides which process sends them
+    outbox_relay_service = OutboxRelayService(kafka_producer_service)
+    if settings.OUTBOX_ENABLED:
+        await outbox_relay_service.start()
+    distance_service = await asyncio.to_thread(DistanceService.from_settings, settings)
+
+    scheduler = TaskSchedulerService(care_worker_service, care_request_service, distance_service)
+    tasks = [scheduler.process_tasks()]
+    if settings.SCHEDULER_WORKER_INDEX:
+        tasks.append(scheduler.consume_worker_updates())
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        await care_worker_service.close()
+        await outbox_relay_service.close()
+        await kafka_producer_service.close()
+        await close_redis_connection()
+        await close_mongo_connection()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
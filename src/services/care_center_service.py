@@ -1,16 +1,46 @@
-from typing import List
+import logging
+from typing import Any, List, Optional
 from bson import ObjectId
 from fastapi import status
-from src.models.schemas import CareCenter, CareCenterCreate, CareCenterUpdate
+from src.models.schemas import CareCenter, CareCenterCreate, CareCenterUpdate, Location
 from src.database.mongodb import get_collection
 from src.utils.error_handling import AppException
+from src.utils.geometry import PreparedPolygon
+from src.utils.spatial_index import CoverageIndex
+
+logger = logging.getLogger(__name__)
+
+# Shared by every CareCenterService and CareRequestService in the process
+coverage_index = CoverageIndex()
+
+def service_area_geometry(service_area: List[Location]) -> dict:
+    ring = [[location.longitude, location.latitude] for location in service_area]
+    if ring and ring[0] != ring[-1]:
+        ring.append(ring[0])
+    return {"type": "Polygon", "coordinates": [ring]}
+
+def service_area_polygon(service_area: Any) -> Optional[PreparedPolygon]:
+    # Older documents store the service area as a plain list of locations
+    if isinstance(service_area, list):
+        service_area = service_area_geometry([Location(**location) for location in service_area])
+    try:
+        return PreparedPolygon.from_geometry(service_area)
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Skipping invalid service area: {str(e)}")
+        return None
 
 class CareCenterService:
+    def __init__(self):
+        self.coverage_index = coverage_index
+
     async def create_care_center(self, care_center: CareCenterCreate) -> str:
         collection = await get_collection("care_centers")
         care_center_dict = care_center.model_dump()
+        care_center_dict["service_area"] = service_area_geometry(care_center.service_area)
         result = await collection.insert_one(care_center_dict)
-        return str(result.inserted_id)
+        center_id = str(result.inserted_id)
+        self._index_care_center(center_id, care_center_dict["location"], care_center_dict["service_area"])
+        return center_id
 
     async def get_care_center(self, center_id: str) -> CareCenter:
         collection = await get_collection("care_centers")
@@ -23,6 +53,8 @@ class CareCenterService:
     async def update_care_center(self, center_id: str, updates: CareCenterUpdate) -> CareCenter:
         collection = await get_collection("care_centers")
         update_data = updates.model_dump(exclude_unset=True)
+        if updates.service_area is not None:
+            update_data["service_area"] = service_area_geometry(updates.service_area)
         result = await collection.update_one(
             {"_id": ObjectId(center_id)},
             {"$set": update_data}
@@ -30,7 +62,9 @@ class CareCenterService:
         if result.modified_count == 0:
             raise AppException(status_code=status.HTTP_404_NOT_FOUND, 
                                detail="Care center not found or no changes made")
-        return await self.get_care_center(center_id)
+        care_center = await self.get_care_center(center_id)
+        self._index_care_center(center_id, care_center.location.model_dump(), care_center.service_area)
+        return care_center
 
     async def list_care_centers(self, skip: int = 0, limit: int = 100) -> List[CareCenter]:
         collection = await get_collection("care_centers")
@@ -53,4 +87,32 @@ class CareCenterService:
         }
         cursor = collection.find(query)
         care_centers = await cursor.to_list(length=None)
-        return [CareCenter(**cc) for cc in care_centers]
\ No newline at end of file
+        return [CareCenter(**cc) for cc in care_centers]
+
+    async def get_care_centers_covering(self, latitude: float, longitude: float) -> List[CareCenter]:
+        center_ids = self.coverage_index.covering(longitude, latitude)
+        if not center_ids:
+            return []
+        collection = await get_collection("care_centers")
+        cursor = collection.find({"_id": {"$in": [ObjectId(center_id) for center_id in center_ids]}})
+        care_centers = await cursor.to_list(length=None)
+        return [CareCenter(**cc) for cc in care_centers]
+
+    async def load_coverage_index(self):
+        collection = await get_collection("care_centers")
+        cursor = collection.find({}, {"location": 1, "service_area": 1})
+        entries = {}
+        async for care_center in cursor:
+            polygon = service_area_polygon(care_center.get("service_area"))
+            if polygon:
+                location = care_center["location"]
+                entries[str(care_center["_id"])] = (polygon, (location["longitude"], location["latitude"]))
+        self.coverage_index.rebuild(entries)
+        logger.info(f"Indexed service areas of {len(entries)} care centers")
+
+    def _index_care_center(self, center_id: str, location: dict, service_area: Any):
+        polygon = service_area_polygon(service_area)
+        if polygon:
+            self.coverage_index.upsert(center_id, polygon, (location["longitude"], location["latitude"]))
+        else:
+            self.coverage_index.remove(center_id)
@@ -1,16 +1,35 @@
-from typing import List
+from datetime import datetime
+from typing import Any, Dict, List, Optional
 from bson import ObjectId
 from fastapi import status
-from src.models.schemas import CareRequest, CareRequestCreate, CareRequestUpdate, CareRequestStatus
+from pydantic import ValidationError
+from src.models.schemas import (
+    CareRequest, CareRequestCreate, CareRequestUpdate, CareRequestStatus,
+    CareRequestBulkItemResult, CareRequestBulkResult
+)
 from src.database.mongodb import get_care_requests_collection
+from src.services.care_center_service import coverage_index
+from src.services.care_worker_service import CareWorkerService
 from src.services.geofencing_service import GeofencingService
 from src.services.kafka_producer_service import KafkaProducerService
+from src.services.outbox_service import record_events
+from src.utils.config import get_settings
+from src.utils.dispatch_lanes import lane_topic
 from src.utils.error_handling import AppException
+from src.utils.geo_sharding import geo_cell_key
+from src.utils.spatial_index import CoverageIndex
+
+settings = get_settings()
+
+# Status changes of care requests, keyed by request ID so each request's changes stay in order
+CARE_REQUEST_STATUS_TOPIC = "care_request_status"
 
 class CareRequestService:
-    def __init__(self, geofencing: GeofencingService, kafka_producer: KafkaProducerService):
+    def __init__(self, geofencing: GeofencingService, kafka_producer: KafkaProducerService,
+                 care_center_coverage: Optional[CoverageIndex] = None):
         self.geofencing = geofencing
         self.kafka_producer = kafka_producer
+        self.care_center_coverage = care_center_coverage or coverage_index
 
     async def create_care_request(self, care_request: CareRequestCreate) -> str:
         if not self.geofencing.is_location_allowed(care_request.location):
@@ -19,17 +38,88 @@ class CareRequestService:
         
         collection = await get_care_requests_collection()
         care_request_dict = care_request.model_dump()
-        result = await collection.insert_one(care_request_dict)
-        request_id = str(result.inserted_id)
-        
-        # Publish the new care request to Kafka
-        await self.kafka_producer.publish_message("new_care_requests", {
-            "request_id": request_id,
-            **care_request_dict
-        })
+        care_request_dict["status"] = CareRequestStatus.PENDING
+        care_request_dict["created_at"] = care_request.created_at or datetime.utcnow()
+        care_request_dict["care_center_id"] = self._covering_care_center(care_request)
+        # The event for the dispatch lane of its urgency, keyed by its geographic cell so that
+        # each scheduler shard receives its own region, commits with the request and is
+        # published by the outbox relay, so intake waits on MongoDB alone
+        async with self._record_events() as events:
+            result = await collection.insert_one(care_request_dict, session=events.session)
+            request_id = str(result.inserted_id)
+            events.add(lane_topic(care_request.urgency), self._event_payload(request_id, care_request_dict),
+                       key=self._shard_key(care_request))
         
         return request_id
 
+    async def create_care_requests_bulk(self, items: List[Dict[str, Any]]) -> CareRequestBulkResult:
+        if len(items) > settings.CARE_REQUEST_BULK_MAX_ITEMS:
+            raise AppException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                               detail=f"At most {settings.CARE_REQUEST_BULK_MAX_ITEMS} care requests per batch")
+
+        result = CareRequestBulkResult()
+        indexes, care_requests = [], []
+        for index, item in enumerate(items):
+            try:
+                care_requests.append(CareRequestCreate.model_validate(item))
+                indexes.append(index)
+            except ValidationError as e:
+                errors = [{"loc": error["loc"], "msg": error["msg"], "type": error["type"]} for error in e.errors()]
+                result.rejected.append(CareRequestBulkItemResult(index=index, detail=errors))
+
+        if care_requests:
+            allowed = self.geofencing.are_locations_allowed([care_request.location for care_request in care_requests])
+            accepted_indexes, accepted, documents = [], [], []
+            for index, care_request, is_allowed in zip(indexes, care_requests, allowed.tolist()):
+                if is_allowed:
+                    accepted_indexes.append(index)
+                    accepted.append(care_request)
+                    document = care_request.model_dump()
+                    document["status"] = CareRequestStatus.PENDING
+                    document["created_at"] = care_request.created_at or datetime.utcnow()
+                    document["care_center_id"] = self._covering_care_center(care_request)
+                    documents.append(document)
+                else:
+                    result.rejected.append(CareRequestBulkItemResult(index=index, detail="Location is outside of service area"))
+
+            if documents:
+                collection = await get_care_requests_collection()
+                async with self._record_events() as events:
+                    insert_result = await collection.insert_many(documents, session=events.session)
+                    request_ids = [str(inserted_id) for inserted_id in insert_result.inserted_ids]
+                    for request_id, document, care_request in zip(request_ids, documents, accepted):
+                        events.add(lane_topic(document["urgency"]), self._event_payload(request_id, document),
+                                   key=self._shard_key(care_request))
+                result.accepted = [
+                    CareRequestBulkItemResult(index=index, request_id=request_id)
+                    for index, request_id in zip(accepted_indexes, request_ids)
+                ]
+
+        result.rejected.sort(key=lambda item: item.index)
+        return result
+
+    def _record_events(self):
+        return record_events(self.kafka_producer, settings.OUTBOX_ENABLED)
+
+    @staticmethod
+    def _status_event(request_id: str, status: CareRequestStatus, assigned_worker_id: Optional[str] = None) -> dict:
+        return {"request_id": request_id, "status": status, "assigned_worker_id": assigned_worker_id,
+                "updated_at": datetime.utcnow()}
+
+    def _covering_care_center(self, care_request: CareRequestCreate) -> Optional[str]:
+        # In-memory lookup, no database round trip on intake
+        return self.care_center_coverage.nearest_covering(care_request.location.longitude, care_request.location.latitude)
+
+    @staticmethod
+    def _shard_key(care_request: CareRequestCreate) -> bytes:
+        return geo_cell_key(care_request.location.latitude, care_request.location.longitude, settings.GEO_SHARD_CELL_KM)
+
+    @staticmethod
+    def _event_payload(request_id: str, care_request_dict: dict) -> dict:
+        # insert_one/insert_many add the ObjectId under "_id"; the event carries it as request_id
+        payload = {key: value for key, value in care_request_dict.items() if key != "_id"}
+        return {"request_id": request_id, **payload}
+
     async def get_care_request(self, request_id: str) -> CareRequest:
         collection = await get_care_requests_collection()
         care_request = await collection.find_one({"_id": ObjectId(request_id)})
@@ -41,21 +131,56 @@ class CareRequestService:
     async def update_care_request(self, request_id: str, updates: CareRequestUpdate) -> CareRequest:
         collection = await get_care_requests_collection()
         update_data = updates.model_dump(exclude_unset=True)
-        result = await collection.update_one(
-            {"_id": ObjectId(request_id)},
-            {"$set": update_data}
-        )
+        async with self._record_events() as events:
+            result = await collection.update_one(
+                {"_id": ObjectId(request_id)},
+                {"$set": update_data},
+                session=events.session
+            )
+            if result.modified_count and "status" in update_data:
+                events.add(CARE_REQUEST_STATUS_TOPIC,
+                           self._status_event(request_id, update_data["status"], update_data.get("assigned_worker_id")),
+                           key=request_id.encode())
         if result.modified_count == 0:
             raise AppException(status_code=status.HTTP_404_NOT_FOUND, 
                                detail="Care request not found or no changes made")
         return await self.get_care_request(request_id)
 
-    async def assign_care_worker(self, request_id: str, worker_id: str) -> CareRequest:
-        updates = CareRequestUpdate(
-            status=CareRequestStatus.ASSIGNED,
-            assigned_worker_id=worker_id
-        )
-        return await self.update_care_request(request_id, updates)
+    async def assign_care_worker(self, request_id: str, worker_id: str,
+                                 care_worker_service: CareWorkerService) -> CareRequest:
+        """Assign a worker by hand, reserving it and claiming the request as dispatch does."""
+        if not await care_worker_service.reserve_care_worker(worker_id):
+            raise AppException(status_code=status.HTTP_409_CONFLICT,
+                               detail="Care worker not found or not available")
+        try:
+            claimed = await self.claim_care_request(request_id, worker_id)
+        except Exception:
+            await care_worker_service.release_care_worker(worker_id)
+            raise
+        if not claimed:
+            # Assigned or cancelled in the meantime; hand the worker back
+            await care_worker_service.release_care_worker(worker_id)
+            raise AppException(status_code=status.HTTP_409_CONFLICT,
+                               detail="Care request not found or no longer pending")
+        return await self.get_care_request(request_id)
+
+    async def claim_care_request(self, request_id: str, worker_id: str) -> bool:
+        """Assign the worker only if the request is still PENDING.
+
+        Returns False if the request was assigned or cancelled in the meantime.
+        """
+        collection = await get_care_requests_collection()
+        async with self._record_events() as events:
+            # Requests stored without a status are pending
+            result = await collection.update_one(
+                {"_id": ObjectId(request_id), "status": {"$in": [CareRequestStatus.PENDING, None]}},
+                {"$set": {"status": CareRequestStatus.ASSIGNED, "assigned_worker_id": worker_id}},
+                session=events.session
+            )
+            if result.modified_count == 1:
+                events.add(CARE_REQUEST_STATUS_TOPIC, self._status_event(request_id, CareRequestStatus.ASSIGNED, worker_id),
+                           key=request_id.encode())
+        return result.modified_count == 1
 
     async def list_care_requests(self, skip: int = 0, limit: int = 100) -> List[CareRequest]:
         collection = await get_care_requests_collection()
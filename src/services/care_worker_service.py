@@ -1,72 +1,276 @@
-from typing import List
-import json
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import uuid
 from bson import ObjectId
 from fastapi import status
-from src.models.schemas import CareWorker, CareWorkerCreate, CareWorkerUpdate, CareWorkerStatus
+from pymongo import ReturnDocument
+from src.models.schemas import CareWorker, CareWorkerCreate, CareWorkerUpdate, CareWorkerStatus, ServiceType
 from src.database.mongodb import get_care_workers_collection
+from src.services.kafka_producer_service import KafkaProducerService
 from src.services.redis_cache_service import RedisCacheService
+from src.services.worker_geo_index_service import WorkerGeoIndexService, WORKER_LOCATIONS_KEY
+from src.utils.config import get_settings
 from src.utils.error_handling import AppException
+from src.utils.local_cache import LocalCache
+from src.utils.worker_table import WorkerTable
 from passlib.context import CryptContext
 
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Location, status and profile changes, consumed by the task scheduler's in-process index
+WORKER_UPDATES_TOPIC = "worker_updates"
+# Redis pub/sub channel telling every process to drop a worker from its local cache
+WORKER_INVALIDATIONS_CHANNEL = "care_worker_invalidations"
+WORKER_CACHE_EXPIRE = 3600
+# Worker documents as they are read and cached; the password hash stays in MongoDB
+_CACHED_PROJECTION = {"password": 0}
+
 class CareWorkerService:
-    def __init__(self):
+    def __init__(self, kafka_producer: Optional[KafkaProducerService] = None):
         self.redis_cache = RedisCacheService()
+        self.kafka_producer = kafka_producer
+        self.geo_index = WorkerGeoIndexService(self.redis_cache)
+        # Worker documents are read from this process, then Redis, then MongoDB
+        self.local_cache = LocalCache(settings.WORKER_LOCAL_CACHE_SIZE, settings.WORKER_LOCAL_CACHE_TTL)
+        # Tells this process's own invalidations apart from other processes'
+        self.instance_id = uuid.uuid4().hex
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.invalidations_received = 0
+        self._invalidation_task: Optional[asyncio.Task] = None
 
     async def initialize(self):
         await self.redis_cache.initialize()
+        self._invalidation_task = asyncio.create_task(self._listen_for_invalidations())
 
     async def create_care_worker(self, care_worker: CareWorkerCreate) -> str:
         collection = await get_care_workers_collection()
         care_worker_dict = care_worker.model_dump(exclude={"password"})
         care_worker_dict["password"] = pwd_context.hash(care_worker.password)
+        care_worker_dict["status"] = CareWorkerStatus.AVAILABLE
         result = await collection.insert_one(care_worker_dict)
         worker_id = str(result.inserted_id)
         
-        # Add worker to Redis geospatial index
-        await self.redis_cache.geoadd("care_workers_locations", 
-                                      care_worker.current_location.longitude,
-                                      care_worker.current_location.latitude,
-                                      worker_id)
+        # Add worker to the Redis geospatial indexes
+        await self._index_worker(worker_id, care_worker_dict, (care_worker.current_location.longitude,
+                                                               care_worker.current_location.latitude))
+        await self._publish_worker_update(worker_id, {
+            "current_location": care_worker_dict["current_location"],
+            "specializations": care_worker_dict["specializations"],
+            "status": CareWorkerStatus.AVAILABLE,
+            "rating": 0,
+        })
         
         return worker_id
 
     async def get_care_worker(self, worker_id: str) -> CareWorker:
-        # Try to get from cache first
-        cached_worker = await self.redis_cache.get(f"care_worker:{worker_id}")
-        if cached_worker:
-            return CareWorker(**json.loads(cached_worker))
+        # Cached documents were validated when they were written, so hits skip validation
+        care_worker = self.local_cache.get(worker_id)
+        if care_worker is not None:
+            return CareWorker.from_trusted(care_worker)
+
+        # Try the shared cache next
+        care_worker = await self.redis_cache.get(f"care_worker:{worker_id}")
+        if care_worker:
+            self.redis_hits += 1
+            self.local_cache.set(worker_id, care_worker)
+            return CareWorker.from_trusted(care_worker)
+        self.redis_misses += 1
         
         # If not in cache, get from database
         collection = await get_care_workers_collection()
-        care_worker = await collection.find_one({"_id": ObjectId(worker_id)})
+        care_worker = await collection.find_one({"_id": ObjectId(worker_id)}, _CACHED_PROJECTION)
         if care_worker is None:
             raise AppException(status_code=status.HTTP_404_NOT_FOUND, 
                                detail="Care worker not found")
         
         # Cache the worker data
-        await self.redis_cache.set(f"care_worker:{worker_id}", json.dumps(care_worker), expire=3600)
+        await self.redis_cache.set(f"care_worker:{worker_id}", care_worker, expire=WORKER_CACHE_EXPIRE)
+        self.local_cache.set(worker_id, care_worker)
         
         return CareWorker(**care_worker)
 
-    @staticmethod
-    async def update_care_worker(worker_id: str, updates: CareWorkerUpdate) -> CareWorker:
+    async def get_care_workers_bulk(self, worker_ids: List[str]) -> Dict[str, CareWorker]:
+        """Load many workers in three round trips at most; unknown IDs are left out."""
+        documents = await self._get_care_worker_documents(worker_ids)
+        # Only this service writes worker documents, and it validates them first
+        return {worker_id: CareWorker.from_trusted(document) for worker_id, document in documents.items()}
+
+    async def get_care_worker_table(self, worker_ids: List[str]) -> WorkerTable:
+        """Like get_care_workers_bulk, but as a columnar table for scoring."""
+        documents = await self._get_care_worker_documents(worker_ids)
+        return WorkerTable.from_documents(documents.values())
+
+    async def _get_care_worker_documents(self, worker_ids: List[str]) -> Dict[str, dict]:
+        worker_ids = list(dict.fromkeys(worker_ids))
+        documents = {}
+        remote = []
+        for worker_id in worker_ids:
+            document = self.local_cache.get(worker_id)
+            if document is not None:
+                documents[worker_id] = document
+            else:
+                remote.append(worker_id)
+
+        missing = []
+        if remote:
+            cached_workers = await self.redis_cache.mget([f"care_worker:{worker_id}" for worker_id in remote])
+            for worker_id, cached_worker in zip(remote, cached_workers):
+                if cached_worker:
+                    documents[worker_id] = cached_worker
+                    self.local_cache.set(worker_id, documents[worker_id])
+                else:
+                    missing.append(worker_id)
+            self.redis_hits += len(remote) - len(missing)
+            self.redis_misses += len(missing)
+
+        if missing:
+            collection = await get_care_workers_collection()
+            cursor = collection.find({"_id": {"$in": [ObjectId(worker_id) for worker_id in missing]}},
+                                     _CACHED_PROJECTION)
+            care_workers = await cursor.to_list(length=None)
+            await self.redis_cache.set_many(
+                {f"care_worker:{cw['_id']}": cw for cw in care_workers},
+                expire=WORKER_CACHE_EXPIRE
+            )
+            for cw in care_workers:
+                documents[str(cw["_id"])] = cw
+                self.local_cache.set(str(cw["_id"]), cw)
+
+        # Keep the order the IDs were asked for
+        return {worker_id: documents[worker_id] for worker_id in worker_ids if worker_id in documents}
+
+    async def update_care_worker(self, worker_id: str, updates: CareWorkerUpdate) -> CareWorker:
         collection = await get_care_workers_collection()
         update_data = updates.model_dump(exclude_unset=True)
-        result = await collection.update_one(
+        care_worker = await collection.find_one_and_update(
             {"_id": ObjectId(worker_id)},
-            {"$set": update_data}
+            {"$set": update_data},
+            return_document=ReturnDocument.AFTER
         )
-        if result.modified_count == 0:
+        if care_worker is None:
             raise AppException(status_code=status.HTTP_404_NOT_FOUND, 
-                               detail="Care worker not found or no changes made")
-        return await CareWorkerService.get_care_worker(worker_id)
+                               detail="Care worker not found")
+        if updates.current_location is not None:
+            await self._index_worker(worker_id, care_worker, (updates.current_location.longitude,
+                                                              updates.current_location.latitude))
+        elif updates.status is not None:
+            await self._index_worker(worker_id, care_worker)
+        await self._invalidate_worker(worker_id)
+        await self._publish_worker_update(worker_id, update_data)
+        return CareWorker(**care_worker)
 
-    @staticmethod
-    async def delete_care_worker(worker_id: str) -> bool:
+    async def reserve_care_worker(self, worker_id: str) -> bool:
+        """Atomically move an AVAILABLE worker to BUSY.
+
+        Returns False if the worker is no longer available, e.g. because a
+        concurrent dispatch reserved it first.
+        """
+        return await self._transition_status(worker_id, CareWorkerStatus.AVAILABLE, CareWorkerStatus.BUSY)
+
+    async def release_care_worker(self, worker_id: str) -> bool:
+        """Hand a reserved worker back, for when the request it was reserved for is gone."""
+        return await self._transition_status(worker_id, CareWorkerStatus.BUSY, CareWorkerStatus.AVAILABLE)
+
+    async def _transition_status(self, worker_id: str, current: CareWorkerStatus, new: CareWorkerStatus) -> bool:
+        collection = await get_care_workers_collection()
+        # Workers stored without a status are available, as in WorkerTable.from_documents
+        status_filter = {"$in": [current, None]} if current == CareWorkerStatus.AVAILABLE else current
+        care_worker = await collection.find_one_and_update(
+            {"_id": ObjectId(worker_id), "status": status_filter},
+            {"$set": {"status": new}},
+            return_document=ReturnDocument.AFTER
+        )
+        if care_worker is None:
+            return False
+        # Keep the caches and geo sets in step so the next candidate search sees the new status
+        await self._index_worker(worker_id, care_worker)
+        await self._invalidate_worker(worker_id)
+        await self._publish_worker_update(worker_id, {"status": new})
+        return True
+
+    async def _index_worker(self, worker_id: str, care_worker: dict, location=None):
+        try:
+            await self.geo_index.update_worker(worker_id, care_worker, location)
+        except AppException as e:
+            # The database has the change already; the periodic reconciliation repairs the geo sets
+            logger.warning(f"Failed to index care worker {worker_id}: {e.detail}")
+
+    async def _invalidate_worker(self, worker_id: str):
+        """Drop a changed worker from both cache tiers and tell other processes to drop theirs.
+
+        Deleting rather than writing the new document means two writers that
+        race cannot leave the older of their documents cached; the next read
+        fills the caches from MongoDB.
+        """
+        await self.redis_cache.delete(f"care_worker:{worker_id}")
+        self.local_cache.delete(worker_id)
+        await self._publish_invalidation(worker_id)
+
+    async def invalidate_workers(self, worker_ids: List[str]):
+        """_invalidate_worker for many workers, in one Redis round trip and one message."""
+        if not worker_ids:
+            return
+        for worker_id in worker_ids:
+            self.local_cache.delete(worker_id)
+        try:
+            async with self.redis_cache.pipeline() as pipe:
+                pipe.delete(*(f"care_worker:{worker_id}" for worker_id in worker_ids))
+                pipe.publish(WORKER_INVALIDATIONS_CHANNEL, f"{self.instance_id}:{','.join(worker_ids)}")
+                await pipe.execute()
+        except AppException as e:
+            # Other processes and Redis keep the old documents until they expire
+            logger.warning(f"Failed to invalidate {len(worker_ids)} cached care workers: {e.detail}")
+
+    async def _publish_invalidation(self, worker_id: str):
+        try:
+            await self.redis_cache.publish(WORKER_INVALIDATIONS_CHANNEL, f"{self.instance_id}:{worker_id}")
+        except AppException as e:
+            # Other processes pick the change up when their local copy expires
+            logger.warning(f"Failed to publish cache invalidation for care worker {worker_id}: {e.detail}")
+
+    async def _listen_for_invalidations(self):
+        while True:
+            try:
+                async for message in self.redis_cache.subscribe(WORKER_INVALIDATIONS_CHANNEL):
+                    self.handle_invalidation(message)
+            except AppException as e:
+                logger.warning(f"Care worker cache invalidations interrupted: {e.detail}")
+            # Anything could have changed while nothing was being received
+            self.local_cache.clear()
+            await asyncio.sleep(1)
+
+    def handle_invalidation(self, message: str):
+        # One worker ID, or a comma-separated batch from invalidate_workers
+        origin, _, worker_ids = message.partition(":")
+        if origin == self.instance_id:
+            return
+        self.invalidations_received += 1
+        for worker_id in worker_ids.split(","):
+            self.local_cache.delete(worker_id)
+
+    def cache_stats(self) -> dict:
+        lookups = self.redis_hits + self.redis_misses
+        return {
+            "local": self.local_cache.stats(),
+            "redis_hits": self.redis_hits,
+            "redis_misses": self.redis_misses,
+            "redis_hit_rate": self.redis_hits / lookups if lookups else 0.0,
+            "invalidations_received": self.invalidations_received,
+        }
+
+    async def delete_care_worker(self, worker_id: str) -> bool:
         collection = await get_care_workers_collection()
         result = await collection.delete_one({"_id": ObjectId(worker_id)})
+        if result.deleted_count > 0:
+            await self.geo_index.remove_worker(worker_id)
+            await self._invalidate_worker(worker_id)
+            await self._publish_worker_update(worker_id, {"deleted": True})
         return result.deleted_count > 0
 
     @staticmethod
@@ -76,16 +280,30 @@ class CareWorkerService:
         care_workers = await cursor.to_list(length=limit)
         return [CareWorker(**cw) for cw in care_workers]
 
-    async def get_available_care_workers_in_area(self, latitude: float, longitude: float, max_distance: float) -> List[CareWorker]:
-        worker_ids = await self.redis_cache.georadius("care_workers_locations", longitude, latitude, max_distance)
-        
-        workers = []
-        for worker_id in worker_ids:
-            worker = await self.get_care_worker(worker_id)
-            if worker.status == CareWorkerStatus.AVAILABLE:
-                workers.append(worker)
-        
-        return workers
+    async def get_available_care_workers_in_area(self, latitude: float, longitude: float, max_distance: float,
+                                                 service_type: Optional[ServiceType] = None) -> List[CareWorker]:
+        """Available workers within max_distance km, nearest first, with the specialization if given."""
+        # The geo set of available workers holds no one else, so nothing is fetched just to be dropped
+        worker_ids = await self.geo_index.search(latitude, longitude, max_distance, CareWorkerStatus.AVAILABLE,
+                                                 service_type)
+        workers = await self.get_care_workers_bulk(worker_ids)
+        return list(workers.values())
     
+    async def _publish_worker_update(self, worker_id: str, changes: dict):
+        if not self.kafka_producer:
+            return
+        try:
+            await self.kafka_producer.publish(WORKER_UPDATES_TOPIC, {"worker_id": worker_id, **changes})
+        except AppException as e:
+            # The scheduler's index catches up on its next reload from Redis and MongoDB
+            logger.warning(f"Failed to publish update for care worker {worker_id}: {e.detail}")
+
     async def close(self):
+        if self._invalidation_task:
+            self._invalidation_task.cancel()
+            try:
+                await self._invalidation_task
+            except asyncio.CancelledError:
+                pass
+            self._invalidation_task = None
         await self.redis_cache.close()
\ No newline at end of file
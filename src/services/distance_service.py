@@ -1,11 +1,54 @@
 from math import radians, sin, cos, sqrt, atan2
+import math
+from typing import Optional, Sequence, Tuple, Union
+import logging
+import numpy as np
 from src.models.schemas import Location
+from src.utils.config import Settings
+from src.utils.geometry import EARTH_RADIUS_KM, haversine_km
+from src.utils.road_network import DEFAULT_SPEED_KMH, RoadNetwork
+
+logger = logging.getLogger(__name__)
+
+# Either Location objects or an (n, 2) array of (latitude, longitude) rows
+Points = Union[Sequence[Location], np.ndarray]
 
 class DistanceService:
+    def __init__(self, road_network: Optional[RoadNetwork] = None, max_minutes: float = math.inf):
+        self.road_network = road_network
+        # Road travel time beyond which travel_costs reports a candidate as unreachable
+        self.max_minutes = max_minutes
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "DistanceService":
+        if not settings.ROAD_NETWORK_PATH:
+            return cls()
+        road_network = RoadNetwork.from_geojson(settings.ROAD_NETWORK_PATH, settings.ROAD_NETWORK_LANDMARKS)
+        logger.info(f"Loaded road network with {len(road_network)} nodes from {settings.ROAD_NETWORK_PATH}")
+        # Candidates lie within the search radius, so none worth dispatching needs more road than this
+        max_minutes = settings.SCHEDULER_SEARCH_RADIUS_KM * settings.ROAD_NETWORK_MAX_DETOUR / DEFAULT_SPEED_KMH * 60
+        return cls(road_network, max_minutes)
+
+    def travel_cost(self, destination: Location, origin: Location) -> float:
+        """Road travel time in minutes from origin to destination, or haversine kilometers without a road network."""
+        if self.road_network is None:
+            return self.calculate_distance(destination, origin)
+        return self.road_network.travel_time(origin.latitude, origin.longitude, destination.latitude, destination.longitude)
+
+    def travel_costs(self, destination: Location, origin_lats, origin_lons) -> np.ndarray:
+        """travel_cost from every (lat, lon) origin to the destination, with a single graph search.
+
+        With a road network, origins more than ``max_minutes`` of road away cost inf.
+        """
+        if self.road_network is None:
+            return self.calculate_distances(destination, origin_lats, origin_lons)
+        return self.road_network.travel_times_to(destination.latitude, destination.longitude, origin_lats, origin_lons,
+                                                 self.max_minutes)
+
     @staticmethod
     def calculate_distance(loc1: Location, loc2: Location) -> float:
         # Haversine formula
-        R = 6371  # Earth's radius in kilometers
+        R = EARTH_RADIUS_KM  # Earth's radius in kilometers
 
         lat1, lon1 = radians(loc1.latitude), radians(loc1.longitude)
         lat2, lon2 = radians(loc2.latitude), radians(loc2.longitude)
@@ -17,4 +60,27 @@ class DistanceService:
         c = 2 * atan2(sqrt(a), sqrt(1-a))
 
         distance = R * c
-        return distance
\ No newline at end of file
+        return distance
+
+    @staticmethod
+    def calculate_distances(origin: Location, lats, lons) -> np.ndarray:
+        """Haversine distances in kilometers from ``origin`` to every (lat, lon) pair."""
+        return haversine_km(origin.latitude, origin.longitude,
+                            np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+
+    @staticmethod
+    def distance_matrix(origins: Points, destinations: Points) -> np.ndarray:
+        """(len(origins), len(destinations)) matrix of haversine distances in kilometers."""
+        origin_lats, origin_lons = DistanceService._lat_lon(origins)
+        destination_lats, destination_lons = DistanceService._lat_lon(destinations)
+        return haversine_km(origin_lats[:, None], origin_lons[:, None],
+                            destination_lats[None, :], destination_lons[None, :])
+
+    @staticmethod
+    def _lat_lon(points: Points) -> Tuple[np.ndarray, np.ndarray]:
+        if isinstance(points, np.ndarray):
+            points = points.astype(np.float64, copy=False).reshape(-1, 2)
+            return points[:, 0], points[:, 1]
+        lats = np.fromiter((point.latitude for point in points), dtype=np.float64, count=len(points))
+        lons = np.fromiter((point.longitude for point in points), dtype=np.float64, count=len(points))
+        return lats, lons
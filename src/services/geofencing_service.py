@@ -1,27 +1,127 @@
+import asyncio
 import json
-from typing import Optional
-from arcgis.gis import GIS
-from arcgis.features import FeatureLayer
-from arcgis.geometry import Geometry, Point
+import os
+from typing import Any, Optional, Sequence
+import numpy as np
 from src.models.schemas import Location
 from src.utils.config import Settings
+from src.utils.geometry import PreparedPolygon, load_geojson, INSIDE, BOUNDARY
 import logging
 
+try:
+    from arcgis.gis import GIS
+    from arcgis.features import FeatureLayer
+except ImportError:  # ArcGIS is an optional source for the service area
+    GIS = None
+    FeatureLayer = None
+
 logger = logging.getLogger(__name__)
 
 class GeofencingService:
-    def __init__(self, settings: Settings, gis: Optional[GIS] = None):
+    def __init__(self, settings: Settings, gis: Optional["GIS"] = None):
         self.settings = settings
-        self.gis = gis or self._create_gis()
-        self.service_area = self._get_service_area()
+        self.gis = gis
+        self.version: Optional[Any] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.fast_path_hits = 0
+        self.exact_checks = 0
+        self.service_area = self._prepare(self._load_service_area())
+
+    def _load_service_area(self) -> Optional[PreparedPolygon]:
+        if self.settings.SERVICE_AREA_GEOJSON_PATH:
+            service_area = load_geojson(self.settings.SERVICE_AREA_GEOJSON_PATH)
+            logger.info(f"Loaded service area from {self.settings.SERVICE_AREA_GEOJSON_PATH}")
+            return service_area
+
+        service_area = self._load_snapshot()
+        if service_area:
+            return service_area
+
+        if self.settings.SERVICE_AREA_LAYER_URL:
+            version = self._get_layer_version()
+            try:
+                service_area = self._get_service_area()
+            except Exception as e:
+                # Start with the geofence unavailable rather than not at all; start() keeps retrying
+                logger.error(f"Service area unavailable until the layer can be loaded: {str(e)}")
+                return None
+            self.version = version
+            self._save_snapshot(service_area)
+            return service_area
+        logger.warning("No service area source configured")
+        return None
+
+    def _prepare(self, service_area: Optional[PreparedPolygon]) -> Optional[PreparedPolygon]:
+        # The raster mask lives on the polygon so both are swapped in together on refresh
+        if service_area and self.settings.GEOFENCE_GRID_SIZE > 0:
+            mask = service_area.build_mask(
+                self.settings.GEOFENCE_GRID_SIZE,
+                self.settings.GEOFENCE_GRID_REFINE,
+                self.settings.GEOFENCE_GRID_MAX_CELLS
+            )
+            logger.info(f"Built {mask.rows}x{mask.cols} geofence mask with {len(mask.fine)} refined cells ({mask.nbytes} bytes)")
+        return service_area
+
+    def _load_snapshot(self) -> Optional[PreparedPolygon]:
+        path = self.settings.SERVICE_AREA_SNAPSHOT_PATH
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            service_area = PreparedPolygon.from_geometry(snapshot)
+        except Exception as e:
+            logger.error(f"Ignoring unreadable service area snapshot {path}: {str(e)}")
+            return None
+        self.version = snapshot.get("properties", {}).get("version")
+        logger.info(f"Loaded service area snapshot from {path} (version {self.version})")
+        return service_area
+
+    def _save_snapshot(self, service_area: Optional[PreparedPolygon]):
+        path = self.settings.SERVICE_AREA_SNAPSHOT_PATH
+        if not path or not service_area:
+            return
+        try:
+            self._write_geojson(path, service_area)
+        except OSError as e:
+            logger.error(f"Failed to write service area snapshot {path}: {str(e)}")
 
-    def _create_gis(self) -> GIS:
+    def _write_geojson(self, path: str, service_area: PreparedPolygon):
+        # Write to a temporary file first so a crash never leaves a truncated snapshot
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "type": "FeatureCollection",
+                "properties": {"version": self.version},
+                "features": [service_area.to_geojson()]
+            }, f)
+        os.replace(temp_path, path)
+
+    def _create_gis(self) -> "GIS":
+        if GIS is None:
+            raise RuntimeError("The arcgis package is required to load the service area from a FeatureLayer")
         return GIS(self.settings.ARCGIS_PORTAL_URL, api_key=self.settings.ARCGIS_API_KEY)
 
-    def _get_service_area(self) -> Optional[Geometry]:
+    def _get_service_area_layer(self) -> "FeatureLayer":
+        if FeatureLayer is None:
+            raise RuntimeError("The arcgis package is required to load the service area from a FeatureLayer")
+        if self.gis is None:
+            self.gis = self._create_gis()
+        return FeatureLayer(self.settings.SERVICE_AREA_LAYER_URL, self.gis)
+
+    def _get_layer_version(self) -> Optional[Any]:
+        # lastEditDate changes whenever the layer is edited, so it is a cheap version check
         try:
-            service_area_layer = FeatureLayer(self.settings.SERVICE_AREA_LAYER_URL, self.gis)
-            
+            editing_info = self._get_service_area_layer().properties.get("editingInfo") or {}
+            return editing_info.get("lastEditDate")
+        except Exception as e:
+            logger.warning(f"Could not read service area layer version: {str(e)}")
+            return None
+
+    def _get_service_area(self) -> Optional[PreparedPolygon]:
+        try:
+            service_area_layer = self._get_service_area_layer()
+
             query_result = service_area_layer.query(
                 where="1=1",
                 out_fields="*",
@@ -29,31 +129,117 @@ class GeofencingService:
                 geometry_precision=6,
                 out_sr=4326  # WGS84 coordinate system
             )
-            
-            logger.debug(f"Full query result: {json.dumps(query_result.to_dict(), indent=2)}")
-            
+
             if not query_result.features:
-                logger.warning("No features found in the service area layer")
-                return None
-            
+                raise ValueError("No features found in the service area layer")
+
             service_area_feature = query_result.features[0]
             if not service_area_feature.geometry:
                 raise ValueError("Invalid geometry in the service area feature")
-            
-            # Create a Geometry object directly from the feature's geometry
-            return Geometry(service_area_feature.geometry)
+
+            # Prepare the geometry once so containment checks stay local
+            return PreparedPolygon.from_geometry(dict(service_area_feature.geometry))
         except Exception as e:
             error_message = f"Error fetching service area: {str(e)}"
             logger.error(error_message, exc_info=True)
             raise
 
-    def is_location_allowed(self, location: Location) -> bool:
+    def refresh(self) -> bool:
+        """Reload the service area from ArcGIS if the layer changed. Returns True if it was replaced."""
+        version = self._get_layer_version()
+        if version is not None and version == self.version and self.service_area:
+            return False
+        service_area = self._prepare(self._get_service_area())
+        # Swap in one assignment so concurrent checks see either the old or the new polygon
+        self.service_area = service_area
+        self.version = version
+        self._save_snapshot(service_area)
+        logger.info(f"Service area refreshed (version {version})")
+        return True
+
+    async def start(self):
+        interval = self.settings.SERVICE_AREA_REFRESH_INTERVAL
+        if self.settings.SERVICE_AREA_GEOJSON_PATH or not self.settings.SERVICE_AREA_LAYER_URL:
+            return
+        # Without a service area the layer is retried even when periodic refresh is off
+        if interval > 0 or not self.service_area:
+            self._refresh_task = asyncio.create_task(self._refresh_periodically(interval))
+
+    async def _refresh_periodically(self, interval: int):
+        while True:
+            try:
+                await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                # Keep serving the last good polygon during ArcGIS outages
+                logger.error(f"Service area refresh failed: {str(e)}")
+            if not self.service_area:
+                await asyncio.sleep(self.settings.SERVICE_AREA_RETRY_INTERVAL)
+            elif interval > 0:
+                await asyncio.sleep(interval)
+            else:
+                return
+
+    async def close(self):
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            try:
+                await self._refresh_task
+            except asyncio.CancelledError:
+                pass
+            self._refresh_task = None
+
+    def export_service_area(self, path: str):
         if not self.service_area:
+            raise ValueError("Service area not initialized or empty")
+        self._write_geojson(path, self.service_area)
+
+    def is_location_allowed(self, location: Location) -> bool:
+        service_area = self.service_area
+        if not service_area:
             logger.warning("Service area not initialized or empty")
             return False
         try:
-            point = Point({"x": location.longitude, "y": location.latitude, "spatialReference": {"wkid": 4326}})
-            return self.service_area.contains(point)
+            if service_area.mask is not None:
+                cell = service_area.mask.lookup(location.longitude, location.latitude)
+                if cell != BOUNDARY:
+                    self.fast_path_hits += 1
+                    return cell == INSIDE
+            self.exact_checks += 1
+            return service_area.contains(location.longitude, location.latitude)
         except Exception as e:
             logger.error(f"Error checking location {location}: {str(e)}", exc_info=True)
-            return False
\ No newline at end of file
+            return False
+
+    def are_locations_allowed(self, locations: Sequence[Location]) -> np.ndarray:
+        service_area = self.service_area
+        if not service_area:
+            logger.warning("Service area not initialized or empty")
+            return np.zeros(len(locations), dtype=bool)
+        longitudes = np.fromiter((location.longitude for location in locations), dtype=np.float64, count=len(locations))
+        latitudes = np.fromiter((location.latitude for location in locations), dtype=np.float64, count=len(locations))
+        if service_area.mask is None:
+            self.exact_checks += len(locations)
+            return service_area.contains_many(longitudes, latitudes)
+
+        cells = service_area.mask.lookup_many(longitudes, latitudes)
+        allowed = cells == INSIDE
+        boundary = np.flatnonzero(cells == BOUNDARY)
+        if boundary.size:
+            allowed[boundary] = service_area.contains_many(longitudes[boundary], latitudes[boundary])
+        self.fast_path_hits += len(locations) - boundary.size
+        self.exact_checks += boundary.size
+        return allowed
+
+    def stats(self) -> dict:
+        checks = self.fast_path_hits + self.exact_checks
+        mask = self.service_area.mask if self.service_area else None
+        return {
+            "available": self.service_area is not None,
+            "fast_path_hits": self.fast_path_hits,
+            "exact_checks": self.exact_checks,
+            "fast_path_hit_rate": self.fast_path_hits / checks if checks else 0.0,
+            "grid_rows": mask.rows if mask else 0,
+            "grid_cols": mask.cols if mask else 0,
+            "refined_cells": len(mask.fine) if mask else 0,
+            "grid_bytes": mask.nbytes if mask else 0
+        }
@@ -1,24 +1,234 @@
-import json
-from src.utils.kafka_config import get_kafka_consumer
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, Optional
+from aiokafka import ConsumerRebalanceListener
+from aiokafka.structs import TopicPartition
+from src.utils.codec import Codec
+from src.utils.config import get_settings
+from src.utils.kafka_config import start_kafka_consumer
 from src.utils.error_handling import AppException
 
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Called with each decoded message, one at a time per partition
+MessageHandler = Callable[[Any], Awaitable[None]]
+
+_STOP = object()
+
+
+class _PartitionWorker:
+    """Handles the fetched messages of one partition in offset order."""
+
+    def __init__(self, partition: TopicPartition, service: "KafkaConsumerService"):
+        self.partition = partition
+        self.service = service
+        self.queue: Deque[Any] = deque()
+        self.ready = asyncio.Event()
+        self.busy = False
+        # The offset after the last handled message, which is what gets committed
+        self.next_offset: Optional[int] = None
+        self.task = asyncio.create_task(self._run())
+
+    def put(self, messages: Iterable[Any]):
+        self.queue.extend(messages)
+        self.ready.set()
+
+    async def _run(self):
+        while True:
+            if not self.queue:
+                self.ready.clear()
+                await self.ready.wait()
+                continue
+            message = self.queue.popleft()
+            if message is _STOP:
+                return
+            self.busy = True
+            try:
+                await self.service.handler(Codec.decode(message.value))
+            except Exception as e:
+                # The message is skipped rather than blocking its partition
+                self.service.failed += 1
+                logger.error(f"Failed to handle message {self.partition.topic}:{self.partition.partition}"
+                             f"@{message.offset}: {str(e)}")
+            finally:
+                self.busy = False
+            self.next_offset = message.offset + 1
+            self.service.handled += 1
+            self.service._release(1)
+
+    async def stop(self):
+        """Finish the message in hand and drop the rest, which the next owner fetches again."""
+        dropped = sum(1 for message in self.queue if message is not _STOP)
+        self.queue.clear()
+        self.service._release(dropped)
+        self.put([_STOP])
+        await self.task
+
+
+class _PartitionWorkersListener(ConsumerRebalanceListener):
+    """Stops the workers of revoked partitions and commits what they handled before the new owner starts."""
+
+    def __init__(self, service: "KafkaConsumerService"):
+        self.service = service
+
+    async def on_partitions_revoked(self, revoked):
+        await self.service._stop_workers(revoked)
+
+    async def on_partitions_assigned(self, assigned):
+        pass
+
+
 class KafkaConsumerService:
-    def __init__(self, topic: str):
-        self.topic = topic
+    """Consumes topics as a member of a consumer group, partitions in parallel.
+
+    Every assigned partition gets a worker task that handles its messages
+    one after another, so order is kept within a partition while partitions
+    proceed independently. Fetches take at most prefetch messages, and a
+    partition with that many waiting is paused while the others keep
+    flowing; fetching stops altogether once max_in_flight messages are
+    fetched but not handled. Offsets are committed by hand, for all
+    partitions in one request every commit_interval seconds, on rebalance
+    and on close, so a restart handles at most the last interval again.
+    """
+
+    def __init__(self, *topics: str, group_id: str, handler: MessageHandler, prefetch: Optional[int] = None,
+                 max_in_flight: Optional[int] = None, commit_interval: Optional[float] = None):
+        self.topics = topics
+        self.group_id = group_id
+        self.handler = handler
+        self.prefetch = prefetch or settings.KAFKA_CONSUMER_PREFETCH
+        self.max_in_flight = max_in_flight or settings.KAFKA_CONSUMER_MAX_IN_FLIGHT
+        self.commit_interval = commit_interval or settings.KAFKA_CONSUMER_COMMIT_INTERVAL_MS / 1000
         self.consumer = None
+        self.in_flight = 0
+        self.handled = 0
+        self.failed = 0
+        self.commits = 0
+        self._workers: Dict[TopicPartition, _PartitionWorker] = {}
+        self._committed: Dict[TopicPartition, int] = {}
+        self._room = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
 
     async def initialize(self):
-        self.consumer = await anext(get_kafka_consumer(self.topic))
+        # Owned by the service until close(), not by a generator that could be finalized early
+        self.consumer = await start_kafka_consumer(*self.topics, listener=_PartitionWorkersListener(self),
+                                                   group_id=self.group_id, enable_auto_commit=False)
 
-    async def consume_messages(self):
+    async def start(self):
         if not self.consumer:
             raise AppException(status_code=500, detail="Kafka consumer not initialized")
+        self._task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        next_commit = loop.time() + self.commit_interval
+        while True:
+            try:
+                if self.in_flight >= self.max_in_flight:
+                    self._room.clear()
+                    try:
+                        await asyncio.wait_for(self._room.wait(), max(0, next_commit - loop.time()))
+                    except asyncio.TimeoutError:
+                        pass
+                else:
+                    self._throttle_partitions()
+                    records = await self.consumer.getmany(timeout_ms=int(self.commit_interval * 1000),
+                                                          max_records=min(self.prefetch, self.max_in_flight - self.in_flight))
+                    for partition, messages in records.items():
+                        worker = self._workers.get(partition)
+                        if worker is None:
+                            worker = self._workers[partition] = _PartitionWorker(partition, self)
+                        self.in_flight += len(messages)
+                        worker.put(messages)
+                if loop.time() >= next_commit:
+                    await self.commit()
+                    next_commit = loop.time() + self.commit_interval
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Kafka consumer for {', '.join(self.topics)} failed: {str(e)}")
+                await asyncio.sleep(self.commit_interval)
+
+    def _throttle_partitions(self):
+        # Stop fetching a partition whose worker is behind; the other partitions keep flowing
+        behind = [partition for partition, worker in self._workers.items() if len(worker.queue) >= self.prefetch]
+        caught_up = [partition for partition, worker in self._workers.items() if len(worker.queue) < self.prefetch]
+        if behind:
+            self.consumer.pause(*behind)
+        if caught_up:
+            self.consumer.resume(*caught_up)
+
+    def _release(self, count: int):
+        self.in_flight -= count
+        if self.in_flight < self.max_in_flight:
+            self._room.set()
+
+    async def commit(self, partitions: Optional[Iterable[TopicPartition]] = None):
+        """Commit the offsets handled since the last commit, in one request."""
+        workers = self._workers if partitions is None else {
+            partition: self._workers[partition] for partition in partitions if partition in self._workers
+        }
+        offsets = {
+            partition: worker.next_offset for partition, worker in workers.items()
+            if worker.next_offset is not None and worker.next_offset != self._committed.get(partition)
+        }
+        if not offsets:
+            return
         try:
-            async for message in self.consumer:
-                yield json.loads(message.value.decode('utf-8'))
+            await self.consumer.commit(offsets)
         except Exception as e:
-            raise AppException(status_code=500, detail=f"Failed to consume message: {str(e)}")
+            raise AppException(status_code=500, detail=f"Failed to commit offsets: {str(e)}")
+        self._committed.update(offsets)
+        self.commits += 1
+
+    async def _stop_workers(self, partitions: Iterable[TopicPartition]):
+        partitions = [partition for partition in partitions if partition in self._workers]
+        for partition in partitions:
+            await self._workers[partition].stop()
+        try:
+            await self.commit(partitions)
+        except AppException as e:
+            logger.warning(f"Offsets of revoked partitions were not committed: {e.detail}")
+        for partition in partitions:
+            del self._workers[partition]
+            self._committed.pop(partition, None)
+
+    async def partition_lag(self) -> Dict[str, dict]:
+        """Per assigned partition: messages not yet handled, and how many of them are fetched and waiting."""
+        lag = {}
+        for partition in self.consumer.assignment():
+            worker = self._workers.get(partition)
+            queued = len(worker.queue) + worker.busy if worker else 0
+            highwater = self.consumer.highwater(partition)
+            unfetched = max(0, highwater - await self.consumer.position(partition)) if highwater is not None else None
+            lag[f"{partition.topic}:{partition.partition}"] = {
+                "lag": None if unfetched is None else unfetched + queued,
+                "queued": queued,
+                "committed": self._committed.get(partition),
+            }
+        return lag
+
+    def stats(self) -> dict:
+        return {
+            "partitions": len(self._workers),
+            "in_flight": self.in_flight,
+            "handled": self.handled,
+            "failed": self.failed,
+            "commits": self.commits,
+        }
 
     async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
         if self.consumer:
-            await self.consumer.stop()
\ No newline at end of file
+            await self._stop_workers(list(self._workers))
+            await self.consumer.stop()
+            self.consumer = None
@@ -1,23 +1,109 @@
-import json
-from src.utils.kafka_config import get_kafka_producer
+import asyncio
+import logging
+from typing import Callable, List, Optional
+from src.utils.codec import Codec, get_codec
+from src.utils.config import get_settings
+from src.utils.kafka_config import start_kafka_producer
 from src.utils.error_handling import AppException
 
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+# Called with the topic, the message and the delivery error, or None once the broker acknowledged it
+DeliveryCallback = Callable[[str, dict, Optional[BaseException]], None]
+
 class KafkaProducerService:
-    def __init__(self):
+    """One long-lived producer per process.
+
+    publish() hands a message to the producer's batches and returns without
+    waiting for the broker; delivery is reported to a callback. At most
+    KAFKA_PRODUCER_MAX_IN_FLIGHT messages may be unacknowledged at a time,
+    beyond which publish() waits, so a slow broker slows publishers down
+    instead of growing the buffer without bound.
+    """
+
+    def __init__(self, codec: Optional[Codec] = None, max_in_flight: Optional[int] = None):
         self.producer = None
+        self.codec = codec or get_codec(settings.PAYLOAD_CODEC)
+        self.max_in_flight = max_in_flight or settings.KAFKA_PRODUCER_MAX_IN_FLIGHT
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        self.in_flight = 0
+        self.delivered = 0
+        self.failed = 0
 
     async def initialize(self):
-        self.producer = await anext(get_kafka_producer())
+        # Owned by the service until close(), not by a generator that could be finalized early
+        self.producer = await start_kafka_producer()
+
+    async def publish(self, topic: str, message: dict, key: Optional[bytes] = None,
+                      on_delivery: Optional[DeliveryCallback] = None):
+        """Queue a message for delivery without waiting for the broker."""
+        if not self.producer:
+            raise AppException(status_code=500, detail="Kafka producer not initialized")
+        await self._slots.acquire()
+        try:
+            delivery = await self.producer.send(topic, self.codec.encode(message), key=key)
+        except Exception as e:
+            self._slots.release()
+            raise AppException(status_code=500, detail=f"Failed to publish message: {str(e)}")
+        self.in_flight += 1
+        delivery.add_done_callback(lambda future: self._on_delivery(future, topic, message, on_delivery))
+
+    def _on_delivery(self, future: asyncio.Future, topic: str, message: dict,
+                     on_delivery: Optional[DeliveryCallback]):
+        self.in_flight -= 1
+        self._slots.release()
+        error = future.exception() if not future.cancelled() else asyncio.CancelledError()
+        if error is None:
+            self.delivered += 1
+        else:
+            self.failed += 1
+            logger.error(f"Failed to deliver message to {topic}: {str(error)}")
+        if on_delivery:
+            try:
+                on_delivery(topic, message, error)
+            except Exception as e:
+                logger.error(f"Delivery callback for {topic} failed: {str(e)}")
 
-    async def publish_message(self, topic: str, message: dict):
+    async def publish_message(self, topic: str, message: dict, key: Optional[bytes] = None):
+        """Publish and wait until the broker acknowledged the message."""
         if not self.producer:
             raise AppException(status_code=500, detail="Kafka producer not initialized")
         try:
-            value = json.dumps(message).encode('utf-8')
-            await self.producer.send_and_wait(topic, value)
+            await self.producer.send_and_wait(topic, self.codec.encode(message), key=key)
         except Exception as e:
             raise AppException(status_code=500, detail=f"Failed to publish message: {str(e)}")
 
+    async def publish_messages(self, topic: str, messages: List[dict], keys: Optional[List[bytes]] = None):
+        if not self.producer:
+            raise AppException(status_code=500, detail="Kafka producer not initialized")
+        try:
+            keys = keys or [None] * len(messages)
+            # Enqueue everything first so the producer can pack the messages into shared batches
+            deliveries = [
+                await self.producer.send(topic, self.codec.encode(message), key=key)
+                for message, key in zip(messages, keys)
+            ]
+            await asyncio.gather(*deliveries)
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to publish messages: {str(e)}")
+
+    async def flush(self):
+        """Wait until every queued message has been sent."""
+        if self.producer:
+            await self.producer.flush()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "delivered": self.delivered,
+            "failed": self.failed,
+        }
+
     async def close(self):
         if self.producer:
-            await self.producer.stop()
\ No newline at end of file
+            # Stopping sends whatever is still batched before disconnecting
+            await self.producer.stop()
+            self.producer = None
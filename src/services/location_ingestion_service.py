@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from bson import ObjectId
+from fastapi import status
+from pymongo import UpdateOne
+from src.database.mongodb import get_care_workers_collection
+from src.models.schemas import LocationPing
+from src.services.care_worker_service import CareWorkerService, WORKER_UPDATES_TOPIC
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.redis_cache_service import RedisCacheService
+from src.services.worker_geo_index_service import WorkerGeoIndexService
+from src.utils.config import Settings
+from src.utils.error_handling import AppException
+
+logger = logging.getLogger(__name__)
+
+# Longitude, latitude and time of a worker's latest ping
+Position = Tuple[float, float, float]
+
+class LocationIngestionService:
+    """Coalesces worker GPS pings in memory and writes them out in batches.
+
+    Pings are last-write-wins per worker, ordered by when the app took them;
+    times ahead of the server's clock count as now, so a fast device clock
+    cannot hold back later pings. Every LOCATION_FLUSH_INTERVAL_MS the latest position of each worker that
+    moved goes to the Redis geo sets in two pipelined round trips and to the
+    task scheduler as a worker update. MongoDB only gets the latest positions
+    every LOCATION_PERSIST_INTERVAL seconds, in one bulk write, after which
+    the cached documents of the workers written are invalidated.
+    """
+
+    def __init__(self, settings: Settings, redis_cache: RedisCacheService,
+                 kafka_producer: Optional[KafkaProducerService] = None,
+                 care_worker_service: Optional[CareWorkerService] = None):
+        self.settings = settings
+        self.redis_cache = redis_cache
+        self.kafka_producer = kafka_producer
+        self.care_worker_service = care_worker_service
+        self.geo_index = WorkerGeoIndexService(redis_cache)
+        # Not yet in Redis, and in Redis but not yet in MongoDB
+        self._pending: Dict[str, Position] = {}
+        self._unsaved: Dict[str, Position] = {}
+        # Time of each worker's latest ping; workers missing from the geo index are dropped on flush
+        self._latest: Dict[str, float] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.received = 0
+        self.coalesced = 0
+        self.stale = 0
+        self.unknown = 0
+        self.flushed = 0
+        self.persisted = 0
+
+    def submit(self, worker_id: str, latitude: float, longitude: float, timestamp: Optional[float] = None) -> bool:
+        """Queue a ping. Returns False if a newer ping from the worker was already taken."""
+        self.received += 1
+        now = time.time()
+        timestamp = now if timestamp is None else min(timestamp, now)
+        if timestamp < self._latest.get(worker_id, float("-inf")):
+            self.stale += 1
+            return False
+        self._latest[worker_id] = timestamp
+        if worker_id in self._pending:
+            self.coalesced += 1
+        self._pending[worker_id] = (longitude, latitude, timestamp)
+        return True
+
+    def submit_many(self, pings: List[LocationPing]) -> int:
+        """Queue a batch of pings. Returns how many were taken."""
+        if len(pings) > self.settings.LOCATION_BATCH_MAX_ITEMS:
+            raise AppException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                               detail=f"At most {self.settings.LOCATION_BATCH_MAX_ITEMS} locations per batch")
+        return sum(
+            self.submit(ping.worker_id, ping.latitude, ping.longitude,
+                        ping.timestamp.timestamp() if ping.timestamp else None)
+            for ping in pings
+        )
+
+    def supersede(self, worker_id: str):
+        """Take a location written straight to MongoDB as the worker's latest, dropping its queued pings."""
+        self._latest[worker_id] = time.time()
+        self._pending.pop(worker_id, None)
+        self._unsaved.pop(worker_id, None)
+
+    async def flush(self) -> int:
+        """Write the queued positions to the geo set and publish them. Returns how many workers moved."""
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        try:
+            moved = await self.geo_index.move_workers(
+                [(longitude, latitude, worker_id) for worker_id, (longitude, latitude, _) in pending.items()]
+            )
+        except AppException as e:
+            # Retry on the next flush, unless newer pings have replaced them by then
+            self._requeue(self._pending, pending)
+            logger.error(f"Failed to flush {len(pending)} worker locations: {e.detail}")
+            return 0
+
+        # Pings of unknown or deleted workers go nowhere, so they cannot appear as available
+        if len(moved) < len(pending):
+            self.unknown += len(pending) - len(moved)
+            logger.warning(f"Dropped locations of {len(pending) - len(moved)} workers missing from the geo index")
+            # Nor do they keep a place in memory, however many IDs clients make up
+            for worker_id in pending.keys() - set(moved) - self._pending.keys():
+                self._latest.pop(worker_id, None)
+            pending = {worker_id: pending[worker_id] for worker_id in moved}
+            if not pending:
+                return 0
+        self._unsaved.update(pending)
+        self.flushed += len(pending)
+        if self.kafka_producer:
+            try:
+                await self.kafka_producer.publish_messages(WORKER_UPDATES_TOPIC, [
+                    {"worker_id": worker_id, "current_location": {"latitude": latitude, "longitude": longitude}}
+                    for worker_id, (longitude, latitude, _) in pending.items()
+                ])
+            except AppException as e:
+                # The scheduler's index catches up on its next reload from Redis
+                logger.warning(f"Failed to publish {len(pending)} worker locations: {e.detail}")
+        return len(pending)
+
+    async def persist(self) -> int:
+        """Write the latest flushed positions to MongoDB. Returns how many workers were written."""
+        unsaved, self._unsaved = self._unsaved, {}
+        if not unsaved:
+            return 0
+        collection = await get_care_workers_collection()
+        try:
+            await collection.bulk_write([
+                UpdateOne({"_id": ObjectId(worker_id)},
+                          {"$set": {"current_location": {"latitude": latitude, "longitude": longitude}}})
+                for worker_id, (longitude, latitude, _) in unsaved.items()
+            ], ordered=False)
+        except Exception as e:
+            self._requeue(self._unsaved, unsaved)
+            logger.error(f"Failed to persist {len(unsaved)} worker locations: {str(e)}")
+            return 0
+        if self.care_worker_service:
+            await self.care_worker_service.invalidate_workers(list(unsaved))
+        self.persisted += len(unsaved)
+        return len(unsaved)
+
+    @staticmethod
+    def _requeue(queue: Dict[str, Position], positions: Dict[str, Position]):
+        for worker_id, position in positions.items():
+            queue.setdefault(worker_id, position)
+
+    async def start(self):
+        self._tasks = [
+            asyncio.create_task(self._run_periodically(self.flush, self.settings.LOCATION_FLUSH_INTERVAL_MS / 1000)),
+            asyncio.create_task(self._run_periodically(self.persist, self.settings.LOCATION_PERSIST_INTERVAL)),
+        ]
+
+    async def _run_periodically(self, job: Callable[[], Awaitable[int]], interval: float):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await job()
+            except Exception as e:
+                logger.error(f"Location {job.__name__} failed: {str(e)}")
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        # Write out whatever was accepted before shutting down
+        await self.flush()
+        await self.persist()
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "stale": self.stale,
+            "unknown": self.unknown,
+            "flushed": self.flushed,
+            "persisted": self.persisted,
+            "pending": len(self._pending),
+            "unsaved": len(self._unsaved),
+            "tracked": len(self._latest),
+        }
@@ -0,0 +1,215 @@
+import asyncio
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from typing import AsyncIterator, List, Optional
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+from src.database.mongodb import get_client, get_leases_collection, get_outbox_collection
+from src.services.kafka_producer_service import KafkaProducerService
+from src.utils.config import get_settings
+from src.utils.error_handling import AppException
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+OUTBOX_RELAY_LEASE = "outbox_relay"
+# Relay order; events of one care request are written one after another, so they keep theirs
+_RELAY_ORDER = [("created_at", 1), ("_id", 1)]
+# Wake-ups of the relays running in this process, set whenever events commit here
+_relay_wakeups: List[asyncio.Event] = []
+
+
+def outbox_event(topic: str, payload: dict, key: Optional[bytes] = None) -> dict:
+    """An outbox document. Its ID goes out with the message as event_id for consumers to deduplicate on."""
+    event_id = ObjectId()
+    return {"_id": event_id, "topic": topic, "key": key, "payload": {"event_id": str(event_id), **payload},
+            "created_at": datetime.utcnow()}
+
+
+class EventBatch:
+    """The events of one write, and the session the write must run in to commit with them."""
+
+    def __init__(self, session=None):
+        self.session = session
+        self.events: List[dict] = []
+
+    def add(self, topic: str, payload: dict, key: Optional[bytes] = None):
+        self.events.append(outbox_event(topic, payload, key))
+
+
+@asynccontextmanager
+async def record_events(kafka_producer: KafkaProducerService, enabled: bool = True) -> AsyncIterator[EventBatch]:
+    """Collect the events of the writes made in the block.
+
+    With the outbox enabled the writes and their events commit in one
+    transaction, and the relay publishes the events afterwards. Otherwise
+    the writes run on their own and the events are published once they
+    succeeded, so a failed publish loses the event.
+    """
+    if not enabled:
+        batch = EventBatch()
+        yield batch
+        for event in batch.events:
+            await kafka_producer.publish(event["topic"], event["payload"], key=event["key"])
+        return
+
+    client = await get_client()
+    async with await client.start_session() as session:
+        async with session.start_transaction():
+            batch = EventBatch(session)
+            yield batch
+            if batch.events:
+                outbox = await get_outbox_collection()
+                await outbox.insert_many(batch.events, session=session)
+    if batch.events:
+        for wakeup in _relay_wakeups:
+            wakeup.set()
+
+
+def _settle(delivery: asyncio.Future, topic: str, message: dict, error: Optional[BaseException]):
+    if not delivery.done():
+        delivery.set_result(error)
+
+
+class OutboxRelayService:
+    """Publishes outbox events to Kafka in the order they were written.
+
+    Each round reads up to OUTBOX_RELAY_BATCH_SIZE events, hands them all to
+    the producer so they share batches, and deletes the acknowledged prefix.
+    Events after a failed one stay in the outbox and are sent again, so
+    delivery is at least once. The scheduler needs no deduplication, since
+    claim_care_request only assigns a PENDING request and a repeated dispatch
+    event hands its worker back; other consumers can drop repeats by
+    event_id. A lease
+    in MongoDB lets one process relay at a time, which keeps the order
+    across API and scheduler processes. Events committed in the relay's own
+    process wake it at once; those from other processes wait for the next
+    poll, OUTBOX_RELAY_INTERVAL_MS after the outbox was last found empty.
+    """
+
+    def __init__(self, kafka_producer: KafkaProducerService, batch_size: Optional[int] = None,
+                 interval: Optional[float] = None, lease_seconds: Optional[int] = None):
+        self.kafka_producer = kafka_producer
+        self.batch_size = batch_size or settings.OUTBOX_RELAY_BATCH_SIZE
+        self.interval = settings.OUTBOX_RELAY_INTERVAL_MS / 1000 if interval is None else interval
+        self.lease_seconds = lease_seconds or settings.OUTBOX_RELAY_LEASE_SECONDS
+        self.instance_id = uuid.uuid4().hex
+        self.lease_held = False
+        self._lease_renew_at = 0.0
+        self.relayed = 0
+        self.failed = 0
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def relay_batch(self) -> int:
+        """Publish the oldest events and remove the delivered ones. Returns how many were delivered."""
+        outbox = await get_outbox_collection()
+        events = await outbox.find().sort(_RELAY_ORDER).limit(self.batch_size).to_list(length=self.batch_size)
+        if not events:
+            return 0
+
+        loop = asyncio.get_running_loop()
+        deliveries = []
+        for event in events:
+            delivery = loop.create_future()
+            try:
+                await self.kafka_producer.publish(event["topic"], event["payload"], key=event["key"],
+                                                  on_delivery=partial(_settle, delivery))
+            except AppException as e:
+                logger.error(f"Failed to publish outbox event {event['_id']}: {e.detail}")
+                break
+            deliveries.append(delivery)
+        errors = await asyncio.gather(*deliveries)
+        # Stop at the first failure so that a retry cannot overtake the events before it
+        delivered = next((index for index, error in enumerate(errors) if error is not None), len(errors))
+        if delivered:
+            await outbox.delete_many({"_id": {"$in": [event["_id"] for event in events[:delivered]]}})
+        self.relayed += delivered
+        if delivered < len(events):
+            self.failed += 1
+            logger.warning(f"Relayed {delivered} of {len(events)} outbox events, retrying from {events[delivered]['_id']}")
+        return delivered
+
+    async def hold_lease(self) -> bool:
+        """Take or renew the relay lease; renewed once half of it has run out."""
+        loop = asyncio.get_running_loop()
+        if self.lease_held and loop.time() < self._lease_renew_at:
+            return True
+        leases = await get_leases_collection()
+        now = datetime.utcnow()
+        try:
+            # Matches when the lease is ours or expired; otherwise the upsert collides with the holder's
+            await leases.update_one(
+                {"_id": OUTBOX_RELAY_LEASE, "$or": [{"owner": self.instance_id}, {"expires_at": {"$lt": now}}]},
+                {"$set": {"owner": self.instance_id, "expires_at": now + timedelta(seconds=self.lease_seconds)}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            self.lease_held = False
+            return False
+        if not self.lease_held:
+            logger.info(f"Took the outbox relay lease as {self.instance_id}")
+        self.lease_held = True
+        self._lease_renew_at = loop.time() + self.lease_seconds / 2
+        return True
+
+    async def initialize(self):
+        """Check that MongoDB supports the outbox transactions, and index the outbox in relay order."""
+        client = await get_client()
+        hello = await client.admin.command("hello")
+        # Transactions need a replica set or a sharded cluster; a standalone server rejects them
+        if "setName" not in hello and hello.get("msg") != "isdbgrid":
+            raise AppException(status_code=500, detail="OUTBOX_ENABLED needs MongoDB to run as a replica set "
+                                                        "or sharded cluster")
+        outbox = await get_outbox_collection()
+        await outbox.create_index(_RELAY_ORDER)
+
+    async def start(self):
+        await self.initialize()
+        self._wakeup = asyncio.Event()
+        _relay_wakeups.append(self._wakeup)
+        self._task = asyncio.create_task(self._relay_continuously())
+
+    async def _relay_continuously(self):
+        while True:
+            try:
+                if not await self.hold_lease():
+                    # Another process relays; try again before its lease could run out
+                    await asyncio.sleep(self.lease_seconds / 2)
+                    continue
+                # A full batch means more are waiting
+                if await self.relay_batch() == self.batch_size:
+                    continue
+            except Exception as e:
+                logger.error(f"Outbox relay failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stats(self) -> dict:
+        return {"lease_held": self.lease_held, "relayed": self.relayed, "failed_rounds": self.failed}
+
+    async def close(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._wakeup in _relay_wakeups:
+            _relay_wakeups.remove(self._wakeup)
+        if self.lease_held:
+            # Hand over without waiting for the lease to expire
+            try:
+                leases = await get_leases_collection()
+                await leases.delete_one({"_id": OUTBOX_RELAY_LEASE, "owner": self.instance_id})
+            except Exception as e:
+                logger.warning(f"Failed to release the outbox relay lease: {str(e)}")
+            self.lease_held = False
@@ -1,30 +1,108 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 from redis.asyncio import Redis
-from src.utils.redis_config import get_redis
+from redis.asyncio.client import NEVER_DECODE, Pipeline
+from redis.exceptions import RedisError
+from src.utils.codec import Codec, get_codec
+from src.utils.config import get_settings
+from src.utils.redis_config import get_redis_client
 from src.utils.error_handling import AppException
 
+settings = get_settings()
+
 class RedisCacheService:
-    def __init__(self):
+    def __init__(self, codec: Optional[Codec] = None):
         self.redis: Redis = None
+        # Cached values are stored encoded by the codec and decoded on the way out
+        self.codec = codec or get_codec(settings.PAYLOAD_CODEC)
 
     async def initialize(self):
-        self.redis = await anext(get_redis())
+        # The process-wide pooled client, closed by whoever connected it
+        self.redis = await get_redis_client()
+
+    @asynccontextmanager
+    async def pipeline(self, transaction: bool = False) -> AsyncIterator[Pipeline]:
+        """Queue several commands on the yielded pipeline; its execute() sends them in one round trip."""
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        try:
+            async with self.redis.pipeline(transaction=transaction) as pipe:
+                yield pipe
+        except RedisError as e:
+            raise AppException(status_code=500, detail=f"Failed to run Redis pipeline: {str(e)}")
 
-    async def set(self, key: str, value: str, expire: int = None):
+    async def set(self, key: str, value: Any, expire: int = None):
         if not self.redis:
             raise AppException(status_code=500, detail="Redis connection not initialized")
         try:
-            await self.redis.set(key, value, ex=expire)
+            await self.redis.set(key, self.codec.encode(value), ex=expire)
         except Exception as e:
             raise AppException(status_code=500, detail=f"Failed to set cache: {str(e)}")
 
-    async def get(self, key: str):
+    async def get(self, key: str) -> Optional[Any]:
         if not self.redis:
             raise AppException(status_code=500, detail="Redis connection not initialized")
         try:
-            return await self.redis.get(key)
+            # Encoded values are not text, so skip the connection's response decoding
+            value = await self.redis.execute_command("GET", key, **{NEVER_DECODE: True})
+            return None if value is None else self.codec.decode(value)
         except Exception as e:
             raise AppException(status_code=500, detail=f"Failed to get cache: {str(e)}")
 
+    async def delete(self, key: str):
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        try:
+            await self.redis.delete(key)
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to delete cache: {str(e)}")
+
+    async def mget(self, keys: List[str]) -> List[Optional[Any]]:
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        if not keys:
+            return []
+        try:
+            values = await self.redis.execute_command("MGET", *keys, **{NEVER_DECODE: True})
+            return [None if value is None else self.codec.decode(value) for value in values]
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to get cache: {str(e)}")
+
+    async def set_many(self, mapping: Dict[str, Any], expire: int = None):
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        if not mapping:
+            return
+        try:
+            # MSET cannot set an expiry, so pipeline one SET per key instead
+            async with self.redis.pipeline(transaction=False) as pipe:
+                for key, value in mapping.items():
+                    pipe.set(key, self.codec.encode(value), ex=expire)
+                await pipe.execute()
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to set cache: {str(e)}")
+
+    async def publish(self, channel: str, message: str):
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        try:
+            await self.redis.publish(channel, message)
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to publish to {channel}: {str(e)}")
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        """Yield the messages published on a channel until the connection fails."""
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        try:
+            async with self.redis.pubsub() as pubsub:
+                await pubsub.subscribe(channel)
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        yield message["data"]
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to read from {channel}: {str(e)}")
+
     async def geoadd(self, key: str, longitude: float, latitude: float, member: str):
         if not self.redis:
             raise AppException(status_code=500, detail="Redis connection not initialized")
@@ -33,6 +111,15 @@ class RedisCacheService:
         except Exception as e:
             raise AppException(status_code=500, detail=f"Failed to add geospatial data: {str(e)}")
 
+    async def georemove(self, key: str, member: str):
+        if not self.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        try:
+            # Geo sets are sorted sets, so ZREM removes a member
+            await self.redis.zrem(key, member)
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to remove geospatial data: {str(e)}")
+
     async def georadius(self, key: str, longitude: float, latitude: float, radius: float, unit: str = 'km'):
         if not self.redis:
             raise AppException(status_code=500, detail="Redis connection not initialized")
@@ -42,5 +129,5 @@ class RedisCacheService:
             raise AppException(status_code=500, detail=f"Failed to query geospatial data: {str(e)}")
 
     async def close(self):
-        if self.redis:
-            await self.redis.close()
\ No newline at end of file
+        # The pooled client is shared, so only close_redis_connection() closes it
+        self.redis = None
\ No newline at end of file
@@ -1,88 +1,646 @@
-import json
-from typing import List
-from src.models.schemas import CareRequest, CareWorker
-from src.services.care_worker_service import CareWorkerService
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from aiokafka import ConsumerRebalanceListener
+from aiokafka.coordinator.assignors.range import RangePartitionAssignor
+from aiokafka.errors import KafkaError
+from aiokafka.structs import TopicPartition
+from src.models.schemas import CareRequest, CareWorker, CareWorkerStatus, UrgencyLevel
+from src.services.care_worker_service import CareWorkerService, WORKER_LOCATIONS_KEY, WORKER_UPDATES_TOPIC
 from src.services.care_request_service import CareRequestService
 from src.services.distance_service import DistanceService
-from src.utils.kafka_config import get_kafka_producer, get_kafka_consumer
-from src.utils.redis_config import get_redis
+from src.services.kafka_consumer_service import KafkaConsumerService
+from src.services.worker_geo_index_service import worker_geo_key
+from src.utils.assignment import solve_assignment
+from src.utils.codec import Codec
+from src.utils.config import get_settings
+from src.utils.dispatch_lanes import LANE_TOPICS, LaneMessage, LaneMetrics, LaneQueue, lane_topic
+from src.utils.error_handling import AppException
+from src.utils.geo_sharding import GeoGrid, ShardRegion, geo_cell_key
+from src.utils.kafka_config import get_kafka_consumer
+from src.utils.redis_config import get_redis_client
+from src.utils.worker_index import WorkerIndex
+from src.utils.worker_table import SPECIALIZATION_BITS, STATUS_CODES, WorkerTable
+
+logger = logging.getLogger(__name__)
+
+settings = get_settings()
+
+class _ShardRebalanceListener(ConsumerRebalanceListener):
+    """Hands partition assignments to the scheduler, which re-shards before its next batch."""
+
+    def __init__(self, scheduler: "TaskSchedulerService", lanes: LaneQueue):
+        self.scheduler = scheduler
+        self.lanes = lanes
+        # Set once the consumer is started
+        self.consumer = None
+
+    async def on_partitions_revoked(self, revoked):
+        # Commit what was dispatched first, or the new owner would dispatch it again
+        offsets = self.scheduler._offsets_to_commit(self.lanes, set(revoked))
+        if offsets and self.consumer is not None:
+            try:
+                await self.consumer.commit(offsets)
+            except KafkaError as e:
+                logger.warning(f"Dispatched offsets of revoked partitions were not committed: {str(e)}")
+        # The new owner re-reads the rest from the last committed offset
+        self.lanes.discard(revoked)
+        for partition in revoked:
+            self.scheduler._dispatched_offsets.pop(partition, None)
+            self.scheduler._committed_offsets.pop(partition, None)
+
+    async def on_partitions_assigned(self, assigned):
+        self.scheduler._pending_partitions = set(assigned)
 
 class TaskSchedulerService:
     def __init__(self, care_worker_service: CareWorkerService, care_request_service: CareRequestService, distance_service: DistanceService):
         self.care_worker_service = care_worker_service
         self.care_request_service = care_request_service
         self.distance_service = distance_service
+        self.distance_weight = settings.SCHEDULER_DISTANCE_WEIGHT
+        self.specialization_weight = settings.SCHEDULER_SPECIALIZATION_WEIGHT
+        self.availability_weight = settings.SCHEDULER_AVAILABILITY_WEIGHT
+        # Set once consume_worker_updates has loaded it; until then dispatch queries Redis
+        self.worker_index: Optional[WorkerIndex] = None
+        self.worker_updates: Optional[KafkaConsumerService] = None
+        self.lane_metrics = LaneMetrics(settings.SCHEDULER_LANE_SLO_MS)
+        # The region of the partitions this instance owns; None while it owns them all
+        self.shard: Optional[ShardRegion] = None
+        self._pending_partitions: Optional[Set[TopicPartition]] = None
+        # Per partition, the offset after the last dispatched message and the offset last committed
+        self._dispatched_offsets: Dict[TopicPartition, int] = {}
+        self._committed_offsets: Dict[TopicPartition, int] = {}
+        # Requests of the current dispatch that turned out to be assigned or cancelled elsewhere
+        self._taken_elsewhere: Set[str] = set()
 
     async def assign_task(self, care_request_id: str):
         care_request = await self.care_request_service.get_care_request(care_request_id)
         
-        # Publish task to Kafka
-        async for producer in get_kafka_producer():
-            await producer.send_and_wait("care_requests", json.dumps(care_request.dict()).encode())
+        # Publish task to the dispatch lane of its urgency, in the same shape as intake events,
+        # through the process's long-lived producer
+        payload = {"request_id": str(care_request.id), **care_request.model_dump(exclude={"id"})}
+        key = geo_cell_key(care_request.location.latitude, care_request.location.longitude, settings.GEO_SHARD_CELL_KM)
+        await self.care_request_service.kafka_producer.publish(lane_topic(care_request.urgency), payload, key=key)
 
     async def process_tasks(self):
-        async for consumer in get_kafka_consumer("care_requests"):
-            async for msg in consumer:
-                care_request = CareRequest.parse_raw(msg.value)
-                await self._process_single_task(care_request)
-
-    async def _process_single_task(self, care_request: CareRequest):
-        async for redis in get_redis():
-            # Get nearby workers from Redis
-            nearby_workers = await redis.georadius(
-                "worker_locations", 
-                care_request.location.longitude, 
-                care_request.location.latitude, 
-                10, 
-                "km", 
-                withcoord=True
+        # Each urgency has its own topic. Fetched messages wait in per-lane buffers that every
+        # batch is drawn from by weighted fair sharing, and offsets are committed by hand once
+        # the messages taken into a batch have been dispatched.
+        # A request that finds no worker is tried again after a backoff: it waits in its lane
+        # queue, holding back the commits of its partition, and is then published to its lane
+        # again, so it is neither lost nor blocks the requests behind it.
+        # Requests are keyed by geographic cell, so the partitions the consumer group gives this
+        # instance define the region it dispatches for. The range assignor gives each instance the
+        # same partition numbers of every lane topic, so those partitions make up one region;
+        # aiokafka's default round robin would interleave them across the topics.
+        lanes = LaneQueue(settings.SCHEDULER_LANE_WEIGHTS, settings.SCHEDULER_LANE_SLO_MS)
+        listener = _ShardRebalanceListener(self, lanes)
+        async for consumer in get_kafka_consumer(*LANE_TOPICS.values(), listener=listener,
+                                                 group_id=settings.SCHEDULER_CONSUMER_GROUP,
+                                                 enable_auto_commit=False,
+                                                 partition_assignment_strategy=(RangePartitionAssignor,)):
+            listener.consumer = consumer
+            loop = asyncio.get_running_loop()
+            next_report = loop.time() + settings.SCHEDULER_METRICS_INTERVAL
+            # Dispatches or commits failed in a row, which sets the backoff
+            failures = 0
+            while True:
+                if self._pending_partitions is not None:
+                    await self._reshard(consumer)
+                if settings.SCHEDULER_BATCH_DISPATCH:
+                    await self._collect_batch(consumer, lanes)
+                    taken = lanes.take(settings.SCHEDULER_BATCH_MAX_SIZE)
+                else:
+                    # Only block on the poll when nothing is buffered
+                    timeout_ms = 0 if len(lanes) else settings.SCHEDULER_POLL_TIMEOUT_MS
+                    await self._fetch(consumer, lanes, timeout_ms, settings.SCHEDULER_MICRO_BATCH_SIZE)
+                    taken = lanes.take(settings.SCHEDULER_MICRO_BATCH_SIZE)
+
+                if taken:
+                    try:
+                        unassigned = await self._dispatch_lane_messages(taken)
+                    except Exception as e:
+                        # MongoDB or Redis is down, say; the batch waits at the head of its lanes
+                        lanes.requeue(self._owned(taken, consumer.assignment()))
+                        failures += 1
+                        await self._back_off(failures, f"Failed to dispatch {len(taken)} care requests: {str(e)}")
+                        continue
+                    self._defer_retries(lanes, unassigned)
+                    owned = self._owned(taken, consumer.assignment())
+                    for partition, offset in self._commit_offsets(owned).items():
+                        self._dispatched_offsets[partition] = max(offset, self._dispatched_offsets.get(partition, 0))
+                await self._republish_due(lanes)
+
+                offsets = self._offsets_to_commit(lanes, consumer.assignment())
+                try:
+                    if offsets:
+                        await consumer.commit(offsets)
+                        self._committed_offsets.update(offsets)
+                    failures = 0
+                except KafkaError as e:
+                    # The requests are dispatched; the next commit of their partitions covers these offsets
+                    failures += 1
+                    await self._back_off(failures, f"Failed to commit dispatched offsets: {str(e)}")
+                self._throttle_lanes(consumer, lanes)
+
+                if settings.SCHEDULER_METRICS_INTERVAL and loop.time() >= next_report:
+                    await self.report_lane_metrics(consumer, lanes)
+                    next_report = loop.time() + settings.SCHEDULER_METRICS_INTERVAL
+
+    @staticmethod
+    def _retry_delay(retries: int) -> float:
+        return min(settings.SCHEDULER_RETRY_BACKOFF_MS * 2 ** retries, settings.SCHEDULER_RETRY_MAX_BACKOFF_MS) / 1000
+
+    async def _back_off(self, failures: int, reason: str):
+        delay = self._retry_delay(failures - 1)
+        logger.error(f"{reason}; retrying in {delay:g}s")
+        await asyncio.sleep(delay)
+
+    def _defer_retries(self, lanes: LaneQueue, unassigned: List[LaneMessage]):
+        now = time.time()
+        for item in unassigned:
+            attempts = Codec.decode(item.message.value).get("dispatch_attempts", 0)
+            lanes.defer(item, now + self._retry_delay(attempts))
+
+    async def _republish_due(self, lanes: LaneQueue):
+        """Publish the requests whose retry backoff has run out to their lanes again."""
+        by_topic: Dict[str, List[LaneMessage]] = {}
+        for item in lanes.due():
+            by_topic.setdefault(item.message.topic, []).append(item)
+        for topic, items in by_topic.items():
+            payloads = []
+            for item in items:
+                payload = Codec.decode(item.message.value)
+                payload["dispatch_attempts"] = payload.get("dispatch_attempts", 0) + 1
+                payloads.append(payload)
+            try:
+                # Acknowledged before the commit that moves past the original messages
+                await self.care_request_service.kafka_producer.publish_messages(
+                    topic, payloads, [item.message.key for item in items])
+            except AppException as e:
+                logger.error(f"Failed to requeue {len(items)} care requests to {topic}: {e.detail}")
+                for item in items:
+                    lanes.defer(item, time.time() + self._retry_delay(0))
+
+    async def _reshard(self, consumer):
+        """Take over the region of the partitions assigned in the last rebalance."""
+        assigned, self._pending_partitions = self._pending_partitions, None
+        # Lane topics share one partition count, and the range assignor gives an instance the
+        # same partition numbers on each, so a partition number stands for one region
+        partition_count = max(len(consumer.partitions_for_topic(topic) or ()) for topic in LANE_TOPICS.values())
+        partitions = {partition.partition for partition in assigned}
+        if len(partitions) >= partition_count or not settings.GEO_SHARD_BOUNDS:
+            # Without bounds cells are hashed to partitions, so every region spans the whole map
+            self.shard = None
+        else:
+            # Range assignment gives an instance consecutive partitions, one contiguous stretch of the grid.
+            # Its workers reach a little past the border; requests right at it may miss candidates beyond
+            # the halo, which the search radius would otherwise have reached.
+            grid = GeoGrid(settings.GEO_SHARD_BOUNDS, settings.GEO_SHARD_CELL_KM)
+            self.shard = ShardRegion(partitions, partition_count, grid,
+                                     min(settings.GEO_SHARD_HALO_KM, settings.SCHEDULER_SEARCH_RADIUS_KM))
+        logger.info(f"Dispatching for partitions {sorted(partitions)} of {partition_count}")
+        if self.worker_index is not None:
+            await self.load_worker_index()
+
+    async def _fetch(self, consumer, lanes: LaneQueue, timeout_ms: int, max_records: int):
+        records = await consumer.getmany(timeout_ms=timeout_ms, max_records=max_records)
+        now = time.time()
+        for partition_messages in records.values():
+            for msg in partition_messages:
+                lanes.put(msg, now)
+
+    async def _collect_batch(self, consumer, lanes: LaneQueue):
+        # Wait up to the batch window for more requests, unless the batch fills up first
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.SCHEDULER_BATCH_WINDOW_MS / 1000
+        while len(lanes) < settings.SCHEDULER_BATCH_MAX_SIZE:
+            timeout_ms = int((deadline - loop.time()) * 1000)
+            if timeout_ms <= 0:
+                break
+            await self._fetch(consumer, lanes, timeout_ms, settings.SCHEDULER_BATCH_MAX_SIZE - len(lanes))
+
+    async def _dispatch_lane_messages(self, taken: List[LaneMessage]) -> List[LaneMessage]:
+        """Dispatch the requests of the messages; returns the messages of those left unassigned."""
+        parsed = []
+        for item in taken:
+            try:
+                parsed.append(self._parse_care_request(item.message.value))
+            except (ValueError, TypeError) as e:
+                # Could never be dispatched; skipped, and committed with the rest of the batch
+                message = item.message
+                logger.error(f"Skipping malformed care request {message.topic}:{message.partition}@{message.offset}: {str(e)}")
+                parsed.append(None)
+        taken = [item for item, care_request in zip(taken, parsed) if care_request is not None]
+        care_requests = [care_request for care_request in parsed if care_request is not None]
+        if not care_requests:
+            return []
+        self._taken_elsewhere.clear()
+        if settings.SCHEDULER_BATCH_DISPATCH:
+            assignments = await self.dispatch_batch(care_requests)
+        else:
+            assignments = await self.process_micro_batch(care_requests)
+
+        now = time.time()
+        unassigned = []
+        for item, care_request in zip(taken, care_requests):
+            request_id = str(care_request.id)
+            if request_id in assignments:
+                self.lane_metrics.record_assignment(item.lane, now - item.enqueued_at)
+            elif request_id not in self._taken_elsewhere:
+                self.lane_metrics.record_unassigned(item.lane)
+                unassigned.append(item)
+        return unassigned
+
+    @staticmethod
+    def _parse_care_request(value) -> CareRequest:
+        # Intake events carry the document id as request_id
+        data = Codec.decode(value)
+        if "request_id" in data:
+            data["_id"] = data.pop("request_id")
+        return CareRequest.model_validate(data)
+
+    @staticmethod
+    def _owned(taken: List[LaneMessage], assignment: Set[TopicPartition]) -> List[LaneMessage]:
+        # Partitions revoked while their messages were being dispatched belong to the new owner,
+        # which reads them again from the last committed offset
+        return [item for item in taken if TopicPartition(item.message.topic, item.message.partition) in assignment]
+
+    @staticmethod
+    def _commit_offsets(taken: List[LaneMessage]) -> Dict[TopicPartition, int]:
+        # Lanes are FIFO, so everything before the last offset taken from a partition is done
+        offsets: Dict[TopicPartition, int] = {}
+        for item in taken:
+            partition = TopicPartition(item.message.topic, item.message.partition)
+            offsets[partition] = max(offsets.get(partition, 0), item.message.offset + 1)
+        return offsets
+
+    def _offsets_to_commit(self, lanes: LaneQueue, assignment: Set[TopicPartition]) -> Dict[TopicPartition, int]:
+        # Commits stop short of requests waiting for a retry, so a restart reads them again
+        deferred = lanes.deferred_offsets()
+        offsets = {}
+        for partition, offset in self._dispatched_offsets.items():
+            offset = min(offset, deferred.get(partition, offset))
+            if partition in assignment and offset != self._committed_offsets.get(partition):
+                offsets[partition] = offset
+        return offsets
+
+    def _throttle_lanes(self, consumer, lanes: LaneQueue):
+        # Stop fetching a lane whose buffer is full; the other lanes keep flowing
+        for lane, topic in LANE_TOPICS.items():
+            partitions = [partition for partition in consumer.assignment() if partition.topic == topic]
+            if lanes.depth(lane) >= settings.SCHEDULER_LANE_BUFFER_SIZE:
+                consumer.pause(*partitions)
+            else:
+                consumer.resume(*partitions)
+
+    async def report_lane_metrics(self, consumer, lanes: LaneQueue):
+        """Refresh each lane's depth, buffered plus not yet fetched, and log the lane metrics."""
+        lag = dict.fromkeys(LANE_TOPICS.values(), 0)
+        for partition in consumer.assignment():
+            highwater = consumer.highwater(partition)
+            if partition.topic in lag and highwater is not None:
+                lag[partition.topic] += max(0, highwater - await consumer.position(partition))
+        for lane, topic in LANE_TOPICS.items():
+            self.lane_metrics.depth[lane] = lanes.depth(lane) + lag[topic]
+        logger.info(f"Dispatch lanes: {self.lane_metrics.snapshot()}")
+
+    async def process_micro_batch(self, care_requests: List[CareRequest]) -> Dict[str, str]:
+        """Give every request its best-scoring nearby worker that can still be reserved.
+
+        Returns the request id -> worker id assignments that were made.
+        """
+        assignments: Dict[str, str] = {}
+        pending = care_requests
+        # Requests that lost every candidate to other reservations search again; the workers
+        # reserved meanwhile are busy now, so the next search reaches further out
+        for _ in range(settings.SCHEDULER_RESERVATION_ROUNDS):
+            candidate_ids, table = await self._find_candidates(pending)
+
+            rankings = []
+            for care_request, worker_ids in zip(pending, candidate_ids):
+                rows = table.indexes(worker_ids)
+                if rows.size:
+                    scores = self._score_workers(care_request, table, rows)
+                    rankings.append([table.ids[row] for row in rows[np.argsort(-scores, kind="stable")].tolist()])
+                else:
+                    logger.warning(f"No available care worker within {settings.SCHEDULER_SEARCH_RADIUS_KM} km "
+                                   f"of care request {care_request.id}")
+                    rankings.append([])
+
+            reserved, contended = await self._reserve_all(pending, rankings)
+            assignments.update(reserved)
+            pending = [care_request for care_request in pending if str(care_request.id) in contended]
+            if not pending:
+                break
+
+        for care_request in pending:
+            logger.warning(f"Could not reserve a care worker for care request {care_request.id}")
+        return assignments
+
+    async def dispatch_batch(self, care_requests: List[CareRequest]) -> Dict[str, str]:
+        """Assign a batch of requests jointly, maximising the total worker score.
+
+        Returns the request id -> worker id assignments that were made.
+        """
+        start = time.perf_counter()
+        candidate_ids, table = await self._find_candidates(care_requests)
+
+        cost = self._build_cost_matrix(care_requests, candidate_ids, table)
+        rows, cols = solve_assignment(cost)
+        chosen = dict(zip(rows.tolist(), cols.tolist()))
+
+        # Each request reserves the solver's choice first; if another dispatch took that worker
+        # meanwhile it falls back to its next-best candidate that nobody in the batch was given
+        taken = set(chosen.values())
+        rankings = []
+        for row in range(len(care_requests)):
+            fallbacks = [col for col in np.argsort(cost[row], kind="stable").tolist()
+                         if np.isfinite(cost[row, col]) and col not in taken]
+            columns = [chosen[row]] + fallbacks if row in chosen else []
+            rankings.append([table.ids[col] for col in columns])
+
+        assignments, contended = await self._reserve_all(care_requests, rankings)
+        for request_id in contended:
+            logger.warning(f"Could not reserve a care worker for care request {request_id}")
+        logger.info(f"Assigned {len(assignments)} of {len(care_requests)} care requests across {len(table)} "
+                    f"workers in {(time.perf_counter() - start) * 1000:.1f}ms")
+        return assignments
+
+    async def _reserve_all(self, care_requests: List[CareRequest],
+                           rankings: List[List[str]]) -> Tuple[Dict[str, str], Set[str]]:
+        """Reserve workers for the requests concurrently, in ranking order.
+
+        At most SCHEDULER_DISPATCH_CONCURRENCY requests reserve at a time, in
+        batch order. Returns the assignments made and the IDs of the requests
+        whose candidates were all taken by other reservations.
+        """
+        semaphore = asyncio.Semaphore(settings.SCHEDULER_DISPATCH_CONCURRENCY)
+        # Workers this batch has reserved or is reserving
+        claimed: Set[str] = set()
+
+        async def reserve(care_request: CareRequest, worker_ids: List[str]):
+            async with semaphore:
+                return await self._reserve_worker(care_request, worker_ids, claimed)
+
+        results = await asyncio.gather(*(
+            reserve(care_request, worker_ids)
+            for care_request, worker_ids in zip(care_requests, rankings) if worker_ids
+        ))
+        assignments = {request_id: worker_id for request_id, worker_id, _ in results if worker_id}
+        contended = {request_id for request_id, _, was_contended in results if was_contended}
+        return assignments, contended
+
+    async def _reserve_worker(self, care_request: CareRequest, worker_ids: List[str],
+                              claimed: Set[str]) -> Tuple[str, Optional[str], bool]:
+        """Reserve the first free worker in ranking order and assign it to the request.
+
+        Returns the request id, the worker assigned if any, and whether the
+        request went without because every candidate was taken.
+        """
+        request_id = str(care_request.id)
+        attempts = 0
+        for worker_id in worker_ids:
+            # Skip workers taken by this batch, or by another dispatch whose update has arrived since
+            if worker_id in claimed or self._known_unavailable(worker_id):
+                continue
+            if attempts >= settings.SCHEDULER_RESERVATION_ATTEMPTS:
+                break
+            attempts += 1
+            claimed.add(worker_id)
+            reserved = await self.care_worker_service.reserve_care_worker(worker_id)
+            # Either way the worker is busy now; don't offer it to later searches
+            self.apply_worker_update({"worker_id": worker_id, "status": CareWorkerStatus.BUSY})
+            if not reserved:
+                continue
+            try:
+                assigned = await self.care_request_service.claim_care_request(request_id, worker_id)
+            except Exception:
+                # Don't leave the worker busy behind a request it was never given
+                await self._release_worker(worker_id)
+                raise
+            if assigned:
+                return request_id, worker_id, False
+
+            # The request was assigned or cancelled elsewhere; hand the worker back
+            await self._release_worker(worker_id)
+            claimed.discard(worker_id)
+            self._taken_elsewhere.add(request_id)
+            return request_id, None, False
+
+        return request_id, None, True
+
+    async def _release_worker(self, worker_id: str):
+        if await self.care_worker_service.release_care_worker(worker_id):
+            self.apply_worker_update({"worker_id": worker_id, "status": CareWorkerStatus.AVAILABLE})
+
+    def _known_unavailable(self, worker_id: str) -> bool:
+        if self.worker_index is None:
+            return False
+        worker_status = self.worker_index.status(worker_id)
+        return worker_status is not None and worker_status != CareWorkerStatus.AVAILABLE
+
+    async def _find_candidates(self, care_requests: List[CareRequest]) -> Tuple[List[List[str]], WorkerTable]:
+        """The nearest available workers of every request, nearest first, and a table of their attributes.
+
+        The search starts at SCHEDULER_INITIAL_SEARCH_RADIUS_KM and doubles until it has
+        SCHEDULER_CANDIDATE_COUNT candidates or reaches SCHEDULER_SEARCH_RADIUS_KM, so the
+        number of workers scored per request stays bounded however dense the area is.
+        """
+        if self.worker_index is None:
+            return await self._search_candidates(care_requests)
+
+        candidate_ids = [
+            self.worker_index.nearest(
+                care_request.location.latitude, care_request.location.longitude,
+                settings.SCHEDULER_CANDIDATE_COUNT,
+                max_km=settings.SCHEDULER_SEARCH_RADIUS_KM,
+                statuses=[CareWorkerStatus.AVAILABLE],
+                min_km=settings.SCHEDULER_INITIAL_SEARCH_RADIUS_KM
             )
+            for care_request in care_requests
+        ]
+        return candidate_ids, self.worker_index.table(worker_id for ids in candidate_ids for worker_id in ids)
+
+    async def _search_candidates(self, care_requests: List[CareRequest]) -> Tuple[List[List[str]], WorkerTable]:
+        # Each round asks GEOSEARCH for the nearest `count` members of the available workers' geo
+        # set, loads the ones not seen yet and keeps those whose document still says available.
+        # A request that is still short doubles its count if the radius held more members, else
+        # its radius.
+        wanted = settings.SCHEDULER_CANDIDATE_COUNT
+        radius = [min(settings.SCHEDULER_INITIAL_SEARCH_RADIUS_KM, settings.SCHEDULER_SEARCH_RADIUS_KM)] * len(care_requests)
+        count = [2 * wanted] * len(care_requests)
+        candidate_ids: List[List[str]] = [[] for _ in care_requests]
+        available: Dict[str, bool] = {}
+        tables = []
+
+        pending = list(range(len(care_requests)))
+        while pending:
+            # One pipelined round trip for every request still searching
+            async with self.care_worker_service.redis_cache.pipeline() as pipe:
+                for i in pending:
+                    pipe.geosearch(
+                        worker_geo_key(CareWorkerStatus.AVAILABLE),
+                        longitude=care_requests[i].location.longitude,
+                        latitude=care_requests[i].location.latitude,
+                        radius=radius[i],
+                        unit="km",
+                        sort="ASC",
+                        count=count[i]
+                    )
+                results = await pipe.execute()
+
+            new_ids = list(dict.fromkeys(worker_id for ids in results for worker_id in ids if worker_id not in available))
+            if new_ids:
+                # Workers still in the geo set but no longer in the database are never available
+                available.update(dict.fromkeys(new_ids, False))
+                table = await self.care_worker_service.get_care_worker_table(new_ids)
+                available.update(zip(table.ids, (table.statuses == STATUS_CODES[CareWorkerStatus.AVAILABLE]).tolist()))
+                tables.append(table)
+
+            still_pending = []
+            for i, ids in zip(pending, results):
+                candidate_ids[i] = [worker_id for worker_id in ids if available[worker_id]][:wanted]
+                if len(candidate_ids[i]) >= wanted:
+                    continue
+                if len(ids) >= count[i]:
+                    count[i] *= 2
+                elif radius[i] < settings.SCHEDULER_SEARCH_RADIUS_KM:
+                    radius[i] = min(radius[i] * 2, settings.SCHEDULER_SEARCH_RADIUS_KM)
+                else:
+                    continue
+                still_pending.append(i)
+            pending = still_pending
+
+        return candidate_ids, WorkerTable.concat(tables)
 
-        if not nearby_workers:
-            # Handle case when no workers are available
+    async def load_worker_index(self):
+        """(Re)build the in-process worker index from the Redis geo set and the worker documents."""
+        redis = await get_redis_client()
+        worker_ids = await redis.zrange(WORKER_LOCATIONS_KEY, 0, -1)
+        positions = await redis.geopos(WORKER_LOCATIONS_KEY, *worker_ids) if worker_ids else []
+
+        # Redis holds the latest positions, the documents everything else
+        located = {worker_id: position for worker_id, position in zip(worker_ids, positions) if position}
+        if self.shard is not None:
+            # Only this shard's region and the halo around it
+            located = {worker_id: (longitude, latitude) for worker_id, (longitude, latitude) in located.items()
+                       if self.shard.covers(latitude, longitude)}
+            worker_ids = list(located)
+        table = await self.care_worker_service.get_care_worker_table(worker_ids)
+        for row, worker_id in enumerate(table.ids):
+            if worker_id in located:
+                table.longitudes[row], table.latitudes[row] = located[worker_id]
+        self.worker_index = WorkerIndex.from_table(table, settings.WORKER_INDEX_CELL_KM)
+        logger.info(f"Indexed {len(self.worker_index)} care workers in process")
+
+    async def consume_worker_updates(self):
+        # Every scheduler needs every update, so each instance reads them in a consumer group of
+        # its own. A new group starts at the current end of the topic; everything older comes
+        # from the initial load.
+        self.worker_updates = KafkaConsumerService(
+            WORKER_UPDATES_TOPIC, group_id=f"{settings.SCHEDULER_CONSUMER_GROUP}-worker-updates-{uuid.uuid4().hex}",
+            handler=self._handle_worker_update,
+        )
+        await self.worker_updates.initialize()
+        try:
+            await self.load_worker_index()
+            await self.worker_updates.start()
+            loop = asyncio.get_running_loop()
+            next_resync = loop.time() + settings.WORKER_INDEX_RESYNC_INTERVAL
+            next_report = loop.time() + settings.SCHEDULER_METRICS_INTERVAL
+            while True:
+                await asyncio.sleep(1)
+                if settings.WORKER_INDEX_RESYNC_INTERVAL and loop.time() >= next_resync:
+                    # Picks up anything whose event was lost
+                    await self.load_worker_index()
+                    next_resync = loop.time() + settings.WORKER_INDEX_RESYNC_INTERVAL
+                if settings.SCHEDULER_METRICS_INTERVAL and loop.time() >= next_report:
+                    logger.info(f"Worker updates: {await self.worker_update_stats()}")
+                    next_report = loop.time() + settings.SCHEDULER_METRICS_INTERVAL
+        finally:
+            await self.worker_updates.close()
+
+    async def _handle_worker_update(self, event: dict):
+        self.apply_worker_update(event)
+
+    async def worker_update_stats(self) -> dict:
+        """The worker update consumer's counters and the lag of each of its partitions."""
+        if self.worker_updates is None or self.worker_updates.consumer is None:
+            return {}
+        return {**self.worker_updates.stats(), "lag": await self.worker_updates.partition_lag()}
+
+    def apply_worker_update(self, event: dict):
+        if self.worker_index is None:
+            return
+        location = event.get("current_location") or event
+        latitude, longitude = location.get("latitude"), location.get("longitude")
+        if self.shard is not None and latitude is not None and longitude is not None \
+                and not self.shard.covers(latitude, longitude):
+            # Moved out of this shard's region
+            self.worker_index.remove(event["worker_id"])
             return
+        self.worker_index.apply_update(event)
+
+    def _build_cost_matrix(self, care_requests: List[CareRequest], candidate_ids: List[List[str]],
+                           table: WorkerTable) -> np.ndarray:
+        # Workers outside a request's candidate set cannot take it. Scores are scaled by the
+        # request's lane weight so that urgent requests win the workers they contend for.
+        cost = np.full((len(care_requests), len(table)), np.inf)
+        for row, (care_request, worker_ids) in enumerate(zip(care_requests, candidate_ids)):
+            columns = table.indexes(worker_ids)
+            if columns.size:
+                weight = settings.SCHEDULER_LANE_WEIGHTS.get(UrgencyLevel(care_request.urgency).value, 1)
+                cost[row, columns] = -weight * self._score_workers(care_request, table, columns)
+        return cost
+
+    def _find_optimal_worker(self, care_request: CareRequest, workers: List[CareWorker]) -> Optional[CareWorker]:
+        if not workers:
+            return None
+        scores = self._score_workers(care_request, WorkerTable.from_workers(workers))
+        return workers[int(np.argmax(scores))]
+
+    def _score_workers(self, care_request: CareRequest, table: WorkerTable,
+                       rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """_calculate_worker_score for every worker in the table, or for the given rows, in one pass."""
+        latitudes, longitudes = table.latitudes, table.longitudes
+        specializations, statuses = table.specializations, table.statuses
+        if rows is not None:
+            latitudes, longitudes = latitudes[rows], longitudes[rows]
+            specializations, statuses = specializations[rows], statuses[rows]
+
+        distance = self.distance_service.travel_costs(care_request.location, latitudes, longitudes)
+        distance_score = 1 / (1 + distance)
+        specialization_score = (specializations & SPECIALIZATION_BITS[care_request.service_type]) != 0
+        availability_score = statuses == STATUS_CODES[CareWorkerStatus.AVAILABLE]
+
+        # Same terms and operation order as _calculate_worker_score; only NumPy's haversine
+        # can differ from the scalar one, in the last bit
+        return (
+            self.distance_weight * distance_score +
+            self.specialization_weight * specialization_score +
+            self.availability_weight * availability_score
+        )
 
-        optimal_worker = await self._find_optimal_worker(care_request, nearby_workers)
-        
-        if optimal_worker:
-            await self.care_request_service.assign_care_worker(care_request.id, optimal_worker.id)
-        else:
-            # Handle case when no suitable worker is found
-            pass
-
-    async def _find_optimal_worker(self, care_request: CareRequest, nearby_workers: List[tuple]) -> CareWorker:
-        scored_workers = []
-        for worker_id, (lon, lat) in nearby_workers:
-            worker = await self.care_worker_service.get_care_worker(worker_id.decode())
-            score = self._calculate_worker_score(care_request, worker)
-            scored_workers.append((worker, score))
-
-        scored_workers.sort(key=lambda x: x[1], reverse=True)
-        return scored_workers[0][0] if scored_workers else None
-    
     def _calculate_worker_score(self, care_request: CareRequest, worker: CareWorker) -> float:
-        # Calculate distance score (inverse of distance)
-        distance = self.distance_service.calculate_distance(care_request.location, worker.current_location)
+        # Calculate distance score (inverse of road travel time, or of distance without a road network)
+        distance = self.distance_service.travel_cost(care_request.location, worker.current_location)
         distance_score = 1 / (1 + distance)  # Normalize distance score
 
         # Calculate specialization match score
         specialization_score = 1 if care_request.service_type in worker.specializations else 0
 
         # Calculate availability score (can be more complex based on worker's schedule)
-        availability_score = 1 if worker.status == "AVAILABLE" else 0
+        availability_score = 1 if worker.status == CareWorkerStatus.AVAILABLE else 0
 
         # Weighted sum of scores
         total_score = (
-            0.4 * distance_score +
-            0.4 * specialization_score +
-            0.2 * availability_score
+            self.distance_weight * distance_score +
+            self.specialization_weight * specialization_score +
+            self.availability_weight * availability_score
         )
 
         return total_score
-
-    async def schedule_new_request(self, care_request_id: str):
-        await self.assign_task(care_request_id)
-
-    async def update_worker_location(self, worker_id: str, latitude: float, longitude: float):
-        async for redis in get_redis():
-            await redis.geoadd("worker_locations", longitude, latitude, worker_id)
\ No newline at end of file
@@ -0,0 +1,205 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+from bson import ObjectId
+from redis.asyncio import Redis
+from src.database.mongodb import get_care_workers_collection
+from src.models.schemas import CareWorkerStatus, ServiceType
+from src.services.redis_cache_service import RedisCacheService
+from src.utils.error_handling import AppException
+
+logger = logging.getLogger(__name__)
+
+# Redis geo set of every worker's position, shared with the task scheduler
+WORKER_LOCATIONS_KEY = "worker_locations"
+# Hash of worker ID -> the partitioned geo sets the worker is in, "|"-separated
+WORKER_GEO_MEMBERSHIP_KEY = "worker_locations:membership"
+_PROJECTION = {"status": 1, "specializations": 1, "current_location": 1}
+
+
+def worker_geo_key(status: CareWorkerStatus, service_type: Optional[ServiceType] = None) -> str:
+    """The geo set of the workers with a status, and with a specialization if given."""
+    key = f"{WORKER_LOCATIONS_KEY}:{CareWorkerStatus(status).value}"
+    return key if service_type is None else f"{key}:{ServiceType(service_type).value}"
+
+
+PARTITION_KEYS = [worker_geo_key(status) for status in CareWorkerStatus] + [
+    worker_geo_key(status, service_type) for status in CareWorkerStatus for service_type in ServiceType
+]
+
+
+def partition_keys(document: dict) -> List[str]:
+    """The partitioned geo sets a worker document belongs in."""
+    # Workers stored without a status are available, as in WorkerTable.from_documents
+    status = document.get("status") or CareWorkerStatus.AVAILABLE
+    return [worker_geo_key(status)] + [
+        worker_geo_key(status, service_type) for service_type in document.get("specializations") or []
+    ]
+
+
+class WorkerGeoIndexService:
+    """Worker positions in Redis geo sets partitioned by status and by status and specialization.
+
+    Besides worker_locations, which holds every worker, each worker is in
+    worker_locations:<status> and worker_locations:<status>:<specialization>
+    for each of its specializations, so "available physical therapists
+    within 5 km" is one GEOSEARCH with nothing to filter out afterwards.
+    A membership hash records each worker's partitioned sets so location
+    updates can move it in all of them without knowing its status.
+    """
+
+    def __init__(self, redis_cache: RedisCacheService, reconcile_interval: int = 0):
+        self.redis_cache = redis_cache
+        self.reconcile_interval = reconcile_interval
+        self._reconcile_task: Optional[asyncio.Task] = None
+
+    def _redis(self) -> Redis:
+        if not self.redis_cache.redis:
+            raise AppException(status_code=500, detail="Redis connection not initialized")
+        return self.redis_cache.redis
+
+    async def update_worker(self, worker_id: str, document: dict, location: Optional[Tuple[float, float]] = None):
+        """Move a worker into the partitioned sets of its document's status and specializations.
+
+        location is the worker's new (longitude, latitude). Without it the
+        worker keeps its position in worker_locations, which GPS pings keep
+        more current than the document.
+        """
+        redis = self._redis()
+        try:
+            if location is None:
+                position = (await redis.geopos(WORKER_LOCATIONS_KEY, worker_id))[0]
+                current_location = document["current_location"]
+                location = tuple(position) if position else (current_location["longitude"],
+                                                             current_location["latitude"])
+            keys = partition_keys(document)
+            # One transaction, so searches never see the worker in both or neither status
+            async with redis.pipeline(transaction=True) as pipe:
+                for key in PARTITION_KEYS:
+                    if key not in keys:
+                        pipe.zrem(key, worker_id)
+                for key in [WORKER_LOCATIONS_KEY] + keys:
+                    pipe.geoadd(key, (*location, worker_id))
+                pipe.hset(WORKER_GEO_MEMBERSHIP_KEY, worker_id, "|".join(keys))
+                await pipe.execute()
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to index care worker {worker_id}: {str(e)}")
+
+    async def remove_worker(self, worker_id: str):
+        redis = self._redis()
+        try:
+            async with redis.pipeline(transaction=True) as pipe:
+                for key in [WORKER_LOCATIONS_KEY] + PARTITION_KEYS:
+                    pipe.zrem(key, worker_id)
+                pipe.hdel(WORKER_GEO_MEMBERSHIP_KEY, worker_id)
+                await pipe.execute()
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to unindex care worker {worker_id}: {str(e)}")
+
+    async def move_workers(self, members: Sequence[Tuple[float, float, str]], chunk_size: int = 1000) -> List[str]:
+        """Update many (longitude, latitude, worker ID) positions in two round trips.
+
+        Partitioned sets are only updated where the worker is still a member,
+        so a status change racing the update cannot put it back in a set it
+        just left. Workers with no membership entry were never indexed or
+        have been removed, and are left out. Returns the IDs of the workers
+        that were moved.
+        """
+        if not members:
+            return []
+        redis = self._redis()
+        try:
+            memberships = await redis.hmget(WORKER_GEO_MEMBERSHIP_KEY, [worker_id for _, _, worker_id in members])
+            moved = []
+            updates: Dict[str, List] = defaultdict(list)
+            for (longitude, latitude, worker_id), membership in zip(members, memberships):
+                if membership is None:
+                    continue
+                moved.append(worker_id)
+                for key in [WORKER_LOCATIONS_KEY] + membership.split("|"):
+                    updates[key].extend((longitude, latitude, worker_id))
+            # Several moderate GEOADDs rather than a few huge commands that would stall Redis
+            async with redis.pipeline(transaction=False) as pipe:
+                for key, values in updates.items():
+                    for start in range(0, len(values), 3 * chunk_size):
+                        pipe.geoadd(key, values[start:start + 3 * chunk_size], xx=key != WORKER_LOCATIONS_KEY)
+                await pipe.execute()
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to move {len(members)} care workers: {str(e)}")
+        return moved
+
+    async def search(self, latitude: float, longitude: float, radius_km: float,
+                     status: CareWorkerStatus = CareWorkerStatus.AVAILABLE,
+                     service_type: Optional[ServiceType] = None, count: Optional[int] = None) -> List[str]:
+        """IDs of the workers with the status (and specialization) within the radius, nearest first."""
+        redis = self._redis()
+        try:
+            return await redis.geosearch(worker_geo_key(status, service_type), longitude=longitude,
+                                         latitude=latitude, radius=radius_km, unit="km", sort="ASC", count=count)
+        except Exception as e:
+            raise AppException(status_code=500, detail=f"Failed to query geospatial data: {str(e)}")
+
+    async def reconcile(self) -> Dict[str, int]:
+        """Repair drift between the geo sets and the worker documents in MongoDB.
+
+        Workers whose sets or membership differ from their document are
+        re-indexed, and IDs with no document are removed. A change that races
+        the repair is caught by the next run. Returns how many workers were
+        checked, re-indexed and removed.
+        """
+        collection = await get_care_workers_collection()
+        documents = await collection.find({}, _PROJECTION).to_list(length=None)
+        expected = {str(document["_id"]): partition_keys(document) for document in documents}
+
+        redis = self._redis()
+        async with redis.pipeline(transaction=False) as pipe:
+            for key in [WORKER_LOCATIONS_KEY] + PARTITION_KEYS:
+                pipe.zrange(key, 0, -1)
+            pipe.hgetall(WORKER_GEO_MEMBERSHIP_KEY)
+            results = await pipe.execute()
+        located, membership = set(results[0]), results[-1]
+        actual: Dict[str, Set[str]] = defaultdict(set)
+        for key, members in zip(PARTITION_KEYS, results[1:-1]):
+            for worker_id in members:
+                actual[worker_id].add(key)
+
+        drifted = [worker_id for worker_id, keys in expected.items()
+                   if worker_id not in located or actual.get(worker_id, set()) != set(keys)
+                   or membership.get(worker_id) != "|".join(keys)]
+        orphaned = (located | set(actual) | set(membership)) - set(expected)
+
+        if drifted:
+            # Re-read just before repairing to narrow the window for racing changes
+            fresh = await collection.find({"_id": {"$in": [ObjectId(worker_id) for worker_id in drifted]}},
+                                          _PROJECTION).to_list(length=None)
+            for document in fresh:
+                await self.update_worker(str(document["_id"]), document)
+        for worker_id in orphaned:
+            await self.remove_worker(worker_id)
+
+        if drifted or orphaned:
+            logger.warning(f"Repaired worker geo index: {len(drifted)} re-indexed, {len(orphaned)} removed")
+        return {"checked": len(expected), "reindexed": len(drifted), "removed": len(orphaned)}
+
+    async def start(self):
+        if self.reconcile_interval > 0:
+            self._reconcile_task = asyncio.create_task(self._reconcile_periodically())
+
+    async def _reconcile_periodically(self):
+        # The first run backfills sets that predate them
+        while True:
+            try:
+                await self.reconcile()
+            except Exception as e:
+                logger.error(f"Worker geo index reconciliation failed: {str(e)}")
+            await asyncio.sleep(self.reconcile_interval)
+
+    async def close(self):
+        if self._reconcile_task:
+            self._reconcile_task.cancel()
+            try:
+                await self._reconcile_task
+            except asyncio.CancelledError:
+                pass
+            self._reconcile_task = None
@@ -0,0 +1,94 @@
+from typing import Tuple
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+
+def solve_assignment(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Min-cost one-to-one assignment of rows to columns.
+
+    ``cost`` may be rectangular, and ``inf`` marks pairs that must not be
+    matched. The returned ``(rows, cols)`` first match as many rows as the
+    feasible pairs allow, then minimise the total cost among those matchings.
+    Uses SciPy when installed and a NumPy shortest augmenting path solver
+    otherwise.
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    empty = np.zeros(0, dtype=np.intp)
+    if cost.ndim != 2 or cost.size == 0:
+        return empty, empty
+
+    feasible = np.isfinite(cost)
+    if not feasible.any():
+        return empty, empty
+    # A forbidden pair costs more than any complete matching of allowed pairs,
+    # so the solver only falls back to one when nothing else is left
+    finite = cost[feasible]
+    span = float(finite.max() - finite.min()) + 1.0
+    forbidden = float(finite.max()) + span * min(cost.shape)
+    padded = np.where(feasible, cost, forbidden)
+
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(padded)
+    elif padded.shape[0] <= padded.shape[1]:
+        rows, cols = _shortest_augmenting_path(padded)
+    else:
+        cols, rows = _shortest_augmenting_path(padded.T)
+        order = np.argsort(rows)
+        rows, cols = rows[order], cols[order]
+
+    keep = feasible[rows, cols]
+    return rows[keep], cols[keep]
+
+
+def _shortest_augmenting_path(cost: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Hungarian algorithm with potentials for an (n, m) matrix with n <= m.
+
+    Each row is added by a Dijkstra-like search for the cheapest augmenting
+    path over reduced costs; the scan over columns is vectorised.
+    """
+    n, m = cost.shape
+    # Index 0 is a virtual column that holds the row being inserted
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=np.intp)  # row (1-based) matched to each column, 0 if free
+    way = np.zeros(m + 1, dtype=np.intp)
+
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_reduced = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[column] = True
+            current_row = match[column]
+            free = ~used
+            reduced = cost[current_row - 1] - u[current_row] - v[1:]
+            improved = free[1:] & (reduced < min_reduced[1:])
+            min_reduced[1:][improved] = reduced[improved]
+            way[1:][improved] = column
+
+            candidates = np.where(free, min_reduced, np.inf)
+            next_column = int(np.argmin(candidates))
+            delta = candidates[next_column]
+            u[match[used]] += delta
+            v[used] -= delta
+            min_reduced[free] -= delta
+
+            column = next_column
+            if match[column] == 0:
+                break
+
+        # Flip the matching along the augmenting path
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    cols = np.flatnonzero(match[1:])
+    rows = match[1:][cols] - 1
+    order = np.argsort(rows)
+    return rows[order], cols[order]
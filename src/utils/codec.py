@@ -0,0 +1,96 @@
+import json
+import logging
+from datetime import datetime
+from typing import Any, Dict, Union
+
+try:
+    import orjson
+except ImportError:  # the stdlib encoder writes the same JSON, only slower
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # the msgpack codec falls back to JSON
+    msgpack = None
+
+logger = logging.getLogger(__name__)
+
+# Every payload starts with a byte naming its format, so readers decode whatever the
+# writers' codec was, before and after a change of PAYLOAD_CODEC.
+JSON_VERSION = 1
+MSGPACK_VERSION = 2
+# Payloads written before the codecs are bare JSON objects or arrays
+_LEGACY_JSON = (ord("{"), ord("["))
+
+
+def _default(value: Any) -> Any:
+    # ObjectIds and anything else stdlib JSON cannot write become strings, as with json.dumps(default=str)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def _json_dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def _msgpack_loads(data: bytes) -> Any:
+    if msgpack is None:
+        raise ValueError("msgpack payload received but msgpack is not installed")
+    return msgpack.unpackb(data, raw=False)
+
+
+_DECODERS = {JSON_VERSION: _json_loads, MSGPACK_VERSION: _msgpack_loads}
+
+
+class Codec:
+    """Encodes payloads for Redis and Kafka behind a one-byte format version."""
+
+    name = "json"
+    version = JSON_VERSION
+
+    def dumps(self, value: Any) -> bytes:
+        return _json_dumps(value)
+
+    def encode(self, value: Any) -> bytes:
+        return bytes((self.version,)) + self.dumps(value)
+
+    @staticmethod
+    def decode(data: Union[bytes, str]) -> Any:
+        """Decode a payload of any known version, whichever codec is configured."""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if not data:
+            raise ValueError("Empty payload")
+        if data[0] in _LEGACY_JSON:
+            return _json_loads(data)
+        decoder = _DECODERS.get(data[0])
+        if decoder is None:
+            raise ValueError(f"Unknown payload version {data[0]}")
+        return decoder(data[1:])
+
+
+class MsgpackCodec(Codec):
+    name = "msgpack"
+    version = MSGPACK_VERSION
+
+    def dumps(self, value: Any) -> bytes:
+        return msgpack.packb(value, default=_default, use_bin_type=True)
+
+
+_CODECS: Dict[str, Codec] = {"json": Codec(), "msgpack": MsgpackCodec()}
+
+
+def get_codec(name: str) -> Codec:
+    if name not in _CODECS:
+        raise ValueError(f"Unknown payload codec {name!r}, expected one of {sorted(_CODECS)}")
+    if name == "msgpack" and msgpack is None:
+        logger.warning("msgpack is not installed; encoding payloads as JSON")
+        name = "json"
+    return _CODECS[name]
@@ -1,16 +1,81 @@
+from typing import Dict, Optional, Tuple
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     mongodb_url: str
     db_name: str
-    ARCGIS_API_KEY: str
-    ARCGIS_PORTAL_URL: str
-    SERVICE_AREA_LAYER_URL: str
+    ARCGIS_API_KEY: Optional[str] = None
+    ARCGIS_PORTAL_URL: Optional[str] = None
+    SERVICE_AREA_LAYER_URL: Optional[str] = None
+    SERVICE_AREA_GEOJSON_PATH: Optional[str] = None
+    SERVICE_AREA_SNAPSHOT_PATH: Optional[str] = "service_area_snapshot.geojson"
+    SERVICE_AREA_REFRESH_INTERVAL: int = 3600  # seconds, 0 disables background refresh
+    SERVICE_AREA_RETRY_INTERVAL: int = 60  # seconds between loads while no service area could be loaded
+    GEOFENCE_GRID_SIZE: int = 256  # coarse cells along the longer side, 0 disables the raster mask
+    GEOFENCE_GRID_REFINE: int = 4  # boundary cells are split into REFINE x REFINE sub-cells
+    GEOFENCE_GRID_MAX_CELLS: int = 1_048_576
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     KAFKA_BOOTSTRAP_SERVERS: str = "localhost:9092"
+    KAFKA_PRODUCER_LINGER_MS: int = 5  # how long a batch waits to fill before it is sent
+    KAFKA_PRODUCER_BATCH_SIZE: int = 65536  # bytes per partition batch
+    KAFKA_PRODUCER_COMPRESSION: Optional[str] = None  # "gzip", "snappy", "lz4" or "zstd"
+    KAFKA_PRODUCER_MAX_IN_FLIGHT: int = 10000  # unacknowledged messages before publishing waits
+    KAFKA_CONSUMER_PREFETCH: int = 500  # messages per fetch; a partition with this many waiting is paused
+    KAFKA_CONSUMER_MAX_IN_FLIGHT: int = 2000  # fetched but unhandled messages before fetching waits
+    KAFKA_CONSUMER_COMMIT_INTERVAL_MS: int = 1000  # handled offsets are committed together this often
+    PAYLOAD_CODEC: str = "json"  # "json" or "msgpack" for cached workers and Kafka messages; readers take both
     REDIS_URL: str = "redis://localhost:6379"
+    REDIS_MAX_CONNECTIONS: int = 50  # per process; commands wait for a free connection beyond this
+    REDIS_POOL_TIMEOUT: float = 5  # seconds to wait for a free connection before failing
+    REDIS_SOCKET_TIMEOUT: float = 5
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # seconds a connection may sit idle before it is PINGed on reuse
+    REDIS_RETRY_ATTEMPTS: int = 3  # reconnects with backoff after a dropped connection
+    CARE_REQUEST_BULK_MAX_ITEMS: int = 1000
+    OUTBOX_ENABLED: bool = False  # commit care request events with the write (needs a replica set); False publishes after it
+    OUTBOX_RELAY_BATCH_SIZE: int = 500  # events read and published per round
+    OUTBOX_RELAY_INTERVAL_MS: int = 100  # wait before polling again once the outbox is drained
+    OUTBOX_RELAY_LEASE_SECONDS: int = 10  # one process relays at a time; another takes over after this
+    ROAD_NETWORK_PATH: Optional[str] = None  # GeoJSON road lines; haversine distance is used when unset
+    ROAD_NETWORK_LANDMARKS: int = 8
+    ROAD_NETWORK_MAX_DETOUR: float = 3  # road km per straight-line km of search radius before a candidate counts as unreachable
+    SCHEDULER_SEARCH_RADIUS_KM: float = 10  # largest radius the candidate search expands to
+    SCHEDULER_INITIAL_SEARCH_RADIUS_KM: float = 1
+    SCHEDULER_CANDIDATE_COUNT: int = 16  # nearest available workers scored per request
+    SCHEDULER_CONSUMER_GROUP: str = "task-scheduler"
+    SCHEDULER_MICRO_BATCH_SIZE: int = 100
+    SCHEDULER_POLL_TIMEOUT_MS: int = 100
+    GEO_SHARD_CELL_KM: float = 5  # care requests are keyed by cells of this size; API and schedulers must agree
+    # South, west, north and east edge of the area whose cells lane partitions split into contiguous regions,
+    # the service area's extent; unset, cells are hashed to partitions and every scheduler indexes every worker
+    GEO_SHARD_BOUNDS: Optional[Tuple[float, float, float, float]] = None
+    GEO_SHARD_HALO_KM: float = 2  # workers kept beyond a scheduler's region, at most SCHEDULER_SEARCH_RADIUS_KM
+    SCHEDULER_WORKER_INDEX: bool = True  # answer dispatch queries from an in-process index instead of Redis
+    WORKER_INDEX_CELL_KM: float = 1.0
+    WORKER_INDEX_RESYNC_INTERVAL: int = 300  # seconds between full reloads, 0 disables them
+    SCHEDULER_DISTANCE_WEIGHT: float = 0.4
+    SCHEDULER_SPECIALIZATION_WEIGHT: float = 0.4
+    SCHEDULER_AVAILABILITY_WEIGHT: float = 0.2
+    SCHEDULER_BATCH_DISPATCH: bool = False  # match pending requests to workers jointly instead of one at a time
+    SCHEDULER_BATCH_WINDOW_MS: int = 200
+    SCHEDULER_BATCH_MAX_SIZE: int = 500
+    SCHEDULER_DISPATCH_CONCURRENCY: int = 32  # requests reserving workers at the same time
+    SCHEDULER_RESERVATION_ATTEMPTS: int = 5  # candidates tried per request when reservations conflict
+    SCHEDULER_RESERVATION_ROUNDS: int = 3  # candidate searches per request when all its candidates were taken
+    # Urgency lanes: share of each batch per round, and time-to-assignment targets
+    SCHEDULER_LANE_WEIGHTS: Dict[str, int] = {"Emergency": 8, "High": 4, "Normal": 2, "Low": 1}
+    SCHEDULER_LANE_SLO_MS: Dict[str, int] = {"Emergency": 1000, "High": 5000, "Normal": 60000, "Low": 300000}
+    SCHEDULER_LANE_BUFFER_SIZE: int = 1000  # fetched but undispatched messages per lane before it is paused
+    SCHEDULER_METRICS_INTERVAL: int = 60  # seconds between lane metrics log lines
+    SCHEDULER_RETRY_BACKOFF_MS: int = 500  # first wait before retrying a failed dispatch or an unassigned request, doubled per retry
+    SCHEDULER_RETRY_MAX_BACKOFF_MS: int = 30000
+    WORKER_LOCAL_CACHE_SIZE: int = 10000  # workers kept in each process in front of Redis, 0 disables the tier
+    WORKER_LOCAL_CACHE_TTL: float = 30  # seconds; bounds staleness if an invalidation message is missed
+    WORKER_GEO_RECONCILE_INTERVAL: int = 900  # seconds between repairs of the worker geo sets from MongoDB, 0 disables them
+    LOCATION_FLUSH_INTERVAL_MS: int = 250  # coalesced GPS pings are written to the Redis geo set this often
+    LOCATION_PERSIST_INTERVAL: int = 30  # seconds between writes of the latest positions to MongoDB
+    LOCATION_BATCH_MAX_ITEMS: int = 5000
 
     class Config:
         env_file = ".env"
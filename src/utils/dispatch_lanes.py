@@ -0,0 +1,168 @@
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from src.models.schemas import UrgencyLevel
+
+CARE_REQUESTS_TOPIC = "care_requests"
+# Highest priority first
+LANES = [UrgencyLevel.EMERGENCY, UrgencyLevel.HIGH, UrgencyLevel.NORMAL, UrgencyLevel.LOW]
+LANE_TOPICS = {urgency: f"{CARE_REQUESTS_TOPIC}.{urgency.name.lower()}" for urgency in LANES}
+TOPIC_LANES = {topic: urgency for urgency, topic in LANE_TOPICS.items()}
+
+
+def lane_topic(urgency: Any) -> str:
+    return LANE_TOPICS[UrgencyLevel(urgency)]
+
+
+class LaneMessage:
+    """A consumed care request message waiting in its lane."""
+
+    __slots__ = ("message", "lane", "enqueued_at")
+
+    def __init__(self, message: Any, lane: UrgencyLevel, enqueued_at: float):
+        self.message = message
+        self.lane = lane
+        self.enqueued_at = enqueued_at
+
+
+class LaneQueue:
+    """Per-urgency FIFO buffers drained by weighted fair sharing.
+
+    Each take() first serves messages that have outlived their lane's latency
+    SLO, highest lane first, then shares the rest of the batch between the
+    lanes by deficit round robin: every round a lane may take up to its weight
+    in messages, so higher lanes drain faster but no lane starves. Messages
+    deferred for a retry wait outside the lanes until they are due.
+    """
+
+    def __init__(self, weights: Dict[str, int], slo_ms: Dict[str, int]):
+        self.weights = {lane: max(1, int(weights.get(lane.value, 1))) for lane in LANES}
+        self.slo = {lane: slo_ms[lane.value] / 1000 if lane.value in slo_ms else None for lane in LANES}
+        self.buffers: Dict[UrgencyLevel, Deque[LaneMessage]] = {lane: deque() for lane in LANES}
+        self._deficits = dict.fromkeys(LANES, 0)
+        # Messages waiting out a retry backoff, as (due at, sequence, message)
+        self._deferred: List[Tuple[float, int, LaneMessage]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(len(buffer) for buffer in self.buffers.values())
+
+    def depth(self, lane: UrgencyLevel) -> int:
+        return len(self.buffers[lane])
+
+    def discard(self, partitions: Iterable[Any]):
+        """Drop buffered messages of partitions this consumer no longer owns."""
+        partitions = {(partition.topic, partition.partition) for partition in partitions}
+        for lane, buffer in self.buffers.items():
+            self.buffers[lane] = deque(item for item in buffer
+                                       if (item.message.topic, item.message.partition) not in partitions)
+        self._deferred = [entry for entry in self._deferred
+                          if (entry[2].message.topic, entry[2].message.partition) not in partitions]
+        heapq.heapify(self._deferred)
+
+    def put(self, message: Any, now: Optional[float] = None):
+        """Buffer a Kafka message in the lane of its topic, timed from when it was produced."""
+        now = time.time() if now is None else now
+        lane = TOPIC_LANES.get(message.topic, UrgencyLevel.NORMAL)
+        # Kafka timestamps are milliseconds since the epoch
+        timestamp = getattr(message, "timestamp", None)
+        enqueued_at = timestamp / 1000 if isinstance(timestamp, (int, float)) and timestamp > 0 else now
+        self.buffers[lane].append(LaneMessage(message, lane, enqueued_at))
+
+    def requeue(self, items: List[LaneMessage]):
+        """Put taken messages back at the head of their lanes, in order, to be taken again first."""
+        for item in reversed(items):
+            self.buffers[item.lane].appendleft(item)
+
+    def defer(self, item: LaneMessage, due_at: float):
+        """Hold a taken message back until due_at."""
+        heapq.heappush(self._deferred, (due_at, next(self._sequence), item))
+
+    def due(self, now: Optional[float] = None) -> List[LaneMessage]:
+        """Remove and return the deferred messages whose time has come."""
+        now = time.time() if now is None else now
+        due = []
+        while self._deferred and self._deferred[0][0] <= now:
+            due.append(heapq.heappop(self._deferred)[2])
+        return due
+
+    def deferred_offsets(self) -> Dict[Tuple[str, int], int]:
+        """The lowest deferred offset of each (topic, partition)."""
+        offsets: Dict[Tuple[str, int], int] = {}
+        for _, _, item in self._deferred:
+            partition = (item.message.topic, item.message.partition)
+            offsets[partition] = min(offsets.get(partition, item.message.offset), item.message.offset)
+        return offsets
+
+    def take(self, limit: int, now: Optional[float] = None) -> List[LaneMessage]:
+        """Up to limit messages, highest lane first within the batch."""
+        now = time.time() if now is None else now
+        taken: List[LaneMessage] = []
+
+        for lane in LANES:
+            buffer, slo = self.buffers[lane], self.slo[lane]
+            while slo is not None and buffer and len(taken) < limit and now - buffer[0].enqueued_at >= slo:
+                taken.append(buffer.popleft())
+
+        while len(taken) < limit and len(self):
+            for lane in LANES:
+                buffer = self.buffers[lane]
+                if not buffer:
+                    # An idle lane does not bank credit for later
+                    self._deficits[lane] = 0
+                    continue
+                self._deficits[lane] += self.weights[lane]
+                while buffer and self._deficits[lane] > 0 and len(taken) < limit:
+                    taken.append(buffer.popleft())
+                    self._deficits[lane] -= 1
+                if len(taken) >= limit:
+                    break
+
+        taken.sort(key=lambda item: LANES.index(item.lane))
+        return taken
+
+
+class LaneMetrics:
+    """Queue depth, time to assignment and SLO misses per urgency lane."""
+
+    def __init__(self, slo_ms: Dict[str, int], window: int = 1000):
+        self.slo = {lane: slo_ms[lane.value] / 1000 if lane.value in slo_ms else None for lane in LANES}
+        self.depth = dict.fromkeys(LANES, 0)
+        self.assigned = dict.fromkeys(LANES, 0)
+        self.unassigned = dict.fromkeys(LANES, 0)
+        self.slo_misses = dict.fromkeys(LANES, 0)
+        # Recent times to assignment, in seconds, for the percentiles
+        self._latencies: Dict[UrgencyLevel, Deque[float]] = {lane: deque(maxlen=window) for lane in LANES}
+
+    def record_assignment(self, lane: UrgencyLevel, seconds: float):
+        self.assigned[lane] += 1
+        self._latencies[lane].append(seconds)
+        if self.slo[lane] is not None and seconds > self.slo[lane]:
+            self.slo_misses[lane] += 1
+
+    def record_unassigned(self, lane: UrgencyLevel):
+        self.unassigned[lane] += 1
+
+    def percentile(self, lane: UrgencyLevel, q: float) -> Optional[float]:
+        latencies = self._latencies[lane]
+        return float(np.percentile(latencies, q)) if latencies else None
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            lane.value: {
+                "depth": self.depth[lane],
+                "assigned": self.assigned[lane],
+                "unassigned": self.unassigned[lane],
+                "slo_misses": self.slo_misses[lane],
+                "p50_ms": _milliseconds(self.percentile(lane, 50)),
+                "p99_ms": _milliseconds(self.percentile(lane, 99)),
+            }
+            for lane in LANES
+        }
+
+
+def _milliseconds(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 1)
@@ -0,0 +1,137 @@
+import math
+import re
+from typing import Iterable, Optional, Sequence, Set, Tuple
+import numpy as np
+from aiokafka.partitioner import DefaultPartitioner
+from src.utils.worker_index import KM_PER_DEGREE
+
+_partitioner = DefaultPartitioner()
+_CELL_KEY = re.compile(rb"^(-?\d+):(-?\d+)$")
+# Cells a grid may rank; a larger area needs larger GEO_SHARD_CELL_KM
+MAX_GRID_CELLS = 1 << 22
+
+
+def geo_cell(latitude: float, longitude: float, cell_km: float) -> Tuple[int, int]:
+    cell_deg = cell_km / KM_PER_DEGREE
+    return int(math.floor(latitude / cell_deg)), int(math.floor(longitude / cell_deg))
+
+
+def geo_cell_key(latitude: float, longitude: float, cell_km: float) -> bytes:
+    """Kafka message key of the geographic cell a location falls in."""
+    row, col = geo_cell(latitude, longitude, cell_km)
+    return f"{row}:{col}".encode()
+
+
+def _hilbert_index(side: int, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    """Position of each (x, y) along the Hilbert curve through a side x side grid."""
+    x, y = x.astype(np.int64), y.astype(np.int64)
+    d = np.zeros_like(x)
+    s = side // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        d += s * s * ((3 * rx.astype(np.int64)) ^ ry.astype(np.int64))
+        # Rotate the quadrant so the curve joins up with the next one
+        flip = ~ry & rx
+        x = np.where(flip, side - 1 - x, x)
+        y = np.where(flip, side - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s //= 2
+    return d
+
+
+class GeoGrid:
+    """The cells of the service area, in the order of a Hilbert curve through them.
+
+    A partition owns a contiguous stretch of the curve, so the cells of a
+    partition, and of a range of partitions, form a compact region rather
+    than cells scattered over the map; only where the curve leaves the
+    bounds and comes back can a stretch fall in two pieces. Cells outside
+    the bounds belong to the nearest cell inside them.
+    """
+
+    def __init__(self, bounds: Sequence[float], cell_km: float):
+        south, west, north, east = bounds
+        self.cell_km = cell_km
+        self.min_row, self.min_col = geo_cell(south, west, cell_km)
+        max_row, max_col = geo_cell(north, east, cell_km)
+        self.rows = max_row - self.min_row + 1
+        self.cols = max_col - self.min_col + 1
+        if self.rows <= 0 or self.cols <= 0:
+            raise ValueError(f"Empty geo shard bounds {tuple(bounds)}")
+        if self.rows * self.cols > MAX_GRID_CELLS:
+            raise ValueError(f"Geo shard bounds {tuple(bounds)} hold more than {MAX_GRID_CELLS} cells of {cell_km} km")
+        side = 1 << max(self.rows - 1, self.cols - 1, 1).bit_length()
+        rows, cols = np.divmod(np.arange(self.rows * self.cols), self.cols)
+        order = np.argsort(_hilbert_index(side, cols, rows), kind="stable")
+        # Each cell's place among the grid's cells along the curve
+        self.rank = np.empty(self.rows * self.cols, dtype=np.int64)
+        self.rank[order] = np.arange(self.rows * self.cols)
+
+    def __len__(self) -> int:
+        return self.rows * self.cols
+
+    def cell_partitions(self, partition_count: int) -> np.ndarray:
+        """The partition of every cell, row by row."""
+        return self.rank * partition_count // len(self)
+
+    def partition(self, cell: Tuple[int, int], partition_count: int) -> int:
+        row = min(max(cell[0] - self.min_row, 0), self.rows - 1)
+        col = min(max(cell[1] - self.min_col, 0), self.cols - 1)
+        return int(self.rank[row * self.cols + col] * partition_count // len(self))
+
+    def partition_of(self, latitude: float, longitude: float, partition_count: int) -> int:
+        return self.partition(geo_cell(latitude, longitude, self.cell_km), partition_count)
+
+
+class GeoPartitioner:
+    """Producer partitioner sending cell keys to the partition that owns the cell.
+
+    Other keys, and every key when no grid is configured, are partitioned as
+    the default partitioner does.
+    """
+
+    def __init__(self, grid: Optional[GeoGrid]):
+        self.grid = grid
+
+    def __call__(self, key: Optional[bytes], all_partitions: list, available: list) -> int:
+        match = _CELL_KEY.match(key) if key is not None and self.grid is not None else None
+        if match is None:
+            return _partitioner(key, all_partitions, available)
+        cell = int(match.group(1)), int(match.group(2))
+        return all_partitions[self.grid.partition(cell, len(all_partitions))]
+
+
+class ShardRegion:
+    """The cells one scheduler instance owns, plus a halo of workers around them.
+
+    A scheduler owns the cells the grid gives to the partitions assigned to
+    it, one contiguous region for a contiguous range of partitions. Requests
+    are dispatched by the owner of the cell they fall in; workers are kept if
+    they are within halo_km of an owned cell, so requests near a border still
+    see candidates across it.
+    """
+
+    def __init__(self, partitions: Iterable[int], partition_count: int, grid: GeoGrid, halo_km: float):
+        self.partitions: Set[int] = set(partitions)
+        self.partition_count = partition_count
+        self.grid = grid
+        self.cell_deg = grid.cell_km / KM_PER_DEGREE
+        self.halo_deg = halo_km / KM_PER_DEGREE
+        owned = np.isin(grid.cell_partitions(partition_count), list(self.partitions))
+        self._owned = owned.reshape(grid.rows, grid.cols)
+
+    def _owns_cell(self, row: int, col: int) -> bool:
+        grid = self.grid
+        return bool(self._owned[min(max(row - grid.min_row, 0), grid.rows - 1),
+                                min(max(col - grid.min_col, 0), grid.cols - 1)])
+
+    def covers(self, latitude: float, longitude: float) -> bool:
+        """Whether a worker here is within the halo of an owned cell."""
+        lon_span = self.halo_deg / max(math.cos(math.radians(min(abs(latitude) + self.halo_deg, 89.9))), 1e-6)
+        min_row = int(math.floor((latitude - self.halo_deg) / self.cell_deg))
+        max_row = int(math.floor((latitude + self.halo_deg) / self.cell_deg))
+        min_col = int(math.floor((longitude - lon_span) / self.cell_deg))
+        max_col = int(math.floor((longitude + lon_span) / self.cell_deg))
+        return any(self._owns_cell(row, col)
+                   for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1))
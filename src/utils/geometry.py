@@ -0,0 +1,337 @@
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+Ring = List[Tuple[float, float]]
+
+MAX_EDGE_BUCKETS = 4096
+EARTH_RADIUS_KM = 6371
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distances in kilometers between points in degrees, broadcast like NumPy operands."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def rings_from_geometry(geometry: Dict[str, Any]) -> List[Ring]:
+    """Collect every ring of a GeoJSON object or an ArcGIS (Esri JSON) polygon."""
+    if geometry is None:
+        return []
+    if "rings" in geometry:
+        return [_to_ring(ring) for ring in geometry["rings"]]
+
+    geometry_type = geometry.get("type")
+    if geometry_type == "FeatureCollection":
+        rings = []
+        for feature in geometry.get("features", []):
+            rings.extend(rings_from_geometry(feature))
+        return rings
+    if geometry_type == "Feature":
+        return rings_from_geometry(geometry.get("geometry"))
+    if geometry_type == "GeometryCollection":
+        rings = []
+        for part in geometry.get("geometries", []):
+            rings.extend(rings_from_geometry(part))
+        return rings
+    if geometry_type == "Polygon":
+        return [_to_ring(ring) for ring in geometry["coordinates"]]
+    if geometry_type == "MultiPolygon":
+        return [_to_ring(ring) for polygon in geometry["coordinates"] for ring in polygon]
+    raise ValueError(f"Unsupported geometry type: {geometry_type}")
+
+
+def _to_ring(coordinates: Sequence[Sequence[float]]) -> Ring:
+    return [(float(point[0]), float(point[1])) for point in coordinates]
+
+
+def _ring_contains(ring: Ring, x: float, y: float) -> bool:
+    inside = False
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1]):
+        if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+            inside = not inside
+    return inside
+
+
+class PreparedPolygon:
+    """Polygon (or multipolygon with holes) prepared for fast point-in-polygon tests.
+
+    Coordinates are (x, y) = (longitude, latitude). Containment uses the even-odd
+    rule: a bounding-box reject, then a ray cast against only the edges stored in
+    the horizontal band the point falls in.
+    """
+
+    def __init__(self, rings: List[Ring], bucket_count: Optional[int] = None):
+        rings = [ring for ring in rings if len(ring) >= 3]
+        if not rings:
+            raise ValueError("Polygon has no rings with at least three points")
+        self.rings = rings
+
+        edges = []
+        for ring in rings:
+            closed = ring if ring[0] == ring[-1] else ring + [ring[0]]
+            for (x1, y1), (x2, y2) in zip(closed[:-1], closed[1:]):
+                # Horizontal edges never cross a horizontal ray
+                if y1 != y2:
+                    edges.append((x1, y1, x2, y2))
+        if not edges:
+            raise ValueError("Polygon has no non-degenerate edges")
+
+        all_points = np.array([point for ring in rings for point in ring], dtype=np.float64)
+        self.min_x, self.min_y = all_points.min(axis=0)
+        self.max_x, self.max_y = all_points.max(axis=0)
+
+        edge_array = np.array(edges, dtype=np.float64)
+        self._x1, self._y1, self._x2, self._y2 = edge_array.T
+        self._inv_slope = (self._x2 - self._x1) / (self._y2 - self._y1)
+
+        self._bucket_count = bucket_count or max(1, min(MAX_EDGE_BUCKETS, len(edges)))
+        self._bucket_height = (self.max_y - self.min_y) / self._bucket_count or 1.0
+        first = self._bucket_of(np.minimum(self._y1, self._y2))
+        last = self._bucket_of(np.maximum(self._y1, self._y2))
+
+        bucket_edges: List[List[int]] = [[] for _ in range(self._bucket_count)]
+        for edge_index, (start, stop) in enumerate(zip(first.tolist(), last.tolist())):
+            for bucket in range(start, stop + 1):
+                bucket_edges[bucket].append(edge_index)
+
+        # Index arrays for the vectorized path, plain tuples for the scalar one
+        self._bucket_index = [np.array(indexes, dtype=np.intp) for indexes in bucket_edges]
+        self._bucket_tuples = [
+            [(edges[i][0], edges[i][1], edges[i][3], float(self._inv_slope[i])) for i in indexes]
+            for indexes in bucket_edges
+        ]
+        self.mask: Optional["RasterMask"] = None
+
+    def build_mask(self, grid_size: int = 256, refine: int = 4, max_cells: int = 1_048_576) -> "RasterMask":
+        self.mask = RasterMask(self, grid_size, refine, max_cells)
+        return self.mask
+
+    @classmethod
+    def from_geometry(cls, geometry: Dict[str, Any], bucket_count: Optional[int] = None) -> "PreparedPolygon":
+        return cls(rings_from_geometry(geometry), bucket_count)
+
+    @property
+    def bounds(self) -> Tuple[float, float, float, float]:
+        return float(self.min_x), float(self.min_y), float(self.max_x), float(self.max_y)
+
+    def _bucket_of(self, y):
+        bucket = ((y - self.min_y) / self._bucket_height).astype(np.intp)
+        return np.clip(bucket, 0, self._bucket_count - 1)
+
+    def contains(self, x: float, y: float) -> bool:
+        if x < self.min_x or x > self.max_x or y < self.min_y or y > self.max_y:
+            return False
+        bucket = min(int((y - self.min_y) / self._bucket_height), self._bucket_count - 1)
+        inside = False
+        for x1, y1, y2, inv_slope in self._bucket_tuples[bucket]:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * inv_slope:
+                inside = not inside
+        return inside
+
+    def contains_many(self, xs, ys) -> np.ndarray:
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        result = np.zeros(xs.shape, dtype=bool)
+
+        candidates = np.flatnonzero(
+            (xs >= self.min_x) & (xs <= self.max_x) & (ys >= self.min_y) & (ys <= self.max_y)
+        )
+        if candidates.size == 0:
+            return result
+
+        buckets = self._bucket_of(ys[candidates])
+        order = np.argsort(buckets, kind="stable")
+        candidates, buckets = candidates[order], buckets[order]
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        stops = np.r_[starts[1:], buckets.size]
+
+        for start, stop in zip(starts, stops):
+            edge_index = self._bucket_index[buckets[start]]
+            if edge_index.size == 0:
+                continue
+            points = candidates[start:stop]
+            px = xs[points][:, None]
+            py = ys[points][:, None]
+            y1 = self._y1[edge_index]
+            crossings = ((y1 > py) != (self._y2[edge_index] > py)) & (
+                px < self._x1[edge_index] + (py - y1) * self._inv_slope[edge_index]
+            )
+            result[points] = np.count_nonzero(crossings, axis=1) % 2 == 1
+        return result
+
+    def polygons(self) -> List[List[Ring]]:
+        """The rings grouped into polygons, each an outer ring followed by its holes.
+
+        Under the even-odd rule a ring inside an odd number of other rings is
+        a hole, and belongs to the innermost ring around it.
+        """
+        enclosing = [
+            [other for other, outer in enumerate(self.rings) if other != index and _ring_contains(outer, *ring[0])]
+            for index, ring in enumerate(self.rings)
+        ]
+        polygons: Dict[int, List[Ring]] = {}
+        for index, ring in enumerate(self.rings):
+            if len(enclosing[index]) % 2 == 0:
+                polygons[index] = [ring]
+        for index, ring in enumerate(self.rings):
+            if len(enclosing[index]) % 2 == 1:
+                parent = max(enclosing[index], key=lambda outer: len(enclosing[outer]))
+                polygons[parent].append(ring)
+        return list(polygons.values())
+
+    def to_geojson(self) -> Dict[str, Any]:
+        polygons = [[[list(point) for point in ring] for ring in polygon] for polygon in self.polygons()]
+        if len(polygons) == 1:
+            geometry = {"type": "Polygon", "coordinates": polygons[0]}
+        else:
+            geometry = {"type": "MultiPolygon", "coordinates": polygons}
+        return {"type": "Feature", "properties": {}, "geometry": geometry}
+
+
+def load_geojson(path: str) -> PreparedPolygon:
+    with open(path, "r", encoding="utf-8") as f:
+        return PreparedPolygon.from_geometry(json.load(f))
+
+
+OUTSIDE, INSIDE, BOUNDARY = 0, 1, 2
+
+
+class RasterMask:
+    """Two-level grid over a polygon's bounding box.
+
+    Every coarse cell is classified as fully inside, fully outside or boundary
+    (crossed or touched by an edge). Boundary cells are subdivided into
+    ``refine x refine`` sub-cells while the total cell count stays within
+    ``max_cells``; only points that still land on a boundary sub-cell need an
+    exact polygon test.
+    """
+
+    def __init__(self, polygon: PreparedPolygon, grid_size: int = 256, refine: int = 4, max_cells: int = 1_048_576):
+        self.min_x, self.min_y, max_x, max_y = polygon.bounds
+        width, height = max_x - self.min_x, max_y - self.min_y
+        self.cell_size = max(width, height) / grid_size or 1.0
+        self.cols = max(1, int(np.ceil(width / self.cell_size)))
+        self.rows = max(1, int(np.ceil(height / self.cell_size)))
+        if self.rows * self.cols > max_cells:
+            scale = np.sqrt(self.rows * self.cols / max_cells)
+            self.cell_size *= scale
+            self.cols = max(1, int(width / self.cell_size))
+            self.rows = max(1, int(height / self.cell_size))
+            self.cell_size = max(width / self.cols, height / self.rows)
+
+        edges = np.array([
+            (x1, y1, x2, y2)
+            for ring in polygon.rings
+            for (x1, y1), (x2, y2) in zip(ring, ring[1:] + ring[:1])
+            if (x1, y1) != (x2, y2)
+        ], dtype=np.float64)
+
+        boundary = _boundary_cells(edges, self.min_x, self.min_y, self.cell_size, self.rows, self.cols)
+        self.coarse = self._classify(polygon, boundary, self.rows, self.cols, self.cell_size)
+
+        self.refine = refine
+        self.fine_index = np.full((self.rows, self.cols), -1, dtype=np.int32)
+        boundary_cells = np.flatnonzero(self.coarse.ravel() == BOUNDARY)
+        if refine > 1 and boundary_cells.size and self.rows * self.cols + boundary_cells.size * refine * refine <= max_cells:
+            self.fine_index.ravel()[boundary_cells] = np.arange(boundary_cells.size, dtype=np.int32)
+            fine_size = self.cell_size / refine
+            fine_rows, fine_cols = self.rows * refine, self.cols * refine
+            fine_boundary = _boundary_cells(edges, self.min_x, self.min_y, fine_size, fine_rows, fine_cols)
+            # Sub-cells of every boundary cell, laid out as (cell, sub_row, sub_col)
+            sub_rows, sub_cols = np.divmod(np.arange(refine * refine), refine)
+            cell_rows, cell_cols = np.divmod(boundary_cells, self.cols)
+            rows = (cell_rows[:, None] * refine + sub_rows[None, :]).ravel()
+            cols = (cell_cols[:, None] * refine + sub_cols[None, :]).ravel()
+            flat = rows * fine_cols + cols
+            codes = np.where(np.isin(flat, fine_boundary), BOUNDARY, OUTSIDE).astype(np.uint8)
+            interior = codes != BOUNDARY
+            codes[interior] = np.where(polygon.contains_many(
+                self.min_x + (cols[interior] + 0.5) * fine_size,
+                self.min_y + (rows[interior] + 0.5) * fine_size
+            ), INSIDE, OUTSIDE)
+            self.fine = codes.reshape(boundary_cells.size, refine, refine)
+        else:
+            self.fine = np.zeros((0, refine, refine), dtype=np.uint8)
+
+        # Flat memoryviews index to plain ints, much cheaper than numpy scalar access
+        self._coarse_view = memoryview(self.coarse.ravel())
+        self._fine_index_view = memoryview(self.fine_index.ravel())
+        self._fine_view = memoryview(self.fine.ravel())
+
+    def _classify(self, polygon: PreparedPolygon, boundary: np.ndarray, rows: int, cols: int, cell_size: float) -> np.ndarray:
+        codes = np.zeros(rows * cols, dtype=np.uint8)
+        codes[boundary] = BOUNDARY
+        # A cell no edge touches lies entirely on one side, so its center decides it
+        interior = np.flatnonzero(codes != BOUNDARY)
+        cell_rows, cell_cols = np.divmod(interior, cols)
+        codes[interior] = np.where(polygon.contains_many(
+            self.min_x + (cell_cols + 0.5) * cell_size,
+            self.min_y + (cell_rows + 0.5) * cell_size
+        ), INSIDE, OUTSIDE)
+        return codes.reshape(rows, cols)
+
+    @property
+    def nbytes(self) -> int:
+        return self.coarse.nbytes + self.fine_index.nbytes + self.fine.nbytes
+
+    def lookup(self, x: float, y: float) -> int:
+        gx = (x - self.min_x) / self.cell_size
+        gy = (y - self.min_y) / self.cell_size
+        if gx < 0 or gy < 0 or gx > self.cols or gy > self.rows:
+            return OUTSIDE
+        col = min(int(gx), self.cols - 1)
+        row = min(int(gy), self.rows - 1)
+        code = self._coarse_view[row * self.cols + col]
+        if code != BOUNDARY:
+            return code
+        fine = self._fine_index_view[row * self.cols + col]
+        if fine < 0:
+            return BOUNDARY
+        sub_col = min(int((gx - col) * self.refine), self.refine - 1)
+        sub_row = min(int((gy - row) * self.refine), self.refine - 1)
+        return self._fine_view[(fine * self.refine + sub_row) * self.refine + sub_col]
+
+    def lookup_many(self, xs, ys) -> np.ndarray:
+        gx = (np.asarray(xs, dtype=np.float64) - self.min_x) / self.cell_size
+        gy = (np.asarray(ys, dtype=np.float64) - self.min_y) / self.cell_size
+        in_grid = (gx >= 0) & (gy >= 0) & (gx <= self.cols) & (gy <= self.rows)
+        col = np.clip(gx, 0, self.cols - 1).astype(np.intp)
+        row = np.clip(gy, 0, self.rows - 1).astype(np.intp)
+        codes = np.where(in_grid, self.coarse[row, col], OUTSIDE).astype(np.uint8)
+
+        fine = np.where(codes == BOUNDARY, self.fine_index[row, col], -1)
+        refined = np.flatnonzero(fine >= 0)
+        if refined.size:
+            sub_col = np.clip((gx[refined] - col[refined]) * self.refine, 0, self.refine - 1).astype(np.intp)
+            sub_row = np.clip((gy[refined] - row[refined]) * self.refine, 0, self.refine - 1).astype(np.intp)
+            codes[refined] = self.fine[fine[refined], sub_row, sub_col]
+        return codes
+
+
+def _boundary_cells(edges: np.ndarray, min_x: float, min_y: float, cell_size: float, rows: int, cols: int) -> np.ndarray:
+    """Flat indexes of the grid cells that any edge crosses or touches."""
+    marked = []
+    for x1, y1, x2, y2 in edges:
+        col0 = max(int(np.floor((min(x1, x2) - min_x) / cell_size)), 0)
+        col1 = min(int(np.floor((max(x1, x2) - min_x) / cell_size)), cols - 1)
+        row0 = max(int(np.floor((min(y1, y2) - min_y) / cell_size)), 0)
+        row1 = min(int(np.floor((max(y1, y2) - min_y) / cell_size)), rows - 1)
+        cell_rows, cell_cols = np.meshgrid(np.arange(row0, row1 + 1), np.arange(col0, col1 + 1), indexing="ij")
+        cell_rows, cell_cols = cell_rows.ravel(), cell_cols.ravel()
+        if cell_rows.size > 1:
+            # Separating axis test: the segment misses a cell in its bounding box
+            # only when all four corners lie strictly on one side of its line
+            x0 = min_x + cell_cols * cell_size
+            y0 = min_y + cell_rows * cell_size
+            sides = np.stack([
+                (x2 - x1) * (corner_y - y1) - (y2 - y1) * (corner_x - x1)
+                for corner_x, corner_y in ((x0, y0), (x0 + cell_size, y0), (x0, y0 + cell_size), (x0 + cell_size, y0 + cell_size))
+            ])
+            hit = ~(np.all(sides > 0, axis=0) | np.all(sides < 0, axis=0))
+            cell_rows, cell_cols = cell_rows[hit], cell_cols[hit]
+        marked.append(cell_rows * cols + cell_cols)
+    if not marked:
+        return np.zeros(0, dtype=np.intp)
+    return np.unique(np.concatenate(marked))
@@ -1,20 +1,38 @@
 from aiokafka import AIOKafkaProducer, AIOKafkaConsumer
 from src.utils.config import Settings
+from src.utils.geo_sharding import GeoGrid, GeoPartitioner
 
 settings = Settings()
 
-async def get_kafka_producer():
-    producer = AIOKafkaProducer(bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
+async def start_kafka_producer() -> AIOKafkaProducer:
+    """A started producer; the caller owns it and stops it."""
+    producer = AIOKafkaProducer(
+        bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS,
+        # Wait a little for more messages so each request to the broker carries a full batch
+        linger_ms=settings.KAFKA_PRODUCER_LINGER_MS,
+        max_batch_size=settings.KAFKA_PRODUCER_BATCH_SIZE,
+        compression_type=settings.KAFKA_PRODUCER_COMPRESSION,
+        # Care requests keyed by cell go to the partition whose region the cell is in
+        partitioner=GeoPartitioner(GeoGrid(settings.GEO_SHARD_BOUNDS, settings.GEO_SHARD_CELL_KM)
+                                   if settings.GEO_SHARD_BOUNDS else None),
+    )
     await producer.start()
-    try:
-        yield producer
-    finally:
-        await producer.stop()
+    return producer
 
-async def get_kafka_consumer(topic):
-    consumer = AIOKafkaConsumer(topic, bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS)
+async def start_kafka_consumer(*topics, listener=None, **kwargs) -> AIOKafkaConsumer:
+    """A started consumer; the caller owns it and stops it."""
+    if listener is None:
+        consumer = AIOKafkaConsumer(*topics, bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS, **kwargs)
+    else:
+        # A rebalance listener can only be given through subscribe()
+        consumer = AIOKafkaConsumer(bootstrap_servers=settings.KAFKA_BOOTSTRAP_SERVERS, **kwargs)
+        consumer.subscribe(topics=list(topics), listener=listener)
     await consumer.start()
+    return consumer
+
+async def get_kafka_consumer(*topics, listener=None, **kwargs):
+    consumer = await start_kafka_consumer(*topics, listener=listener, **kwargs)
     try:
         yield consumer
     finally:
-        await consumer.stop()
\ No newline at end of file
+        await consumer.stop()
@@ -1,11 +1,46 @@
-from redis.asyncio import Redis
+from redis.asyncio import BlockingConnectionPool, Redis
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError, TimeoutError
 from src.utils.config import Settings
 
 settings = Settings()
 
+class RedisClient:
+    client: Redis = None # type: ignore
+
+redis_client = RedisClient()
+
+async def connect_to_redis() -> Redis:
+    """Create the process-wide client; every command borrows a connection from its pool."""
+    pool = BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        encoding="utf-8",
+        decode_responses=True,
+        # Callers wait up to REDIS_POOL_TIMEOUT for a free connection rather than opening more
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+        # Idle connections are PINGed before reuse, and dropped ones reconnect with backoff
+        health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+        retry=Retry(ExponentialBackoff(cap=1, base=0.05), settings.REDIS_RETRY_ATTEMPTS),
+        retry_on_error=[ConnectionError, TimeoutError],
+    )
+    redis_client.client = Redis(connection_pool=pool)
+    return redis_client.client
+
+async def close_redis_connection():
+    if redis_client.client:
+        await redis_client.client.aclose()
+        await redis_client.client.connection_pool.disconnect()
+        redis_client.client = None
+
+async def get_redis_client() -> Redis:
+    if not redis_client.client:
+        await connect_to_redis()
+    return redis_client.client
+
 async def get_redis():
-    redis = Redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
-    try:
-        yield redis
-    finally:
-        await redis.close()
\ No newline at end of file
+    # Dependency form of get_redis_client; the shared client outlives the request
+    yield await get_redis_client()
@@ -0,0 +1,294 @@
+import heapq
+import json
+import math
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from src.utils.geometry import haversine_km
+
+# Typical urban driving speeds by OSM highway class, in km/h
+HIGHWAY_SPEEDS_KMH = {
+    "motorway": 90, "motorway_link": 50,
+    "trunk": 70, "trunk_link": 40,
+    "primary": 50, "primary_link": 35,
+    "secondary": 40, "secondary_link": 30,
+    "tertiary": 35, "tertiary_link": 25,
+    "unclassified": 30, "residential": 25, "living_street": 10,
+    "service": 15, "track": 10,
+}
+DEFAULT_SPEED_KMH = 30
+# Speed for the straight-line hop between a location and its nearest road node
+ACCESS_SPEED_KMH = 15
+
+
+
+def _parse_speed(properties: dict) -> float:
+    maxspeed = properties.get("maxspeed")
+    if maxspeed is not None:
+        match = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", str(maxspeed))
+        if match:
+            speed = float(match.group(1))
+            return speed * 1.609344 if match.group(2) else speed
+    return HIGHWAY_SPEEDS_KMH.get(properties.get("highway"), DEFAULT_SPEED_KMH)
+
+
+def _parse_oneway(properties: dict) -> int:
+    """1 for forward-only, -1 for reverse-only, 0 for both directions."""
+    oneway = str(properties.get("oneway", "no")).lower()
+    if oneway in ("yes", "true", "1"):
+        return 1
+    if oneway == "-1":
+        return -1
+    return 0
+
+
+class RoadNetwork:
+    """Directed road graph answering travel-time queries in minutes.
+
+    Point-to-point queries use ALT: A* guided by lower bounds from the
+    triangle inequality against a few precomputed landmarks. One-to-many
+    queries run a single Dijkstra search that stops once every target is
+    settled; targets the landmark bounds prove unreachable, or farther than
+    ``max_minutes``, are dropped first so they cannot drag the search over
+    the whole graph. Locations are snapped to their nearest node through a uniform
+    grid, and the snap distance is charged at ``ACCESS_SPEED_KMH``.
+    """
+
+    def __init__(self, node_lats: Sequence[float], node_lons: Sequence[float],
+                 edges: Iterable[Tuple[int, int, float]], landmark_count: int = 8, snap_cell_deg: float = 0.005,
+                 max_snap_km: float = 5.0):
+        self.node_lats = np.asarray(node_lats, dtype=np.float64)
+        self.node_lons = np.asarray(node_lons, dtype=np.float64)
+        node_count = len(self.node_lats)
+
+        self.forward: List[List[Tuple[int, float]]] = [[] for _ in range(node_count)]
+        self.backward: List[List[Tuple[int, float]]] = [[] for _ in range(node_count)]
+        for u, v, minutes in edges:
+            self.forward[u].append((v, minutes))
+            self.backward[v].append((u, minutes))
+
+        self.snap_cell_deg = snap_cell_deg
+        self.max_snap_km = max_snap_km
+        self._snap_grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for node, (lat, lon) in enumerate(zip(self.node_lats.tolist(), self.node_lons.tolist())):
+            self._snap_grid[self._cell(lat, lon)].append(node)
+
+        self.landmarks: List[int] = []
+        self._from_landmarks = np.zeros((node_count, 0))
+        self._to_landmarks = np.zeros((node_count, 0))
+        if node_count and landmark_count:
+            self._select_landmarks(landmark_count)
+
+    @classmethod
+    def from_geojson(cls, path: str, landmark_count: int = 8, precision: int = 7) -> "RoadNetwork":
+        """Build the graph from LineString features, e.g. roads exported from an OSM extract.
+
+        Vertices shared by features (after rounding to ``precision`` decimals)
+        become junctions. ``maxspeed``, ``highway`` and ``oneway`` properties
+        are honoured when present.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        node_ids: Dict[Tuple[float, float], int] = {}
+        lats: List[float] = []
+        lons: List[float] = []
+        edges: List[Tuple[int, int, float]] = []
+
+        def node_for(point):
+            key = (round(point[1], precision), round(point[0], precision))
+            if key not in node_ids:
+                node_ids[key] = len(lats)
+                lats.append(key[0])
+                lons.append(key[1])
+            return node_ids[key]
+
+        features = data.get("features", [data]) if data.get("type") == "FeatureCollection" else [data]
+        for feature in features:
+            geometry = feature.get("geometry") or {}
+            properties = feature.get("properties") or {}
+            if geometry.get("type") == "LineString":
+                lines = [geometry["coordinates"]]
+            elif geometry.get("type") == "MultiLineString":
+                lines = geometry["coordinates"]
+            else:
+                continue
+            speed_kmh = _parse_speed(properties)
+            oneway = _parse_oneway(properties)
+            for line in lines:
+                nodes = [node_for(point) for point in line]
+                for u, v in zip(nodes[:-1], nodes[1:]):
+                    if u == v:
+                        continue
+                    minutes = float(haversine_km(lats[u], lons[u], lats[v], lons[v])) / speed_kmh * 60
+                    if oneway >= 0:
+                        edges.append((u, v, minutes))
+                    if oneway <= 0:
+                        edges.append((v, u, minutes))
+
+        return cls(lats, lons, edges, landmark_count)
+
+    def __len__(self) -> int:
+        return len(self.node_lats)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.snap_cell_deg)), int(math.floor(lon / self.snap_cell_deg))
+
+    def nearest_node(self, lat: float, lon: float) -> Tuple[int, float]:
+        """Nearest node to (lat, lon) and its distance in kilometers, or -1 if none is within max_snap_km."""
+        if not len(self):
+            return -1, math.inf
+        row, col = self._cell(lat, lon)
+        best_node, best_km = -1, math.inf
+        ring = 0
+        # Grow square rings of cells until everything unscanned is provably farther than the best hit
+        while True:
+            cells = [(row + dr, col + dc) for dr in range(-ring, ring + 1) for dc in range(-ring, ring + 1)
+                     if max(abs(dr), abs(dc)) == ring]
+            candidates = [node for cell in cells for node in self._snap_grid.get(cell, ())]
+            if candidates:
+                distances = haversine_km(lat, lon, self.node_lats[candidates], self.node_lons[candidates])
+                index = int(np.argmin(distances))
+                if distances[index] < best_km:
+                    best_node, best_km = candidates[index], float(distances[index])
+            unscanned_km = ring * self.snap_cell_deg * 111.32 * max(math.cos(math.radians(lat)), 0.01)
+            if best_node >= 0 and best_km <= unscanned_km:
+                return best_node, best_km
+            if unscanned_km > self.max_snap_km:
+                return (best_node, best_km) if best_km <= self.max_snap_km else (-1, math.inf)
+            ring += 1
+
+    def _dijkstra(self, graph: List[List[Tuple[int, float]]], source: int,
+                  targets: Optional[set] = None, max_minutes: float = math.inf) -> Dict[int, float]:
+        settled: Dict[int, float] = {}
+        queue = [(0.0, source)]
+        remaining = set(targets) if targets is not None else None
+        while queue:
+            minutes, node = heapq.heappop(queue)
+            if node in settled:
+                continue
+            if minutes > max_minutes:
+                break
+            settled[node] = minutes
+            if remaining is not None:
+                remaining.discard(node)
+                if not remaining:
+                    break
+            for neighbor, weight in graph[node]:
+                if neighbor not in settled:
+                    heapq.heappush(queue, (minutes + weight, neighbor))
+        return settled
+
+    def _select_landmarks(self, count: int):
+        # Farthest-point selection spreads landmarks towards the edges of the network
+        node_count = len(self)
+        from_landmarks, to_landmarks = [], []
+        nearest = np.full(node_count, np.inf)
+        candidate = int(np.argmin(self.node_lats + self.node_lons))
+        for _ in range(min(count, node_count)):
+            self.landmarks.append(candidate)
+            forward = np.full(node_count, np.inf)
+            for node, minutes in self._dijkstra(self.forward, candidate).items():
+                forward[node] = minutes
+            backward = np.full(node_count, np.inf)
+            for node, minutes in self._dijkstra(self.backward, candidate).items():
+                backward[node] = minutes
+            from_landmarks.append(forward)
+            to_landmarks.append(backward)
+
+            nearest = np.minimum(nearest, forward)
+            spread = np.where(np.isfinite(nearest), nearest, -1.0)
+            spread[self.landmarks] = -1.0
+            if spread.max() <= 0:
+                break
+            candidate = int(np.argmax(spread))
+        self._from_landmarks = np.column_stack(from_landmarks)
+        self._to_landmarks = np.column_stack(to_landmarks)
+
+    def _lower_bounds(self, target: int) -> List[float]:
+        """Triangle-inequality lower bounds on the travel time from every node to ``target``."""
+        if not self.landmarks:
+            return [0.0] * len(self)
+        with np.errstate(invalid="ignore"):
+            # d(v, t) >= d(L, t) - d(L, v) and d(v, t) >= d(v, L) - d(t, L)
+            bounds = np.fmax(
+                np.fmax.reduce(self._from_landmarks[target] - self._from_landmarks, axis=1),
+                np.fmax.reduce(self._to_landmarks - self._to_landmarks[target], axis=1),
+            )
+        return np.fmax(np.nan_to_num(bounds, nan=0.0, posinf=np.inf), 0.0).tolist()
+
+    def _target_bounds(self, graph: List[List[Tuple[int, float]]], source: int, targets: np.ndarray) -> np.ndarray:
+        """Lower bounds on the minutes between ``source`` and each target, in the direction ``graph`` searches."""
+        if not self.landmarks or not len(targets):
+            return np.zeros(len(targets))
+        from_landmarks, to_landmarks = self._from_landmarks, self._to_landmarks
+        with np.errstate(invalid="ignore"):
+            if graph is self.forward:
+                # d(s, t) >= d(L, t) - d(L, s) and d(s, t) >= d(s, L) - d(t, L)
+                bounds = np.fmax(np.fmax.reduce(from_landmarks[targets] - from_landmarks[source], axis=1),
+                                 np.fmax.reduce(to_landmarks[source] - to_landmarks[targets], axis=1))
+            else:
+                # d(t, s) >= d(L, s) - d(L, t) and d(t, s) >= d(t, L) - d(s, L)
+                bounds = np.fmax(np.fmax.reduce(from_landmarks[source] - from_landmarks[targets], axis=1),
+                                 np.fmax.reduce(to_landmarks[targets] - to_landmarks[source], axis=1))
+        return np.fmax(np.nan_to_num(bounds, nan=0.0, posinf=np.inf), 0.0)
+
+    def shortest_path_minutes(self, source: int, target: int) -> float:
+        if source == target:
+            return 0.0
+        bounds = self._lower_bounds(target)
+        best = {source: 0.0}
+        queue = [(bounds[source], 0.0, source)]
+        settled = set()
+        while queue:
+            _, minutes, node = heapq.heappop(queue)
+            if node == target:
+                return minutes
+            if node in settled:
+                continue
+            settled.add(node)
+            for neighbor, weight in self.forward[node]:
+                candidate = minutes + weight
+                if candidate < best.get(neighbor, math.inf) and bounds[neighbor] != math.inf:
+                    best[neighbor] = candidate
+                    heapq.heappush(queue, (candidate + bounds[neighbor], candidate, neighbor))
+        return math.inf
+
+    def travel_time(self, origin_lat: float, origin_lon: float, destination_lat: float, destination_lon: float) -> float:
+        source, source_km = self.nearest_node(origin_lat, origin_lon)
+        target, target_km = self.nearest_node(destination_lat, destination_lon)
+        if source < 0 or target < 0:
+            return math.inf
+        access_minutes = (source_km + target_km) / ACCESS_SPEED_KMH * 60
+        return self.shortest_path_minutes(source, target) + access_minutes
+
+    def travel_times(self, origin_lat: float, origin_lon: float, lats: Sequence[float], lons: Sequence[float],
+                     max_minutes: float = math.inf) -> np.ndarray:
+        """Minutes from the origin to every destination with one Dijkstra search (inf if unreachable)."""
+        return self._one_to_many(self.forward, origin_lat, origin_lon, lats, lons, max_minutes)
+
+    def travel_times_to(self, destination_lat: float, destination_lon: float, lats: Sequence[float],
+                        lons: Sequence[float], max_minutes: float = math.inf) -> np.ndarray:
+        """Minutes from every origin to the destination, searching the reversed graph once."""
+        return self._one_to_many(self.backward, destination_lat, destination_lon, lats, lons, max_minutes)
+
+    def _one_to_many(self, graph: List[List[Tuple[int, float]]], lat: float, lon: float,
+                     lats: Sequence[float], lons: Sequence[float], max_minutes: float) -> np.ndarray:
+        result = np.full(len(lats), np.inf)
+        source, source_km = self.nearest_node(lat, lon)
+        if source < 0:
+            return result
+        snapped = [self.nearest_node(other_lat, other_lon) for other_lat, other_lon in zip(lats, lons)]
+        nodes = np.unique([node for node, _ in snapped if node >= 0]).astype(np.int64)
+        # An unreachable target would otherwise keep the search going until it has settled every node it can reach
+        bounds = self._target_bounds(graph, source, nodes)
+        nodes = nodes[np.isfinite(bounds) & (bounds <= max_minutes)]
+        if not len(nodes):
+            return result
+        settled = self._dijkstra(graph, source, set(nodes.tolist()), max_minutes)
+        source_minutes = source_km / ACCESS_SPEED_KMH * 60
+        for index, (node, km) in enumerate(snapped):
+            if node in settled:
+                result[index] = settled[node] + source_minutes + km / ACCESS_SPEED_KMH * 60
+        return result
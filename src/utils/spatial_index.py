@@ -0,0 +1,147 @@
+import math
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+from src.utils.geometry import PreparedPolygon
+
+BBox = Tuple[float, float, float, float]
+
+
+class STRTree:
+    """Static R-tree bulk-loaded with Sort-Tile-Recursive packing.
+
+    Each level is a (n, 4) array of (min_x, min_y, max_x, max_y) boxes. Packing
+    keeps the children of a node contiguous in the level below, so a node only
+    stores the [start, stop) range of its children.
+    """
+
+    def __init__(self, entries: Sequence[Tuple[BBox, Any]], node_capacity: int = 16):
+        self.node_capacity = node_capacity
+        self.items: List[Any] = []
+        self.levels: List[np.ndarray] = []
+        self.children: List[np.ndarray] = []
+        if not entries:
+            return
+
+        boxes = np.array([bbox for bbox, _ in entries], dtype=np.float64)
+        order = self._str_order(boxes)
+        self.items = [entries[i][1] for i in order]
+        level = boxes[order]
+        self.levels.append(level)
+
+        while len(level) > 1:
+            # Consecutive runs of a level in STR order form the parent nodes
+            starts = np.arange(0, len(level), node_capacity)
+            stops = np.minimum(starts + node_capacity, len(level))
+            parents = np.column_stack([
+                np.minimum.reduceat(level[:, 0], starts),
+                np.minimum.reduceat(level[:, 1], starts),
+                np.maximum.reduceat(level[:, 2], starts),
+                np.maximum.reduceat(level[:, 3], starts),
+            ])
+            # Sorting the parents only permutes their child ranges, which stay contiguous
+            order = self._str_order(parents)
+            self.children.append(np.column_stack([starts, stops])[order])
+            level = parents[order]
+            self.levels.append(level)
+
+    def _str_order(self, boxes: np.ndarray) -> np.ndarray:
+        centers_x = (boxes[:, 0] + boxes[:, 2]) / 2
+        centers_y = (boxes[:, 1] + boxes[:, 3]) / 2
+        leaf_count = math.ceil(len(boxes) / self.node_capacity)
+        slice_size = math.ceil(math.sqrt(leaf_count)) * self.node_capacity
+        by_x = np.argsort(centers_x, kind="stable")
+        return np.concatenate([
+            chunk[np.argsort(centers_y[chunk], kind="stable")]
+            for chunk in np.array_split(by_x, range(slice_size, len(by_x), slice_size))
+        ])
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def query_point(self, x: float, y: float) -> List[Any]:
+        if not self.levels:
+            return []
+        top = len(self.levels) - 1
+        candidates = np.arange(len(self.levels[top]))
+        for level_index in range(top, -1, -1):
+            boxes = self.levels[level_index][candidates]
+            candidates = candidates[(boxes[:, 0] <= x) & (boxes[:, 2] >= x) & (boxes[:, 1] <= y) & (boxes[:, 3] >= y)]
+            if candidates.size == 0:
+                return []
+            if level_index == 0:
+                return [self.items[i] for i in candidates]
+            ranges = self.children[level_index - 1][candidates]
+            candidates = _expand_ranges(ranges[:, 0], ranges[:, 1])
+        return []
+
+
+def _expand_ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Concatenate ``arange(start, stop)`` for every pair without a Python loop."""
+    lengths = stops - starts
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+class CoverageIndex:
+    """Which polygons cover a point, keyed by an id.
+
+    Polygons live in a packed STRTree plus a small unpacked delta of recent
+    inserts and updates. Updated or removed ids are masked out of the packed
+    tree until the delta grows past ``rebuild_threshold`` and everything is
+    repacked.
+    """
+
+    def __init__(self, rebuild_threshold: int = 64, node_capacity: int = 16):
+        self.rebuild_threshold = rebuild_threshold
+        self.node_capacity = node_capacity
+        self.polygons: Dict[Hashable, PreparedPolygon] = {}
+        self.anchors: Dict[Hashable, Tuple[float, float]] = {}
+        self._tree = STRTree([], node_capacity)
+        self._packed: Set[Hashable] = set()
+        self._pending: Dict[Hashable, BBox] = {}
+        self._stale: Set[Hashable] = set()
+
+    def __len__(self) -> int:
+        return len(self.polygons)
+
+    def rebuild(self, entries: Optional[Dict[Hashable, Tuple[PreparedPolygon, Tuple[float, float]]]] = None):
+        if entries is not None:
+            self.polygons = {key: polygon for key, (polygon, _) in entries.items()}
+            self.anchors = {key: anchor for key, (_, anchor) in entries.items()}
+        self._tree = STRTree([(polygon.bounds, key) for key, polygon in self.polygons.items()], self.node_capacity)
+        self._packed = set(self.polygons)
+        self._pending.clear()
+        self._stale.clear()
+
+    def upsert(self, key: Hashable, polygon: PreparedPolygon, anchor: Tuple[float, float]):
+        """Add or replace ``key``; ``anchor`` is the (x, y) used to rank overlapping polygons."""
+        self.polygons[key] = polygon
+        self.anchors[key] = anchor
+        if key in self._packed:
+            self._stale.add(key)
+        self._pending[key] = polygon.bounds
+        if len(self._pending) > self.rebuild_threshold:
+            self.rebuild()
+
+    def remove(self, key: Hashable):
+        self.polygons.pop(key, None)
+        self.anchors.pop(key, None)
+        self._pending.pop(key, None)
+        if key in self._packed:
+            self._stale.add(key)
+
+    def covering(self, x: float, y: float) -> List[Hashable]:
+        keys = [key for key in self._tree.query_point(x, y) if key not in self._stale]
+        keys.extend(
+            key for key, (min_x, min_y, max_x, max_y) in self._pending.items()
+            if min_x <= x <= max_x and min_y <= y <= max_y
+        )
+        return [key for key in keys if self.polygons[key].contains(x, y)]
+
+    def nearest_covering(self, x: float, y: float) -> Optional[Hashable]:
+        keys = self.covering(x, y)
+        if len(keys) <= 1:
+            return keys[0] if keys else None
+        # Equirectangular distance is plenty to rank anchors that all cover the point
+        scale = math.cos(math.radians(y))
+        return min(keys, key=lambda key: ((self.anchors[key][0] - x) * scale) ** 2 + (self.anchors[key][1] - y) ** 2)
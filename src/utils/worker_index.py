@@ -0,0 +1,193 @@
+import math
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from src.models.schemas import CareWorkerStatus, ServiceType
+from src.utils.geometry import EARTH_RADIUS_KM, haversine_km
+from src.utils.worker_table import SPECIALIZATION_BITS, STATUS_CODES, STATUSES, WorkerTable, specialization_mask
+
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+class WorkerIndex:
+    """In-memory uniform grid of worker positions plus the attributes dispatch scores on.
+
+    Workers live in slots of growable NumPy columns; each grid cell holds the
+    slots inside it. Queries gather the slots of the cells overlapping the
+    search area and filter them with one vectorized distance check.
+    """
+
+    def __init__(self, cell_km: float = 1.0, capacity: int = 1024):
+        self.cell_deg = cell_km / KM_PER_DEGREE
+        self.ids: List[Optional[str]] = [None] * capacity
+        self.latitudes = np.zeros(capacity)
+        self.longitudes = np.zeros(capacity)
+        self.specializations = np.zeros(capacity, dtype=np.uint32)
+        self.statuses = np.zeros(capacity, dtype=np.int8)
+        self.ratings = np.zeros(capacity, dtype=np.float32)
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = list(range(capacity - 1, -1, -1))
+        self._cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self._slot_cells: Dict[int, Tuple[int, int]] = {}
+
+    @classmethod
+    def from_table(cls, table: WorkerTable, cell_km: float = 1.0) -> "WorkerIndex":
+        index = cls(cell_km, capacity=max(1024, 2 * len(table)))
+        for row, worker_id in enumerate(table.ids):
+            index.upsert(
+                worker_id,
+                latitude=float(table.latitudes[row]),
+                longitude=float(table.longitudes[row]),
+                specializations=int(table.specializations[row]),
+                status=STATUSES[table.statuses[row]],
+                rating=float(table.ratings[row]),
+            )
+        return index
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, worker_id: str) -> bool:
+        return worker_id in self._slots
+
+    def status(self, worker_id: str) -> Optional[CareWorkerStatus]:
+        slot = self._slots.get(worker_id)
+        return None if slot is None else STATUSES[self.statuses[slot]]
+
+    def _cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return int(math.floor(latitude / self.cell_deg)), int(math.floor(longitude / self.cell_deg))
+
+    def _grow(self):
+        capacity = len(self.ids)
+        self.ids.extend([None] * capacity)
+        self.latitudes = np.concatenate([self.latitudes, np.zeros(capacity)])
+        self.longitudes = np.concatenate([self.longitudes, np.zeros(capacity)])
+        self.specializations = np.concatenate([self.specializations, np.zeros(capacity, dtype=np.uint32)])
+        self.statuses = np.concatenate([self.statuses, np.zeros(capacity, dtype=np.int8)])
+        self.ratings = np.concatenate([self.ratings, np.zeros(capacity, dtype=np.float32)])
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def upsert(self, worker_id: str, latitude: Optional[float] = None, longitude: Optional[float] = None,
+               specializations: Optional[Any] = None, status: Optional[CareWorkerStatus] = None,
+               rating: Optional[float] = None):
+        """Add a worker or update the given fields; a new worker needs a location and a status.
+
+        A location alone does not add a worker, so pings from workers the
+        index does not know cannot make them available for dispatch.
+        """
+        slot = self._slots.get(worker_id)
+        if slot is None:
+            if latitude is None or longitude is None or status is None:
+                return
+            if not self._free:
+                self._grow()
+            slot = self._free.pop()
+            self._slots[worker_id] = slot
+            self.ids[slot] = worker_id
+            self.specializations[slot] = 0
+            self.ratings[slot] = 0
+
+        if latitude is not None and longitude is not None:
+            self.latitudes[slot] = latitude
+            self.longitudes[slot] = longitude
+            cell = self._cell(latitude, longitude)
+            previous = self._slot_cells.get(slot)
+            if previous != cell:
+                if previous is not None:
+                    self._discard_from_cell(previous, slot)
+                self._cells[cell].add(slot)
+                self._slot_cells[slot] = cell
+        if specializations is not None:
+            self.specializations[slot] = (specializations if isinstance(specializations, int)
+                                          else specialization_mask(specializations))
+        if status is not None:
+            self.statuses[slot] = STATUS_CODES[CareWorkerStatus(status)]
+        if rating is not None:
+            self.ratings[slot] = rating
+
+    def remove(self, worker_id: str):
+        slot = self._slots.pop(worker_id, None)
+        if slot is None:
+            return
+        self._discard_from_cell(self._slot_cells.pop(slot), slot)
+        self.ids[slot] = None
+        self._free.append(slot)
+
+    def _discard_from_cell(self, cell: Tuple[int, int], slot: int):
+        slots = self._cells[cell]
+        slots.discard(slot)
+        if not slots:
+            del self._cells[cell]
+
+    def apply_update(self, event: Dict[str, Any]):
+        """Apply a worker_updates event; only the fields present in the event change."""
+        worker_id = event["worker_id"]
+        if event.get("deleted"):
+            self.remove(worker_id)
+            return
+        location = event.get("current_location") or {}
+        self.upsert(
+            worker_id,
+            latitude=location.get("latitude", event.get("latitude")),
+            longitude=location.get("longitude", event.get("longitude")),
+            specializations=event.get("specializations"),
+            status=event.get("status"),
+            rating=event.get("rating"),
+        )
+
+    def radius(self, latitude: float, longitude: float, radius_km: float,
+               statuses: Optional[Iterable[CareWorkerStatus]] = None,
+               service_type: Optional[ServiceType] = None) -> List[str]:
+        """IDs within radius_km, nearest first, optionally filtered by status and specialization."""
+        slots, distances = self._search(latitude, longitude, radius_km, statuses, service_type)
+        return [self.ids[slot] for slot in slots[np.argsort(distances, kind="stable")].tolist()]
+
+    def nearest(self, latitude: float, longitude: float, k: int, max_km: float = 50,
+                statuses: Optional[Iterable[CareWorkerStatus]] = None,
+                service_type: Optional[ServiceType] = None, min_km: Optional[float] = None) -> List[str]:
+        """Up to k nearest matching IDs within max_km, nearest first.
+
+        The search starts at min_km (one grid cell by default) and doubles.
+        """
+        # Every worker farther than the search radius is farther than all those inside it,
+        # so the k nearest are final as soon as the radius holds k matches
+        radius_km = min_km or self.cell_deg * KM_PER_DEGREE
+        while True:
+            radius_km = min(radius_km, max_km)
+            slots, distances = self._search(latitude, longitude, radius_km, statuses, service_type)
+            if len(slots) >= k or radius_km >= max_km:
+                order = np.argsort(distances, kind="stable")[:k]
+                return [self.ids[slot] for slot in slots[order].tolist()]
+            radius_km *= 2
+
+    def _search(self, latitude: float, longitude: float, radius_km: float,
+                statuses: Optional[Iterable[CareWorkerStatus]],
+                service_type: Optional[ServiceType]) -> Tuple[np.ndarray, np.ndarray]:
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = lat_span / max(math.cos(math.radians(min(abs(latitude) + lat_span, 89.9))), 1e-6)
+        min_row, min_col = self._cell(latitude - lat_span, longitude - lon_span)
+        max_row, max_col = self._cell(latitude + lat_span, longitude + lon_span)
+
+        if (max_row - min_row + 1) * (max_col - min_col + 1) > len(self._cells):
+            # Wide searches are cheaper over the occupied cells than over every cell in the box
+            found = [slot for (row, col), slots in self._cells.items()
+                     if min_row <= row <= max_row and min_col <= col <= max_col for slot in slots]
+        else:
+            found = [slot for row in range(min_row, max_row + 1) for col in range(min_col, max_col + 1)
+                     for slot in self._cells.get((row, col), ())]
+        slots = np.fromiter(found, dtype=np.intp, count=len(found))
+
+        distances = haversine_km(latitude, longitude, self.latitudes[slots], self.longitudes[slots])
+        keep = distances <= radius_km
+        if statuses is not None:
+            keep &= np.isin(self.statuses[slots], [STATUS_CODES[CareWorkerStatus(status)] for status in statuses])
+        if service_type is not None:
+            keep &= (self.specializations[slots] & SPECIALIZATION_BITS[ServiceType(service_type)]) != 0
+        return slots[keep], distances[keep]
+
+    def table(self, worker_ids: Iterable[str]) -> WorkerTable:
+        """Snapshot of the given workers as a WorkerTable; unknown IDs are left out."""
+        worker_ids = [worker_id for worker_id in dict.fromkeys(worker_ids) if worker_id in self._slots]
+        slots = np.fromiter((self._slots[worker_id] for worker_id in worker_ids), dtype=np.intp, count=len(worker_ids))
+        return WorkerTable(worker_ids, self.latitudes[slots], self.longitudes[slots], self.specializations[slots],
+                           self.statuses[slots], self.ratings[slots])
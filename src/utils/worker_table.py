@@ -0,0 +1,88 @@
+from typing import Any, Dict, Iterable, List, Sequence
+import numpy as np
+from src.models.schemas import CareWorker, CareWorkerStatus, ServiceType
+
+# One bit per service type in the specialization mask
+SPECIALIZATION_BITS = {service_type: 1 << bit for bit, service_type in enumerate(ServiceType)}
+STATUS_CODES = {worker_status: code for code, worker_status in enumerate(CareWorkerStatus)}
+STATUSES = list(CareWorkerStatus)
+
+
+def specialization_mask(specializations: Iterable[Any]) -> int:
+    mask = 0
+    for specialization in specializations:
+        mask |= SPECIALIZATION_BITS[ServiceType(specialization)]
+    return mask
+
+
+class WorkerTable:
+    """Columnar worker attributes used for scoring, one row per worker.
+
+    Scoring only needs a location, specializations, status and rating, so a
+    worker costs about 25 bytes of array storage plus its ID instead of a
+    full CareWorker model.
+    """
+
+    def __init__(self, ids: Sequence[str], latitudes, longitudes, specializations, statuses, ratings):
+        self.ids: List[str] = list(ids)
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.specializations = np.asarray(specializations, dtype=np.uint32)
+        self.statuses = np.asarray(statuses, dtype=np.int8)
+        self.ratings = np.asarray(ratings, dtype=np.float32)
+        self._rows = {worker_id: row for row, worker_id in enumerate(self.ids)}
+
+    @classmethod
+    def from_workers(cls, workers: Iterable[CareWorker]) -> "WorkerTable":
+        workers = list(workers)
+        return cls(
+            [str(worker.id) for worker in workers],
+            [worker.current_location.latitude for worker in workers],
+            [worker.current_location.longitude for worker in workers],
+            [specialization_mask(worker.specializations) for worker in workers],
+            [STATUS_CODES[worker.status] for worker in workers],
+            [worker.rating for worker in workers],
+        )
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "WorkerTable":
+        """Build the table straight from MongoDB or cached documents, skipping model validation."""
+        documents = list(documents)
+        return cls(
+            [str(document["_id"]) for document in documents],
+            [document["current_location"]["latitude"] for document in documents],
+            [document["current_location"]["longitude"] for document in documents],
+            [specialization_mask(document.get("specializations", ())) for document in documents],
+            # Workers stored without a status, or with a null one, are available
+            [STATUS_CODES[CareWorkerStatus(document.get("status") or CareWorkerStatus.AVAILABLE)] for document in documents],
+            [document.get("rating", 0) for document in documents],
+        )
+
+    @classmethod
+    def concat(cls, tables: Iterable["WorkerTable"]) -> "WorkerTable":
+        tables = list(tables)
+        if not tables:
+            return cls([], [], [], [], [], [])
+        return cls(
+            [worker_id for table in tables for worker_id in table.ids],
+            np.concatenate([table.latitudes for table in tables]),
+            np.concatenate([table.longitudes for table in tables]),
+            np.concatenate([table.specializations for table in tables]),
+            np.concatenate([table.statuses for table in tables]),
+            np.concatenate([table.ratings for table in tables]),
+        )
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, worker_id: str) -> bool:
+        return worker_id in self._rows
+
+    @property
+    def nbytes(self) -> int:
+        return (self.latitudes.nbytes + self.longitudes.nbytes + self.specializations.nbytes
+                + self.statuses.nbytes + self.ratings.nbytes)
+
+    def indexes(self, worker_ids: Iterable[str]) -> np.ndarray:
+        """Row numbers of the given IDs, skipping IDs that are not in the table."""
+        return np.fromiter((self._rows[worker_id] for worker_id in worker_ids if worker_id in self._rows), dtype=np.intp)
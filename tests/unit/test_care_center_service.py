@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from src.models.schemas import CareCenterCreate, CareCenterUpdate, Location
+from src.services.care_center_service import CareCenterService, service_area_polygon
+from src.utils.spatial_index import CoverageIndex, STRTree
+
+def square(x, y, size):
+    return [Location(latitude=y, longitude=x), Location(latitude=y, longitude=x + size),
+            Location(latitude=y + size, longitude=x + size), Location(latitude=y + size, longitude=x)]
+
+@pytest.fixture
+def care_center_service():
+    service = CareCenterService()
+    service.coverage_index = CoverageIndex(rebuild_threshold=2)
+    return service
+
+@pytest.fixture
+def mock_collection(monkeypatch):
+    collection = AsyncMock()
+    monkeypatch.setattr("src.services.care_center_service.get_collection", AsyncMock(return_value=collection))
+    return collection
+
+def test_str_tree_matches_linear_scan():
+    rng = np.random.default_rng(0)
+    boxes = [(x, y, x + w, y + h) for x, y, w, h in rng.uniform(0, 10, (2000, 4))]
+    tree = STRTree([(box, index) for index, box in enumerate(boxes)], node_capacity=8)
+
+    for x, y in rng.uniform(0, 20, (200, 2)):
+        expected = [index for index, (x0, y0, x1, y1) in enumerate(boxes) if x0 <= x <= x1 and y0 <= y <= y1]
+        assert sorted(tree.query_point(x, y)) == expected
+
+def test_coverage_index_prefers_nearest_center():
+    index = CoverageIndex()
+    index.upsert("big", service_area_polygon([location.model_dump() for location in square(0, 0, 10)]), (0.0, 0.0))
+    index.upsert("small", service_area_polygon([location.model_dump() for location in square(4, 4, 2)]), (5.0, 5.0))
+
+    assert sorted(index.covering(5, 5)) == ["big", "small"]
+    assert index.nearest_covering(5, 5) == "small"
+    assert index.nearest_covering(1, 1) == "big"
+    assert index.nearest_covering(11, 11) is None
+
+@pytest.mark.asyncio
+async def test_create_and_update_keep_index_current(care_center_service, mock_collection):
+    center_ids = [ObjectId() for _ in range(4)]
+    mock_collection.insert_one.side_effect = [MagicMock(inserted_id=center_id) for center_id in center_ids]
+    for offset, center_id in enumerate(center_ids):
+        await care_center_service.create_care_center(CareCenterCreate(
+            name=f"Center {offset}", location=Location(latitude=offset + 0.5, longitude=offset + 0.5),
+            service_area=square(offset, offset, 1)
+        ))
+
+    assert care_center_service.coverage_index.covering(2.5, 2.5) == [str(center_ids[2])]
+
+    mock_collection.update_one.return_value = MagicMock(modified_count=1)
+    mock_collection.find_one.return_value = {
+        "_id": center_ids[2], "name": "Center 2", "location": {"latitude": 20.5, "longitude": 20.5},
+        "service_area": {"type": "Polygon", "coordinates": [[[20, 20], [21, 20], [21, 21], [20, 21], [20, 20]]]}
+    }
+    await care_center_service.update_care_center(str(center_ids[2]), CareCenterUpdate(service_area=square(20, 20, 1)))
+
+    assert care_center_service.coverage_index.covering(2.5, 2.5) == []
+    assert care_center_service.coverage_index.covering(20.5, 20.5) == [str(center_ids[2])]
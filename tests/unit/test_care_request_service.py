@@ -1,14 +1,20 @@
 import pytest
 import logging
+import numpy as np
+from datetime import datetime
 from unittest.mock import AsyncMock, MagicMock
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
 from fastapi import status
-from src.models.schemas import CareRequest, CareRequestUpdate, CareRequestStatus, Location, ServiceType, UrgencyLevel
+from src.models.schemas import CareRequest, CareRequestCreate, CareRequestUpdate, CareRequestStatus, Location, ServiceType, UrgencyLevel
 from src.services.care_request_service import CareRequestService
+from src.services.care_worker_service import CareWorkerService
 from src.services.geofencing_service import GeofencingService
+from src.services.kafka_producer_service import KafkaProducerService
 from src.services.task_scheduler_service import TaskSchedulerService
+from src.utils.config import get_settings
 from src.utils.error_handling import AppException
+from src.utils.geo_sharding import geo_cell_key
 
 @pytest.fixture
 def mock_db_client():
@@ -28,10 +34,10 @@ def mock_task_scheduler_service():
     return AsyncMock(spec=TaskSchedulerService)
 
 @pytest.fixture
-def care_request_service(mock_db_client):
+def care_request_service():
     geofencing_service = MagicMock(spec=GeofencingService)
-    task_scheduler_service = AsyncMock(spec=TaskSchedulerService)
-    return CareRequestService(mock_db_client, geofencing_service, task_scheduler_service)
+    kafka_producer = AsyncMock(spec=KafkaProducerService)
+    return CareRequestService(geofencing_service, kafka_producer)
 
 @pytest.fixture(scope="function")
 def sample_care_request():
@@ -47,19 +53,42 @@ def sample_care_request():
 def mock_collection():
     return AsyncMock()
 
+@pytest.fixture
+def mock_outbox(monkeypatch):
+    monkeypatch.setattr("src.services.care_request_service.settings.OUTBOX_ENABLED", True)
+    # A session whose transaction commits on exit and lets exceptions through
+    session = MagicMock()
+    session.__aenter__.return_value = session
+    session.__aexit__.return_value = False
+    session.start_transaction.return_value.__aexit__.return_value = False
+    client = MagicMock()
+    client.start_session = AsyncMock(return_value=session)
+    outbox = AsyncMock()
+    outbox.session = session
+    monkeypatch.setattr("src.services.outbox_service.get_client", AsyncMock(return_value=client))
+    monkeypatch.setattr("src.services.outbox_service.get_outbox_collection", AsyncMock(return_value=outbox))
+    return outbox
+
 @pytest.mark.asyncio
-async def test_create_care_request_success(care_request_service, sample_care_request, mock_collection, monkeypatch):
+async def test_create_care_request_success(care_request_service, sample_care_request, mock_collection, mock_outbox, monkeypatch):
     care_request_service.geofencing.is_location_allowed.return_value = True
-    mock_collection.insert_one.return_value = AsyncMock(inserted_id=ObjectId("60d5ec9f1c9d440000000000"))
+    mock_collection.insert_one.return_value = MagicMock(inserted_id=ObjectId("60d5ec9f1c9d440000000000"))
     monkeypatch.setattr("src.services.care_request_service.get_care_requests_collection", AsyncMock(return_value=mock_collection))
+    care_request = CareRequestCreate(**sample_care_request.model_dump(include={"client_id", "service_type", "urgency", "location"}))
 
-    result = await care_request_service.create_care_request(sample_care_request)
+    result = await care_request_service.create_care_request(care_request)
 
     assert result == "60d5ec9f1c9d440000000000"
-    care_request_service.geofencing.is_location_allowed.assert_called_once_with(sample_care_request.location)
-    expected_dict = sample_care_request.model_dump(exclude={"id"})
-    mock_collection.insert_one.assert_called_once_with(expected_dict)
-    care_request_service.scheduler.schedule_new_request.assert_called_once_with("60d5ec9f1c9d440000000000")
+    care_request_service.geofencing.is_location_allowed.assert_called_once_with(care_request.location)
+    document = mock_collection.insert_one.call_args.args[0]
+    assert document["status"] == CareRequestStatus.PENDING
+    # The request and its dispatch event commit in one transaction; the relay publishes the event
+    assert mock_collection.insert_one.call_args.kwargs["session"] is mock_outbox.session
+    (event,) = mock_outbox.insert_many.await_args.args[0]
+    assert mock_outbox.insert_many.await_args.kwargs["session"] is mock_outbox.session
+    assert (event["topic"], event["key"]) == ("care_requests.normal", geo_cell_key(40.7128, -74.0060, get_settings().GEO_SHARD_CELL_KM))
+    assert event["payload"]["request_id"] == result
+    care_request_service.kafka_producer.publish.assert_not_called()
 
 @pytest.mark.asyncio
 async def test_get_care_request_not_found(care_request_service, mock_collection, monkeypatch):
@@ -74,7 +103,7 @@ async def test_get_care_request_not_found(care_request_service, mock_collection,
     assert exc_info.value.detail == "Care request not found"
 
 @pytest.mark.asyncio
-async def test_update_care_request_not_found(care_request_service, mock_collection, monkeypatch):
+async def test_update_care_request_not_found(care_request_service, mock_collection, mock_outbox, monkeypatch):
     mock_id = "60d5ec9f1c9d440000000000"
     update_data = CareRequestUpdate(status=CareRequestStatus.IN_PROGRESS)
     mock_collection.update_one.return_value = AsyncMock(modified_count=0)
@@ -150,3 +179,97 @@ def mock_motor_client(monkeypatch):
     monkeypatch.setattr("motor.motor_asyncio.AsyncIOMotorClient", MagicMock(return_value=mock_client))
     return mock_collection
 
+@pytest.fixture
+def bulk_care_request_service():
+    geofencing_service = MagicMock(spec=GeofencingService)
+    kafka_producer = AsyncMock(spec=KafkaProducerService)
+    return CareRequestService(geofencing_service, kafka_producer)
+
+@pytest.mark.asyncio
+async def test_create_care_requests_bulk_reports_per_index(bulk_care_request_service, mock_collection, mock_outbox, monkeypatch):
+    client_id = str(ObjectId())
+    inside = {"client_id": client_id, "service_type": "Medical Checkup", "urgency": "High",
+              "location": {"latitude": 31.88, "longitude": 117.35}}
+    outside = {**inside, "location": {"latitude": 32.0, "longitude": 118.0}}
+    invalid = {"client_id": client_id, "urgency": "High"}
+    inserted_ids = [ObjectId(), ObjectId()]
+    bulk_care_request_service.geofencing.are_locations_allowed.return_value = np.array([True, False, True])
+    mock_collection.insert_many.return_value = MagicMock(inserted_ids=inserted_ids)
+    monkeypatch.setattr("src.services.care_request_service.get_care_requests_collection", AsyncMock(return_value=mock_collection))
+
+    result = await bulk_care_request_service.create_care_requests_bulk([inside, invalid, outside, inside])
+
+    assert [(item.index, item.request_id) for item in result.accepted] == [(0, str(inserted_ids[0])), (3, str(inserted_ids[1]))]
+    assert [item.index for item in result.rejected] == [1, 2]
+    assert result.rejected[1].detail == "Location is outside of service area"
+    mock_collection.insert_many.assert_called_once()
+    assert len(mock_collection.insert_many.call_args.args[0]) == 2
+    # The events commit in the transaction of the insert, and the relay publishes them
+    assert mock_collection.insert_many.call_args.kwargs["session"] is mock_outbox.session
+    events = mock_outbox.insert_many.call_args.args[0]
+    assert mock_outbox.insert_many.call_args.kwargs["session"] is mock_outbox.session
+    bulk_care_request_service.kafka_producer.publish.assert_not_called()
+    assert [event["topic"] for event in events] == ["care_requests.high"] * 2
+    # Keyed by geographic cell, so requests from one area share a partition
+    assert [event["key"] for event in events] == [geo_cell_key(31.88, 117.35, get_settings().GEO_SHARD_CELL_KM)] * 2
+    messages = [event["payload"] for event in events]
+    assert [message["request_id"] for message in messages] == [str(inserted_id) for inserted_id in inserted_ids]
+    assert [message["event_id"] for message in messages] == [str(event["_id"]) for event in events]
+    # The scheduler parses events into CareRequest, where created_at is required
+    assert all(isinstance(message["created_at"], datetime) for message in messages)
+
+@pytest.mark.asyncio
+async def test_claim_care_request_only_assigns_pending_requests(bulk_care_request_service, mock_collection, mock_outbox, monkeypatch):
+    request_id, worker_id = str(ObjectId()), str(ObjectId())
+    mock_collection.update_one.side_effect = [MagicMock(modified_count=1), MagicMock(modified_count=0)]
+    monkeypatch.setattr("src.services.care_request_service.get_care_requests_collection", AsyncMock(return_value=mock_collection))
+
+    assert await bulk_care_request_service.claim_care_request(request_id, worker_id)
+    assert not await bulk_care_request_service.claim_care_request(request_id, worker_id)
+
+    query, update = mock_collection.update_one.await_args.args
+    assert query == {"_id": ObjectId(request_id), "status": {"$in": [CareRequestStatus.PENDING, None]}}
+    assert update == {"$set": {"status": CareRequestStatus.ASSIGNED, "assigned_worker_id": worker_id}}
+    # Only the claim that changed the request records a status event
+    mock_outbox.insert_many.assert_awaited_once()
+    (event,) = mock_outbox.insert_many.await_args.args[0]
+    assert (event["topic"], event["key"]) == ("care_request_status", request_id.encode())
+    assert event["payload"]["status"] == CareRequestStatus.ASSIGNED
+    assert event["payload"]["assigned_worker_id"] == worker_id
+
+@pytest.mark.asyncio
+async def test_events_are_published_after_the_write_without_the_outbox(bulk_care_request_service, mock_collection, monkeypatch):
+    request_id, worker_id = str(ObjectId()), str(ObjectId())
+    mock_collection.update_one.return_value = MagicMock(modified_count=1)
+    monkeypatch.setattr("src.services.care_request_service.get_care_requests_collection", AsyncMock(return_value=mock_collection))
+    monkeypatch.setattr("src.services.care_request_service.settings.OUTBOX_ENABLED", False)
+
+    assert await bulk_care_request_service.claim_care_request(request_id, worker_id)
+
+    assert mock_collection.update_one.await_args.kwargs["session"] is None
+    topic, message = bulk_care_request_service.kafka_producer.publish.await_args.args
+    assert topic == "care_request_status"
+    assert message["request_id"] == request_id
+    assert bulk_care_request_service.kafka_producer.publish.await_args.kwargs["key"] == request_id.encode()
+
+@pytest.mark.asyncio
+async def test_assign_care_worker_releases_the_worker_when_the_claim_fails(bulk_care_request_service, monkeypatch):
+    request_id, worker_id = str(ObjectId()), str(ObjectId())
+    care_worker_service = AsyncMock(spec=CareWorkerService)
+    care_worker_service.reserve_care_worker.return_value = True
+    bulk_care_request_service.claim_care_request = AsyncMock(side_effect=[False, AppException(status_code=500, detail="down")])
+
+    for expected_status in (status.HTTP_409_CONFLICT, 500):
+        with pytest.raises(AppException) as exc_info:
+            await bulk_care_request_service.assign_care_worker(request_id, worker_id, care_worker_service)
+        assert exc_info.value.status_code == expected_status
+
+    # Reserved before each claim and handed back after each failed one
+    assert care_worker_service.reserve_care_worker.await_count == 2
+    assert care_worker_service.release_care_worker.await_count == 2
+
+    care_worker_service.reserve_care_worker.return_value = False
+    with pytest.raises(AppException) as exc_info:
+        await bulk_care_request_service.assign_care_worker(request_id, worker_id, care_worker_service)
+    assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+    assert bulk_care_request_service.claim_care_request.await_count == 2
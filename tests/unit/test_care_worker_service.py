@@ -0,0 +1,312 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from src.models.schemas import CareWorker, CareWorkerStatus, CareWorkerUpdate, Location, ServiceType
+from src.services.care_worker_service import CareWorkerService
+from src.services.redis_cache_service import RedisCacheService
+from src.services.worker_geo_index_service import WorkerGeoIndexService
+from src.utils.error_handling import AppException
+from src.utils.codec import get_codec
+from src.utils.local_cache import LocalCache
+from src.utils.worker_table import SPECIALIZATION_BITS, STATUSES
+
+def worker_document(status=CareWorkerStatus.AVAILABLE):
+    return {
+        "_id": ObjectId(),
+        "name": "Worker",
+        "email": "worker@example.com",
+        "phone_number": "123",
+        "specializations": [ServiceType.PERSONAL_CARE.value],
+        "care_center_id": str(ObjectId()),
+        "current_location": {"latitude": 31.88, "longitude": 117.35},
+        "status": status.value,
+    }
+
+def cache_entry(document):
+    # What the Redis cache hands back for a stored worker document
+    codec = get_codec("json")
+    return codec.decode(codec.encode(document))
+
+@pytest.fixture
+def care_worker_service():
+    service = CareWorkerService()
+    service.redis_cache = AsyncMock(spec=RedisCacheService)
+    service.geo_index = AsyncMock(spec=WorkerGeoIndexService)
+    return service
+
+@pytest.fixture
+def mock_collection(monkeypatch):
+    collection = MagicMock()
+    monkeypatch.setattr("src.services.care_worker_service.get_care_workers_collection", AsyncMock(return_value=collection))
+    return collection
+
+def mock_find(collection, documents):
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(return_value=documents)
+    collection.find.return_value = cursor
+
+@pytest.mark.asyncio
+async def test_get_care_workers_bulk_fills_cache_misses_in_one_query(care_worker_service, mock_collection):
+    cached, missed = worker_document(), worker_document()
+    unknown = str(ObjectId())
+    ids = [str(cached["_id"]), str(missed["_id"]), unknown, str(cached["_id"])]
+    care_worker_service.redis_cache.mget.return_value = [cache_entry(cached), None, None]
+    mock_find(mock_collection, [missed])
+
+    workers = await care_worker_service.get_care_workers_bulk(ids)
+
+    assert list(workers) == [str(cached["_id"]), str(missed["_id"])]
+    care_worker_service.redis_cache.mget.assert_awaited_once_with([f"care_worker:{worker_id}" for worker_id in ids[:3]])
+    mock_collection.find.assert_called_once_with({"_id": {"$in": [missed["_id"], ObjectId(unknown)]}},
+                                                 {"password": 0})
+    care_worker_service.redis_cache.set_many.assert_awaited_once()
+    assert list(care_worker_service.redis_cache.set_many.await_args.args[0]) == [f"care_worker:{missed['_id']}"]
+
+@pytest.mark.asyncio
+async def test_get_care_workers_bulk_skips_database_when_all_cached(care_worker_service, mock_collection):
+    documents = [worker_document() for _ in range(200)]
+    care_worker_service.redis_cache.mget.return_value = [cache_entry(document) for document in documents]
+
+    workers = await care_worker_service.get_care_workers_bulk([str(document["_id"]) for document in documents])
+
+    assert len(workers) == 200
+    mock_collection.find.assert_not_called()
+    care_worker_service.redis_cache.set_many.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_available_workers_in_area_search_partitioned_set(care_worker_service, mock_collection):
+    available = worker_document()
+    care_worker_service.geo_index.search.return_value = [str(available["_id"])]
+    care_worker_service.redis_cache.mget.return_value = [None]
+    mock_find(mock_collection, [available])
+
+    workers = await care_worker_service.get_available_care_workers_in_area(31.88, 117.35, 5,
+                                                                          ServiceType.PERSONAL_CARE)
+
+    assert [str(worker.id) for worker in workers] == [str(available["_id"])]
+    care_worker_service.geo_index.search.assert_awaited_once_with(
+        31.88, 117.35, 5, CareWorkerStatus.AVAILABLE, ServiceType.PERSONAL_CARE
+    )
+    care_worker_service.redis_cache.get.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_get_care_worker_table_skips_models(care_worker_service, mock_collection):
+    cached, missed = worker_document(), worker_document(CareWorkerStatus.OFFLINE)
+    care_worker_service.redis_cache.mget.return_value = [cache_entry(cached), None]
+    mock_find(mock_collection, [missed])
+
+    table = await care_worker_service.get_care_worker_table([str(cached["_id"]), str(missed["_id"])])
+
+    assert table.ids == [str(cached["_id"]), str(missed["_id"])]
+    assert [STATUSES[code] for code in table.statuses] == [CareWorkerStatus.AVAILABLE, CareWorkerStatus.OFFLINE]
+    assert table.specializations[0] & SPECIALIZATION_BITS[ServiceType.PERSONAL_CARE]
+
+@pytest.mark.asyncio
+async def test_update_care_worker_moves_geo_member_and_publishes(care_worker_service, mock_collection):
+    document = worker_document()
+    worker_id = str(document["_id"])
+    care_worker_service.kafka_producer = AsyncMock()
+    mock_collection.find_one_and_update = AsyncMock(return_value=document)
+
+    await care_worker_service.update_care_worker(
+        worker_id, CareWorkerUpdate(current_location=Location(latitude=31.9, longitude=117.4), status=CareWorkerStatus.BUSY)
+    )
+
+    care_worker_service.geo_index.update_worker.assert_awaited_once_with(worker_id, document, (117.4, 31.9))
+    care_worker_service.kafka_producer.publish.assert_awaited_once_with("worker_updates", {
+        "worker_id": worker_id,
+        "current_location": {"latitude": 31.9, "longitude": 117.4},
+        "status": CareWorkerStatus.BUSY,
+    })
+
+@pytest.mark.asyncio
+async def test_delete_care_worker_leaves_geo_set(care_worker_service, mock_collection):
+    worker_id = str(ObjectId())
+    care_worker_service.kafka_producer = AsyncMock()
+    mock_collection.delete_one = AsyncMock(return_value=MagicMock(deleted_count=1))
+
+    assert await care_worker_service.delete_care_worker(worker_id)
+
+    care_worker_service.geo_index.remove_worker.assert_awaited_once_with(worker_id)
+    care_worker_service.kafka_producer.publish.assert_awaited_once_with(
+        "worker_updates", {"worker_id": worker_id, "deleted": True}
+    )
+
+@pytest.mark.asyncio
+async def test_reserve_care_worker_only_takes_available_workers(care_worker_service, mock_collection):
+    document = worker_document(CareWorkerStatus.BUSY)
+    worker_id = str(document["_id"])
+    care_worker_service.kafka_producer = AsyncMock()
+    mock_collection.find_one_and_update = AsyncMock(side_effect=[document, None])
+
+    assert await care_worker_service.reserve_care_worker(worker_id)
+    assert not await care_worker_service.reserve_care_worker(worker_id)
+
+    query, update = mock_collection.find_one_and_update.await_args_list[0].args
+    assert query == {"_id": document["_id"], "status": {"$in": [CareWorkerStatus.AVAILABLE, None]}}
+    assert update == {"$set": {"status": CareWorkerStatus.BUSY}}
+    care_worker_service.geo_index.update_worker.assert_awaited_once_with(worker_id, document, None)
+    care_worker_service.redis_cache.delete.assert_awaited_once_with(f"care_worker:{worker_id}")
+    care_worker_service.kafka_producer.publish.assert_awaited_once_with(
+        "worker_updates", {"worker_id": worker_id, "status": CareWorkerStatus.BUSY}
+    )
+
+@pytest.mark.asyncio
+async def test_get_care_worker_serves_repeat_reads_from_local_cache(care_worker_service, mock_collection):
+    document = worker_document()
+    worker_id = str(document["_id"])
+    care_worker_service.redis_cache.get.return_value = cache_entry(document)
+
+    first = await care_worker_service.get_care_worker(worker_id)
+    second = await care_worker_service.get_care_worker(worker_id)
+
+    assert first == second
+    care_worker_service.redis_cache.get.assert_awaited_once_with(f"care_worker:{worker_id}")
+    assert care_worker_service.cache_stats()["local"]["hits"] == 1
+
+@pytest.mark.asyncio
+async def test_update_care_worker_invalidates_both_tiers_and_other_processes(care_worker_service, mock_collection):
+    document = worker_document()
+    worker_id = str(document["_id"])
+    care_worker_service.redis_cache.get.return_value = cache_entry(document)
+    await care_worker_service.get_care_worker(worker_id)
+    updated = {**document, "status": CareWorkerStatus.OFFLINE.value}
+    mock_collection.find_one_and_update = AsyncMock(return_value=updated)
+    mock_collection.find_one = AsyncMock(return_value=updated)
+
+    await care_worker_service.update_care_worker(worker_id, CareWorkerUpdate(status=CareWorkerStatus.OFFLINE))
+
+    # Nothing is written back, so a racing writer cannot leave an older document cached
+    care_worker_service.redis_cache.set.assert_not_awaited()
+    care_worker_service.redis_cache.delete.assert_awaited_once_with(f"care_worker:{worker_id}")
+    assert care_worker_service.local_cache.get(worker_id) is None
+    # The next read misses both tiers and sees the change
+    care_worker_service.redis_cache.get.return_value = None
+    assert (await care_worker_service.get_care_worker(worker_id)).status == CareWorkerStatus.OFFLINE
+    care_worker_service.redis_cache.publish.assert_awaited_once_with(
+        "care_worker_invalidations", f"{care_worker_service.instance_id}:{worker_id}"
+    )
+
+@pytest.mark.asyncio
+async def test_update_care_worker_not_found(care_worker_service, mock_collection):
+    mock_collection.find_one_and_update = AsyncMock(return_value=None)
+
+    with pytest.raises(AppException) as exc_info:
+        await care_worker_service.update_care_worker(str(ObjectId()), CareWorkerUpdate(status=CareWorkerStatus.OFFLINE))
+
+    assert exc_info.value.status_code == 404
+    care_worker_service.redis_cache.publish.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_delete_care_worker_drops_both_cache_tiers(care_worker_service, mock_collection):
+    worker_id = str(ObjectId())
+    care_worker_service.local_cache.set(worker_id, worker_document())
+    mock_collection.delete_one = AsyncMock(return_value=MagicMock(deleted_count=1))
+
+    assert await care_worker_service.delete_care_worker(worker_id)
+
+    assert care_worker_service.local_cache.get(worker_id) is None
+    care_worker_service.redis_cache.delete.assert_awaited_once_with(f"care_worker:{worker_id}")
+    care_worker_service.redis_cache.publish.assert_awaited_once()
+
+def test_invalidations_from_other_processes_drop_local_copies(care_worker_service):
+    worker_id = str(ObjectId())
+    care_worker_service.local_cache.set(worker_id, worker_document())
+
+    # Our own writes already updated the local copy
+    care_worker_service.handle_invalidation(f"{care_worker_service.instance_id}:{worker_id}")
+    assert care_worker_service.local_cache.get(worker_id) is not None
+
+    care_worker_service.handle_invalidation(f"other-process:{worker_id}")
+    assert care_worker_service.local_cache.get(worker_id) is None
+    assert care_worker_service.invalidations_received == 1
+
+@pytest.mark.asyncio
+async def test_invalidate_workers_drops_a_batch_in_one_round_trip(care_worker_service):
+    worker_ids = [str(ObjectId()) for _ in range(3)]
+    for worker_id in worker_ids:
+        care_worker_service.local_cache.set(worker_id, worker_document())
+    pipe = MagicMock()
+    pipe.execute = AsyncMock()
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=pipe)
+    context.__aexit__ = AsyncMock(return_value=False)
+    care_worker_service.redis_cache.pipeline = MagicMock(return_value=context)
+
+    await care_worker_service.invalidate_workers(worker_ids)
+
+    assert all(care_worker_service.local_cache.get(worker_id) is None for worker_id in worker_ids)
+    pipe.delete.assert_called_once_with(*(f"care_worker:{worker_id}" for worker_id in worker_ids))
+    channel, message = pipe.publish.call_args.args
+    pipe.execute.assert_awaited_once()
+
+    # Another process receiving the batch drops all of it
+    other = CareWorkerService()
+    for worker_id in worker_ids:
+        other.local_cache.set(worker_id, worker_document())
+    other.handle_invalidation(message)
+    assert all(other.local_cache.get(worker_id) is None for worker_id in worker_ids)
+    assert (channel, other.invalidations_received) == ("care_worker_invalidations", 1)
+
+def test_local_cache_evicts_least_recently_used_and_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.utils.local_cache.time.monotonic", lambda: now[0])
+    cache = LocalCache(max_size=2, ttl=30)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    now[0] += 31
+    assert cache.get("c") is None
+    assert cache.stats() == {"size": 1, "max_size": 2, "hits": 2, "misses": 2, "hit_rate": 0.5,
+                             "evictions": 1, "expirations": 1}
+
+def test_codec_round_trips_worker_documents_and_reads_legacy_json():
+    document = worker_document()
+    codec = get_codec("json")
+
+    payload = codec.encode(document)
+
+    assert payload[0] == codec.version
+    assert codec.decode(payload) == {**document, "_id": str(document["_id"])}
+    # Entries written before the codec are bare JSON
+    assert codec.decode(b'{"status": "Available"}') == {"status": "Available"}
+    with pytest.raises(ValueError):
+        codec.decode(b"\x7fpayload")
+
+def test_msgpack_payloads_are_read_by_any_codec():
+    pytest.importorskip("msgpack")
+    document = worker_document()
+
+    payload = get_codec("msgpack").encode(document)
+
+    assert get_codec("json").decode(payload) == {**document, "_id": str(document["_id"])}
+
+def test_trusted_worker_documents_build_the_same_model_as_validation():
+    document = {**cache_entry(worker_document()), "rating": 4}
+
+    worker = CareWorker.from_trusted(document)
+
+    assert worker == CareWorker(**document)
+    assert worker.status is CareWorkerStatus.AVAILABLE
+    assert isinstance(worker.current_location, Location) and worker.rating == 4.0
+
+@pytest.mark.asyncio
+async def test_worker_ids_are_strings_from_every_cache_tier(care_worker_service, mock_collection):
+    document = worker_document()
+    worker_id = str(document["_id"])
+    care_worker_service.redis_cache.mget.return_value = [None]
+    mock_find(mock_collection, [document])
+
+    # Filled from MongoDB, so the local tier holds the ObjectId
+    from_database = (await care_worker_service.get_care_workers_bulk([worker_id]))[worker_id]
+    from_local = (await care_worker_service.get_care_workers_bulk([worker_id]))[worker_id]
+    care_worker_service.local_cache.clear()
+    care_worker_service.redis_cache.mget.return_value = [cache_entry(document)]
+    from_redis = (await care_worker_service.get_care_workers_bulk([worker_id]))[worker_id]
+
+    assert from_database.id == from_local.id == from_redis.id == worker_id
+    assert type(from_local.id) is type(from_redis.id) is str
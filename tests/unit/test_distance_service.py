@@ -0,0 +1,122 @@
+import json
+import numpy as np
+import pytest
+from src.models.schemas import Location
+from src.services.distance_service import DistanceService
+from src.utils.road_network import RoadNetwork
+
+def random_locations(rng, count):
+    return [Location(latitude=lat, longitude=lon)
+            for lat, lon in zip(rng.uniform(-80, 80, count), rng.uniform(-180, 180, count))]
+
+def test_calculate_distances_matches_scalar():
+    rng = np.random.default_rng(0)
+    origin = Location(latitude=31.88, longitude=117.35)
+    destinations = random_locations(rng, 500)
+
+    result = DistanceService.calculate_distances(
+        origin, [location.latitude for location in destinations], [location.longitude for location in destinations]
+    )
+
+    expected = [DistanceService.calculate_distance(origin, location) for location in destinations]
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-9)
+
+def test_distance_matrix_matches_scalar():
+    rng = np.random.default_rng(1)
+    origins = random_locations(rng, 20)
+    destinations = random_locations(rng, 30)
+
+    result = DistanceService.distance_matrix(origins, destinations)
+
+    expected = [[DistanceService.calculate_distance(origin, destination) for destination in destinations] for origin in origins]
+    assert result.shape == (20, 30)
+    np.testing.assert_allclose(result, expected, rtol=1e-12, atol=1e-9)
+
+def test_distance_matrix_accepts_lat_lon_arrays():
+    origins = np.array([[31.88, 117.35]])
+    destinations = np.array([[31.88, 117.35], [31.89, 117.36]])
+
+    result = DistanceService.distance_matrix(origins, destinations)
+
+    assert result[0, 0] == 0
+    assert result[0, 1] == pytest.approx(DistanceService.calculate_distance(
+        Location(latitude=31.88, longitude=117.35), Location(latitude=31.89, longitude=117.36)
+    ))
+
+def river_city_geojson(path, size=10, spacing=0.01, bridge_col=0):
+    """Grid of two-way streets split by an east-west river with a single bridge."""
+    features = []
+    def street(a, b):
+        features.append({"type": "Feature", "properties": {"highway": "residential"},
+                         "geometry": {"type": "LineString", "coordinates": [a, b]}})
+    for row in range(size):
+        for col in range(size):
+            here = [117.30 + col * spacing, 31.85 + row * spacing]
+            if col + 1 < size:
+                street(here, [here[0] + spacing, here[1]])
+            if row + 1 < size and (row != size // 2 - 1 or col == bridge_col):
+                street(here, [here[0], here[1] + spacing])
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    return str(path)
+
+@pytest.fixture
+def road_network(tmp_path):
+    return RoadNetwork.from_geojson(river_city_geojson(tmp_path / "roads.geojson"), landmark_count=4)
+
+def test_alt_query_matches_dijkstra(road_network):
+    rng = np.random.default_rng(2)
+    for source, target in rng.integers(0, len(road_network), (50, 2)):
+        expected = road_network._dijkstra(road_network.forward, int(source)).get(int(target), np.inf)
+        assert road_network.shortest_path_minutes(int(source), int(target)) == pytest.approx(expected)
+
+def test_one_to_many_matches_point_to_point(road_network):
+    request = Location(latitude=31.86, longitude=117.38)
+    lats, lons = [31.90, 31.87, 31.93], [117.35, 117.30, 117.38]
+    service = DistanceService(road_network)
+
+    result = service.travel_costs(request, lats, lons)
+
+    expected = [service.travel_cost(request, Location(latitude=lat, longitude=lon)) for lat, lon in zip(lats, lons)]
+    np.testing.assert_allclose(result, expected)
+
+def test_travel_cost_ranks_by_road_not_straight_line(road_network):
+    service = DistanceService(road_network)
+    request = Location(latitude=31.89, longitude=117.38)
+    across_river = Location(latitude=31.90, longitude=117.38)
+    same_bank = Location(latitude=31.85, longitude=117.38)
+
+    assert service.calculate_distance(request, across_river) < service.calculate_distance(request, same_bank)
+    assert service.travel_cost(request, across_river) > service.travel_cost(request, same_bank)
+
+def test_travel_cost_without_road_network_is_haversine():
+    service = DistanceService()
+    loc1, loc2 = Location(latitude=31.88, longitude=117.35), Location(latitude=31.90, longitude=117.36)
+
+    assert service.travel_cost(loc1, loc2) == DistanceService.calculate_distance(loc1, loc2)
+
+def test_one_to_many_skips_targets_the_landmarks_prove_unreachable(road_network, monkeypatch):
+    # A street cut off from the grid, next to its south-west corner
+    isolated = RoadNetwork(
+        np.append(road_network.node_lats, [31.845, 31.845]), np.append(road_network.node_lons, [117.30, 117.31]),
+        [(u, v, minutes) for u, edges in enumerate(road_network.forward) for v, minutes in edges]
+        + [(len(road_network), len(road_network) + 1, 0.5), (len(road_network) + 1, len(road_network), 0.5)],
+        landmark_count=4,
+    )
+    searched = []
+    dijkstra = isolated._dijkstra
+    monkeypatch.setattr(isolated, "_dijkstra", lambda graph, source, targets=None, max_minutes=np.inf:
+                        searched.append(targets) or dijkstra(graph, source, targets, max_minutes))
+
+    result = isolated.travel_times_to(31.86, 117.31, [31.87, 31.8449], [117.31, 117.305])
+
+    assert np.isfinite(result[0]) and result[1] == np.inf
+    assert searched == [{isolated.nearest_node(31.87, 117.31)[0]}]
+
+def test_travel_costs_beyond_max_minutes_are_unreachable(road_network):
+    request = Location(latitude=31.89, longitude=117.38)
+    lats, lons = [31.88, 31.90], [117.38, 117.38]
+    unbounded = DistanceService(road_network).travel_costs(request, lats, lons)
+
+    bounded = DistanceService(road_network, max_minutes=(unbounded[0] + unbounded[1]) / 2).travel_costs(request, lats, lons)
+
+    assert bounded[0] == unbounded[0] and bounded[1] == np.inf
@@ -1,92 +1,257 @@
+import asyncio
 import pytest
+import numpy as np
+from pathlib import Path
 from unittest.mock import Mock, patch
 from src.services.geofencing_service import GeofencingService
 from src.models.schemas import Location
 from src.utils.config import Settings
-from arcgis.geometry import Geometry, Point
+from src.utils.geometry import PreparedPolygon, RasterMask, load_geojson, BOUNDARY
 
-class MockGeometry:
-    def __init__(self, contains_result=True):
-        self.contains_result = contains_result
-
-    def contains(self, point):
-        return self.contains_result
+SERVICE_AREA_GEOJSON = str(Path(__file__).parent.parent.parent / "geojson" / "tests" / "service_area.geojson")
 
 @pytest.fixture
 def mock_settings():
-    return Mock(spec=Settings, ARCGIS_PORTAL_URL="http://mock-portal.com", 
-                ARCGIS_API_KEY="mock-api-key", 
-                SERVICE_AREA_LAYER_URL="http://mock-service-area-layer.com")
+    return Mock(spec=Settings, ARCGIS_PORTAL_URL="http://mock-portal.com",
+                ARCGIS_API_KEY="mock-api-key",
+                SERVICE_AREA_LAYER_URL="http://mock-service-area-layer.com",
+                SERVICE_AREA_GEOJSON_PATH=None,
+                SERVICE_AREA_SNAPSHOT_PATH=None,
+                SERVICE_AREA_REFRESH_INTERVAL=3600,
+                SERVICE_AREA_RETRY_INTERVAL=60,
+                GEOFENCE_GRID_SIZE=64, GEOFENCE_GRID_REFINE=4,
+                GEOFENCE_GRID_MAX_CELLS=1_048_576)
 
 @pytest.fixture
-def mock_gis():
-    return Mock()
+def geojson_settings():
+    return Mock(spec=Settings, ARCGIS_PORTAL_URL=None, ARCGIS_API_KEY=None,
+                SERVICE_AREA_LAYER_URL=None,
+                SERVICE_AREA_GEOJSON_PATH=SERVICE_AREA_GEOJSON,
+                SERVICE_AREA_SNAPSHOT_PATH=None,
+                SERVICE_AREA_REFRESH_INTERVAL=3600,
+                SERVICE_AREA_RETRY_INTERVAL=60,
+                GEOFENCE_GRID_SIZE=64, GEOFENCE_GRID_REFINE=4,
+                GEOFENCE_GRID_MAX_CELLS=1_048_576)
 
 @pytest.fixture
-def mock_feature_layer():
-    mock_feature = Mock()
-    mock_feature.geometry = {'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
-    mock_query = Mock()
-    mock_query.features = [mock_feature]
-    mock_layer = Mock()
-    mock_layer.query.return_value = mock_query
-    return mock_layer
+def mock_gis():
+    return Mock()
 
 @pytest.fixture
-def geofencing_service(mock_settings, mock_gis, mock_feature_layer):
-    with patch('src.services.geofencing_service.FeatureLayer', return_value=mock_feature_layer):
-        with patch('src.services.geofencing_service.Geometry', return_value=MockGeometry()):
-            service = GeofencingService(settings=mock_settings, gis=mock_gis)
-            return service
+def geofencing_service(geojson_settings):
+    return GeofencingService(settings=geojson_settings)
 
 def test_is_location_allowed_inside(geofencing_service):
     location = Location(latitude=31.88, longitude=117.35)
-    geofencing_service.service_area = MockGeometry(contains_result=True)
-    
+
     result = geofencing_service.is_location_allowed(location)
-    
+
     assert result is True
 
 def test_is_location_allowed_outside(geofencing_service):
     location = Location(latitude=32.0, longitude=118.0)
-    geofencing_service.service_area = MockGeometry(contains_result=False)
-    
+
     result = geofencing_service.is_location_allowed(location)
-    
+
     assert result is False
 
+def test_is_location_allowed_inside_bbox_outside_polygon(geofencing_service):
+    # North-east corner of the bounding box lies outside the polygon
+    location = Location(latitude=31.904, longitude=117.365)
+
+    assert geofencing_service.is_location_allowed(location) is False
+
 def test_is_location_allowed_error(geofencing_service):
     location = Location(latitude=31.88, longitude=117.35)
-    geofencing_service.service_area = MockGeometry()
+    geofencing_service.service_area = Mock(mask=None)
     geofencing_service.service_area.contains = Mock(side_effect=Exception("Test error"))
-    
+
     result = geofencing_service.is_location_allowed(location)
-    
+
     assert result is False
     geofencing_service.service_area.contains.assert_called_once()
 
+def test_no_service_area_source(geojson_settings):
+    geojson_settings.SERVICE_AREA_GEOJSON_PATH = None
+
+    service = GeofencingService(settings=geojson_settings)
+
+    assert service.service_area is None
+    assert service.is_location_allowed(Location(latitude=31.88, longitude=117.35)) is False
+
+def test_export_service_area_round_trip(geofencing_service, tmp_path):
+    path = str(tmp_path / "service_area.geojson")
+
+    geofencing_service.export_service_area(path)
+
+    assert load_geojson(path).bounds == geofencing_service.service_area.bounds
+
+def test_prepared_polygon_matches_brute_force():
+    square_with_hole = {
+        "type": "Polygon",
+        "coordinates": [
+            [[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]],
+            [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]],
+        ],
+    }
+    polygon = PreparedPolygon.from_geometry(square_with_hole, bucket_count=7)
+    rng = np.random.default_rng(0)
+    xs, ys = rng.uniform(-2, 12, 2000), rng.uniform(-2, 12, 2000)
+
+    expected = (xs > 0) & (xs < 10) & (ys > 0) & (ys < 10) & ~((xs > 4) & (xs < 6) & (ys > 4) & (ys < 6))
+
+    assert [polygon.contains(x, y) for x, y in zip(xs, ys)] == expected.tolist()
+    assert polygon.contains_many(xs, ys).tolist() == expected.tolist()
+
+def test_raster_mask_agrees_with_exact_test(geofencing_service):
+    service_area = geofencing_service.service_area
+    min_x, min_y, max_x, max_y = service_area.bounds
+    rng = np.random.default_rng(1)
+    xs, ys = rng.uniform(min_x - 0.01, max_x + 0.01, 5000), rng.uniform(min_y - 0.01, max_y + 0.01, 5000)
+
+    cells = service_area.mask.lookup_many(xs, ys)
+    decided = cells != BOUNDARY
+
+    assert decided.mean() > 0.9
+    assert ((cells == 1) == service_area.contains_many(xs, ys))[decided].all()
+    assert [service_area.mask.lookup(x, y) for x, y in zip(xs, ys)] == cells.tolist()
+
+def test_raster_mask_respects_cell_budget(geofencing_service):
+    mask = RasterMask(geofencing_service.service_area, grid_size=512, refine=8, max_cells=10_000)
+
+    assert mask.rows * mask.cols + mask.fine.shape[0] * 64 <= 10_000
+
+def test_stats_count_fast_path(geofencing_service):
+    geofencing_service.is_location_allowed(Location(latitude=31.88, longitude=117.35))
+    geofencing_service.are_locations_allowed([Location(latitude=32.0, longitude=118.0)] * 3)
+
+    stats = geofencing_service.stats()
+
+    assert stats["fast_path_hits"] + stats["exact_checks"] == 4
+    assert stats["fast_path_hit_rate"] == 1.0
+
+def test_prepared_polygon_writes_separate_areas_as_a_multipolygon():
+    islands = {
+        "type": "MultiPolygon",
+        "coordinates": [
+            [[[0, 0], [10, 0], [10, 10], [0, 10], [0, 0]], [[4, 4], [6, 4], [6, 6], [4, 6], [4, 4]]],
+            [[[20, 0], [30, 0], [30, 10], [20, 10], [20, 0]]],
+            # An island in the hole of the first area
+            [[[4.5, 4.5], [5.5, 4.5], [5.5, 5.5], [4.5, 5.5], [4.5, 4.5]]],
+        ],
+    }
+    polygon = PreparedPolygon.from_geometry(islands)
+
+    geometry = polygon.to_geojson()["geometry"]
+
+    assert geometry == islands
+    round_trip = PreparedPolygon.from_geometry(geometry)
+    rng = np.random.default_rng(2)
+    xs, ys = rng.uniform(-2, 32, 2000), rng.uniform(-2, 12, 2000)
+    assert round_trip.contains_many(xs, ys).tolist() == polygon.contains_many(xs, ys).tolist()
+    assert PreparedPolygon.from_geometry({"type": "Polygon", "coordinates": islands["coordinates"][0]}
+                                         ).to_geojson()["geometry"]["type"] == "Polygon"
+
+def test_prepared_polygon_reads_esri_rings():
+    polygon = PreparedPolygon.from_geometry({"rings": [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]})
+
+    assert polygon.contains(0.5, 0.5)
+    assert not polygon.contains(1.5, 0.5)
+
 @patch('src.services.geofencing_service.FeatureLayer')
 def test_get_service_area_success(mock_feature_layer, mock_gis, mock_settings):
     mock_feature = Mock()
     mock_feature.geometry = {'type': 'Polygon', 'coordinates': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
     mock_feature_layer.return_value.query.return_value.features = [mock_feature]
-    
+
     service = GeofencingService(settings=mock_settings, gis=mock_gis)
-    
-    assert isinstance(service.service_area, Geometry)
+
+    assert isinstance(service.service_area, PreparedPolygon)
+    assert service.is_location_allowed(Location(latitude=0.5, longitude=0.5))
+
+@patch('src.services.geofencing_service.FeatureLayer')
+def test_snapshot_survives_arcgis_outage(mock_feature_layer, mock_gis, mock_settings, tmp_path):
+    mock_settings.SERVICE_AREA_SNAPSHOT_PATH = str(tmp_path / "snapshot.geojson")
+    mock_feature = Mock()
+    mock_feature.geometry = {'rings': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
+    mock_feature_layer.return_value.query.return_value.features = [mock_feature]
+    mock_feature_layer.return_value.properties = {"editingInfo": {"lastEditDate": 1700000000000}}
+    GeofencingService(settings=mock_settings, gis=mock_gis)
+
+    mock_feature_layer.side_effect = Exception("ArcGIS unavailable")
+    service = GeofencingService(settings=mock_settings, gis=mock_gis)
+
+    assert service.version == 1700000000000
+    assert service.is_location_allowed(Location(latitude=0.5, longitude=0.5))
+    with pytest.raises(Exception, match="ArcGIS unavailable"):
+        service.refresh()
+    assert service.is_location_allowed(Location(latitude=0.5, longitude=0.5))
+
+@patch('src.services.geofencing_service.FeatureLayer')
+def test_refresh_skips_unchanged_version(mock_feature_layer, mock_gis, mock_settings):
+    mock_feature = Mock()
+    mock_feature.geometry = {'rings': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
+    mock_feature_layer.return_value.query.return_value.features = [mock_feature]
+    mock_feature_layer.return_value.properties = {"editingInfo": {"lastEditDate": 1}}
+    service = GeofencingService(settings=mock_settings, gis=mock_gis)
+
+    assert service.refresh() is False
+    mock_feature_layer.return_value.properties = {"editingInfo": {"lastEditDate": 2}}
+    assert service.refresh() is True
+    assert mock_feature_layer.return_value.query.call_count == 2
 
 @patch('src.services.geofencing_service.FeatureLayer')
 def test_get_service_area_no_features(mock_feature_layer, mock_gis, mock_settings):
     mock_feature_layer.return_value.query.return_value.features = []
-    
+
+    # An empty layer on a cold start leaves the geofence unavailable instead of failing startup
+    service = GeofencingService(settings=mock_settings, gis=mock_gis)
+
+    assert service.service_area is None
+    assert not service.stats()["available"]
     with pytest.raises(ValueError, match="No features found in the service area layer"):
-        GeofencingService(settings=mock_settings, gis=mock_gis)
+        service.refresh()
 
 @patch('src.services.geofencing_service.FeatureLayer')
 def test_get_service_area_invalid_geometry(mock_feature_layer, mock_gis, mock_settings):
     mock_feature = Mock()
     mock_feature.geometry = None
     mock_feature_layer.return_value.query.return_value.features = [mock_feature]
-    
+    service = GeofencingService(settings=mock_settings, gis=mock_gis)
+
     with pytest.raises(ValueError, match="Invalid geometry in the service area feature"):
-        GeofencingService(settings=mock_settings, gis=mock_gis)
\ No newline at end of file
+        service.refresh()
+
+@pytest.mark.asyncio
+@patch('src.services.geofencing_service.FeatureLayer')
+async def test_cold_start_outage_is_retried_in_the_background(mock_feature_layer, mock_gis, mock_settings):
+    mock_settings.SERVICE_AREA_REFRESH_INTERVAL = 0
+    mock_settings.SERVICE_AREA_RETRY_INTERVAL = 0
+    mock_feature = Mock()
+    mock_feature.geometry = {'rings': [[[0, 0], [0, 1], [1, 1], [1, 0], [0, 0]]]}
+    mock_feature_layer.return_value.query.side_effect = [Exception("ArcGIS unavailable")] * 2 + [
+        Mock(features=[mock_feature])
+    ]
+    service = GeofencingService(settings=mock_settings, gis=mock_gis)
+    assert not service.is_location_allowed(Location(latitude=0.5, longitude=0.5))
+
+    # Retried although periodic refresh is off, and stopped once the layer loads
+    await service.start()
+    await asyncio.wait_for(service._refresh_task, 1)
+
+    assert service.is_location_allowed(Location(latitude=0.5, longitude=0.5))
+    assert mock_feature_layer.return_value.query.call_count == 3
+    await service.close()
+
+def test_are_locations_allowed_matches_scalar(geofencing_service):
+    locations = [
+        Location(latitude=31.88, longitude=117.35),
+        Location(latitude=32.0, longitude=118.0),
+        Location(latitude=31.904, longitude=117.365),
+        Location(latitude=31.875, longitude=117.36),
+    ]
+
+    result = geofencing_service.are_locations_allowed(locations)
+
+    assert result.tolist() == [geofencing_service.is_location_allowed(location) for location in locations]
+    assert result.tolist() == [True, False, False, True]
@@ -0,0 +1,111 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+from aiokafka.structs import TopicPartition
+from src.services.kafka_consumer_service import KafkaConsumerService, _PartitionWorkersListener
+from src.utils.codec import get_codec
+
+FIRST, SECOND = TopicPartition("worker_updates", 0), TopicPartition("worker_updates", 1)
+
+def record(partition: TopicPartition, offset: int) -> SimpleNamespace:
+    value = get_codec("json").encode({"partition": partition.partition, "offset": offset})
+    return SimpleNamespace(topic=partition.topic, partition=partition.partition, offset=offset, value=value)
+
+def mock_consumer(*batches):
+    batches = list(batches)
+    consumer = MagicMock()
+
+    async def getmany(timeout_ms, max_records):
+        if batches:
+            return batches.pop(0)
+        await asyncio.sleep(0.01)
+        return {}
+
+    consumer.getmany = AsyncMock(side_effect=getmany)
+    consumer.commit = AsyncMock()
+    consumer.stop = AsyncMock()
+    return consumer
+
+async def wait_until(condition):
+    for _ in range(200):
+        if condition():
+            return
+        await asyncio.sleep(0.005)
+    raise AssertionError("condition not reached")
+
+@pytest.mark.asyncio
+async def test_partitions_are_handled_in_parallel_and_in_order():
+    handled = []
+    second_started = asyncio.Event()
+
+    async def handler(message):
+        if message["partition"] == 1:
+            second_started.set()
+        elif message["offset"] == 0:
+            # Waits on the other partition, so handling them one at a time would stall here
+            await asyncio.wait_for(second_started.wait(), 1)
+        handled.append((message["partition"], message["offset"]))
+
+    consumer = mock_consumer({FIRST: [record(FIRST, 0), record(FIRST, 1)], SECOND: [record(SECOND, 0)]})
+    service = KafkaConsumerService("worker_updates", group_id="test", handler=handler, commit_interval=60)
+    service.consumer = consumer
+    await service.start()
+    await wait_until(lambda: len(handled) == 3)
+    await service.close()
+
+    assert handled.index((1, 0)) < handled.index((0, 0)) < handled.index((0, 1))
+    # Offsets are committed together, the one after the last handled message of each partition
+    consumer.commit.assert_awaited_once_with({FIRST: 2, SECOND: 1})
+    assert service.stats() == {"partitions": 0, "in_flight": 0, "handled": 3, "failed": 0, "commits": 1}
+    consumer.stop.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_revoked_partition_finishes_its_message_and_commits_it():
+    release = asyncio.Event()
+
+    async def handler(message):
+        await release.wait()
+        if message["offset"] == 0:
+            raise ValueError("malformed update")
+
+    consumer = mock_consumer({FIRST: [record(FIRST, offset) for offset in range(3)]})
+    service = KafkaConsumerService("worker_updates", group_id="test", handler=handler, prefetch=2,
+                                   max_in_flight=10, commit_interval=60)
+    service.consumer = consumer
+    await service.start()
+    await wait_until(lambda: service.in_flight == 3 and consumer.getmany.await_count > 1)
+    # The worker is behind by a full prefetch, so its partition stops being fetched
+    consumer.pause.assert_called_with(FIRST)
+
+    revoked = asyncio.create_task(_PartitionWorkersListener(service).on_partitions_revoked({FIRST}))
+    await asyncio.sleep(0.01)
+    assert not revoked.done()
+    release.set()
+    await revoked
+
+    # The failed message is skipped and committed; the queued ones are left to the next owner
+    consumer.commit.assert_awaited_once_with({FIRST: 1})
+    assert (service.handled, service.failed, service.in_flight) == (1, 1, 0)
+    await service.close()
+
+@pytest.mark.asyncio
+async def test_initialized_consumer_runs_until_close(monkeypatch):
+    consumer = mock_consumer()
+    consumer.start = AsyncMock()
+    consumer.assignment.return_value = set()
+    factory = MagicMock(return_value=consumer)
+    monkeypatch.setattr("src.utils.kafka_config.AIOKafkaConsumer", factory)
+    service = KafkaConsumerService("worker_updates", group_id="test", handler=AsyncMock())
+
+    await service.initialize()
+    # Long enough for a dropped async generator to have been finalized
+    await asyncio.sleep(0.25)
+
+    assert factory.call_args.kwargs["group_id"] == "test"
+    assert factory.call_args.kwargs["enable_auto_commit"] is False
+    assert consumer.subscribe.call_args.kwargs["topics"] == ["worker_updates"]
+    consumer.start.assert_awaited_once()
+    consumer.stop.assert_not_awaited()
+    await service.close()
+    consumer.stop.assert_awaited_once()
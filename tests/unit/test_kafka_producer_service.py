@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from src.services.kafka_producer_service import KafkaProducerService
+from src.utils.codec import Codec
+from src.utils.error_handling import AppException
+
+def mock_producer(service):
+    deliveries = []
+
+    async def send(topic, value, key=None):
+        deliveries.append(asyncio.get_running_loop().create_future())
+        return deliveries[-1]
+
+    service.producer = MagicMock()
+    service.producer.send = AsyncMock(side_effect=send)
+    return deliveries
+
+@pytest.mark.asyncio
+async def test_publish_returns_before_delivery_and_reports_it():
+    service = KafkaProducerService()
+    deliveries = mock_producer(service)
+    reports = []
+
+    await service.publish("care_requests.normal", {"request_id": "1"}, key=b"cell",
+                          on_delivery=lambda topic, message, error: reports.append((topic, message, error)))
+
+    topic, value = service.producer.send.await_args.args
+    assert topic == "care_requests.normal" and Codec.decode(value) == {"request_id": "1"}
+    assert service.stats()["in_flight"] == 1 and reports == []
+    deliveries[0].set_result(None)
+    await asyncio.sleep(0)
+    assert reports == [("care_requests.normal", {"request_id": "1"}, None)]
+    assert service.stats() == {"in_flight": 0, "max_in_flight": service.max_in_flight, "delivered": 1, "failed": 0}
+
+@pytest.mark.asyncio
+async def test_publish_waits_while_too_many_messages_are_unacknowledged():
+    service = KafkaProducerService(max_in_flight=2)
+    deliveries = mock_producer(service)
+    await service.publish("worker_updates", {"worker_id": "1"})
+    await service.publish("worker_updates", {"worker_id": "2"})
+
+    third = asyncio.create_task(service.publish("worker_updates", {"worker_id": "3"}))
+    await asyncio.sleep(0)
+    assert not third.done()
+
+    # A failed delivery frees its slot as well
+    deliveries[0].set_exception(ConnectionError("broker down"))
+    await third
+    assert service.stats()["failed"] == 1 and service.stats()["in_flight"] == 2
+
+@pytest.mark.asyncio
+async def test_publish_requires_initialized_producer():
+    with pytest.raises(AppException):
+        await KafkaProducerService().publish("worker_updates", {})
+
+@pytest.mark.asyncio
+async def test_initialized_producer_runs_until_close(monkeypatch):
+    producer = MagicMock()
+    producer.start, producer.stop = AsyncMock(), AsyncMock()
+    monkeypatch.setattr("src.utils.kafka_config.AIOKafkaProducer", MagicMock(return_value=producer))
+    service = KafkaProducerService()
+
+    await service.initialize()
+    # Long enough for a dropped async generator to have been finalized
+    await asyncio.sleep(0.25)
+
+    assert service.producer is producer
+    producer.start.assert_awaited_once()
+    producer.stop.assert_not_awaited()
+    await service.close()
+    producer.stop.assert_awaited_once()
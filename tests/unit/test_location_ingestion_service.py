@@ -0,0 +1,150 @@
+import pytest
+import time
+from datetime import datetime, timezone
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from fastapi import status
+from src.models.schemas import LocationPing
+from src.services.care_worker_service import CareWorkerService
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.location_ingestion_service import LocationIngestionService
+from src.services.redis_cache_service import RedisCacheService
+from src.services.worker_geo_index_service import WorkerGeoIndexService
+from src.utils.config import get_settings
+from src.utils.error_handling import AppException
+
+@pytest.fixture
+def ingestion_service():
+    service = LocationIngestionService(get_settings(), AsyncMock(spec=RedisCacheService),
+                                       AsyncMock(spec=KafkaProducerService), AsyncMock(spec=CareWorkerService))
+    service.geo_index = AsyncMock(spec=WorkerGeoIndexService)
+    service.geo_index.move_workers.side_effect = lambda members: [worker_id for _, _, worker_id in members]
+    return service
+
+@pytest.fixture
+def mock_collection(monkeypatch):
+    collection = MagicMock()
+    collection.bulk_write = AsyncMock()
+    monkeypatch.setattr("src.services.location_ingestion_service.get_care_workers_collection",
+                        AsyncMock(return_value=collection))
+    return collection
+
+@pytest.mark.asyncio
+async def test_flush_writes_latest_ping_per_worker_in_one_round_trip(ingestion_service):
+    first, second = str(ObjectId()), str(ObjectId())
+    ingestion_service.submit(first, 31.80, 117.30, timestamp=1)
+    ingestion_service.submit(second, 31.85, 117.35, timestamp=1)
+    ingestion_service.submit(first, 31.81, 117.31, timestamp=2)
+
+    assert await ingestion_service.flush() == 2
+
+    ingestion_service.geo_index.move_workers.assert_awaited_once_with(
+        [(117.31, 31.81, first), (117.35, 31.85, second)]
+    )
+    topic, messages = ingestion_service.kafka_producer.publish_messages.await_args.args
+    assert topic == "worker_updates"
+    assert messages[0] == {"worker_id": first, "current_location": {"latitude": 31.81, "longitude": 117.31}}
+    assert ingestion_service.coalesced == 1
+    # Nothing new, no round trip
+    assert await ingestion_service.flush() == 0
+    ingestion_service.geo_index.move_workers.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_out_of_order_pings_do_not_overwrite_newer_ones(ingestion_service):
+    worker_id = str(ObjectId())
+    assert ingestion_service.submit(worker_id, 31.81, 117.31, timestamp=10)
+    await ingestion_service.flush()
+
+    # Delayed in the app's queue; the worker has moved on since
+    assert not ingestion_service.submit(worker_id, 31.80, 117.30, timestamp=5)
+
+    assert await ingestion_service.flush() == 0
+    assert ingestion_service.stale == 1
+
+@pytest.mark.asyncio
+async def test_persist_writes_flushed_positions_in_one_bulk_write(ingestion_service, mock_collection):
+    worker_id = str(ObjectId())
+    for step in range(5):
+        ingestion_service.submit(worker_id, 31.8 + step / 100, 117.3, timestamp=step)
+        await ingestion_service.flush()
+
+    assert await ingestion_service.persist() == 1
+
+    (operations,), kwargs = mock_collection.bulk_write.await_args
+    assert len(operations) == 1
+    assert operations[0]._filter == {"_id": ObjectId(worker_id)}
+    assert operations[0]._doc == {"$set": {"current_location": {"latitude": 31.84, "longitude": 117.3}}}
+    # Cached copies of the worker would otherwise keep its old location
+    ingestion_service.care_worker_service.invalidate_workers.assert_awaited_once_with([worker_id])
+    assert await ingestion_service.persist() == 0
+    mock_collection.bulk_write.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_failed_flush_is_retried_unless_superseded(ingestion_service):
+    moved, idle = str(ObjectId()), str(ObjectId())
+    ingestion_service.submit(moved, 31.80, 117.30, timestamp=1)
+    ingestion_service.submit(idle, 31.90, 117.40, timestamp=1)
+    ingestion_service.geo_index.move_workers.side_effect = [AppException(status_code=500, detail="down"),
+                                                            [moved, idle]]
+
+    assert await ingestion_service.flush() == 0
+    ingestion_service.submit(moved, 31.82, 117.32, timestamp=2)
+    assert await ingestion_service.flush() == 2
+
+    members = ingestion_service.geo_index.move_workers.await_args.args[0]
+    assert sorted(members, key=lambda member: member[2]) == sorted(
+        [(117.32, 31.82, moved), (117.40, 31.90, idle)], key=lambda member: member[2]
+    )
+
+@pytest.mark.asyncio
+async def test_flush_drops_workers_missing_from_the_geo_index(ingestion_service):
+    known, unknown = str(ObjectId()), str(ObjectId())
+    ingestion_service.submit(known, 31.80, 117.30, timestamp=1)
+    ingestion_service.submit(unknown, 31.90, 117.40, timestamp=1)
+    ingestion_service.geo_index.move_workers.side_effect = None
+    ingestion_service.geo_index.move_workers.return_value = [known]
+
+    assert await ingestion_service.flush() == 1
+
+    # Neither published to the scheduler nor persisted
+    _, messages = ingestion_service.kafka_producer.publish_messages.await_args.args
+    assert [message["worker_id"] for message in messages] == [known]
+    assert ingestion_service.stats()["unsaved"] == 1
+    assert ingestion_service.unknown == 1
+    # Only workers the geo index knows stay tracked for ordering their pings
+    assert ingestion_service.stats()["tracked"] == 1
+
+def test_future_timestamps_count_as_now(ingestion_service):
+    worker_id = str(ObjectId())
+    # The device's clock runs an hour ahead
+    assert ingestion_service.submit(worker_id, 31.80, 117.30, timestamp=time.time() + 3600)
+
+    assert ingestion_service.submit(worker_id, 31.81, 117.31)
+    assert ingestion_service.stale == 0
+
+@pytest.mark.asyncio
+async def test_supersede_drops_queued_pings(ingestion_service, mock_collection):
+    worker_id = str(ObjectId())
+    ingestion_service.submit(worker_id, 31.80, 117.30, timestamp=1)
+    await ingestion_service.flush()
+    ingestion_service.submit(worker_id, 31.81, 117.31, timestamp=2)
+
+    # The location was written straight to MongoDB in the meantime
+    ingestion_service.supersede(worker_id)
+
+    assert await ingestion_service.flush() == 0
+    assert await ingestion_service.persist() == 0
+    assert not ingestion_service.submit(worker_id, 31.82, 117.32, timestamp=3)
+
+def test_submit_many_takes_app_timestamps_and_limits_batch_size(ingestion_service):
+    worker_id = str(ObjectId())
+    newer = LocationPing(worker_id=worker_id, latitude=31.81, longitude=117.31,
+                         timestamp=datetime(2024, 1, 1, 0, 0, 5, tzinfo=timezone.utc))
+    older = LocationPing(worker_id=worker_id, latitude=31.80, longitude=117.30,
+                         timestamp=datetime(2024, 1, 1, 0, 0, 1, tzinfo=timezone.utc))
+
+    assert ingestion_service.submit_many([newer, older]) == 1
+
+    with pytest.raises(AppException) as exc_info:
+        ingestion_service.submit_many([newer] * (get_settings().LOCATION_BATCH_MAX_ITEMS + 1))
+    assert exc_info.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
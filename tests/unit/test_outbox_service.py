@@ -0,0 +1,74 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from pymongo.errors import DuplicateKeyError
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.outbox_service import OUTBOX_RELAY_LEASE, _RELAY_ORDER, OutboxRelayService, outbox_event
+from src.utils.error_handling import AppException
+
+@pytest.fixture
+def kafka_producer():
+    return MagicMock(spec=KafkaProducerService)
+
+def mock_outbox(monkeypatch, events):
+    outbox = AsyncMock()
+    outbox.find = MagicMock()
+    outbox.find.return_value.sort.return_value.limit.return_value.to_list = AsyncMock(return_value=events)
+    monkeypatch.setattr("src.services.outbox_service.get_outbox_collection", AsyncMock(return_value=outbox))
+    return outbox
+
+@pytest.mark.asyncio
+async def test_relay_removes_events_up_to_the_first_failed_delivery(kafka_producer, monkeypatch):
+    events = [outbox_event("care_requests.normal", {"request_id": str(index)}, key=b"cell") for index in range(3)]
+    outbox = mock_outbox(monkeypatch, events)
+    errors = iter([None, ConnectionError("broker unavailable"), None])
+
+    async def publish(topic, message, key=None, on_delivery=None):
+        on_delivery(topic, message, next(errors))
+
+    kafka_producer.publish = AsyncMock(side_effect=publish)
+    relay = OutboxRelayService(kafka_producer, batch_size=3)
+
+    assert await relay.relay_batch() == 1
+
+    # Published in order, with the event ID for consumers to deduplicate on
+    messages = [call.args[1] for call in kafka_producer.publish.await_args_list]
+    assert [message["event_id"] for message in messages] == [str(event["_id"]) for event in events]
+    # The third event was delivered but stays behind the failed one, to be sent again in order
+    outbox.delete_many.assert_awaited_once_with({"_id": {"$in": [events[0]["_id"]]}})
+    assert relay.stats() == {"lease_held": False, "relayed": 1, "failed_rounds": 1}
+
+@pytest.mark.asyncio
+async def test_relay_lease_is_held_by_one_process(kafka_producer, monkeypatch):
+    leases = AsyncMock()
+    leases.update_one.side_effect = [MagicMock(), DuplicateKeyError("E11000 duplicate key error")]
+    monkeypatch.setattr("src.services.outbox_service.get_leases_collection", AsyncMock(return_value=leases))
+    holder = OutboxRelayService(kafka_producer, lease_seconds=10)
+    other = OutboxRelayService(kafka_producer, lease_seconds=10)
+
+    assert await holder.hold_lease()
+    assert not await other.hold_lease()
+    # Renewed only once half of the lease has run out
+    assert await holder.hold_lease()
+    assert leases.update_one.await_count == 2
+    query = leases.update_one.await_args_list[0].args[0]
+    assert query["_id"] == OUTBOX_RELAY_LEASE
+    assert {"owner": holder.instance_id} in query["$or"]
+
+    await holder.close()
+    leases.delete_one.assert_awaited_once_with({"_id": OUTBOX_RELAY_LEASE, "owner": holder.instance_id})
+
+@pytest.mark.asyncio
+async def test_relay_starts_only_with_transactions_available(kafka_producer, monkeypatch):
+    client = MagicMock()
+    client.admin.command = AsyncMock(side_effect=[{"ismaster": True}, {"setName": "rs0"}])
+    monkeypatch.setattr("src.services.outbox_service.get_client", AsyncMock(return_value=client))
+    outbox = mock_outbox(monkeypatch, [])
+    relay = OutboxRelayService(kafka_producer)
+
+    # A standalone server cannot run the transactions the outbox writes in
+    with pytest.raises(AppException):
+        await relay.initialize()
+    outbox.create_index.assert_not_awaited()
+
+    await relay.initialize()
+    outbox.create_index.assert_awaited_once_with(_RELAY_ORDER)
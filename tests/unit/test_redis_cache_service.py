@@ -0,0 +1,44 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from redis.exceptions import ConnectionError
+from src.services.redis_cache_service import RedisCacheService
+from src.utils import redis_config
+from src.utils.config import get_settings
+from src.utils.error_handling import AppException
+
+@pytest.mark.asyncio
+async def test_services_share_one_pooled_client():
+    first, second = RedisCacheService(), RedisCacheService()
+    try:
+        await first.initialize()
+        await second.initialize()
+
+        assert first.redis is second.redis
+        pool = first.redis.connection_pool
+        assert pool.max_connections == get_settings().REDIS_MAX_CONNECTIONS
+        assert pool.connection_kwargs["health_check_interval"] == get_settings().REDIS_HEALTH_CHECK_INTERVAL
+        # Closing a service leaves the shared client to the lifespan
+        await first.close()
+        assert redis_config.redis_client.client is second.redis
+    finally:
+        await redis_config.close_redis_connection()
+    assert redis_config.redis_client.client is None
+
+@pytest.mark.asyncio
+async def test_pipeline_sends_queued_commands_and_wraps_redis_errors():
+    redis_cache = RedisCacheService()
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=[[True, "value"], ConnectionError("reset by peer")])
+    redis_cache.redis = MagicMock()
+    redis_cache.redis.pipeline.return_value.__aenter__.return_value = pipe
+
+    async with redis_cache.pipeline() as queued:
+        queued.set("key", "value")
+        queued.get("key")
+        assert await queued.execute() == [True, "value"]
+
+    with pytest.raises(AppException) as exc_info:
+        async with redis_cache.pipeline(transaction=True) as queued:
+            await queued.execute()
+    assert exc_info.value.status_code == 500
+    redis_cache.redis.pipeline.assert_called_with(transaction=True)
@@ -0,0 +1,769 @@
+import asyncio
+import itertools
+import json
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from aiokafka.coordinator.assignors.range import RangePartitionAssignor
+from aiokafka.errors import CommitFailedError
+from aiokafka.structs import TopicPartition
+from bson import ObjectId
+from src.models.schemas import CareRequest, CareWorker, CareWorkerStatus, Location, ServiceType, UrgencyLevel
+from src.services.care_request_service import CareRequestService
+from src.services.care_worker_service import CareWorkerService
+from src.services.distance_service import DistanceService
+from src.services.kafka_producer_service import KafkaProducerService
+from src.services.redis_cache_service import RedisCacheService
+from src.services.task_scheduler_service import TaskSchedulerService, _ShardRebalanceListener
+from src.utils.assignment import solve_assignment
+from src.utils.dispatch_lanes import LANE_TOPICS, LaneMessage, LaneMetrics, LaneQueue
+from src.utils.error_handling import AppException
+from src.utils.geo_sharding import GeoGrid, GeoPartitioner, ShardRegion, geo_cell_key
+from src.utils.worker_index import WorkerIndex
+from src.utils.worker_table import SPECIALIZATION_BITS, STATUSES, WorkerTable
+
+# Partition 0 of every lane topic, which is where make_message puts requests
+LANE_PARTITIONS = {TopicPartition(topic, 0) for topic in LANE_TOPICS.values()}
+
+def make_request(latitude, longitude, service_type=ServiceType.MEDICAL_CHECKUP, urgency=UrgencyLevel.NORMAL):
+    return CareRequest(
+        _id=str(ObjectId()),
+        client_id=str(ObjectId()),
+        service_type=service_type,
+        urgency=urgency,
+        location=Location(latitude=latitude, longitude=longitude)
+    )
+
+def make_message(care_request, offset):
+    return MagicMock(value=care_request.model_dump_json(by_alias=True), topic=LANE_TOPICS[care_request.urgency],
+                     partition=0, offset=offset, timestamp=None)
+
+def make_worker(latitude, longitude, specializations=(ServiceType.MEDICAL_CHECKUP,), status=CareWorkerStatus.AVAILABLE):
+    return CareWorker(
+        _id=str(ObjectId()),
+        name="Worker",
+        email="worker@example.com",
+        phone_number="123",
+        specializations=list(specializations),
+        care_center_id=str(ObjectId()),
+        current_location=Location(latitude=latitude, longitude=longitude),
+        status=status
+    )
+
+def claims(scheduler):
+    return {call.args[0]: call.args[1] for call in scheduler.care_request_service.claim_care_request.await_args_list}
+
+@pytest.fixture(autouse=True)
+def search_settings(monkeypatch):
+    # Search the whole radius at once unless a test is about the expanding search
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_INITIAL_SEARCH_RADIUS_KM", 10)
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_SEARCH_RADIUS_KM", 10)
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_CANDIDATE_COUNT", 16)
+
+@pytest.fixture
+def task_scheduler_service():
+    care_worker_service = AsyncMock(spec=CareWorkerService)
+    care_worker_service.redis_cache = MagicMock(spec=RedisCacheService)
+    care_request_service = AsyncMock(spec=CareRequestService)
+    return TaskSchedulerService(care_worker_service, care_request_service, DistanceService())
+
+def mock_redis(task_scheduler_service, *rounds):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(side_effect=list(rounds))
+    task_scheduler_service.care_worker_service.redis_cache.pipeline.return_value.__aenter__.return_value = pipe
+    return pipe
+
+def brute_force(cost):
+    # Most matched pairs first, then the lowest total cost
+    rows, cols = cost.shape
+    best = (0, 0.0)
+    for perm in itertools.permutations(range(max(rows, cols)), min(rows, cols)):
+        pairs = zip(range(rows), perm) if rows <= cols else zip(perm, range(cols))
+        values = [cost[row, col] for row, col in pairs if np.isfinite(cost[row, col])]
+        best = min(best, (-len(values), sum(values)))
+    return -best[0], best[1]
+
+@pytest.mark.parametrize("use_scipy", [True, False])
+def test_solve_assignment_matches_brute_force(use_scipy, monkeypatch):
+    if not use_scipy:
+        monkeypatch.setattr("src.utils.assignment.linear_sum_assignment", None)
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        cost = rng.uniform(-1, 1, tuple(rng.integers(1, 6, 2)))
+        cost[rng.random(cost.shape) < 0.3] = np.inf
+
+        rows, cols = solve_assignment(cost)
+
+        assert len(set(rows.tolist())) == len(rows) and len(set(cols.tolist())) == len(cols)
+        assert np.isfinite(cost[rows, cols]).all()
+        matched, total = brute_force(cost)
+        assert len(rows) == matched
+        assert cost[rows, cols].sum() == pytest.approx(total)
+
+def test_worker_score_counts_availability(task_scheduler_service):
+    care_request = make_request(31.88, 117.35)
+    available = make_worker(31.88, 117.35)
+    busy = make_worker(31.88, 117.35, status=CareWorkerStatus.BUSY)
+
+    assert task_scheduler_service._calculate_worker_score(care_request, available) == pytest.approx(1.0)
+    assert task_scheduler_service._calculate_worker_score(care_request, busy) == pytest.approx(0.8)
+
+def test_score_workers_matches_scalar_score(task_scheduler_service):
+    rng = np.random.default_rng(0)
+    service_types, statuses = list(ServiceType), list(CareWorkerStatus)
+    workers = [
+        make_worker(lat, lon, [service_types[k] for k in rng.permutation(4)[:rng.integers(0, 4)]],
+                    statuses[rng.integers(len(statuses))])
+        for lat, lon in zip(rng.uniform(31.8, 32.0, 300), rng.uniform(117.2, 117.5, 300))
+    ]
+    table = WorkerTable.from_workers(workers)
+    task_scheduler_service.distance_weight, task_scheduler_service.availability_weight = 0.5, 0.1
+
+    for service_type in service_types:
+        care_request = make_request(31.9, 117.35, service_type)
+
+        scores = task_scheduler_service._score_workers(care_request, table)
+
+        expected = [task_scheduler_service._calculate_worker_score(care_request, worker) for worker in workers]
+        np.testing.assert_allclose(scores, expected, rtol=1e-12, atol=0)
+        assert int(np.argmax(scores)) == int(np.argmax(expected))
+        rows = np.array([5, 0, 42])
+        np.testing.assert_array_equal(task_scheduler_service._score_workers(care_request, table, rows), scores[rows])
+
+def test_worker_table_rows_round_trip():
+    worker = make_worker(31.88, 117.35, [ServiceType.PERSONAL_CARE, ServiceType.PHYSICAL_THERAPY], CareWorkerStatus.BUSY)
+    document = worker.model_dump(by_alias=True)
+    document["_id"] = ObjectId(document["_id"])
+
+    for table in (WorkerTable.from_workers([worker]), WorkerTable.from_documents([document])):
+        assert table.ids == [str(worker.id)]
+        assert (table.latitudes[0], table.longitudes[0]) == (31.88, 117.35)
+        assert STATUSES[table.statuses[0]] == CareWorkerStatus.BUSY
+        assert table.specializations[0] & SPECIALIZATION_BITS[ServiceType.PERSONAL_CARE]
+        assert not table.specializations[0] & SPECIALIZATION_BITS[ServiceType.MEDICAL_CHECKUP]
+        assert table.indexes([str(ObjectId()), str(worker.id)]).tolist() == [0]
+
+def test_worker_table_treats_missing_or_null_status_as_available():
+    documents = [{"_id": ObjectId(), "current_location": {"latitude": 31.88, "longitude": 117.35}},
+                 {"_id": ObjectId(), "current_location": {"latitude": 31.88, "longitude": 117.35}, "status": None}]
+
+    table = WorkerTable.from_documents(documents)
+
+    assert [STATUSES[code] for code in table.statuses] == [CareWorkerStatus.AVAILABLE] * 2
+
+@pytest.mark.asyncio
+async def test_dispatch_batch_avoids_greedy_contention(task_scheduler_service, monkeypatch):
+    # Both requests prefer the central worker, but only the first can also use the far one
+    central = make_worker(31.880, 117.350)
+    far = make_worker(31.880, 117.400)
+    first = make_request(31.880, 117.352)
+    second = make_request(31.880, 117.348)
+    task_scheduler_service.care_worker_service.get_care_worker_table.return_value = WorkerTable.from_workers([central, far])
+    mock_redis(task_scheduler_service, [[str(central.id), str(far.id)], [str(central.id)]])
+
+    assignments = await task_scheduler_service.dispatch_batch([first, second])
+
+    assert assignments == {str(first.id): str(far.id), str(second.id): str(central.id)}
+    assert claims(task_scheduler_service) == assignments
+
+@pytest.mark.asyncio
+async def test_dispatch_batch_leaves_unreachable_requests_pending(task_scheduler_service, monkeypatch):
+    worker = make_worker(31.88, 117.35)
+    near = make_request(31.88, 117.35)
+    isolated = make_request(32.5, 118.0)
+    task_scheduler_service.care_worker_service.get_care_worker_table.return_value = WorkerTable.from_workers([worker])
+    mock_redis(task_scheduler_service, [[str(worker.id)], []])
+
+    assignments = await task_scheduler_service.dispatch_batch([near, isolated])
+
+    assert assignments == {str(near.id): str(worker.id)}
+
+@pytest.mark.asyncio
+async def test_process_micro_batch_loads_workers_in_one_call(task_scheduler_service, monkeypatch):
+    near = make_worker(31.880, 117.350)
+    farther = make_worker(31.880, 117.360)
+    gone = str(ObjectId())
+    # A worker deleted from the database is missing from the table
+    task_scheduler_service.care_worker_service.get_care_worker_table.return_value = WorkerTable.from_workers([near, farther])
+    care_requests = [make_request(31.880, 117.351) for _ in range(3)]
+    pipe = mock_redis(task_scheduler_service, [[str(near.id), str(farther.id)], [str(farther.id), gone], []])
+
+    assignments = await task_scheduler_service.process_micro_batch(care_requests)
+
+    # Greedy per request, like one message at a time
+    assert assignments == {str(care_requests[0].id): str(near.id), str(care_requests[1].id): str(farther.id)}
+    assert pipe.geosearch.call_count == 3
+    pipe.execute.assert_awaited_once()
+    task_scheduler_service.care_worker_service.get_care_worker_table.assert_awaited_once_with(
+        [str(near.id), str(farther.id), gone]
+    )
+    assert claims(task_scheduler_service) == assignments
+
+@pytest.mark.asyncio
+async def test_process_micro_batch_falls_back_when_reservation_conflicts(task_scheduler_service, monkeypatch):
+    near, middle, far = make_worker(31.880, 117.350), make_worker(31.880, 117.355), make_worker(31.880, 117.360)
+    task_scheduler_service.care_worker_service.get_care_worker_table.return_value = WorkerTable.from_workers([near, middle, far])
+    care_request = make_request(31.880, 117.350)
+    mock_redis(task_scheduler_service, [[str(near.id), str(middle.id), str(far.id)]])
+    # Another dispatch reserved the nearest worker after the candidates were read
+    task_scheduler_service.care_worker_service.reserve_care_worker.side_effect = lambda worker_id: worker_id != str(near.id)
+
+    assignments = await task_scheduler_service.process_micro_batch([care_request])
+
+    assert assignments == {str(care_request.id): str(middle.id)}
+    reserved = [call.args[0] for call in task_scheduler_service.care_worker_service.reserve_care_worker.await_args_list]
+    assert reserved == [str(near.id), str(middle.id)]
+
+@pytest.mark.asyncio
+async def test_process_micro_batch_searches_again_for_contended_requests(task_scheduler_service, monkeypatch):
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_CANDIDATE_COUNT", 1)
+    near, far = make_worker(31.880, 117.350), make_worker(31.880, 117.380)
+    task_scheduler_service.worker_index = WorkerIndex.from_table(WorkerTable.from_workers([near, far]))
+    care_requests = [make_request(31.880, 117.350) for _ in range(2)]
+
+    assignments = await task_scheduler_service.process_micro_batch(care_requests)
+
+    # Both requests only see the nearest worker at first; the one that loses it finds the next
+    assert sorted(assignments.values()) == sorted([str(near.id), str(far.id)])
+
+@pytest.mark.asyncio
+async def test_concurrent_dispatches_never_share_a_worker(monkeypatch):
+    workers = [make_worker(31.880, 117.350 + i * 0.001) for i in range(3)]
+    care_requests = [make_request(31.880, 117.350) for _ in range(8)]
+    status = {str(worker.id): CareWorkerStatus.AVAILABLE for worker in workers}
+
+    async def reserve_care_worker(worker_id):
+        await asyncio.sleep(0)
+        if status[worker_id] != CareWorkerStatus.AVAILABLE:
+            return False
+        status[worker_id] = CareWorkerStatus.BUSY
+        return True
+
+    def make_scheduler():
+        care_worker_service = AsyncMock(spec=CareWorkerService)
+        care_worker_service.reserve_care_worker.side_effect = reserve_care_worker
+        scheduler = TaskSchedulerService(care_worker_service, AsyncMock(spec=CareRequestService), DistanceService())
+        scheduler.worker_index = WorkerIndex.from_table(WorkerTable.from_workers(workers))
+        return scheduler
+
+    # Two schedulers with their own indexes, racing for the same three workers
+    results = await asyncio.gather(make_scheduler().process_micro_batch(care_requests[:4]),
+                                   make_scheduler().process_micro_batch(care_requests[4:]))
+
+    assigned = [worker_id for assignments in results for worker_id in assignments.values()]
+    assert sorted(assigned) == sorted(status)
+
+@pytest.mark.asyncio
+async def test_reservation_is_released_when_request_was_taken(task_scheduler_service):
+    worker = make_worker(31.880, 117.350)
+    care_request = make_request(31.880, 117.350)
+    task_scheduler_service.worker_index = WorkerIndex.from_table(WorkerTable.from_workers([worker]))
+    task_scheduler_service.care_request_service.claim_care_request.return_value = False
+
+    assignments = await task_scheduler_service.process_micro_batch([care_request])
+
+    assert assignments == {}
+    task_scheduler_service.care_worker_service.release_care_worker.assert_awaited_once_with(str(worker.id))
+    assert task_scheduler_service.worker_index.nearest(31.880, 117.350, 1, statuses=[CareWorkerStatus.AVAILABLE]) == [str(worker.id)]
+
+@pytest.mark.asyncio
+async def test_reservation_is_released_when_the_claim_fails(task_scheduler_service):
+    worker = make_worker(31.880, 117.350)
+    care_request = make_request(31.880, 117.350)
+    task_scheduler_service.worker_index = WorkerIndex.from_table(WorkerTable.from_workers([worker]))
+    task_scheduler_service.care_request_service.claim_care_request.side_effect = AppException(
+        status_code=500, detail="Transaction aborted")
+
+    with pytest.raises(AppException):
+        await task_scheduler_service.process_micro_batch([care_request])
+
+    task_scheduler_service.care_worker_service.release_care_worker.assert_awaited_once_with(str(worker.id))
+    assert task_scheduler_service.worker_index.nearest(31.880, 117.350, 1, statuses=[CareWorkerStatus.AVAILABLE]) == [str(worker.id)]
+
+@pytest.mark.asyncio
+async def test_process_tasks_commits_once_per_batch(task_scheduler_service, monkeypatch):
+    care_requests = [make_request(31.88, 117.35) for _ in range(5)]
+    messages = [make_message(care_request, offset) for offset, care_request in enumerate(care_requests)]
+    batches = [{"partition-0": messages[:3]}, {}, {"partition-0": messages[3:]}]
+    consumer = MagicMock()
+    consumer.getmany = AsyncMock(side_effect=batches + [asyncio.CancelledError()])
+    consumer.commit = AsyncMock()
+    consumer.assignment.return_value = LANE_PARTITIONS
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        assert set(topics) == set(LANE_TOPICS.values())
+        assert kwargs["enable_auto_commit"] is False
+        assert kwargs["partition_assignment_strategy"] == (RangePartitionAssignor,)
+        yield consumer
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_kafka_consumer", get_kafka_consumer)
+    task_scheduler_service.process_micro_batch = AsyncMock(
+        side_effect=lambda care_requests: {str(care_request.id): "worker" for care_request in care_requests})
+
+    with pytest.raises(asyncio.CancelledError):
+        await task_scheduler_service.process_tasks()
+
+    assert [len(call.args[0]) for call in task_scheduler_service.process_micro_batch.await_args_list] == [3, 2]
+    partition = TopicPartition(LANE_TOPICS[UrgencyLevel.NORMAL], 0)
+    assert [call.args[0] for call in consumer.commit.await_args_list] == [{partition: 3}, {partition: 5}]
+
+@pytest.mark.asyncio
+async def test_process_tasks_retries_unassigned_requests_after_a_backoff(task_scheduler_service, monkeypatch):
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_RETRY_BACKOFF_MS", 20)
+    care_requests = [make_request(31.88, 117.35) for _ in range(3)]
+    messages = [make_message(care_request, offset) for offset, care_request in enumerate(care_requests)]
+    batches = [{"partition-0": messages}]
+    kafka_producer = task_scheduler_service.care_request_service.kafka_producer = AsyncMock(spec=KafkaProducerService)
+    consumer = MagicMock()
+
+    async def getmany(timeout_ms, max_records):
+        if batches:
+            return batches.pop(0)
+        if kafka_producer.publish_messages.await_count:
+            raise asyncio.CancelledError()
+        await asyncio.sleep(0.005)
+        return {}
+
+    consumer.getmany = AsyncMock(side_effect=getmany)
+    consumer.commit = AsyncMock()
+    consumer.assignment.return_value = LANE_PARTITIONS
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_kafka_consumer", get_kafka_consumer)
+    # The middle request finds no worker
+    task_scheduler_service.process_micro_batch = AsyncMock(
+        return_value={str(care_requests[0].id): "worker", str(care_requests[2].id): "worker"})
+
+    with pytest.raises(asyncio.CancelledError):
+        await task_scheduler_service.process_tasks()
+
+    # Published to its lane again, counting the attempt, once the backoff ran out
+    topic, (payload,), keys = kafka_producer.publish_messages.await_args.args
+    assert topic == LANE_TOPICS[UrgencyLevel.NORMAL]
+    assert (payload["_id"], payload["dispatch_attempts"]) == (str(care_requests[1].id), 1)
+    assert keys == [messages[1].key]
+    # Until then commits stop short of it, so a restart would read it again
+    partition = TopicPartition(LANE_TOPICS[UrgencyLevel.NORMAL], 0)
+    assert [call.args[0] for call in consumer.commit.await_args_list] == [{partition: 1}, {partition: 3}]
+    assert task_scheduler_service.lane_metrics.unassigned[UrgencyLevel.NORMAL] == 1
+
+@pytest.mark.asyncio
+async def test_requests_taken_elsewhere_are_not_retried(task_scheduler_service):
+    worker = make_worker(31.880, 117.350)
+    # The first loses its claim to another dispatch, the second has no worker within reach
+    taken, stranded = make_request(31.880, 117.350), make_request(32.5, 118.0)
+    items = [LaneMessage(make_message(care_request, offset), UrgencyLevel.NORMAL, 0)
+             for offset, care_request in enumerate([taken, stranded])]
+    task_scheduler_service.worker_index = WorkerIndex.from_table(WorkerTable.from_workers([worker]))
+    task_scheduler_service.care_request_service.claim_care_request.return_value = False
+
+    unassigned = await task_scheduler_service._dispatch_lane_messages(items)
+
+    assert unassigned == [items[1]]
+
+@pytest.mark.asyncio
+async def test_redelivered_dispatch_event_assigns_the_request_once(task_scheduler_service):
+    workers = [make_worker(31.880, 117.350), make_worker(31.881, 117.350)]
+    care_request = make_request(31.880, 117.350)
+    task_scheduler_service.worker_index = WorkerIndex.from_table(WorkerTable.from_workers(workers))
+    task_scheduler_service.care_worker_service.release_care_worker.return_value = True
+    assigned = {}
+
+    async def claim_care_request(request_id, worker_id):
+        # Only a PENDING request can be claimed
+        if request_id in assigned:
+            return False
+        assigned[request_id] = worker_id
+        return True
+
+    task_scheduler_service.care_request_service.claim_care_request.side_effect = claim_care_request
+    # The relay sent the same outbox event twice
+    message = make_message(care_request, 0)
+    redelivered = make_message(care_request, 1)
+
+    first = await task_scheduler_service._dispatch_lane_messages([LaneMessage(message, UrgencyLevel.NORMAL, 0)])
+    second = await task_scheduler_service._dispatch_lane_messages([LaneMessage(redelivered, UrgencyLevel.NORMAL, 0)])
+
+    assert first == second == []
+    winner, loser = [call.args[1] for call in task_scheduler_service.care_request_service.claim_care_request.await_args_list]
+    assert assigned == {str(care_request.id): winner}
+    task_scheduler_service.care_worker_service.release_care_worker.assert_awaited_once_with(loser)
+
+@pytest.mark.asyncio
+async def test_process_tasks_does_not_commit_partitions_revoked_during_dispatch(task_scheduler_service, monkeypatch):
+    care_requests = [make_request(31.88, 117.35) for _ in range(4)]
+    messages = [make_message(care_request, offset) for offset, care_request in enumerate(care_requests)]
+    for message in messages[2:]:
+        message.partition = 1
+    topic = LANE_TOPICS[UrgencyLevel.NORMAL]
+    kept, revoked = TopicPartition(topic, 0), TopicPartition(topic, 1)
+    consumer = MagicMock()
+    consumer.getmany = AsyncMock(side_effect=[{kept: messages[:2], revoked: messages[2:]}, asyncio.CancelledError()])
+    consumer.commit = AsyncMock()
+    consumer.assignment.return_value = {kept, revoked}
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    async def process_micro_batch(care_requests):
+        # A rebalance takes partition 1 away while the batch is being dispatched
+        consumer.assignment.return_value = {kept}
+        return {str(care_request.id): "worker" for care_request in care_requests}
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_kafka_consumer", get_kafka_consumer)
+    task_scheduler_service.process_micro_batch = AsyncMock(side_effect=process_micro_batch)
+
+    with pytest.raises(asyncio.CancelledError):
+        await task_scheduler_service.process_tasks()
+
+    consumer.commit.assert_awaited_once_with({kept: 2})
+
+@pytest.mark.asyncio
+async def test_process_tasks_dispatches_emergencies_first(task_scheduler_service, monkeypatch):
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_MICRO_BATCH_SIZE", 4)
+    low = [make_request(31.88, 117.35, urgency=UrgencyLevel.LOW) for _ in range(6)]
+    emergency = make_request(31.88, 117.35, urgency=UrgencyLevel.EMERGENCY)
+    # Intake publishes the document id as request_id
+    emergency_message = make_message(emergency, 0)
+    emergency_message.value = json.dumps({"request_id": str(emergency.id),
+                                          **emergency.model_dump(mode="json", exclude={"id"})})
+    consumer = MagicMock()
+    consumer.getmany = AsyncMock(side_effect=[
+        {"low-0": [make_message(care_request, offset) for offset, care_request in enumerate(low)]},
+        {"emergency-0": [emergency_message]},
+        asyncio.CancelledError(),
+    ])
+    consumer.commit = AsyncMock()
+    consumer.assignment.return_value = LANE_PARTITIONS
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_kafka_consumer", get_kafka_consumer)
+    task_scheduler_service.process_micro_batch = AsyncMock(
+        side_effect=lambda care_requests: {str(care_request.id): "worker" for care_request in care_requests})
+
+    with pytest.raises(asyncio.CancelledError):
+        await task_scheduler_service.process_tasks()
+
+    batches = [call.args[0] for call in task_scheduler_service.process_micro_batch.await_args_list]
+    # The emergency overtakes the two low requests still buffered
+    assert [len(batch) for batch in batches] == [4, 3]
+    assert str(batches[1][0].id) == str(emergency.id)
+    assert task_scheduler_service.lane_metrics.assigned[UrgencyLevel.EMERGENCY] == 1
+    assert task_scheduler_service.lane_metrics.assigned[UrgencyLevel.LOW] == 6
+
+@pytest.mark.asyncio
+async def test_process_tasks_skips_malformed_requests_and_retries_failed_batches(task_scheduler_service, monkeypatch):
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_RETRY_BACKOFF_MS", 1)
+    care_requests = [make_request(31.88, 117.35) for _ in range(2)]
+    malformed = make_message(care_requests[0], 1)
+    malformed.value = json.dumps({"request_id": "not-a-request"})
+    messages = [make_message(care_requests[0], 0), malformed, make_message(care_requests[1], 2)]
+    consumer = MagicMock()
+    consumer.getmany = AsyncMock(side_effect=[{"partition-0": messages}, {}, {}, asyncio.CancelledError()])
+    consumer.commit = AsyncMock(side_effect=CommitFailedError("rebalanced"))
+    consumer.assignment.return_value = LANE_PARTITIONS
+
+    async def get_kafka_consumer(*topics, **kwargs):
+        yield consumer
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_kafka_consumer", get_kafka_consumer)
+    task_scheduler_service.process_micro_batch = AsyncMock(side_effect=[
+        AppException(status_code=500, detail="Failed to reserve care worker"),
+        {str(care_request.id): "worker" for care_request in care_requests},
+    ])
+
+    with pytest.raises(asyncio.CancelledError):
+        await task_scheduler_service.process_tasks()
+
+    # The failed batch is dispatched again, without the malformed request and without committing first
+    batches = [call.args[0] for call in task_scheduler_service.process_micro_batch.await_args_list]
+    assert [[str(care_request.id) for care_request in batch] for batch in batches] == \
+        [[str(care_request.id) for care_request in care_requests]] * 2
+    partition = TopicPartition(LANE_TOPICS[UrgencyLevel.NORMAL], 0)
+    # A failed commit does not stop the loop, and is tried again on the next rounds
+    assert [call.args[0] for call in consumer.commit.await_args_list] == [{partition: 3}] * 2
+
+def test_lane_queue_shares_batches_by_weight_and_serves_overdue_first():
+    lanes = LaneQueue({"Emergency": 4, "High": 2, "Normal": 1, "Low": 1},
+                      {"Emergency": 1000, "Low": 60000})
+    now = 1000.0
+    for offset in range(20):
+        for urgency in (UrgencyLevel.EMERGENCY, UrgencyLevel.HIGH, UrgencyLevel.LOW):
+            lanes.put(MagicMock(topic=LANE_TOPICS[urgency], timestamp=None, offset=offset), now)
+
+    taken = lanes.take(7, now)
+    assert [item.lane for item in taken] == [UrgencyLevel.EMERGENCY] * 4 + [UrgencyLevel.HIGH] * 2 + [UrgencyLevel.LOW]
+    # Low keeps getting a share while higher lanes are backlogged
+    assert UrgencyLevel.LOW in {item.lane for item in lanes.take(8, now)}
+
+    # Low messages past their SLO go ahead of everything that is not
+    taken = lanes.take(3, now + 61)
+    assert [item.lane for item in taken] == [UrgencyLevel.EMERGENCY] * 3
+    lanes.buffers[UrgencyLevel.EMERGENCY].clear()
+    taken = lanes.take(3, now + 61)
+    assert [item.lane for item in taken] == [UrgencyLevel.LOW] * 3
+
+def test_lane_metrics_time_to_assignment():
+    metrics = LaneMetrics({"Emergency": 1000})
+    for seconds in (0.1, 0.2, 1.5):
+        metrics.record_assignment(UrgencyLevel.EMERGENCY, seconds)
+    snapshot = metrics.snapshot()["Emergency"]
+    assert snapshot["assigned"] == 3
+    assert snapshot["slo_misses"] == 1
+    assert snapshot["p50_ms"] == 200.0
+
+def test_worker_index_matches_brute_force():
+    rng = np.random.default_rng(0)
+    index = WorkerIndex(cell_km=0.5, capacity=8)
+    service_types, statuses = list(ServiceType), list(CareWorkerStatus)
+    latitudes, longitudes = rng.uniform(31.8, 32.0, 3000), rng.uniform(117.2, 117.5, 3000)
+    for i, (lat, lon) in enumerate(zip(latitudes, longitudes)):
+        index.upsert(f"w{i}", lat, lon, [service_types[i % 4]], statuses[i % 3])
+    # Move some workers across cells and remove others
+    for i in range(0, 3000, 7):
+        latitudes[i] += 0.02
+        index.apply_update({"worker_id": f"w{i}", "current_location": {"latitude": latitudes[i], "longitude": longitudes[i]}})
+    removed = set(range(0, 3000, 11))
+    for i in removed:
+        index.apply_update({"worker_id": f"w{i}", "deleted": True})
+
+    for lat, lon in zip(rng.uniform(31.8, 32.0, 50), rng.uniform(117.2, 117.5, 50)):
+        location = Location(latitude=lat, longitude=lon)
+        distances = DistanceService.calculate_distances(location, latitudes, longitudes)
+        by_distance = [i for i in np.argsort(distances, kind="stable") if i not in removed]
+
+        assert index.radius(lat, lon, 2) == [f"w{i}" for i in by_distance if distances[i] <= 2]
+        assert index.nearest(lat, lon, 5) == [f"w{i}" for i in by_distance[:5]]
+        assert index.radius(lat, lon, 3, [CareWorkerStatus.AVAILABLE], ServiceType.PHYSICAL_THERAPY) == [
+            f"w{i}" for i in by_distance if distances[i] <= 3 and i % 3 == 0 and i % 4 == 2
+        ]
+
+@pytest.mark.asyncio
+async def test_search_expands_until_enough_available_workers(task_scheduler_service, monkeypatch):
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_INITIAL_SEARCH_RADIUS_KM", 1)
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_CANDIDATE_COUNT", 2)
+    busy = [make_worker(31.880, 117.350 + 0.001 * i, status=CareWorkerStatus.BUSY) for i in range(4)]
+    available = [make_worker(31.880, 117.380 + 0.001 * i) for i in range(3)]
+    by_id = {str(worker.id): worker for worker in busy + available}
+    task_scheduler_service.care_worker_service.get_care_worker_table.side_effect = (
+        lambda worker_ids: WorkerTable.from_workers(by_id[worker_id] for worker_id in worker_ids)
+    )
+    ids = [str(worker.id) for worker in busy + available]
+    pipe = mock_redis(
+        task_scheduler_service,
+        [[]],           # 1 km: nothing
+        [ids[:4]],      # 2 km: four busy workers, the count of 4 is saturated
+        [ids[:4]],      # 2 km, count 8: still only busy workers inside 2 km
+        [ids[:6]],      # 4 km: two available workers found
+    )
+
+    candidate_ids, table = await task_scheduler_service._find_candidates([make_request(31.880, 117.350)])
+
+    assert candidate_ids == [ids[4:6]]
+    assert [(call.kwargs["radius"], call.kwargs["count"]) for call in pipe.geosearch.call_args_list] == [
+        (1, 4), (2, 4), (2, 8), (4, 8)
+    ]
+    assert sorted(table.ids) == sorted(ids[:6])
+
+def test_worker_index_nearest_skips_unavailable():
+    index = WorkerIndex()
+    index.upsert("busy", 31.880, 117.350, status=CareWorkerStatus.BUSY)
+    index.upsert("near", 31.880, 117.360, status=CareWorkerStatus.AVAILABLE)
+    index.upsert("far", 31.880, 117.450, status=CareWorkerStatus.AVAILABLE)
+    # A location alone does not add a worker
+    index.apply_update({"worker_id": "unknown", "current_location": {"latitude": 31.880, "longitude": 117.350}})
+    assert "unknown" not in index
+
+    assert index.nearest(31.880, 117.350, 1, statuses=[CareWorkerStatus.AVAILABLE]) == ["near"]
+    assert index.nearest(31.880, 117.350, 5, max_km=5, statuses=[CareWorkerStatus.AVAILABLE]) == ["near"]
+    assert index.nearest(31.880, 117.350, 5, max_km=20, statuses=[CareWorkerStatus.AVAILABLE]) == ["near", "far"]
+
+@pytest.mark.asyncio
+async def test_dispatch_uses_worker_index_instead_of_redis(task_scheduler_service, monkeypatch):
+    near = make_worker(31.880, 117.350)
+    far = make_worker(31.880, 117.360, status=CareWorkerStatus.BUSY)
+    redis = MagicMock()
+    redis.zrange = AsyncMock(return_value=[str(near.id), str(far.id)])
+    # Redis positions win over the (stale) document locations
+    redis.geopos = AsyncMock(return_value=[(117.350, 31.880), (117.351, 31.881)])
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_redis_client", AsyncMock(return_value=redis))
+    task_scheduler_service.care_worker_service.get_care_worker_table.return_value = WorkerTable.from_workers([near, far])
+
+    await task_scheduler_service.load_worker_index()
+    task_scheduler_service.apply_worker_update({"worker_id": str(far.id), "status": "Available"})
+    task_scheduler_service.care_worker_service.get_care_worker_table.reset_mock()
+    task_scheduler_service.care_worker_service.redis_cache.pipeline.side_effect = AssertionError(
+        "dispatch should not query Redis"
+    )
+
+    care_request = make_request(31.8812, 117.3512)
+    assignments = await task_scheduler_service.process_micro_batch([care_request])
+
+    assert assignments == {str(care_request.id): str(far.id)}
+    task_scheduler_service.care_worker_service.get_care_worker_table.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_consume_worker_updates_keeps_index_current(task_scheduler_service, monkeypatch):
+    worker = make_worker(31.88, 117.35)
+    event = {"worker_id": str(worker.id), "current_location": {"latitude": 31.95, "longitude": 117.45}}
+    partition = TopicPartition("worker_updates", 0)
+    batches = [{partition: [MagicMock(value=json.dumps(event).encode(), topic=partition.topic,
+                                      partition=0, offset=0)]}]
+    consumer = MagicMock()
+    consumer.stop = AsyncMock()
+    consumer.commit = AsyncMock()
+    consumer.assignment.return_value = {partition}
+    consumer.highwater.return_value = 1
+    consumer.position = AsyncMock(return_value=1)
+
+    async def getmany(timeout_ms, max_records):
+        if batches:
+            return batches.pop(0)
+        await asyncio.sleep(0.01)
+        return {}
+
+    consumer.getmany = AsyncMock(side_effect=getmany)
+    group_ids = []
+
+    async def start_kafka_consumer(*topics, listener=None, group_id=None, **kwargs):
+        assert topics == ("worker_updates",)
+        group_ids.append(group_id)
+        return consumer
+
+    async def load_worker_index():
+        task_scheduler_service.worker_index = WorkerIndex.from_table(WorkerTable.from_workers([worker]))
+
+    monkeypatch.setattr("src.services.kafka_consumer_service.start_kafka_consumer", start_kafka_consumer)
+    monkeypatch.setattr(task_scheduler_service, "load_worker_index", load_worker_index)
+
+    task = asyncio.create_task(task_scheduler_service.consume_worker_updates())
+    for _ in range(100):
+        if task_scheduler_service.worker_updates and task_scheduler_service.worker_updates.handled:
+            break
+        await asyncio.sleep(0.005)
+
+    assert task_scheduler_service.worker_index.radius(31.88, 117.35, 1) == []
+    assert task_scheduler_service.worker_index.radius(31.95, 117.45, 1) == [str(worker.id)]
+    stats = await task_scheduler_service.worker_update_stats()
+    assert stats["handled"] == 1 and stats["lag"] == {"worker_updates:0": {"lag": 0, "queued": 0, "committed": None}}
+    # A group per scheduler, so each one receives every update
+    assert group_ids[0].startswith("task-scheduler-worker-updates-")
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    consumer.stop.assert_awaited_once()
+
+BOUNDS = (31.5, 117.0, 32.3, 117.8)
+
+def test_geo_partitioner_gives_partitions_contiguous_regions():
+    grid = GeoGrid(BOUNDS, cell_km=5)
+    partitioner = GeoPartitioner(grid)
+    partitions = grid.cell_partitions(8).reshape(grid.rows, grid.cols)
+
+    # Cell keys go to the partition of their cell, which is one of a balanced share of the grid
+    rng = np.random.default_rng(0)
+    for latitude, longitude in zip(rng.uniform(31.5, 32.3, 200), rng.uniform(117.0, 117.8, 200)):
+        key = geo_cell_key(latitude, longitude, 5)
+        assert partitioner(key, list(range(8)), list(range(8))) == grid.partition_of(latitude, longitude, 8)
+    assert np.ptp(np.bincount(partitions.ravel())) <= 1
+    # A partition's cells touch each other, save where the curve leaves the grid and comes back
+    for partition in range(8):
+        rows, cols = np.nonzero(partitions == partition)
+        neighbours = sum(any(abs(row - other_row) + abs(col - other_col) == 1
+                             for other_row, other_col in zip(rows, cols)) for row, col in zip(rows, cols))
+        assert neighbours >= len(rows) - 1
+    # Other keys are hashed as usual
+    assert 0 <= partitioner(b"64f1c0ffee", list(range(8)), list(range(8))) < 8
+
+def test_shard_regions_split_cells_between_partitions():
+    grid = GeoGrid(BOUNDS, cell_km=5)
+    rng = np.random.default_rng(0)
+    locations = list(zip(rng.uniform(31.5, 32.3, 2000), rng.uniform(117.0, 117.8, 2000)))
+    # Consecutive partitions, as the range assignor hands them out
+    regions = [ShardRegion({2 * instance, 2 * instance + 1}, 8, grid, halo_km=2) for instance in range(4)]
+
+    for latitude, longitude in locations:
+        partition = grid.partition_of(latitude, longitude, 8)
+        assert sum(partition in region.partitions for region in regions) == 1
+        # The owner keeps every worker in its cells, and neighbours keep those near the border
+        owner = next(region for region in regions if partition in region.partitions)
+        assert owner.covers(latitude, longitude)
+    # Each instance keeps its own quarter and a thin halo, not every worker
+    for region in regions:
+        assert sum(region.covers(*location) for location in locations) < 0.5 * len(locations)
+
+def test_shard_region_covers_workers_across_the_border():
+    grid = GeoGrid(BOUNDS, cell_km=5)
+    region = ShardRegion({0}, 2, grid, halo_km=2)
+    cell_deg = 5 / 111.19492664455873
+
+    def owned(latitude, longitude):
+        return grid.partition_of(latitude, longitude, 2) in region.partitions
+
+    # Walk east along a row until the neighbouring cell is not owned
+    latitude = (grid.min_row + 0.5) * cell_deg
+    col = next(col for col in range(grid.min_col, grid.min_col + grid.cols)
+               if owned(latitude, (col + 0.5) * cell_deg) and not owned(latitude, (col + 1.5) * cell_deg))
+    assert region.covers(latitude, (col + 1.01) * cell_deg)
+    assert not owned(latitude, (col + 1.01) * cell_deg)
+    assert not region.covers(latitude, (col + 1.9) * cell_deg)
+
+@pytest.mark.asyncio
+async def test_revoked_partitions_commit_their_dispatched_offsets(task_scheduler_service):
+    topic = LANE_TOPICS[UrgencyLevel.NORMAL]
+    revoked, kept = TopicPartition(topic, 1), TopicPartition(topic, 0)
+    lanes = LaneQueue({"Normal": 1}, {"Normal": 1000})
+    listener = _ShardRebalanceListener(task_scheduler_service, lanes)
+    listener.consumer = MagicMock()
+    listener.consumer.commit = AsyncMock()
+    task_scheduler_service._dispatched_offsets.update({revoked: 7, kept: 3})
+    task_scheduler_service._committed_offsets[revoked] = 4
+
+    await listener.on_partitions_revoked({revoked})
+
+    # The new owner starts after what this instance dispatched, instead of dispatching it again
+    listener.consumer.commit.assert_awaited_once_with({revoked: 7})
+    assert task_scheduler_service._dispatched_offsets == {kept: 3}
+
+@pytest.mark.asyncio
+async def test_reshard_keeps_only_the_region_and_its_halo(task_scheduler_service, monkeypatch):
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.GEO_SHARD_CELL_KM", 5)
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.GEO_SHARD_BOUNDS", BOUNDS)
+    monkeypatch.setattr("src.services.task_scheduler_service.settings.SCHEDULER_SEARCH_RADIUS_KM", 1)
+    rng = np.random.default_rng(1)
+    workers = [make_worker(lat, lon) for lat, lon in zip(rng.uniform(31.7, 32.1, 300), rng.uniform(117.1, 117.6, 300))]
+    redis = MagicMock()
+    redis.zrange = AsyncMock(return_value=[str(worker.id) for worker in workers])
+    redis.geopos = AsyncMock(return_value=[(worker.current_location.longitude, worker.current_location.latitude)
+                                           for worker in workers])
+
+    async def get_care_worker_table(worker_ids):
+        return WorkerTable.from_workers(worker for worker in workers if str(worker.id) in set(worker_ids))
+
+    monkeypatch.setattr("src.services.task_scheduler_service.get_redis_client", AsyncMock(return_value=redis))
+    task_scheduler_service.care_worker_service.get_care_worker_table.side_effect = get_care_worker_table
+    task_scheduler_service.worker_index = WorkerIndex()
+    consumer = MagicMock()
+    consumer.partitions_for_topic.return_value = {0, 1, 2, 3}
+    task_scheduler_service._pending_partitions = {TopicPartition(topic, 1) for topic in LANE_TOPICS.values()}
+
+    await task_scheduler_service._reshard(consumer)
+
+    shard = task_scheduler_service.shard
+    assert shard.partitions == {1}
+    kept = {worker_id for worker_id in task_scheduler_service.worker_index.ids if worker_id}
+    assert kept == {str(worker.id) for worker in workers
+                    if shard.covers(worker.current_location.latitude, worker.current_location.longitude)}
+    assert 0 < len(kept) < len(workers)
+
+    # A worker moving out of the region leaves the index
+    worker_id = next(iter(kept))
+    outside = next((worker.current_location for worker in workers if str(worker.id) not in kept))
+    task_scheduler_service.apply_worker_update({"worker_id": worker_id, "latitude": outside.latitude,
+                                                "longitude": outside.longitude})
+    assert worker_id not in task_scheduler_service.worker_index
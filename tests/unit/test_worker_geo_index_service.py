@@ -0,0 +1,101 @@
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from bson import ObjectId
+from src.models.schemas import CareWorkerStatus, ServiceType
+from src.services.redis_cache_service import RedisCacheService
+from src.services.worker_geo_index_service import (
+    PARTITION_KEYS, WORKER_GEO_MEMBERSHIP_KEY, WorkerGeoIndexService, partition_keys, worker_geo_key
+)
+
+def mock_pipeline(redis, results=None):
+    pipe = MagicMock()
+    pipe.execute = AsyncMock(return_value=results or [])
+    context = MagicMock()
+    context.__aenter__ = AsyncMock(return_value=pipe)
+    context.__aexit__ = AsyncMock(return_value=False)
+    redis.pipeline.return_value = context
+    return pipe
+
+@pytest.fixture
+def geo_index():
+    redis_cache = MagicMock(spec=RedisCacheService)
+    redis_cache.redis = MagicMock()
+    return WorkerGeoIndexService(redis_cache)
+
+@pytest.fixture
+def mock_collection(monkeypatch):
+    collection = MagicMock()
+    monkeypatch.setattr("src.services.worker_geo_index_service.get_care_workers_collection",
+                        AsyncMock(return_value=collection))
+    return collection
+
+def test_partition_keys_cover_status_and_each_specialization():
+    document = {"status": CareWorkerStatus.BUSY.value,
+                "specializations": [ServiceType.MEDICAL_CHECKUP.value, ServiceType.PHYSICAL_THERAPY.value]}
+
+    assert partition_keys(document) == [
+        "worker_locations:Busy", "worker_locations:Busy:Medical Checkup", "worker_locations:Busy:Physical Therapy"
+    ]
+    # Stored without a status means available
+    assert partition_keys({}) == [worker_geo_key(CareWorkerStatus.AVAILABLE)]
+
+@pytest.mark.asyncio
+async def test_update_worker_moves_between_partitions_in_one_transaction(geo_index):
+    worker_id = str(ObjectId())
+    redis = geo_index.redis_cache.redis
+    redis.geopos = AsyncMock(return_value=[(117.31, 31.81)])
+    pipe = mock_pipeline(redis)
+    document = {"status": CareWorkerStatus.OFFLINE.value, "specializations": [ServiceType.MEDICAL_CHECKUP.value],
+                "current_location": {"latitude": 31.0, "longitude": 117.0}}
+
+    await geo_index.update_worker(worker_id, document)
+
+    redis.pipeline.assert_called_once_with(transaction=True)
+    keys = partition_keys(document)
+    removed = {call.args[0] for call in pipe.zrem.call_args_list}
+    assert removed == set(PARTITION_KEYS) - set(keys)
+    # The last pinged position wins over the document's
+    assert [call.args for call in pipe.geoadd.call_args_list] == [
+        (key, (117.31, 31.81, worker_id)) for key in ["worker_locations"] + keys
+    ]
+    pipe.hset.assert_called_once_with(WORKER_GEO_MEMBERSHIP_KEY, worker_id, "|".join(keys))
+
+@pytest.mark.asyncio
+async def test_move_workers_only_updates_partitions_they_are_still_in(geo_index):
+    member, unindexed = str(ObjectId()), str(ObjectId())
+    redis = geo_index.redis_cache.redis
+    redis.hmget = AsyncMock(return_value=["worker_locations:Available|worker_locations:Available:Medical Checkup", None])
+    pipe = mock_pipeline(redis)
+
+    assert await geo_index.move_workers([(117.3, 31.8, member), (117.4, 31.9, unindexed)]) == [member]
+
+    # A worker without a membership entry is not added anywhere
+    calls = {call.args[0]: (call.args[1], call.kwargs["xx"]) for call in pipe.geoadd.call_args_list}
+    assert calls == {
+        "worker_locations": ([117.3, 31.8, member], False),
+        "worker_locations:Available": ([117.3, 31.8, member], True),
+        "worker_locations:Available:Medical Checkup": ([117.3, 31.8, member], True),
+    }
+
+@pytest.mark.asyncio
+async def test_reconcile_reindexes_drifted_and_removes_orphaned_workers(geo_index, mock_collection):
+    in_step = {"_id": ObjectId(), "status": CareWorkerStatus.AVAILABLE.value, "specializations": [],
+               "current_location": {"latitude": 31.8, "longitude": 117.3}}
+    # Went offline while Redis was unreachable
+    drifted = {**in_step, "_id": ObjectId(), "status": CareWorkerStatus.OFFLINE.value}
+    orphaned = str(ObjectId())
+    cursor = MagicMock()
+    cursor.to_list = AsyncMock(side_effect=[[in_step, drifted], [drifted]])
+    mock_collection.find.return_value = cursor
+    available = worker_geo_key(CareWorkerStatus.AVAILABLE)
+    ids = [str(in_step["_id"]), str(drifted["_id"]), orphaned]
+    mock_pipeline(geo_index.redis_cache.redis, [ids] + [ids if key == available else [] for key in PARTITION_KEYS] + [
+        {worker_id: available for worker_id in ids}
+    ])
+    geo_index.update_worker = AsyncMock()
+    geo_index.remove_worker = AsyncMock()
+
+    assert await geo_index.reconcile() == {"checked": 2, "reindexed": 1, "removed": 1}
+
+    geo_index.update_worker.assert_awaited_once_with(str(drifted["_id"]), drifted)
+    geo_index.remove_worker.assert_awaited_once_with(orphaned)